@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频击球瞬态定位
+
+杆头击球会产生一个尖锐的音频瞬态，比逐帧跑高分辨率YOLO便宜得多。
+流程：ffmpeg 抽取单声道 PCM → 向量化分帧 → 能量差分 + 频谱通量 → 取最强起音点 → 映射到视频帧号。
+抽取的 PCM 从音频流的第一个采样开始，起音时间加上音频流 start_time 得到容器时间，再按 ffprobe 读出的
+视频帧时间戳找最近的帧（可变帧率、音视频起始时间不同的手机视频也能对齐）；ffprobe 不可用时退回 时间 × 平均帧率。
+没有音轨或 ffmpeg 不可用时返回 None，由调用方回退到纯视觉流程。
+"""
+
+import json
+import subprocess
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def extract_audio_pcm(video_path: str, sample_rate: int = 16000, timeout: float = 30.0) -> Optional[np.ndarray]:
+    """用 ffmpeg 抽取单声道 float32 PCM，无音轨/失败时返回 None"""
+    cmd = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "pipe:1",
+    ]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ 音频抽取失败: {e}")
+        return None
+    if proc.returncode != 0 or not proc.stdout:
+        # 典型情况：视频没有音轨
+        return None
+    return np.frombuffer(proc.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def probe_stream_timing(video_path: str, timeout: float = 30.0) -> Optional[Dict[str, Any]]:
+    """
+    用 ffprobe 读取音频/视频流的 start_time 和视频帧的显示时间戳（只读包头，不解码）
+
+    Returns:
+        {"audio_start": 秒, "video_start": 秒, "video_pts": 按显示顺序排列的视频帧时间戳}；失败返回 None
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "stream=index,codec_type,start_time:packet=stream_index,pts_time",
+        "-of", "json", video_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        data = json.loads(proc.stdout) if proc.returncode == 0 else None
+    except (FileNotFoundError, subprocess.TimeoutExpired, ValueError) as e:
+        print(f"⚠️ 读取音视频时间戳失败: {e}")
+        return None
+    if not data:
+        return None
+
+    def _float(value) -> Optional[float]:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    streams = data.get("streams", [])
+    video = next((st for st in streams if st.get("codec_type") == "video"), None)
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), None)
+    if video is None or audio is None:
+        return None
+    video_pts = [_float(pkt.get("pts_time")) for pkt in data.get("packets", [])
+                 if pkt.get("stream_index") == video.get("index")]
+    video_pts = np.sort(np.array([t for t in video_pts if t is not None], dtype=np.float64))
+    return {
+        "audio_start": _float(audio.get("start_time")) or 0.0,
+        "video_start": _float(video.get("start_time")) or (float(video_pts[0]) if len(video_pts) else 0.0),
+        "video_pts": video_pts,
+    }
+
+
+def onset_to_frame(onset_time: float, fps: float, timing: Optional[Dict[str, Any]] = None,
+                   total_frames: Optional[int] = None) -> int:
+    """
+    把起音时间（相对抽取的 PCM 起点）换算成视频帧号
+
+    有时间戳时按 音频 start_time + 起音时间 找显示时间最近的视频帧；
+    只有 start_time 时按平均帧率从视频 start_time 起算；没有 timing 时为 时间 × 平均帧率。
+    """
+    if timing is None:
+        frame = int(round(onset_time * fps))
+    else:
+        pts_time = timing["audio_start"] + onset_time
+        video_pts = timing.get("video_pts")
+        if video_pts is not None and len(video_pts) > 0:
+            idx = int(np.searchsorted(video_pts, pts_time))
+            if idx >= len(video_pts) or (idx > 0 and pts_time - video_pts[idx - 1] <= video_pts[idx] - pts_time):
+                idx -= 1
+            frame = idx
+        else:
+            frame = int(round((pts_time - timing["video_start"]) * fps))
+    if total_frames:
+        frame = min(total_frames - 1, frame)
+    return max(0, frame)
+
+
+def detect_onset(samples: np.ndarray, sample_rate: int, frame_length: int = 1024, hop_length: int = 256,
+                 min_peak_ratio: float = 4.0) -> Optional[Dict[str, float]]:
+    """
+    检测最强的起音点
+
+    Args:
+        samples: 单声道 PCM
+        sample_rate: 采样率
+        frame_length: 分析帧长
+        hop_length: 帧移
+        min_peak_ratio: 峰值相对新颖度中位数的最小倍数，低于此认为没有明显击球声
+
+    Returns:
+        {"time": 秒, "strength": 峰值/中位数}，未找到返回 None
+    """
+    if samples is None or len(samples) < frame_length * 4:
+        return None
+
+    # 分帧（零拷贝视图）+ 加窗
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop_length]
+    window = np.hanning(frame_length).astype(np.float32)
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames * window, axis=1)))
+
+    # 频谱通量：只累计能量上升的频带
+    flux = np.maximum(np.diff(spectrum, axis=0), 0.0).sum(axis=1)
+    # 对数能量的正向差分
+    log_energy = np.log(np.mean(frames ** 2, axis=1) + 1e-10)
+    energy_rise = np.maximum(np.diff(log_energy), 0.0)
+
+    def _normalize(x: np.ndarray) -> np.ndarray:
+        peak = float(x.max())
+        return x / peak if peak > 0 else x
+
+    novelty = _normalize(flux) + _normalize(energy_rise)
+    peak_idx = int(np.argmax(novelty))
+    baseline = float(np.median(novelty)) + 1e-6
+    strength = float(novelty[peak_idx]) / baseline
+    if strength < min_peak_ratio:
+        return None
+
+    # diff 后第 i 个值对应第 i+1 个分析帧；瞬态在该帧内的位置不固定（窗口长度 64ms，对 240fps 是十几帧），
+    # 按采样幅度细化到帧内第一个达到局部峰值一半的采样
+    start = (peak_idx + 1) * hop_length
+    segment = np.abs(samples[start:start + frame_length + hop_length])
+    onset_sample = start + int(np.argmax(segment >= 0.5 * float(segment.max()))) if len(segment) else start
+    onset_time = onset_sample / float(sample_rate)
+    return {"time": onset_time, "strength": strength}
+
+
+def locate_impact_frame(video_path: str, fps: float, total_frames: Optional[int] = None,
+                        sample_rate: int = 16000, min_peak_ratio: float = 4.0) -> Optional[Dict[str, Any]]:
+    """
+    从音轨定位击球帧
+
+    Returns:
+        {"frame": 帧号, "time": 秒, "strength": 峰值强度}；无音轨或无明显瞬态时返回 None
+    """
+    if not fps or fps <= 0:
+        return None
+    samples = extract_audio_pcm(video_path, sample_rate=sample_rate)
+    if samples is None:
+        print("🔇 视频没有可用音轨，跳过音频击球定位")
+        return None
+
+    onset = detect_onset(samples, sample_rate, min_peak_ratio=min_peak_ratio)
+    if onset is None:
+        print("🔇 音频中未发现明显击球瞬态")
+        return None
+
+    frame = onset_to_frame(onset["time"], fps, probe_stream_timing(video_path), total_frames)
+    print(f"🔊 音频击球定位: {onset['time']:.3f}s → 帧{frame} (强度 {onset['strength']:.1f})")
+    return {"frame": frame, "time": round(onset["time"], 4), "strength": round(onset["strength"], 2)}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+截止时间控制器 - 按实时吞吐量逐级降级
+
+任务带截止时间运行时，周期性地用最近的处理速度和 CAP_PROP_FRAME_COUNT 估算完成时间；
+预计超时就沿降级阶梯前进一级（加大帧步长 / 降低分辨率档位 / 切换廉价模型），
+截止时间仍然到达时由调用方停止检测并返回已完成部分的轨迹。
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+
+# 默认降级阶梯：按代价从小到大
+DEFAULT_DEGRADATION_LADDER = [
+    {"type": "stride", "value": 2},
+    {"type": "resolution", "value": 960},
+    {"type": "stride", "value": 3},
+    {"type": "model", "value": "cheap"},
+    {"type": "resolution", "value": 640},
+    {"type": "stride", "value": 4},
+]
+
+
+class DeadlineController:
+    """基于实时吞吐量的截止时间控制器"""
+
+    def __init__(self, deadline_seconds: float, estimated_total_frames: int,
+                 ladder: Optional[List[Dict[str, Any]]] = None, postprocess_reserve_s: float = 5.0,
+                 safety_factor: float = 1.1, check_interval_frames: int = 15, min_sample_seconds: float = 1.0):
+        """
+        Args:
+            deadline_seconds: 从任务开始算起的截止时间（秒）
+            estimated_total_frames: 估计的总帧数（CAP_PROP_FRAME_COUNT）
+            ladder: 降级阶梯，每一级为 {"type": "stride"|"resolution"|"model", "value": ...}
+            postprocess_reserve_s: 为检测之后的轨迹优化/状态分析预留的时间
+            safety_factor: 预计完成时间乘以该系数后再与截止时间比较
+            check_interval_frames: 每处理多少帧评估一次
+            min_sample_seconds: 吞吐量采样的最短时长，避免刚切换档位时的抖动
+        """
+        self.start_time = time.monotonic()
+        self.deadline_seconds = float(deadline_seconds)
+        self.estimated_total_frames = max(0, int(estimated_total_frames))
+        self.ladder = list(ladder if ladder is not None else DEFAULT_DEGRADATION_LADDER)
+        self.postprocess_reserve_s = postprocess_reserve_s
+        self.safety_factor = safety_factor
+        self.check_interval_frames = max(1, int(check_interval_frames))
+        self.min_sample_seconds = min_sample_seconds
+
+        # 当前生效的档位
+        self.stride = 1
+        self.resolution: Optional[int] = None
+        self.model_tier = "default"
+        self.level = 0
+        self.degradations: List[Dict[str, Any]] = []
+
+        self._sample_start_time = self.start_time
+        self._sample_start_frame = 0
+        self._last_check_frame = 0
+        self.expired_at_frame: Optional[int] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def detection_budget(self) -> float:
+        """检测阶段可用的总时长"""
+        return max(0.0, self.deadline_seconds - self.postprocess_reserve_s)
+
+    def expired(self, frame_idx: int) -> bool:
+        """检测阶段的时间预算是否已用完"""
+        if self.elapsed >= self.detection_budget:
+            if self.expired_at_frame is None:
+                self.expired_at_frame = frame_idx
+                print(f"⏰ 截止时间已到，在帧{frame_idx}停止检测，返回部分轨迹")
+            return True
+        return False
+
+    def projected_finish(self, frame_idx: int) -> Optional[float]:
+        """按当前档位的吞吐量估算检测完成时刻（相对任务开始，秒）"""
+        sample_seconds = time.monotonic() - self._sample_start_time
+        sample_frames = frame_idx - self._sample_start_frame
+        if sample_seconds < self.min_sample_seconds or sample_frames <= 0:
+            return None
+        source_fps = sample_frames / sample_seconds  # 解码位置推进速度（含跳过的帧）
+        remaining = max(0, self.estimated_total_frames - frame_idx)
+        return self.elapsed + remaining / source_fps
+
+    def update(self, frame_idx: int) -> Optional[Dict[str, Any]]:
+        """
+        评估是否需要降级
+
+        Args:
+            frame_idx: 当前解码位置
+
+        Returns:
+            新应用的降级项；无需降级或阶梯已用完时返回 None
+        """
+        if frame_idx - self._last_check_frame < self.check_interval_frames:
+            return None
+        self._last_check_frame = frame_idx
+
+        projected = self.projected_finish(frame_idx)
+        if projected is None or projected * self.safety_factor <= self.detection_budget:
+            return None
+        if self.level >= len(self.ladder):
+            return None
+
+        step = dict(self.ladder[self.level])
+        self.level += 1
+        if step["type"] == "stride":
+            self.stride = max(self.stride, int(step["value"]))
+        elif step["type"] == "resolution":
+            self.resolution = int(step["value"]) if self.resolution is None else min(self.resolution, int(step["value"]))
+        elif step["type"] == "model":
+            self.model_tier = step["value"]
+
+        step.update({
+            "at_frame": frame_idx,
+            "elapsed_s": round(self.elapsed, 2),
+            "projected_finish_s": round(projected, 2)
+        })
+        self.degradations.append(step)
+        print(f"⏱️ 预计 {projected:.1f}s 完成，超出预算 {self.detection_budget:.1f}s，降级: {step['type']}={step['value']}")
+
+        # 新档位重新采样吞吐量
+        self._sample_start_time = time.monotonic()
+        self._sample_start_frame = frame_idx
+        return step
+
+    def summary(self, processed_frames: int) -> Dict[str, Any]:
+        return {
+            "deadline_s": self.deadline_seconds,
+            "elapsed_detection_s": round(self.elapsed, 2),
+            "met": self.expired_at_frame is None,
+            "partial": self.expired_at_frame is not None,
+            "processed_frames": processed_frames,
+            "estimated_total_frames": self.estimated_total_frames,
+            "final_stride": self.stride,
+            "final_resolution": self.resolution,
+            "final_model_tier": self.model_tier,
+            "degradations": self.degradations
+        }
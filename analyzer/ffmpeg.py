@@ -1,36 +1,203 @@
 from __future__ import annotations
 
-from typing import Generator, Tuple
+import subprocess
+import threading
+from collections import deque
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
 
 import cv2
+import numpy as np
 
 
-def iter_video_frames(path: str, sample_stride: int = 1, max_size: int = 960) -> Generator[Tuple[bool, "np.ndarray"], None, None]:
+def iter_video_frames(path: str, sample_stride: int = 1, max_size: int = 960, start_frame: int = 0, end_frame: Optional[int] = None) -> Generator[Tuple[bool, "np.ndarray"], None, None]:
     """Yield frames with optional downscale and frame sampling.
 
-    - sample_stride: >1 means pick 1 frame every N frames
+    - sample_stride: >1 means pick 1 frame every N frames (skipped frames are only grabbed, not decoded)
     - max_size: resize so that the longer edge <= max_size
+    - start_frame / end_frame: only yield frames in [start_frame, end_frame] (inclusive)
     """
     cap = cv2.VideoCapture(path)
     idx = 0
+    if start_frame > 0:
+        if not seek_to_frame(cap, start_frame):
+            cap.release()
+            return
+        idx = start_frame
     try:
         while True:
-            ok, frame = cap.read()
-            if not ok:
+            if end_frame is not None and idx > end_frame:
                 break
-            if sample_stride > 1 and (idx % sample_stride) != 0:
+            if sample_stride > 1 and ((idx - start_frame) % sample_stride) != 0:
+                # 只推进解码位置，不做像素格式转换
+                if not cap.grab():
+                    break
                 idx += 1
                 continue
-            h, w = frame.shape[:2]
-            long_edge = max(h, w)
-            if max_size and long_edge > max_size:
-                scale = float(max_size) / float(long_edge)
-                new_w = int(w * scale)
-                new_h = int(h * scale)
-                frame = cv2.resize(frame, (new_w, new_h))
-            yield True, frame
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield True, resize_long_edge(frame, max_size)
             idx += 1
     finally:
         cap.release()
 
 
+def seek_to_frame(cap: "cv2.VideoCapture", frame_idx: int) -> bool:
+    """Frame-accurate seek: the next read() returns frame `frame_idx`.
+
+    Container seeks land on the preceding keyframe for some codecs/backends; when the
+    reported position does not match, rewind and grab forward instead.
+    """
+    if frame_idx <= 0:
+        return True
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_idx:
+        return True
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_idx):
+        if not cap.grab():
+            return False
+    return True
+
+
+def resize_long_edge(frame: "np.ndarray", max_size: int) -> "np.ndarray":
+    """Downscale so that the longer edge <= max_size (no-op when already small enough)."""
+    h, w = frame.shape[:2]
+    long_edge = max(h, w)
+    if max_size and long_edge > max_size:
+        scale = float(max_size) / float(long_edge)
+        new_w = int(w * scale)
+        new_h = int(h * scale)
+        frame = cv2.resize(frame, (new_w, new_h))
+    return frame
+
+
+def scaled_size(width: int, height: int, max_size: int) -> Tuple[int, int]:
+    """Output (width, height) of resize_long_edge for a frame of the given size."""
+    long_edge = max(width, height)
+    if max_size and long_edge > max_size:
+        scale = float(max_size) / float(long_edge)
+        return int(width * scale), int(height * scale)
+    return width, height
+
+
+def mp4_moov_end(head: bytes) -> Optional[int]:
+    """Locate the end of the `moov` box when it precedes `mdat` (faststart MP4).
+
+    Returns the byte offset where `moov` ends, 0 when `mdat` comes first or the data is
+    not an MP4, or None when more bytes are needed to decide.
+    """
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset:offset + 4], "big")
+        box_type = bytes(head[offset + 4:offset + 8])
+        header = 8
+        if size == 1:
+            if offset + 16 > len(head):
+                return None
+            size = int.from_bytes(head[offset + 8:offset + 16], "big")
+            header = 16
+        if offset == 0 and box_type != b"ftyp":
+            return 0
+        if box_type == b"moov":
+            return offset + size if size >= header else 0
+        if box_type == b"mdat" or size < header:  # size 0 = box runs to end of file
+            return 0
+        offset += size
+    return None
+
+
+def iter_stream_frames(chunks: Iterable[bytes], width: int, height: int, max_size: int = 960, start_frame: int = 0) -> Generator[Tuple[bool, np.ndarray], None, None]:
+    """Decode frames from a byte stream (e.g. an upload still arriving) through `ffmpeg -i pipe:0`.
+
+    A feeder thread copies `chunks` into ffmpeg's stdin while frames are read back from
+    stdout as rawvideo bgr24, already scaled like resize_long_edge. Only containers whose
+    index precedes the media data (faststart MP4) can be decoded from a pipe.
+    """
+    out_w, out_h = scaled_size(width, height, max_size)
+    frame_bytes = out_w * out_h * 3
+    proc = subprocess.Popen(
+        ["ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+         "-vf", f"scale={out_w}:{out_h}:flags=bilinear", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+
+    def _feed() -> None:
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError, OSError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=_feed, daemon=True)
+    feeder.start()
+    idx = 0
+    try:
+        while True:
+            data = proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            if idx >= start_frame:
+                yield True, np.frombuffer(data, dtype=np.uint8).reshape(out_h, out_w, 3).copy()
+            idx += 1
+    finally:
+        proc.kill()
+        proc.wait()
+        proc.stdout.close()
+        feeder.join(timeout=1.0)
+
+
+def iter_tee_frames(path: str, width: int, height: int, output_path: str, encode_args: List[str], max_size: int = 960, start_frame: int = 0, result: Optional[Dict[str, Any]] = None) -> Generator[Tuple[bool, np.ndarray], None, None]:
+    """Decode `path` once and tee it: encode to `output_path` while yielding scaled bgr24 frames.
+
+    A single ffmpeg process splits the decoded video; one branch goes through
+    `encode_args` (codec/container options, audio mapped from the input when present)
+    into `output_path`, the other is scaled like resize_long_edge and read back from
+    stdout. The encoder advances at the pace frames are consumed. When the generator
+    is exhausted, `result["returncode"]` is ffmpeg's exit code (non-zero / missing when
+    the consumer stopped early and the process was killed) and `result["stderr"]` holds
+    the last lines of ffmpeg's log.
+    """
+    result = result if result is not None else {}
+    out_w, out_h = scaled_size(width, height, max_size)
+    frame_bytes = out_w * out_h * 3
+    proc = subprocess.Popen(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path,
+         "-filter_complex", f"[0:v]split=2[enc][det];[det]scale={out_w}:{out_h}:flags=bilinear[raw]",
+         "-map", "[enc]", "-map", "0:a:0?"] + list(encode_args) + ["-y", output_path,
+         "-map", "[raw]", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    stderr_tail: deque = deque(maxlen=20)
+
+    def _drain_stderr() -> None:
+        for line in proc.stderr:
+            stderr_tail.append(line.decode("utf-8", "replace").rstrip())
+
+    drainer = threading.Thread(target=_drain_stderr, daemon=True)
+    drainer.start()
+    idx = 0
+    finished = False
+    try:
+        while True:
+            data = proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                finished = True
+                break
+            if idx >= start_frame:
+                yield True, np.frombuffer(data, dtype=np.uint8).reshape(out_h, out_w, 3).copy()
+            idx += 1
+    finally:
+        if not finished:
+            proc.kill()
+        proc.wait()
+        proc.stdout.close()
+        drainer.join(timeout=1.0)
+        result["returncode"] = proc.returncode if finished else None
+        result["frames"] = idx
+        result["stderr"] = "\n".join(stderr_tail)
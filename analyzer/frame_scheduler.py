@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段帧调度器
+
+Address / Finish 阶段杆头几乎静止，真正需要逐帧检测的是 Top → Downswing → Impact 这段快速运动。
+调度流程：
+  1. 粗扫描：每 k 帧检测一次，得到稀疏轨迹
+  2. 将稀疏轨迹交给 SwingStateMachine 定位 Top/Downswing/Impact
+  3. 只对快速阶段窗口内的帧做全分辨率逐帧检测，其余帧由 AutoFillStrategy 插值补齐
+"""
+
+from typing import List, Optional, Tuple
+
+from analyzer.strategy_manager import AutoFillStrategy
+from analyzer.swing_state_machine import SwingStateMachine, SwingPhase
+from analyzer.trajectory_optimizer import TrajectoryOptimizer
+
+
+# 需要逐帧密集检测的快速阶段
+FAST_PHASES = (SwingPhase.TRANSITION, SwingPhase.DOWNSWING, SwingPhase.IMPACT)
+
+
+def sparse_fill_max_gap(stride: int) -> int:
+    """
+    每 stride 帧推理一次时插值补齐允许的最大间隔
+
+    相邻推理帧之间本来就空 stride-1 帧，其中一个采样点漏检时间隔变成 2*stride-1，仍应补齐；
+    也不比逐帧模式下 AutoFillStrategy 的默认间隔更严。
+    """
+    return max(2 * max(1, int(stride)), AutoFillStrategy().info.parameters.get("max_gap", 10))
+
+
+class PhaseAwareScheduler:
+    """基于粗粒度挥杆阶段预扫描的帧调度器"""
+
+    def __init__(self, coarse_stride: int = 8, margin_frames: int = 8, min_valid_points: int = 4):
+        """
+        Args:
+            coarse_stride: 粗扫描步长 k
+            margin_frames: 密集窗口前后额外扩展的帧数
+            min_valid_points: 粗扫描至少需要的有效检测点数，不足时退回全量检测
+        """
+        self.coarse_stride = max(1, int(coarse_stride))
+        self.margin_frames = max(0, int(margin_frames))
+        self.min_valid_points = min_valid_points
+
+    def is_coarse_frame(self, frame_idx: int) -> bool:
+        """该帧是否属于粗扫描帧"""
+        return frame_idx % self.coarse_stride == 0
+
+    def locate_dense_window(self, coarse_indices: List[int], sparse_trajectory: List[List[float]], total_frames: int,
+                            audio_window: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+        """
+        根据稀疏轨迹定位快速阶段窗口
+
+        Args:
+            coarse_indices: 粗扫描帧索引
+            sparse_trajectory: 与 coarse_indices 一一对应的归一化轨迹，未检测到为 [0, 0]
+            total_frames: 视频实际总帧数
+            audio_window: 音频击球点推出的帧窗口 (start, end)，用于收窄或替代视觉窗口
+
+        Returns:
+            (start_frame, end_frame) 闭区间；无法定位时返回 None
+        """
+        valid_count = sum(1 for p in sparse_trajectory if p and not (p[0] == 0 and p[1] == 0))
+        if valid_count < self.min_valid_points:
+            print(f"⚠️ 粗扫描有效点不足 ({valid_count}/{self.min_valid_points})，无法定位快速阶段")
+            return self._clamp(audio_window, total_frames)
+
+        # 稀疏轨迹先补齐，避免缺失点打断状态机的速度计算
+        filled = TrajectoryOptimizer().optimize_with_strategy(sparse_trajectory, "auto_fill", max_gap=len(sparse_trajectory))
+
+        window = None
+        try:
+            phases = SwingStateMachine().analyze_swing(filled)
+            fast_positions = [i for i, phase in enumerate(phases) if phase in FAST_PHASES]
+            if fast_positions:
+                window = (coarse_indices[min(fast_positions)], coarse_indices[max(fast_positions)])
+                print(f"🎯 粗扫描状态机定位快速阶段: 帧{window[0]} - 帧{window[1]}")
+        except Exception as e:
+            print(f"⚠️ 粗扫描状态机分析失败: {e}")
+
+        if window is None:
+            window = self._locate_by_peak_velocity(coarse_indices, filled)
+            if window is None:
+                return self._clamp(audio_window, total_frames)
+            print(f"🎯 状态机未识别快速阶段，按速度峰值定位: 帧{window[0]} - 帧{window[1]}")
+
+        # 前后各扩展一个粗扫描步长 + 安全边距，避免窗口边缘漏掉快速运动
+        pad = self.coarse_stride + self.margin_frames
+        start = max(0, window[0] - pad)
+        end = min(total_frames - 1, window[1] + pad)
+
+        if audio_window is not None:
+            # 音频击球点精确到帧，用它收窄视觉窗口；两者不重叠时以音频为准
+            lo, hi = max(start, audio_window[0]), min(end, audio_window[1])
+            if lo <= hi:
+                start, end = lo, hi
+                print(f"🔊 音频击球点收窄密集窗口: 帧{start} - 帧{end}")
+            else:
+                print(f"⚠️ 视觉窗口与音频窗口不重叠，采用音频窗口: 帧{audio_window[0]} - 帧{audio_window[1]}")
+                return self._clamp(audio_window, total_frames)
+        return start, end
+
+    @staticmethod
+    def _clamp(window: Optional[Tuple[int, int]], total_frames: int) -> Optional[Tuple[int, int]]:
+        if window is None:
+            return None
+        start = max(0, int(window[0]))
+        end = min(total_frames - 1, int(window[1]))
+        return (start, end) if start <= end else None
+
+    def _locate_by_peak_velocity(self, coarse_indices: List[int], trajectory: List[List[float]]) -> Optional[Tuple[int, int]]:
+        """回退策略：以相邻粗扫描点位移最大处为中心，取前后各两个步长"""
+        best_i = None
+        best_v = 0.0
+        for i in range(1, len(trajectory)):
+            p0, p1 = trajectory[i - 1], trajectory[i]
+            if (p0[0] == 0 and p0[1] == 0) or (p1[0] == 0 and p1[1] == 0):
+                continue
+            v = ((p1[0] - p0[0]) ** 2 + (p1[1] - p0[1]) ** 2) ** 0.5
+            if v > best_v:
+                best_v = v
+                best_i = i
+        if best_i is None:
+            return None
+        lo = max(0, best_i - 2)
+        hi = min(len(coarse_indices) - 1, best_i + 2)
+        return coarse_indices[lo], coarse_indices[hi]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运动门控 - 跳过静止帧和重复帧的推理
+
+上杆前、收杆后的长时间静止，以及 VFR→CFR 转换产生的重复帧，每帧都要跑一次完整的YOLO推理。
+这里在解码阶段做一次廉价的降采样帧差：与"上一次实际推理的帧"相比几乎没有变化时，
+直接复用上一次的检测结果。
+"""
+
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """基于降采样灰度帧差的运动门控"""
+
+    def __init__(self, downsample_size: int = 128, pixel_threshold: int = 15,
+                 max_changed_pixels: int = 2, max_consecutive_gated: int = 30):
+        """
+        Args:
+            downsample_size: 降采样后长边像素数
+            pixel_threshold: 单像素灰度差超过该值视为变化
+            max_changed_pixels: 变化像素数不超过该值时认为帧未变化
+            max_consecutive_gated: 连续跳过的最大帧数，超过后强制推理一次，防止漂移
+        """
+        self.downsample_size = downsample_size
+        self.pixel_threshold = pixel_threshold
+        self.max_changed_pixels = max_changed_pixels
+        self.max_consecutive_gated = max_consecutive_gated
+
+        # 统计信息（跨多次 reset 累计，按任务汇总）
+        self.gated_frames = 0
+        self.inferred_frames = 0
+        self.inference_seconds = 0.0
+
+        self._reference: Optional[np.ndarray] = None
+        self._consecutive_gated = 0
+        self.last_result: Any = None
+
+    def reset(self) -> None:
+        """清除参考帧（切换推理分辨率或跳帧时调用），保留统计信息"""
+        self._reference = None
+        self._consecutive_gated = 0
+        self.last_result = None
+
+    def _thumbnail(self, frame_bgr: np.ndarray) -> np.ndarray:
+        h, w = frame_bgr.shape[:2]
+        scale = float(self.downsample_size) / float(max(h, w))
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+        # INTER_AREA 等价于区域平均，顺带抑制传感器噪声
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def should_infer(self, frame_bgr: np.ndarray) -> bool:
+        """
+        判断当前帧是否需要推理
+
+        返回 False 时调用方应直接复用 last_result；返回 True 时该帧成为新的参考帧，
+        推理完成后需调用 record_inference。
+        """
+        thumb = self._thumbnail(frame_bgr)
+        if self._reference is not None and self._reference.shape == thumb.shape \
+                and self._consecutive_gated < self.max_consecutive_gated:
+            changed = int(np.count_nonzero(cv2.absdiff(thumb, self._reference) > self.pixel_threshold))
+            if changed <= self.max_changed_pixels:
+                self._consecutive_gated += 1
+                self.gated_frames += 1
+                return False
+
+        self._reference = thumb
+        self._consecutive_gated = 0
+        return True
+
+    def record_inference(self, result: Any, seconds: float) -> None:
+        """记录一次实际推理的结果和耗时"""
+        self.last_result = result
+        self.inferred_frames += 1
+        self.inference_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """任务级统计：跳过帧数和估算节省的推理时间"""
+        avg_ms = (self.inference_seconds / self.inferred_frames * 1000) if self.inferred_frames else 0.0
+        total = self.gated_frames + self.inferred_frames
+        return {
+            "enabled": True,
+            "gated_frames": self.gated_frames,
+            "inferred_frames": self.inferred_frames,
+            "gated_ratio": round(self.gated_frames / total, 3) if total else 0.0,
+            "avg_inference_ms": round(avg_ms, 2),
+            "estimated_time_saved_ms": round(avg_ms * self.gated_frames, 1)
+        }
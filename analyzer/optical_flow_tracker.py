@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+杆头光流跟踪器 - 检测器 + 稀疏光流混合模式
+
+检测器只在关键帧运行，关键帧之间的杆头位置由上一次检测位置周围小块区域内的
+稀疏光流 (cv2.calcOpticalFlowPyrLK) 传播。跟踪质量 quality 初始化时为 1.0，只按前后向一致性和
+有效特征点比例逐帧衰减，低于阈值时由调用方强制重新检测；与检测置信度无关，低置信度的检测同样能被跟踪。
+对外报告的置信度为 检测置信度 × 跟踪质量。
+"""
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class ClubHeadFlowTracker:
+    """基于局部稀疏光流的杆头位置跟踪器"""
+
+    def __init__(self, patch_radius: int = 24, search_radius: int = 48, max_corners: int = 12,
+                 fb_error_threshold: float = 1.5, win_size: int = 15, max_level: int = 2):
+        """
+        Args:
+            patch_radius: 特征点选取区域半径（以杆头为中心）
+            search_radius: 光流搜索额外半径，ROI = patch_radius + search_radius
+            max_corners: 最多跟踪的特征点数
+            fb_error_threshold: 前后向光流误差阈值（像素），超过视为跟踪失败点
+            win_size: LK 窗口大小
+            max_level: LK 金字塔层数
+        """
+        self.patch_radius = patch_radius
+        self.search_radius = search_radius
+        self.max_corners = max_corners
+        self.fb_error_threshold = fb_error_threshold
+        self.lk_params = dict(
+            winSize=(win_size, win_size),
+            maxLevel=max_level,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+        )
+        self.reset()
+
+    @property
+    def active(self) -> bool:
+        return self._points is not None
+
+    def reset(self) -> None:
+        """丢弃跟踪状态"""
+        self._prev_gray: Optional[np.ndarray] = None
+        self._points: Optional[np.ndarray] = None
+        self._center: Optional[np.ndarray] = None
+        self.detection_confidence = 0.0
+        self.quality = 0.0
+        self.confidence = 0.0
+
+    def init(self, gray: np.ndarray, point: Tuple[float, float], confidence: float) -> bool:
+        """
+        以检测结果初始化跟踪
+
+        Args:
+            gray: 当前帧灰度图
+            point: 杆头中心 (x, y)，当前帧像素坐标
+            confidence: 检测置信度，作为报告置信度的初始值（不影响跟踪质量）
+        """
+        h, w = gray.shape[:2]
+        cx, cy = float(point[0]), float(point[1])
+        r = self.patch_radius
+        x0, y0 = max(0, int(cx) - r), max(0, int(cy) - r)
+        x1, y1 = min(w, int(cx) + r + 1), min(h, int(cy) + r + 1)
+        if x1 <= x0 or y1 <= y0:
+            self.reset()
+            return False
+
+        mask = np.zeros_like(gray)
+        mask[y0:y1, x0:x1] = 255
+        corners = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_corners, qualityLevel=0.01,
+                                          minDistance=3, mask=mask)
+        center = np.array([[cx, cy]], dtype=np.float32)
+        # 杆头中心本身也作为一个跟踪点，纹理不足时至少还有它
+        points = center if corners is None else np.vstack([center, corners.reshape(-1, 2).astype(np.float32)])
+
+        self._prev_gray = gray
+        self._points = points.reshape(-1, 1, 2)
+        self._center = center.reshape(2)
+        self.detection_confidence = float(confidence)
+        self.quality = 1.0
+        self.confidence = self.detection_confidence
+        return True
+
+    def track(self, gray: np.ndarray) -> Optional[Tuple[float, float, float]]:
+        """
+        将杆头位置传播到下一帧
+
+        Returns:
+            (x, y, confidence)，confidence = 检测置信度 × 跟踪质量；跟踪失败返回 None（调用方应强制检测）
+        """
+        if not self.active:
+            return None
+
+        h, w = gray.shape[:2]
+        cx, cy = self._center
+        r = self.patch_radius + self.search_radius
+        x0, y0 = max(0, int(cx) - r), max(0, int(cy) - r)
+        x1, y1 = min(w, int(cx) + r + 1), min(h, int(cy) + r + 1)
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            self.reset()
+            return None
+
+        # 只在ROI内构建金字塔，开销与整帧尺寸无关
+        offset = np.array([x0, y0], dtype=np.float32)
+        prev_roi = self._prev_gray[y0:y1, x0:x1]
+        next_roi = gray[y0:y1, x0:x1]
+        pts = self._points - offset
+
+        nxt, st, _ = cv2.calcOpticalFlowPyrLK(prev_roi, next_roi, pts, None, **self.lk_params)
+        if nxt is None:
+            self.reset()
+            return None
+        back, st_back, _ = cv2.calcOpticalFlowPyrLK(next_roi, prev_roi, nxt, None, **self.lk_params)
+        if back is None:
+            self.reset()
+            return None
+
+        fb_error = np.linalg.norm((pts - back).reshape(-1, 2), axis=1)
+        good = (st.reshape(-1) == 1) & (st_back.reshape(-1) == 1) & (fb_error < self.fb_error_threshold)
+        good_count = int(np.count_nonzero(good))
+        if good_count == 0:
+            self.reset()
+            return None
+
+        displacement = np.median((nxt - pts).reshape(-1, 2)[good], axis=0)
+        new_center = self._center + displacement
+        if not (0 <= new_center[0] < w and 0 <= new_center[1] < h):
+            self.reset()
+            return None
+
+        # 跟踪质量：有效点比例 × 前后向一致性，逐帧相乘衰减
+        good_ratio = good_count / float(len(good))
+        fb_quality = max(0.0, 1.0 - float(np.median(fb_error[good])) / self.fb_error_threshold)
+        self.quality *= good_ratio * (0.5 + 0.5 * fb_quality)
+        self.confidence = self.detection_confidence * self.quality
+
+        self._prev_gray = gray
+        self._points = (nxt.reshape(-1, 2)[good] + offset).reshape(-1, 1, 2)
+        self._center = new_center.astype(np.float32)
+        return float(new_center[0]), float(new_center[1]), float(self.confidence)
@@ -53,7 +53,7 @@ class AutoFillStrategy(OptimizationStrategy):
         
         Args:
             trajectory: 原始轨迹数据 [(x, y), ...]
-            **kwargs: 额外参数
+            **kwargs: 额外参数（max_gap: 覆盖默认的最大填补间隔）
             
         Returns:
             补齐后的轨迹数据
@@ -80,16 +80,18 @@ class AutoFillStrategy(OptimizationStrategy):
         valid_indices = np.where(valid_mask)[0]
         
         print(f"🔍 有效检测点索引: {valid_indices[:10]}... (共{len(valid_indices)}个)")
-        print(f"🔍 第17帧坐标: x={x_coords[17]}, y={y_coords[17]}")
-        print(f"🔍 第17帧是否有效: {valid_mask[17]}")
+        if len(x_coords) > 17:
+            print(f"🔍 第17帧坐标: x={x_coords[17]}, y={y_coords[17]}")
+            print(f"🔍 第17帧是否有效: {valid_mask[17]}")
         
         if len(valid_indices) < 2:
             print("❌ 有效检测点少于2个，无法补齐")
             return trajectory
         
         # 补齐缺失的帧
-        filled_x = self._fill_missing_frames(x_coords_clean, valid_indices)
-        filled_y = self._fill_missing_frames(y_coords_clean, valid_indices)
+        max_gap = kwargs.get("max_gap")
+        filled_x = self._fill_missing_frames(x_coords_clean, valid_indices, max_gap)
+        filled_y = self._fill_missing_frames(y_coords_clean, valid_indices, max_gap)
         
         # 重新组合轨迹
         filled_trajectory = list(zip(filled_x, filled_y))
@@ -99,19 +101,21 @@ class AutoFillStrategy(OptimizationStrategy):
         
         return filled_trajectory
     
-    def _fill_missing_frames(self, coords: np.ndarray, valid_indices: np.ndarray) -> np.ndarray:
+    def _fill_missing_frames(self, coords: np.ndarray, valid_indices: np.ndarray, max_gap: int = None) -> np.ndarray:
         """
         填补缺失帧的坐标
         
         Args:
             coords: 坐标数组
             valid_indices: 有效检测点的索引
+            max_gap: 最大填补间隔，None时使用策略参数
             
         Returns:
             填补后的坐标数组
         """
         filled_coords = coords.copy()
-        max_gap = self.info.parameters.get("max_gap", 10)
+        if max_gap is None:
+            max_gap = self.info.parameters.get("max_gap", 10)
         
         print(f"🔍 _fill_missing_frames 开始，max_gap={max_gap}")
         print(f"🔍 有效索引: {valid_indices[:10]}... (共{len(valid_indices)}个)")
@@ -140,7 +144,7 @@ class AutoFillStrategy(OptimizationStrategy):
             elif gap_size > max_gap:
                 print(f"🔍 间隔 {start_idx}-{end_idx} 太大 ({gap_size} > {max_gap})，跳过")
         
-        print(f"🔍 填补完成，第17帧值: {filled_coords[17]}")
+        print(f"🔍 填补完成，第17帧值: {filled_coords[17] if len(filled_coords) > 17 else '不存在'}")
         return filled_coords
 
 
@@ -104,6 +104,7 @@ class SwingStateMachine:
             'impact_safety_after_transition': 2,  # Transition 结束后安全间隔帧数（原5，调小便于更早命中）
             'impact_v_quantile': 0.7,   # 速度分位阈值Q（原0.8，调至0.7）
             'impact_local_window_k': 2, # 局部窗口k（±k）
+            'impact_hint_tolerance': 4, # 外部击球提示（如音频）前后搜索帧数
 
             # Top/Transition 窗口参数
             'top_window_pre': 3,        # Top 窗口前 t1
@@ -111,12 +112,13 @@ class SwingStateMachine:
             'n_down_after_top': 3,      # 窗口后连续 dy>0 的最少帧数
         }
     
-    def analyze_swing(self, trajectory: List) -> List[SwingPhase]:
+    def analyze_swing(self, trajectory: List, impact_hint: Optional[int] = None) -> List[SwingPhase]:
         """
         分析挥杆轨迹，返回各帧的状态
         
         Args:
             trajectory: 杆头轨迹数据
+            impact_hint: 外部给出的击球帧（如音频瞬态定位），在其附近搜索并强制标记Impact
             
         Returns:
             各帧的挥杆状态列表
@@ -125,6 +127,7 @@ class SwingStateMachine:
         
         # 总：数据预处理
         processed_data = self._preprocess_data(trajectory)
+        processed_data['impact_hint'] = impact_hint
         
         # 分：状态机执行
         phases = self._execute_state_machine(processed_data)
@@ -324,6 +327,9 @@ class SwingStateMachine:
     def _postprocess_phases(self, phases: List[SwingPhase], data: Dict) -> List[SwingPhase]:
         """后处理阶段：优化和验证状态"""
         
+        # 0. 外部击球提示优先（音频瞬态比速度规则更可靠）
+        phases = self._apply_impact_hint(phases, data)
+
         # 1. 注入缺失的Impact
         phases = self._inject_impact_if_missing(phases, data)
         
@@ -392,6 +398,31 @@ class SwingStateMachine:
         phases[impact_idx] = SwingPhase.IMPACT
         return phases
 
+    def _apply_impact_hint(self, phases: List[SwingPhase], data: Dict) -> List[SwingPhase]:
+        """在外部击球提示附近 ±tolerance 帧内重新定位Impact，并修正其前后的阶段标签"""
+        hint = data.get('impact_hint')
+        if hint is None or not (0 <= hint < len(phases)):
+            return phases
+        tolerance = self.config.get('impact_hint_tolerance', 4)
+        start_idx = max(0, hint - tolerance)
+        impact_idx = self._detect_impact_candidate(data, start_idx, window=2 * tolerance + 1)
+        if impact_idx is None:
+            impact_idx = hint
+
+        result = phases.copy()
+        # 下杆起点：击球前最后一个 Backswing/Transition 之后；找不到时只修正提示窗口内的帧
+        top_like = [i for i in range(impact_idx) if result[i] in (SwingPhase.BACKSWING, SwingPhase.TRANSITION)]
+        downswing_start = top_like[-1] + 1 if top_like else start_idx
+        for i, phase in enumerate(result):
+            # 下杆段内不可能出现 Impact/FollowThrough/Finish，统一归入Downswing
+            if downswing_start <= i < impact_idx and phase in (SwingPhase.IMPACT, SwingPhase.FOLLOWTHROUGH, SwingPhase.FINISH):
+                result[i] = SwingPhase.DOWNSWING
+            elif i > impact_idx and phase == SwingPhase.IMPACT:
+                result[i] = SwingPhase.FOLLOWTHROUGH
+        result[impact_idx] = SwingPhase.IMPACT
+        print(f"   🔊 击球提示帧{hint} → Impact定位于帧{impact_idx}")
+        return result
+
     def _detect_impact_candidate(self, data: Dict, start_idx: int, window: int = 20) -> Optional[int]:
         """在 [start_idx, start_idx+window] 内检测Impact候选。
         规则：
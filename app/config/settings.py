@@ -26,6 +26,218 @@ VIDEO_ANALYSIS_CONFIG = {
     "resolution_limits": {
         "min": 480,    # 最小分辨率
         "max": 2560    # 最大分辨率（RTX 5090支持更高分辨率）
+    },
+    # 帧调度模式: full=逐帧检测, phase_aware=粗扫描定位快速阶段后只对快速阶段逐帧检测,
+    # tracking=关键帧检测 + 光流跟踪中间帧
+    "default_scheduling_mode": "full",
+    "scheduling_modes": ["full", "phase_aware", "tracking"],
+    "phase_aware_scheduling": {
+        "coarse_stride": 8,        # 粗扫描步长k（240fps慢动作可调大）
+        "coarse_resolution": 960,  # 粗扫描推理分辨率
+        "margin_frames": 8,        # 快速阶段窗口前后额外扩展的帧数
+        "min_valid_points": 4      # 粗扫描最少有效检测点，不足时退回逐帧检测
+    },
+    # 运动门控：与上一次推理帧相比几乎无变化的帧（静止/重复帧）直接复用上一次检测结果
+    "motion_gate": {
+        "enabled": False,             # 默认关闭：被门控的帧复用上一次检测结果，轨迹与逐帧推理不同；fast/balanced 档位开启
+        "downsample_size": 128,       # 帧差计算的降采样长边
+        "pixel_threshold": 15,        # 灰度差超过该值视为变化像素
+        "max_changed_pixels": 2,      # 变化像素数不超过该值视为未变化
+        "max_consecutive_gated": 30   # 最多连续跳过帧数，之后强制推理一次
+    },
+    # 跨任务动态批处理推理服务：所有任务的帧汇总成批，一次前向推理
+    "inference_server": {
+        "enabled": True,
+        "max_batch_size": 8,          # 单批最大帧数
+        "max_wait_ms": 5,             # 凑批最长等待时间
+        "max_in_flight": 16           # 单个任务最多同时在途的帧数（限制内存占用）
+    },
+    # 模型副本池：每个副本独立的模型实例，并发任务互不竞争（不设置线程数/CPU亲和性，CPU上按核数限制副本数）
+    "model_pool": {
+        "enabled": True,
+        "size": "auto",               # 副本数；auto=GPU上1个，CPU上按 可用核数/cores_per_replica
+        "max_replicas": 4,            # auto 模式下的副本数上限（每个副本占一份模型显存/内存）
+        "cores_per_replica": 4        # auto 模式下每个副本按多少个核计算副本数
+    },
+    # 多进程推理：启动时父进程加载权重并预热推理一次后 fork 工作进程（写时复制共享），
+    # 逐帧检测按帧区间分片并行；CUDA 可用时自动回退到线程模式
+    "process_pool": {
+        "enabled": False,
+        "workers": "auto",            # 工作进程数；auto=可用核数/2
+        "shard_frames": 300           # 每个分片的帧数
+    },
+    # 上传接收：按块流式写入任务工作目录，同时计算 sha256 并执行 max_file_size 上限
+    "upload": {
+        "chunk_size": 1024 * 1024,    # 每次读取/写入的块大小
+        "dir": "/tmp/golftracker_uploads",  # 未启用检查点时任务视频的落盘目录
+        "memory_threshold": 0,        # 不超过该字节数的上传留在内存（memfd）中解码，0=禁用；内存中的任务不可断点恢复
+        "multipart_overhead": 64 * 1024  # multipart 请求按 Content-Length 提前拒绝时允许的表单开销
+    },
+    # 可续传分片上传会话：保存在磁盘上，过期未完成的会话自动清理
+    "upload_sessions": {
+        "dir": "/tmp/golftracker_upload_sessions",
+        "expiry_seconds": 24 * 3600,  # 会话有效期
+        "chunk_size": 8 * 1024 * 1024  # 建议客户端使用的分片大小
+    },
+    # 检查点：逐帧检测结果和解码位置周期性落盘，服务重启后从检查点继续；上传文件保留到任务结束
+    "checkpoint": {
+        "enabled": True,
+        "dir": "/tmp/golftracker_jobs",  # 容器重建（而非重启）也要保留时，挂载为数据卷
+        "interval_frames": 200,       # 每检测多少帧落盘一次
+        "interval_seconds": 10        # 距上次落盘超过该秒数也会落盘
+    },
+    # 模型档位：default 为 MODEL_PATH，cheap 为低分辨率训练的轻量档位（截止时间降级使用）
+    "model_tiers": {
+        "default": os.getenv("MODEL_PATH", "data/1280p_yolo11x_5090_full.pt"),
+        "cheap": os.getenv("CHEAP_MODEL_PATH", "data/640p_yolo11x_v100_full.pt")
+    },
+    # 截止时间：按实时吞吐量估算完成时间，预计超时则沿阶梯降级，仍超时则返回部分轨迹
+    "deadline": {
+        "postprocess_reserve_s": 5,   # 为轨迹优化/状态分析预留的时间
+        "safety_factor": 1.1,         # 预计完成时间的安全系数
+        "check_interval_frames": 15,  # 每处理多少帧评估一次
+        "ladder": [                   # 降级阶梯，按代价从小到大
+            {"type": "stride", "value": 2},
+            {"type": "resolution", "value": 960},
+            {"type": "stride", "value": 3},
+            {"type": "model", "value": "cheap"},
+            {"type": "resolution", "value": 640},
+            {"type": "stride", "value": 4}
+        ]
+    },
+    # 性能档位：一个 profile 参数选定分辨率档位、帧调度模式、模型档位、推理后端和策略集，
+    # 单独传入的参数优先于档位；实测 fps/准确率由 scripts/benchmark_profiles.py 写入 benchmark_file
+    "default_profile": None,          # None=不使用档位（沿用上面的 default_* 配置）
+    "performance_profiles": {
+        "fast": {
+            "description": "低分辨率 + 轻量模型 + 分阶段调度，适合实时预览",
+            "resolution": "640",
+            "scheduling_mode": "phase_aware",
+            "model_tier": "cheap",
+            "backend": "auto",            # auto / batched / process_pool / sequential（逐帧检测模式生效）
+            "strategies": ["auto_fill"],  # 需要生成的策略集，None=全部已注册策略
+            "motion_gate": True
+        },
+        "balanced": {
+            "description": "960 分辨率逐帧检测，速度与精度折中",
+            "resolution": "960",
+            "scheduling_mode": "full",
+            "model_tier": "default",
+            "backend": "auto",
+            "strategies": ["auto_fill"],
+            "motion_gate": True
+        },
+        "accurate": {
+            "description": "1920 分辨率逐帧检测，不跳帧，精度最高",
+            "resolution": "1920",
+            "scheduling_mode": "full",
+            "model_tier": "default",
+            "backend": "auto",
+            "strategies": None,
+            "motion_gate": False
+        }
+    },
+    "profile_benchmark_file": os.getenv("PROFILE_BENCHMARK_FILE", "data/profile_benchmarks.json"),
+    # 任务记录保留期：已结束的任务超过该时长后删除记录及其解码帧缓存
+    "job_store": {
+        "ttl_seconds": 24 * 3600,
+        "sweep_interval_seconds": 600,
+    },
+    # 解码帧缓存（默认关闭）：各检测方式解码时把分析分辨率的帧写入磁盘，分析中和分析后都可随机访问任意帧
+    "frame_cache": {
+        "enabled": os.getenv("FRAME_CACHE_ENABLED", "false").lower() == "true",
+        "dir": "/tmp/golftracker_frame_cache",
+        "max_bytes_per_job": 4 * 1024 * 1024 * 1024,  # 超出部分的帧不缓存
+    },
+    # 训练帧旁路缓冲：检测时顺带收集失败帧/低置信度帧，训练数据页面不再重新解码视频
+    "training_frames": {
+        "confidence_threshold": 0.3,          # 低于该置信度的帧作为训练帧
+        "max_memory_bytes": 64 * 1024 * 1024,  # 内存中 JPEG 总大小上限，超过后溢出到磁盘
+        "max_frames": 1000,                   # 单个任务最多收集的帧数，超过的丢弃
+        "spill_dir": "/tmp/golftracker_training_frames",
+        "max_pending_encodes": 32,            # 排队等待 JPEG 编码的帧数上限，超过时检测循环等待
+    },
+    # 训练数据静态资源：每个任务一个目录，图片为独立文件，超过保留期删除
+    "training_assets": {
+        "dir": "static/jobs",
+        "url_prefix": "/static/jobs",
+        "ttl_seconds": 7 * 24 * 3600,
+        "sweep_interval_seconds": 3600,
+        "encode_workers": min(4, os.cpu_count() or 1),
+    },
+    # 关键帧缩略图与拖动预览雪碧图（检测过程中从已解码的帧生成）
+    "thumbnails": {
+        "enabled": True,
+        "thumb_width": 320,        # Top/Impact/Finish 缩略图宽度
+        "tile_width": 160,         # 雪碧图格子宽度
+        "sprite_stride": 5,        # 每隔多少帧取一个格子
+        "sprite_columns": 10,
+        "max_tiles": 300,          # 格子数上限，超过时步长加倍
+        "max_thumb_bytes": 64 * 1024 * 1024,  # 内存中保留的缩略图尺寸帧总大小，超过时步长加倍，未保留的关键帧再 seek
+        "jpeg_quality": 80,
+    },
+    # 服务端渲染的标注视频（轨迹 + 阶段标签 + 补齐点），按 (任务, 策略) 缓存
+    "annotated_video": {
+        "enabled": True,
+        "dir": "/tmp/golftracker_annotated",
+        # 分析结束时保留原视频用于渲染（默认不保留，只从解码帧缓存渲染）："link" 硬链接（失败则不保留），"copy" 硬链接失败时复制。
+        # 硬链接同样会让整个上传文件在任务保留期内（24 小时）一直占用磁盘，每个任务（含同步 /analyze）都算在内
+        "keep_source": os.getenv("ANNOTATED_KEEP_SOURCE", "").lower() or False,
+        "max_size": 1280,          # 输出长边上限
+        "crf": 23,
+        "preset": "veryfast",
+        "ffmpeg_threads": 2,
+        "nice": 10,                # 渲染线程和 ffmpeg 的 nice 值（低优先级，不抢分析任务的 CPU）
+        "trail_frames": 0,         # 轨迹尾迹帧数，0 表示画出从第一帧开始的完整轨迹
+        "queue_frames": 16,        # 解码线程与绘制之间的帧队列长度
+        "max_concurrent": 1,       # 同时渲染的任务数，多出的排队
+    },
+    # 视频转换：固定数量的工作线程 + 有界队列
+    "conversion": {
+        "workers": 2,              # 同时运行的 ffmpeg 转换数
+        "max_queue": 20,           # 排队任务数上限，超过时返回 503
+        "ffmpeg_threads": None,    # 每个转换的 ffmpeg 线程数，None 表示 CPU 核数 / workers
+        "copy_video_codecs": ["h264"],  # 可直接流复制的视频编码（加入 "hevc" 则 HEVC 只换容器，需客户端支持）
+        "cache_dir": "/tmp/golftracker_convert_cache",  # 转换结果缓存（按输入内容 sha256 + 质量档位）
+        "cache_ttl_seconds": 7 * 24 * 3600,  # 缓存未命中超过此时长后删除
+        # 长视频完整重编码时按关键帧分段并行
+        "segmented": {
+            "enabled": True,
+            "min_duration_seconds": 120,   # 短于此时长的视频不分段
+            "min_segment_seconds": 30,     # 每段最短时长
+            "threads_per_segment": 2,      # 每个分段 ffmpeg 的线程数
+            "max_segments": 8,
+        },
+    },
+    # 训练数据 ZIP 导出（YOLO 格式）
+    "training_export": {
+        "class_names": ["club", "club_head", "hand"],  # classes.txt，行号即类别 ID
+        "label_class_id": 1,                           # 杆头类别 ID
+        "label_box_size": 0.03,                        # 预标注框的归一化边长（检测结果只有中心点）
+    },
+    # 跨任务训练帧池：所有任务的训练帧按感知哈希去重后追加到同一个池
+    "training_pool": {
+        "enabled": True,
+        "dir": os.getenv("TRAINING_POOL_DIR", "data/training_pool"),
+        "hamming_threshold": 6,       # 64 位 pHash 汉明距离不超过该值视为重复帧
+        "export_max_frames": 5000,    # 单次批量导出的最大帧数
+    },
+
+    # 音频击球瞬态定位（无音轨时自动跳过）
+    "audio_onset": {
+        "enabled": False,
+        "sample_rate": 16000,
+        "min_peak_ratio": 4.0,        # 起音峰值相对中位数的最小倍数
+        "window_pre_s": 0.6,          # phase_aware 密集窗口：击球前覆盖时长（含下杆）
+        "window_post_s": 0.3          # phase_aware 密集窗口：击球后覆盖时长
+    },
+    # 检测器 + 光流混合跟踪（scheduling_mode=tracking）
+    "tracking": {
+        "keyframe_interval": 10,     # 关键帧间隔，到期强制检测
+        "min_confidence": 0.35,      # 跟踪质量（初始化时为 1.0，按光流一致性逐帧衰减，与检测置信度无关）低于该值时强制检测
+        "patch_radius": 24,          # 杆头周围特征点选取半径（像素）
+        "search_radius": 48,         # 光流搜索额外半径（像素）
+        "fb_error_threshold": 1.5    # 前后向光流误差阈值（像素）
     }
 }
 
@@ -1,7 +1,8 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import torch
 import time
 import os
@@ -12,6 +13,10 @@ from .routes.monitoring import router as monitoring_router
 from .routes.welcome import router as welcome_router
 from .routes.model_manager import router as model_manager_router
 from .utils.metrics_store import add_request_metric
+from .config import VIDEO_ANALYSIS_CONFIG
+from .services.upload_ingest import upload_ingest_service
+from .services.training_assets import training_asset_store
+from .utils.static_files import CachedStaticFiles
 from analyzer.config import MODEL_PATH
 
 # 全局模型变量
@@ -69,10 +74,56 @@ async def lifespan(app: FastAPI):
         print(f"⚠️ 模型加载失败: {e}")
         MODEL = None
     
+    # 进程池模式：在启动阶段、分析线程开始工作之前 fork 工作进程
+    process_pool_config = VIDEO_ANALYSIS_CONFIG.get("process_pool", {})
+    if process_pool_config.get("enabled", False):
+        from detector.process_pool import get_process_pool
+        get_process_pool(process_pool_config.get("workers", "auto"))
+    
+    # 清理过期的分片上传会话（未过期的会话重启后仍可续传）
+    try:
+        from .services.upload_sessions import upload_session_store
+        upload_session_store.sweep_expired()
+    except Exception as e:
+        print(f"⚠️ 清理上传会话失败: {e}")
+    
+    # 定期清理：过期的任务记录及其帧缓存、训练数据目录、转换缓存
+    from .routes.analyze import sweep_expired_jobs
+    from .services.video_conversion import video_conversion_service
+    sweep_interval = min(training_asset_store.sweep_interval_seconds,
+                         VIDEO_ANALYSIS_CONFIG.get("job_store", {}).get("sweep_interval_seconds", 600))
+    
+    async def sweep_expired():
+        while True:
+            try:
+                await asyncio.to_thread(sweep_expired_jobs)
+                await asyncio.to_thread(training_asset_store.sweep_expired)
+                await asyncio.to_thread(video_conversion_service.sweep_cache)
+            except Exception as e:
+                print(f"⚠️ 定期清理失败: {e}")
+            await asyncio.sleep(sweep_interval)
+    
+    sweeper_task = asyncio.create_task(sweep_expired())
+    
+    # 恢复重启前未完成的分析任务（从检查点继续）
+    try:
+        from .services.video_analysis import video_analysis_service
+        resumed = video_analysis_service.resume_interrupted_jobs()
+        if resumed:
+            print(f"♻️ 已恢复 {resumed} 个中断的分析任务")
+    except Exception as e:
+        print(f"⚠️ 恢复中断任务失败: {e}")
+    
     yield
     
     # 关闭时清理资源
     print("🛑 正在关闭 GolfTracker 服务...")
+    sweeper_task.cancel()
+    if process_pool_config.get("enabled", False):
+        from detector.process_pool import get_process_pool
+        runner = get_process_pool()
+        if runner is not None:
+            runner.close()
     if MODEL is not None:
         del MODEL
     if torch.cuda.is_available():
@@ -102,7 +153,14 @@ def create_app() -> FastAPI:
         """中间件：跟踪请求统计"""
         start_time = time.time()
         
-        response = await call_next(request)
+        # 上传超过大小上限时在读取请求体之前拒绝（multipart 表单由框架在进入路由前整体解析）
+        if request.method == "POST" and request.url.path.startswith("/analyze/") and \
+                upload_ingest_service.exceeds_limit(request.headers.get("content-length"), multipart=True):
+            response = JSONResponse(status_code=413, content={
+                "detail": f"文件超过大小上限 {upload_ingest_service.max_file_size // (1024 * 1024)}MB"
+            })
+        else:
+            response = await call_next(request)
         
         # 记录请求信息
         process_time = (time.time() - start_time) * 1000  # 转换为毫秒
@@ -155,8 +213,14 @@ def create_app() -> FastAPI:
     app.include_router(monitoring_router)
     app.include_router(model_manager_router, prefix="/models")
     
-    # 挂载静态文件目录
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    # 挂载静态文件目录：任务训练帧图片内容不变，允许长期缓存；页面每次重新验证
+    app.mount("/static", CachedStaticFiles(
+        directory="static",
+        cache_rules={
+            "*.html": "no-cache",
+            "jobs/": f"public, max-age={training_asset_store.ttl_seconds}, immutable",
+        }
+    ), name="static")
     
     return app
 
@@ -1,18 +1,13 @@
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, Request
 from fastapi import HTTPException
-from fastapi.responses import HTMLResponse, StreamingResponse
-import os
-import tempfile
-import shutil
-from typing import List, Dict, Tuple, Any
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+import asyncio
+from typing import List, Dict, Tuple, Any, Optional
 import threading
 import uuid
 import time
 import json
 import base64
-from datetime import datetime
-import zipfile
-import io
 
 import numpy as np
 import cv2
@@ -27,17 +22,28 @@ from analyzer.strategy_manager import get_strategy_manager
 from app.utils.helpers import get_mp_landmark_names, calculate_trajectory_distance, clean_json_data, check_video_compatibility
 from app.services.html_generator import html_generator_service
 from app.services.video_analysis import video_analysis_service
+from app.services.job_checkpoint import job_checkpoint_store
+from app.services.cancellation import cancellation_registry
+from app.services.upload_ingest import IngestedUpload, UploadTooLarge, iter_upload_file, upload_ingest_service
+from app.services.upload_sessions import UploadSessionError, upload_session_store
+from app.services.training_assets import encode_jpeg, training_asset_store
+from app.services.frame_cache import frame_cache_store
+from app.services.annotated_video import annotated_video_service
+from app.services.video_conversion import video_conversion_service
+from app.services.training_export import iter_training_zip
+from app.services.training_pool import training_frame_pool
 from app.services.task_manager import task_manager
 from app.services.file_service import file_service
 from app.services.video_processing import video_processing_service
 from app.services.logging_service import logging_service
 from app.services.response_service import response_service
+from app.utils.static_files import file_range_response
 from app.config import SERVER_CONFIG, VIDEO_ANALYSIS_CONFIG
 
 
 router = APIRouter()
 
-# 简易后台任务存储
+# 简易后台任务存储（已结束的任务超过保留期后由 sweep_expired_jobs 清理）
 _JOB_STORE: Dict[str, Dict] = {}
 
 # 分析结果存储
@@ -58,12 +64,16 @@ _SERVER_STATUS = {
 
 @router.post("/analyze")
 async def analyze(
+    request: Request,
     file: UploadFile = File(...),
     handed: str = Form("right"),
+    deadline_seconds: Optional[float] = Form(None),  # 截止时间（秒），不超过等待上限
+    profile: Optional[str] = Form(None),  # 性能档位 fast / balanced / accurate
 ) -> dict:
     """
     快速分析接口 - 同步返回结果
     使用默认参数进行视频分析，适合简单应用和快速测试
+    预计超过截止时间时自动降级（帧步长/分辨率/模型），仍超时则返回部分轨迹
     """
     # 支持更多视频格式的 MIME 类型
     supported_types = {
@@ -78,40 +88,58 @@ async def analyze(
         if not any(filename.lower().endswith(ext) for ext in supported_extensions):
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
 
-    # 保存到临时文件
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or "video.mp4")[1]) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+    if profile and profile not in VIDEO_ANALYSIS_CONFIG.get("performance_profiles", {}):
+        raise HTTPException(status_code=400, detail=f"不支持的性能档位: {profile}")
+    # 未指定档位时使用固定的快速分析参数，指定档位时由档位决定
+    quick_params = {} if profile else {
+        "resolution": "960",  # 使用960×960默认分辨率
+        "confidence": "0.01",
+        "iou": "0.7",
+        "max_det": "10"
+    }
+
+    # 按块写入（小视频可留在内存中），同时检查大小上限
+    job_id = str(uuid.uuid4())
+    try:
+        upload = await upload_ingest_service.ingest(
+            iter_upload_file(file, upload_ingest_service.chunk_size),
+            upload_ingest_service.upload_path(job_id, file.filename), declared_size=file.size
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    tmp_path = upload.path
 
+    t = None
     try:
         # 使用异步分析，但等待结果
-        job_id = str(uuid.uuid4())
         
         # 初始化任务状态
         _JOB_STORE[job_id] = {
             "status": "queued", 
             "progress": 0, 
+            "created_at": time.time(),
             "filename": file.filename,
-            "resolution": "960",  # 使用960×960默认分辨率
-            "confidence": "0.01", 
-            "iou": "0.7",
-            "max_det": "10",
-            "optimization_strategy": "auto_fill"
+            **quick_params,
+            "optimization_strategy": "auto_fill",
+            "profile": profile
         }
         
-        # 启动分析任务
-        video_analysis_service.analyze_video_job(
+        # 等待分析完成（最多等待60秒）；客户端指定截止时间时留出余量，保证在等待上限内返回结果。
+        # 不指定时走常规流水线（流式解码/批处理/多进程等），不为每个同步请求都启用截止时间模式
+        max_wait_time = 60
+        job_deadline = min(deadline_seconds, max_wait_time - 5) if deadline_seconds else None
+        
+        # 启动分析任务（后台线程），这里异步等待，以便检测客户端断开
+        t = threading.Thread(target=video_analysis_service.analyze_video_job, kwargs=dict(
             job_id=job_id,
             video_path=tmp_path,
-            resolution="960",  # 使用960×960默认分辨率
-            confidence="0.01", 
-            iou="0.7",
-            max_det="10",
-            optimization_strategy="auto_fill"
-        )
+            **quick_params,
+            optimization_strategy="auto_fill",
+            deadline_seconds=job_deadline,
+            profile=profile
+        ), daemon=True)
+        t.start()
         
-        # 等待分析完成（最多等待60秒）
-        max_wait_time = 60
         start_time = time.time()
         
         while time.time() - start_time < max_wait_time:
@@ -126,17 +154,26 @@ async def analyze(
             elif status == "error":
                 error_msg = job_status.get("error", "分析失败")
                 raise HTTPException(status_code=500, detail=f"视频分析失败: {error_msg}")
+            elif status == "cancelled":
+                raise HTTPException(status_code=409, detail="视频分析任务已取消")
             
-            # 等待1秒后再次检查
-            time.sleep(1)
+            # 客户端已断开：取消任务，释放算力
+            if await request.is_disconnected():
+                print(f"🔌 客户端已断开，取消任务 {job_id}")
+                cancellation_registry.cancel(job_id, "客户端断开连接")
+                raise HTTPException(status_code=499, detail="客户端已断开连接")
+            
+            # 等待0.5秒后再次检查
+            await asyncio.sleep(0.5)
         
+        # 超时：没有人再等这个结果了，取消任务
+        cancellation_registry.cancel(job_id, "同步分析超时")
         # 超时
         raise HTTPException(status_code=408, detail="视频分析超时，请稍后重试")
     finally:
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
+        # 分析线程结束时会自行删除视频；线程未启动或已结束时由这里兜底清理
+        if t is None or not t.is_alive():
+            upload_ingest_service.release(tmp_path)
 
 
 
@@ -600,6 +637,14 @@ async def get_visualization_page(result_id: str):
     return HTMLResponse(content=html_content)
 
 
+@router.get("/profiles")
+async def get_profiles():
+    """获取性能档位（分辨率档位、帧调度模式、模型档位、推理后端、策略集）及本机实测 fps/准确率"""
+    try:
+        return video_analysis_service.get_profiles()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取性能档位失败: {str(e)}")
+
 @router.get("/strategies")
 async def get_strategies():
     """获取所有可用策略"""
@@ -901,15 +946,114 @@ async def get_server_test_page():
     return HTMLResponse(content=html_content)
 
 
+def _resolve_video_params(**params) -> Dict[str, Any]:
+    """校验分析参数；未指定性能档位时补齐接口默认值（指定档位时由档位决定）"""
+    profile = params.get("profile")
+    if profile:
+        if profile not in VIDEO_ANALYSIS_CONFIG.get("performance_profiles", {}):
+            raise HTTPException(status_code=400, detail=f"不支持的性能档位: {profile}")
+    else:
+        params["resolution"] = params.get("resolution") or "auto"
+        params["confidence"] = params.get("confidence") or "0.01"
+        params["iou"] = params.get("iou") or "0.7"
+        params["max_det"] = params.get("max_det") or "10"
+        params["scheduling_mode"] = params.get("scheduling_mode") or "full"
+    scheduling_mode = params.get("scheduling_mode")
+    if scheduling_mode is not None and scheduling_mode not in VIDEO_ANALYSIS_CONFIG["scheduling_modes"]:
+        raise HTTPException(status_code=400, detail=f"不支持的帧调度模式: {scheduling_mode}")
+    convert_quality = params.get("convert_quality")
+    if convert_quality is not None and convert_quality not in video_conversion_service.QUALITY_SETTINGS:
+        raise HTTPException(status_code=400, detail=f"不支持的转换质量: {convert_quality}")
+    return params
+
+
+def _upload_dest(job_id: str, filename: Optional[str]) -> str:
+    """上传直接写到任务工作目录（启用检查点时即检查点目录，免去之后的移动）"""
+    return job_checkpoint_store.video_path(job_id, filename or "video.mp4") or \
+        upload_ingest_service.upload_path(job_id, filename)
+
+
+def _start_video_job(job_id: str, upload: IngestedUpload, filename: Optional[str], params: Dict[str, Any], upload_complete: bool = True) -> dict:
+    """
+    登记任务、建立检查点并启动后台分析线程，返回排队响应
+
+    upload_complete=False 时上传仍在接收中（faststart 边上传边分析），sha256/size 在接收完后补齐
+    """
+    # 快速检查：只检查文件大小（不读取视频内容），兼容性检查在后台线程进行
+    quick_check = {
+        "compatible": True,
+        "checked": False,
+        "message": "兼容性检查将在后台进行"
+    }
+    if upload_complete and upload.size == 0:
+        quick_check["compatible"] = False
+        quick_check["error"] = "文件无效"
+
+    _JOB_STORE[job_id] = {
+        "status": "queued",
+        "progress": 0,
+        "created_at": time.time(),
+        "filename": filename,
+        "compatibility": quick_check,
+        "sha256": upload.sha256,
+        "size": upload.size,
+        "upload_complete": upload_complete,
+        **params
+    }
+    video_path = upload.path
+    if not upload.in_memory:
+        # 建立检查点：上传文件保留在任务目录直到任务结束，服务重启后可继续分析（内存中的上传不可恢复）
+        video_path = job_checkpoint_store.create(job_id, upload.path, params=params, job_info={
+            "filename": filename, "compatibility": quick_check, "sha256": upload.sha256, "size": upload.size
+        }, upload_complete=upload_complete)
+    if params.get("convert_quality"):
+        # 合并转换任务与分析任务同 id，登记后即可通过 /convert/status 查询
+        video_conversion_service.register_fused(job_id, params["convert_quality"], sha256=upload.sha256,
+                                                output_filename=f"converted_{job_id[:8]}.mp4")
+    t = threading.Thread(target=video_analysis_service.analyze_video_job, args=(job_id, video_path), kwargs=params, daemon=True)
+    t.start()
+
+    response = {
+        "job_id": job_id,
+        "status": "queued",
+        "sha256": upload.sha256,
+        "size": upload.size,
+        "streaming_analysis": not upload_complete,
+        "compatibility": quick_check
+    }
+
+    # 快速检查如果失败，添加警告
+    if not quick_check.get("compatible", True):
+        response["warning"] = {
+            "message": "文件上传失败或文件无效",
+            "error": quick_check.get("error", "unknown"),
+            "recommendation": "请检查文件是否完整"
+        }
+    if params.get("convert_quality"):
+        response["conversion"] = {
+            "status": video_conversion_service.get_job(job_id)["status"],
+            "status_url": f"/convert/status/{job_id}",
+            "download_url": f"/convert/download/{job_id}"
+        }
+    return response
+
+
 @router.post("/video")
 async def analyze_video_test(
     video: UploadFile = File(...), 
-    resolution: str = Form("auto"),  # 默认自动使用视频实际分辨率
-    confidence: str = Form("0.01"),
-    iou: str = Form("0.7"),
-    max_det: str = Form("10"),
+    resolution: Optional[str] = Form(None),  # 未指定档位时默认 auto：自动使用视频实际分辨率
+    confidence: Optional[str] = Form(None),  # 未指定档位时默认 0.01
+    iou: Optional[str] = Form(None),  # 未指定档位时默认 0.7
+    max_det: Optional[str] = Form(None),  # 未指定档位时默认 10
     optimization_strategy: str = Form("auto_fill"),
-    handed: str = Form("right")
+    handed: str = Form("right"),
+    scheduling_mode: Optional[str] = Form(None),  # full / phase_aware / tracking，未指定档位时默认 full
+    motion_gate: Optional[bool] = Form(None),  # 运动门控，None时使用档位/配置默认值
+    audio_onset: Optional[bool] = Form(None),  # 音频击球定位，None时使用配置默认值
+    deadline_seconds: Optional[float] = Form(None),  # 截止时间（秒），None表示不限时
+    profile: Optional[str] = Form(None),  # 性能档位 fast / balanced / accurate，单独传入的参数优先
+    convert: bool = Form(False),  # 同时输出浏览器兼容的 H.264 视频（与分析共用一次解码）
+    convert_quality: str = Form("medium")  # 转换质量 high / medium / low
 ):
     """分析上传的视频文件，返回YOLOv8检测结果"""
     print(f"收到视频上传请求: {video.filename}, 类型: {video.content_type}, 大小: {video.size}")
@@ -935,58 +1079,274 @@ async def analyze_video_test(
         else:
             print(f"文件类型直接支持: {video.content_type}")
 
-        # 保存到临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(video.filename or "video.mp4")[1]) as tmp:
-            shutil.copyfileobj(video.file, tmp)
-            tmp_path = tmp.name
-
-        # 快速检查：只检查文件是否存在和大小（不读取视频内容）
-        quick_check = {
-            "compatible": True,
-            "checked": False,
-            "message": "兼容性检查将在后台进行"
-        }
-        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
-            quick_check["compatible"] = False
-            quick_check["error"] = "文件无效"
+        params = _resolve_video_params(
+            resolution=resolution, confidence=confidence, iou=iou, max_det=max_det,
+            optimization_strategy=optimization_strategy, scheduling_mode=scheduling_mode,
+            motion_gate=motion_gate, audio_onset=audio_onset,
+            deadline_seconds=deadline_seconds, profile=profile,
+            convert_quality=convert_quality if convert else None
+        )
 
-        # 后台任务：生成 job_id 并启动线程处理
-        # 兼容性检查移到后台线程，避免阻塞响应
+        # 从上传缓冲按块直接写入任务工作目录（不再经过第二个临时文件），同时计算 sha256 并检查大小上限
         job_id = str(uuid.uuid4())
-        _JOB_STORE[job_id] = {
-            "status": "queued", 
-            "progress": 0, 
-            "filename": video.filename,
-            "compatibility": quick_check,
-            "resolution": resolution,
-            "confidence": confidence,
-            "iou": iou,
-            "max_det": max_det,
-            "optimization_strategy": optimization_strategy
-        }
-        t = threading.Thread(target=video_analysis_service.analyze_video_job, args=(job_id, tmp_path, resolution, confidence, iou, max_det, optimization_strategy), daemon=True)
-        t.start()
-        
-        response = {
-            "job_id": job_id, 
-            "status": "queued",
-            "compatibility": quick_check
-        }
-        
-        # 快速检查如果失败，添加警告
-        if not quick_check.get("compatible", True):
-            response["warning"] = {
-                "message": "文件上传失败或文件无效",
-                "error": quick_check.get("error", "unknown"),
-                "recommendation": "请检查文件是否完整"
-            }
-        
-        return response
+        try:
+            upload = await upload_ingest_service.ingest(
+                iter_upload_file(video, upload_ingest_service.chunk_size),
+                _upload_dest(job_id, video.filename), declared_size=video.size
+            )
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        return _start_video_job(job_id, upload, video.filename, params)
                 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@router.post("/video/stream")
+async def analyze_video_stream(
+    request: Request,
+    filename: str = "video.mp4",
+    resolution: Optional[str] = None,
+    confidence: Optional[str] = None,
+    iou: Optional[str] = None,
+    max_det: Optional[str] = None,
+    optimization_strategy: str = "auto_fill",
+    scheduling_mode: Optional[str] = None,
+    motion_gate: Optional[bool] = None,
+    audio_onset: Optional[bool] = None,
+    deadline_seconds: Optional[float] = None,
+    profile: Optional[str] = None
+):
+    """
+    流式上传分析：请求体直接是视频字节（非 multipart），参数放在查询字符串
+    请求体按块写入任务工作目录，不经过框架的临时文件；超过大小上限时立即返回 413
+    faststart MP4 在 moov 接收完后即开始分析，检测与上传并行；其他文件等上传完成后再分析
+    """
+    supported_extensions = [".mp4", ".mov", ".avi", ".quicktime"]
+    if not any(filename.lower().endswith(ext) for ext in supported_extensions):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename}")
+    content_length = request.headers.get("content-length")
+    if upload_ingest_service.exceeds_limit(content_length):
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {upload_ingest_service.max_file_size // (1024 * 1024)}MB")
+
+    params = _resolve_video_params(
+        resolution=resolution, confidence=confidence, iou=iou, max_det=max_det,
+        optimization_strategy=optimization_strategy, scheduling_mode=scheduling_mode,
+        motion_gate=motion_gate, audio_onset=audio_onset,
+        deadline_seconds=deadline_seconds, profile=profile
+    )
+    job_id = str(uuid.uuid4())
+    started = {}
+
+    def start_streaming(path: str) -> None:
+        started["response"] = _start_video_job(job_id, IngestedUpload(path, None, None), filename, params, upload_complete=False)
+
+    try:
+        upload = await upload_ingest_service.ingest(
+            request.stream(), _upload_dest(job_id, filename),
+            declared_size=int(content_length) if content_length and content_length.isdigit() else None,
+            on_ready=start_streaming
+        )
+    except BaseException as e:
+        if started:
+            # 已开始的任务随上传中断一起取消
+            cancellation_registry.cancel(job_id, "上传中断")
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise
+    if not started:
+        return _start_video_job(job_id, upload, filename, params)
+
+    # 边上传边分析的任务：补齐 sha256/大小，标记上传完成（之后重启可从检查点恢复）
+    if job_id in _JOB_STORE:
+        _JOB_STORE[job_id].update({"sha256": upload.sha256, "size": upload.size, "upload_complete": True})
+    job_checkpoint_store.update_meta(job_id, upload_complete=True, job={
+        **(job_checkpoint_store.load_meta(job_id) or {}).get("job", {}), "sha256": upload.sha256, "size": upload.size
+    })
+    response = started["response"]
+    response.update({"sha256": upload.sha256, "size": upload.size, "status": _JOB_STORE.get(job_id, {}).get("status", "queued")})
+    return response
+
+
+@router.post("/uploads")
+async def create_upload_session(
+    filename: str = Form(...),
+    total_size: int = Form(...)
+):
+    """创建可续传的分片上传会话"""
+    supported_extensions = [".mp4", ".mov", ".avi", ".quicktime"]
+    if not any(filename.lower().endswith(ext) for ext in supported_extensions):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename}")
+    try:
+        meta = upload_session_store.create(filename, total_size)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return upload_session_store.status(meta)
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_session_chunk(upload_id: str, request: Request, offset: int = 0):
+    """写入一个分片：请求体为原始字节，offset 为其在文件中的起始位置；分片可乱序、可并行"""
+    try:
+        return await upload_session_store.write_chunk(upload_id, offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """查询已接收的字节区间，断线后据此只补传缺失部分"""
+    meta = upload_session_store.get(upload_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    return upload_session_store.status(meta)
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload_session(upload_id: str):
+    """放弃上传会话"""
+    if upload_session_store.get(upload_id) is None:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    upload_session_store.remove(upload_id)
+    return {"upload_id": upload_id, "status": "deleted"}
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload_session(
+    upload_id: str,
+    sha256: Optional[str] = Form(None),  # 客户端计算的 sha256，给出时校验
+    resolution: Optional[str] = Form(None),
+    confidence: Optional[str] = Form(None),
+    iou: Optional[str] = Form(None),
+    max_det: Optional[str] = Form(None),
+    optimization_strategy: str = Form("auto_fill"),
+    scheduling_mode: Optional[str] = Form(None),
+    motion_gate: Optional[bool] = Form(None),
+    audio_onset: Optional[bool] = Form(None),
+    deadline_seconds: Optional[float] = Form(None),
+    profile: Optional[str] = Form(None),
+    convert: bool = Form(False),
+    convert_quality: str = Form("medium")
+):
+    """所有分片接收完后创建分析任务，参数同 /analyze/video"""
+    meta = upload_session_store.get(upload_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    params = _resolve_video_params(
+        resolution=resolution, confidence=confidence, iou=iou, max_det=max_det,
+        optimization_strategy=optimization_strategy, scheduling_mode=scheduling_mode,
+        motion_gate=motion_gate, audio_onset=audio_onset,
+        deadline_seconds=deadline_seconds, profile=profile,
+        convert_quality=convert_quality if convert else None
+    )
+    job_id = str(uuid.uuid4())
+    try:
+        upload = await asyncio.to_thread(upload_session_store.finalize, upload_id, _upload_dest(job_id, meta["filename"]), sha256)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    except UploadSessionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _start_video_job(job_id, upload, meta["filename"], params)
+
+
+@router.delete("/video/{job_id}")
+async def cancel_video_job(job_id: str):
+    """取消排队中/运行中的分析任务；已结束的任务直接删除记录（仍在生成训练数据页面时中止生成）"""
+    job = _JOB_STORE.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    status = job.get("status")
+    if status in ("queued", "running", "cancelling"):
+        cancellation_registry.cancel(job_id, "用户取消")
+        job["status"] = "cancelling"
+        return {"job_id": job_id, "status": "cancelling"}
+    # 结果已返回（status=done）但训练数据页面可能仍在生成，一并中止
+    cancellation_registry.cancel_if_active(job_id, "任务已删除")
+    _JOB_STORE.pop(job_id, None)
+    frame_cache_store.remove(job_id)
+    annotated_video_service.remove(job_id)
+    training_asset_store.remove(job_id)
+    return {"job_id": job_id, "status": "deleted", "previous_status": status}
+
+
+def sweep_expired_jobs() -> int:
+    """删除超过保留期的已结束任务记录及其解码帧缓存、标注视频、训练数据静态资源，返回删除数量"""
+    ttl_seconds = VIDEO_ANALYSIS_CONFIG.get("job_store", {}).get("ttl_seconds", 24 * 3600)
+    now = time.time()
+    expired = [
+        job_id for job_id, job in list(_JOB_STORE.items())
+        if job.get("status") in ("done", "error", "cancelled") and now - job.get("created_at", now) > ttl_seconds
+    ]
+    for job_id in expired:
+        _JOB_STORE.pop(job_id, None)
+        frame_cache_store.remove(job_id)
+        annotated_video_service.remove(job_id)
+        training_asset_store.remove(job_id)
+    # 重启前留下的缓存（任务记录已不在内存中）按目录时间清理
+    removed = len(expired) + frame_cache_store.sweep_expired(ttl_seconds) + annotated_video_service.sweep_expired(ttl_seconds)
+    if removed:
+        print(f"🧹 清理过期任务记录/帧缓存 {removed} 个")
+    return removed
+
+
+@router.get("/video/{job_id}/frames/{frame_idx}")
+async def get_cached_frame(job_id: str, frame_idx: int):
+    """
+    从解码帧缓存取一帧（JPEG，分析分辨率）
+    
+    需要启用 frame_cache；分析结束后视频文件已删除，帧只能从缓存读取。
+    """
+    cached = frame_cache_store.open(job_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="该任务没有解码帧缓存")
+    frame = cached.get(frame_idx)
+    if frame is None:
+        raise HTTPException(status_code=404, detail=f"第 {frame_idx} 帧未缓存")
+    jpeg = await asyncio.to_thread(encode_jpeg, frame, VIDEO_ANALYSIS_CONFIG.get("jpeg_quality", 90))
+    if jpeg is None:
+        raise HTTPException(status_code=500, detail="帧编码失败")
+    return Response(content=jpeg, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=3600"})
+
+
+@router.get("/video/{job_id}/annotated")
+async def get_annotated_video(job_id: str, request: Request, strategy: Optional[str] = None):
+    """
+    服务端渲染的标注视频（H.264 MP4，支持 Range）
+    
+    首次请求时排队渲染并返回 202 + 渲染进度，渲染完成后同一地址返回视频；
+    结果按 (任务, 策略) 缓存，strategy 缺省为分析时选择的策略。
+    """
+    job = _JOB_STORE.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.get("status") != "done":
+        raise HTTPException(status_code=400, detail="任务尚未完成")
+    result = job.get("result") or {}
+    strategy = strategy or (result.get("selected_strategy") or {}).get("id") or "original"
+    if strategy not in result.get("strategy_trajectories", {}):
+        raise HTTPException(status_code=400, detail=f"未知的策略: {strategy}")
+    
+    state = annotated_video_service.status(job_id, strategy)
+    if state["status"] == "done":
+        return await asyncio.to_thread(
+            file_range_response, annotated_video_service.video_path(job_id, strategy), request.headers.get("range"),
+            "video/mp4", {"Cache-Control": "private, max-age=3600"}
+        )
+    if state["status"] == "error" and request.query_params.get("retry") != "true":
+        return JSONResponse({"job_id": job_id, "strategy": strategy, **state}, status_code=500)
+    try:
+        state = annotated_video_service.request(job_id, result, strategy)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse({"job_id": job_id, "strategy": strategy, **state}, status_code=202)
+
+
 @router.get("/video/status")
 async def analyze_video_status(job_id: str):
     job = _JOB_STORE.get(job_id)
@@ -1119,104 +1479,59 @@ async def get_conversion_guide():
 
 @router.get("/training-data/zip/{job_id}")
 async def download_training_data_zip(job_id: str):
-    """下载训练数据ZIP包"""
-    try:
-        # 检查任务是否存在
-        if job_id not in _JOB_STORE:
+    """
+    下载训练数据ZIP包
+    
+    流式输出：图片取自任务目录中已保存的 JPEG（STORED，不再压缩），附逐帧检测元数据和 YOLO 标注，
+    内存占用与帧数无关。
+    """
+    job_data = _JOB_STORE.get(job_id)
+    if job_data is not None and job_data.get("status") != "done":
+        raise HTTPException(status_code=400, detail="任务尚未完成")
+    
+    manifest = training_asset_store.load_manifest(job_id)
+    if manifest is None:
+        if job_data is None:
             raise HTTPException(status_code=404, detail="任务不存在")
-        
-        job_data = _JOB_STORE[job_id]
-        if job_data["status"] != "done":
-            raise HTTPException(status_code=400, detail="任务尚未完成")
-        
-        result = job_data.get("result", {})
-        if not result:
-            raise HTTPException(status_code=404, detail="分析结果不存在")
-        
-        # 获取训练数据信息
-        failure_frames = result.get("failure_frames", [])
-        low_confidence_frames = result.get("low_confidence_frames", [])
-        total_frames = result.get("total_frames", 0)
-        
-        if not failure_frames and not low_confidence_frames:
-            raise HTTPException(status_code=404, detail="没有训练数据可下载")
-        
-        # 创建ZIP文件
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # 添加README文件
-            readme_content = f"""# 训练数据收集包
-
-## 基本信息
-- 任务ID: {job_id}
-- 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-- 总帧数: {total_frames}
-- 失败帧数: {len(failure_frames)}
-- 低置信度帧数: {len(low_confidence_frames)}
-- 总训练帧数: {len(failure_frames) + len(low_confidence_frames)}
-
-## 文件说明
-- failure_frame_XXX.jpg: 检测失败的帧图片
-- low_confidence_frame_XXX.jpg: 低置信度检测的帧图片
-
-## 用途
-这些图片可用于模型训练数据增强，提高杆头检测准确率。
-
-## 建议
-1. 对失败帧进行重新标注，作为负样本训练
-2. 对低置信度帧进行质量评估，可能需要重新标注
-3. 结合原始视频进行上下文分析
-"""
-            zip_file.writestr("README.txt", readme_content)
-            
-            # 添加统计信息JSON文件
-            stats = {
-                "job_id": job_id,
-                "generation_time": datetime.now().isoformat(),
-                "total_frames": total_frames,
-                "failure_frames": failure_frames,
-                "low_confidence_frames": low_confidence_frames,
-                "failure_count": len(failure_frames),
-                "low_confidence_count": len(low_confidence_frames),
-                "total_training_frames": len(failure_frames) + len(low_confidence_frames),
-                "failure_rate": (len(failure_frames) / total_frames * 100) if total_frames > 0 else 0,
-                "low_confidence_rate": (len(low_confidence_frames) / total_frames * 100) if total_frames > 0 else 0
-            }
-            zip_file.writestr("statistics.json", json.dumps(stats, indent=2, ensure_ascii=False))
-            
-            # 添加帧图片
-            # 注意：这里我们需要重新从视频中提取帧，因为原始视频可能已被删除
-            # 为了简化，我们返回一个说明文件
-            info_content = f"""注意：由于视频文件已被处理，无法直接生成ZIP包中的图片文件。
-请使用训练数据收集页面 (training_data_{job_id}.html) 来下载具体的帧图片。
-
-失败帧列表: {failure_frames}
-低置信度帧列表: {low_confidence_frames}
-
-建议：
-1. 访问训练数据收集页面查看和下载图片
-2. 使用浏览器批量下载功能
-3. 或者重新上传视频进行分析
-"""
-            zip_file.writestr("INFO.txt", info_content)
-        
-        zip_buffer.seek(0)
-        
-        # 返回ZIP文件
-        return StreamingResponse(
-            io.BytesIO(zip_buffer.getvalue()),
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename=training_data_{job_id}.zip"
-            }
-        )
-        
-    except Exception as e:
-        print(f"生成训练数据ZIP包失败: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"生成ZIP包失败: {str(e)}")
+        raise HTTPException(status_code=404, detail="没有训练数据可下载")
+    
+    return StreamingResponse(
+        iter_training_zip(manifest),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=training_data_{job_id}.zip"
+        }
+    )
+
+
+@router.get("/training-pool")
+async def get_training_pool_stats():
+    """跨任务训练帧池统计"""
+    return await asyncio.to_thread(training_frame_pool.stats)
+
+
+@router.get("/training-pool/export")
+async def export_training_pool(since_id: int = 0, limit: Optional[int] = None, frame_type: Optional[str] = None):
+    """
+    批量导出训练帧池（流式 ZIP，格式与单任务训练数据包相同）
+    
+    按 id 增量拉取：响应头 X-Training-Pool-Next-Id 为下一次请求的 since_id。
+    """
+    if frame_type is not None and frame_type not in ("failure", "low_confidence"):
+        raise HTTPException(status_code=400, detail="frame_type 必须是 failure 或 low_confidence")
+    max_frames = VIDEO_ANALYSIS_CONFIG.get("training_pool", {}).get("export_max_frames", 5000)
+    limit = max_frames if limit is None else max(1, min(limit, max_frames))
+    manifest = await asyncio.to_thread(training_frame_pool.export_manifest, max(0, since_id), frame_type, limit)
+    if not manifest["frames"]:
+        raise HTTPException(status_code=404, detail="没有可导出的训练帧")
+    return StreamingResponse(
+        iter_training_zip(manifest, image_path=lambda frame: training_frame_pool.image_path(frame["id"])),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=training_pool_{manifest['since_id']}_{manifest['next_id']}.zip",
+            "X-Training-Pool-Next-Id": str(manifest["next_id"])
+        }
+    )
 
 
 # _generate_failure_frames_html 函数已重构到 html_generator_service
@@ -7,7 +7,6 @@ from typing import List, Dict, Any
 import uuid
 import os
 import shutil
-import io
 
 # 导入服务层
 from app.services.video_service import video_analysis_service
@@ -243,12 +242,12 @@ async def get_conversion_guide():
 async def download_training_data_zip(job_id: str):
     """下载训练数据ZIP包"""
     try:
-        # 生成ZIP包
-        zip_data = training_data_service.generate_training_data_zip(job_id)
+        # 流式生成ZIP包
+        zip_stream = training_data_service.iter_training_data_zip(job_id)
         
         # 返回ZIP文件
         return StreamingResponse(
-            io.BytesIO(zip_data),
+            zip_stream,
             media_type="application/zip",
             headers={"Content-Disposition": f"attachment; filename=training_data_{job_id}.zip"}
         )
@@ -5,220 +5,31 @@
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse
+import asyncio
+import hashlib
 import os
 import tempfile
-import shutil
 import uuid
-import threading
-import time
-import subprocess
-from typing import Dict, Any
-import cv2
 
-router = APIRouter()
-
-# 转换任务存储
-_CONVERSION_JOBS: Dict[str, Dict] = {}
+from app.services.video_conversion import ConversionQueueFull, check_video_compatibility, video_conversion_service
 
-# 服务器资源监控
-_SERVER_STATUS = {
-    "active_conversions": 0,
-    "max_concurrent_conversions": 2,  # 限制并发转换数量
-    "server_load": "normal"
-}
-
-def _check_video_compatibility(video_path: str) -> Dict[str, Any]:
-    """检查视频兼容性"""
-    try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return {"compatible": False, "error": "无法打开视频文件"}
-        
-        # 获取视频信息
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
-        fourcc_str = ''.join([chr((fourcc >> 8 * i) & 0xFF) for i in range(4)])
-        
-        cap.release()
-        
-        # 检查编码格式兼容性
-        compatible_formats = ['h264', 'H264', 'avc1', 'AVC1']
-        is_compatible = fourcc_str.lower() in [fmt.lower() for fmt in compatible_formats]
-        
-        return {
-            "compatible": is_compatible,
-            "video_info": {
-                "width": width,
-                "height": height,
-                "fps": fps,
-                "frame_count": frame_count,
-                "codec": fourcc_str,
-                "aspect_ratio": width / height if height > 0 else 0
-            },
-            "compatibility": {
-                "browser_playback": is_compatible,
-                "backend_processing": True,
-                "recommended_format": "H.264 encoded MP4" if not is_compatible else "Current format is compatible"
-            }
-        }
-        
-    except Exception as e:
-        return {"compatible": False, "error": str(e)}
-
-def _check_ffmpeg_available() -> bool:
-    """检查FFmpeg是否可用"""
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], 
-                              capture_output=True, text=True, timeout=5)
-        return result.returncode == 0
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        return False
-
-def _convert_video_job(job_id: str, input_path: str, output_path: str, quality: str = "medium") -> None:
-    """后台视频转换任务"""
-    try:
-        _CONVERSION_JOBS[job_id]["status"] = "converting"
-        _SERVER_STATUS["active_conversions"] += 1
-        
-        # 检查是否需要转换
-        compatibility = _check_video_compatibility(input_path)
-        if compatibility.get("compatible", False):
-            # 如果已经兼容，直接复制文件
-            shutil.copy2(input_path, output_path)
-            _CONVERSION_JOBS[job_id]["status"] = "completed"
-            _CONVERSION_JOBS[job_id]["message"] = "视频已经是兼容格式，无需转换"
-        else:
-            # 检查FFmpeg是否可用
-            if not _check_ffmpeg_available():
-                # 如果FFmpeg不可用，使用OpenCV进行简单转换
-                _convert_with_opencv(job_id, input_path, output_path)
-            else:
-                # 使用FFmpeg进行真正的H.264转换
-                _convert_with_ffmpeg(job_id, input_path, output_path, quality)
-        
-        # 清理输入文件
-        try:
-            os.remove(input_path)
-        except OSError:
-            pass
-            
-    except Exception as e:
-        _CONVERSION_JOBS[job_id]["status"] = "error"
-        _CONVERSION_JOBS[job_id]["error"] = str(e)
-        
-        # 清理文件
-        try:
-            os.remove(input_path)
-        except OSError:
-            pass
-        try:
-            os.remove(output_path)
-        except OSError:
-            pass
-    finally:
-        _SERVER_STATUS["active_conversions"] = max(0, _SERVER_STATUS["active_conversions"] - 1)
-
-def _convert_with_ffmpeg(job_id: str, input_path: str, output_path: str, quality: str) -> None:
-    """使用FFmpeg进行H.264转换"""
-    # 质量设置
-    quality_settings = {
-        "high": ["-crf", "18", "-preset", "slow"],
-        "medium": ["-crf", "23", "-preset", "medium"], 
-        "low": ["-crf", "28", "-preset", "fast"]
-    }
-    
-    # 构建FFmpeg命令
-    cmd = [
-        "ffmpeg", "-i", input_path,
-        "-c:v", "libx264",  # 使用H.264编码器
-        "-c:a", "aac",      # 音频编码器
-        "-movflags", "+faststart",  # 优化网络播放
-        "-y"  # 覆盖输出文件
-    ] + quality_settings.get(quality, quality_settings["medium"])
-    
-    cmd.append(output_path)
-    
-    print(f"执行FFmpeg命令: {' '.join(cmd)}")
-    
-    # 执行转换
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    
-    # 监控进度（简化版本）
-    _CONVERSION_JOBS[job_id]["progress"] = 10
-    
-    # 等待转换完成
-    stdout, stderr = process.communicate()
-    
-    if process.returncode == 0:
-        _CONVERSION_JOBS[job_id]["status"] = "completed"
-        _CONVERSION_JOBS[job_id]["message"] = "视频转换完成（H.264格式）"
-        _CONVERSION_JOBS[job_id]["progress"] = 100
-        print("FFmpeg转换成功")
-    else:
-        raise Exception(f"FFmpeg转换失败: {stderr}")
+router = APIRouter()
 
-def _convert_with_opencv(job_id: str, input_path: str, output_path: str) -> None:
-    """使用OpenCV进行转换（备用方案）"""
-    cap = cv2.VideoCapture(input_path)
-    if not cap.isOpened():
-        raise Exception("无法打开输入视频文件")
-    
-    # 获取视频属性
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    
-    # 创建视频写入器 - 尝试使用H.264编码器
-    fourcc = cv2.VideoWriter_fourcc(*'H264')  # 尝试H.264编码器
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
-    if not out.isOpened():
-        # 如果H.264不可用，回退到mp4v
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
-    frame_count = 0
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        out.write(frame)
-        frame_count += 1
-        
-        # 更新进度
-        progress = int((frame_count / total_frames) * 100)
-        _CONVERSION_JOBS[job_id]["progress"] = progress
-    
-    cap.release()
-    out.release()
-    
-    _CONVERSION_JOBS[job_id]["status"] = "completed"
-    _CONVERSION_JOBS[job_id]["message"] = "视频转换完成（OpenCV，可能不是H.264）"
-    _CONVERSION_JOBS[job_id]["progress"] = 100
+# 转换任务存储（由转换服务维护）
+_CONVERSION_JOBS = video_conversion_service.jobs
 
 @router.post("/video")
 async def convert_video(
     video: UploadFile = File(...),
     quality: str = "medium"
 ):
-    """转换视频格式为H.264 MP4"""
+    """转换视频格式为H.264 MP4（超过并发数的任务排队执行）"""
     
-    # 检查服务器负载
-    if _SERVER_STATUS["active_conversions"] >= _SERVER_STATUS["max_concurrent_conversions"]:
+    # 检查排队长度
+    if video_conversion_service.queue_length >= video_conversion_service.max_queue:
         raise HTTPException(
             status_code=503, 
-            detail="服务器转换任务已满，请稍后再试"
+            detail="服务器转换队列已满，请稍后再试"
         )
     
     # 检查文件类型
@@ -228,64 +39,69 @@ async def convert_video(
             detail="请上传视频文件"
         )
     
-    # 创建临时文件
+    # 创建临时文件（写入的同时计算内容哈希，作为转换缓存的键）
+    sha256 = hashlib.sha256()
     with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(video.filename or "video.mp4")[1]) as tmp:
-        shutil.copyfileobj(video.file, tmp)
+        while True:
+            chunk = await video.read(1024 * 1024)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            tmp.write(chunk)
         input_path = tmp.name
     
-    # 生成输出文件路径
+    # 下载时使用的文件名
     output_filename = f"converted_{uuid.uuid4().hex[:8]}.mp4"
     output_path = os.path.join(tempfile.gettempdir(), output_filename)
     
-    # 检查视频兼容性
-    compatibility = _check_video_compatibility(input_path)
+    # 已有转换缓存时不再探测；否则检查视频兼容性，ffprobe 选择代价最低的转换方式
+    compatibility, plan = None, None
+    if video_conversion_service.lookup_cache(sha256.hexdigest(), quality) is None:
+        compatibility = await asyncio.to_thread(check_video_compatibility, input_path)
+        plan = await asyncio.to_thread(video_conversion_service.plan, input_path)
     
-    # 生成任务ID
+    # 生成任务ID并排队（命中缓存时直接完成）
     job_id = str(uuid.uuid4())
-    _CONVERSION_JOBS[job_id] = {
-        "status": "queued",
-        "progress": 0,
-        "input_filename": video.filename,
-        "output_filename": output_filename,
-        "output_path": output_path,
-        "compatibility": compatibility,
-        "created_at": time.time()
-    }
-    
-    # 启动转换任务
-    thread = threading.Thread(
-        target=_convert_video_job, 
-        args=(job_id, input_path, output_path, quality),
-        daemon=True
-    )
-    thread.start()
+    try:
+        job = video_conversion_service.submit(
+            job_id, input_path, output_path, quality,
+            sha256=sha256.hexdigest(),
+            plan=plan,
+            input_filename=video.filename,
+            output_filename=output_filename,
+            compatibility=compatibility
+        )
+    except ConversionQueueFull:
+        os.remove(input_path)
+        raise HTTPException(status_code=503, detail="服务器转换队列已满，请稍后再试")
     
     response = {
         "job_id": job_id,
-        "status": "queued",
-        "message": "视频转换任务已开始",
+        "status": job["status"],
+        "message": job.get("message") or "视频转换任务已排队",
+        "queue_position": video_conversion_service.queue_position(job_id),
+        "cache_hit": job.get("cache_hit", False),
         "compatibility": compatibility
     }
     
-    # 如果不兼容，添加转换说明
-    if not compatibility.get("compatible", True):
-        response["conversion_info"] = {
-            "reason": "检测到不兼容的视频格式",
-            "current_codec": compatibility.get("video_info", {}).get("codec", "unknown"),
-            "target_codec": "H.264",
-            "estimated_time": "1-3分钟"
-        }
-    else:
-        response["conversion_info"] = {
-            "reason": "视频已经是兼容格式",
-            "action": "将直接复制文件"
-        }
+    if plan is None:
+        response["conversion_info"] = None
+        return response
+    
+    probe = plan.get("probe") or {}
+    response["conversion_info"] = {
+        "mode": plan["mode"],
+        "reason": plan["reason"],
+        "video_codec": probe.get("video_codec") or compatibility.get("video_info", {}).get("codec", "unknown"),
+        "audio_codec": probe.get("audio_codec"),
+        "target_codec": probe.get("video_codec") if plan["mode"] != "reencode" else "H.264"
+    }
     
     return response
 
 @router.get("/status/{job_id}")
 async def get_conversion_status(job_id: str):
-    """获取转换任务状态"""
+    """获取转换任务状态（进度、编码速度和预计剩余时间来自 ffmpeg -progress 输出）"""
     job = _CONVERSION_JOBS.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="转换任务未找到")
@@ -297,7 +113,21 @@ async def get_conversion_status(job_id: str):
         "message": job.get("message", "")
     }
     
+    if job.get("status") == "queued":
+        response["queue_position"] = video_conversion_service.queue_position(job_id)
+    
+    if job.get("status") == "converting":
+        response["fps"] = job.get("fps")
+        response["speed"] = job.get("speed")
+        response["eta_seconds"] = job.get("eta_seconds")
+        if job.get("segments"):
+            response["segments"] = job["segments"]
+    
+    if job.get("mode"):
+        response["mode"] = job["mode"]
+    
     if job.get("status") == "completed":
+        response["cache_hit"] = job.get("cache_hit", False)
         response["download_url"] = f"/convert/download/{job_id}"
         response["output_filename"] = job.get("output_filename")
     
@@ -333,12 +163,18 @@ async def download_converted_video(job_id: str):
 @router.get("/server-status")
 async def get_server_status():
     """获取转换服务器状态"""
+    stats = video_conversion_service.stats()
+    active = stats["active_conversions"]
+    workers = stats["workers"]
+    queue_length = stats["queue_length"]
     return {
-        "active_conversions": _SERVER_STATUS["active_conversions"],
-        "max_concurrent_conversions": _SERVER_STATUS["max_concurrent_conversions"],
-        "server_load": _SERVER_STATUS["server_load"],
-        "available_slots": _SERVER_STATUS["max_concurrent_conversions"] - _SERVER_STATUS["active_conversions"],
-        "queue_length": len([job for job in _CONVERSION_JOBS.values() if job.get("status") == "queued"])
+        "active_conversions": active,
+        "max_concurrent_conversions": workers,
+        "server_load": "high" if queue_length > 0 else ("busy" if active >= workers else "normal"),
+        "available_slots": max(0, workers - active),
+        "queue_length": queue_length,
+        "max_queue": stats["max_queue"],
+        "ffmpeg_threads_per_job": stats["ffmpeg_threads_per_job"]
     }
 
 @router.get("/supported-formats")
@@ -754,7 +590,13 @@ async def get_conversion_test_page():
                     const status = await response.json();
                     
                     updateProgress(status.progress);
-                    showStatus(status.message || `转换中... ${status.progress}%`, 'info');
+                    if (status.status === 'queued') {
+                        showStatus(`排队中，前面还有 ${(status.queue_position || 1) - 1} 个任务`, 'info');
+                    } else {
+                        const eta = status.eta_seconds != null ? `，预计剩余 ${Math.ceil(status.eta_seconds)} 秒` : '';
+                        const speed = status.speed ? `（${status.speed}x）` : '';
+                        showStatus(status.message || `转换中... ${status.progress}%${speed}${eta}`, 'info');
+                    }
                     
                     if (status.status === 'completed') {
                         clearInterval(pollInterval);
@@ -0,0 +1,313 @@
+"""
+服务端渲染的标注视频
+把杆头轨迹、挥杆阶段标签和补齐点直接画进 H.264 视频，便于分享（不必再录屏）。
+
+渲染流水线：
+    解码线程 --(有界队列)--> 绘制（OpenCV，轨迹点预先换算成数组）--> ffmpeg rawvideo stdin 编码
+
+画面来源优先使用分析结束时保留的原视频（keep_source），其次是解码帧缓存（分析分辨率，无音轨）。
+默认不保留原视频：即使是硬链接，原上传文件也会在任务保留期内一直占用磁盘。keep_source="link" 时
+以硬链接保留，无法硬链接（跨文件系统、内存中的上传）时不保留；"copy" 时退而复制。
+结果按 (任务, 策略) 缓存为 {dir}/{job_id}/annotated_{strategy}.mp4；渲染线程和 ffmpeg 以较低的
+调度优先级（nice）运行，同时渲染的任务数受 max_concurrent 限制，多出的排队。
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from analyzer.ffmpeg import iter_video_frames
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.frame_cache import frame_cache_store
+
+# BGR
+_TRAIL_COLOR = (0, 0, 255)
+_FILLED_COLOR = (0, 200, 255)
+_CURRENT_COLOR = (0, 255, 0)
+_LABEL_BG = (0, 0, 0)
+_LABEL_FG = (255, 255, 255)
+
+
+def _lower_thread_priority(nice: int) -> None:
+    """降低当前线程的调度优先级（Linux 上 setpriority 对线程 ID 生效）"""
+    if nice <= 0:
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError):
+        pass
+
+
+class AnnotatedVideoService:
+    """按 (任务, 策略) 渲染并缓存标注视频"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.root = config.get("dir", "/tmp/golftracker_annotated")
+        keep_source = config.get("keep_source", False)
+        self.keep_source = "copy" if keep_source is True else (keep_source or None)
+        self.max_size = config.get("max_size", 1280)
+        self.crf = config.get("crf", 23)
+        self.preset = config.get("preset", "veryfast")
+        self.ffmpeg_threads = config.get("ffmpeg_threads", 2)
+        self.nice = config.get("nice", 10)
+        self.trail_frames = config.get("trail_frames", 0)
+        self.queue_frames = config.get("queue_frames", 16)
+        self.max_concurrent = config.get("max_concurrent", 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._renders: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def video_path(self, job_id: str, strategy: str) -> str:
+        return os.path.join(self._job_dir(job_id), f"annotated_{strategy}.mp4")
+
+    def _source_path(self, job_id: str) -> Optional[str]:
+        job_dir = self._job_dir(job_id)
+        if not os.path.isdir(job_dir):
+            return None
+        for name in os.listdir(job_dir):
+            if name.startswith("source"):
+                return os.path.join(job_dir, name)
+        return None
+
+    def retain_source(self, job_id: str, video_path: str) -> None:
+        """
+        分析结束、原视频删除之前保留一份用于渲染
+
+        keep_source 未设置时不保留（渲染只用帧缓存）；"link" 时只做硬链接，失败则不保留；"copy" 时退而复制整个文件。
+        """
+        if not self.enabled or not self.keep_source:
+            return
+        in_memory = video_path.startswith("/proc/")
+        if in_memory and self.keep_source != "copy":
+            return
+        ext = os.path.splitext(video_path)[1] if os.path.isfile(video_path) and not in_memory else ""
+        target = os.path.join(self._job_dir(job_id), f"source{ext or '.mp4'}")
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        try:
+            os.link(video_path, target)
+        except OSError:
+            if self.keep_source == "copy":
+                shutil.copyfile(video_path, target)
+            else:
+                print("ℹ️ 原视频无法硬链接，不保留（标注视频将使用解码帧缓存）")
+
+    def status(self, job_id: str, strategy: str) -> Dict[str, Any]:
+        """渲染状态：done / queued / rendering / error / none"""
+        if os.path.exists(self.video_path(job_id, strategy)):
+            return {"status": "done", "progress": 100}
+        with self._lock:
+            state = self._renders.get((job_id, strategy))
+            return dict(state) if state is not None else {"status": "none", "progress": 0}
+
+    def request(self, job_id: str, result: Dict[str, Any], strategy: str) -> Dict[str, Any]:
+        """已缓存时直接返回，否则排队渲染（同一 (任务, 策略) 只渲染一次）"""
+        state = self.status(job_id, strategy)
+        if state["status"] in ("done", "queued", "rendering"):
+            return state
+        if self._source_path(job_id) is None and frame_cache_store.open(job_id) is None:
+            raise ValueError("原视频已删除且没有解码帧缓存，无法渲染标注视频")
+        with self._lock:
+            state = {"status": "queued", "progress": 0}
+            self._renders[(job_id, strategy)] = state
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, int(self.max_concurrent)),
+                                                    thread_name_prefix="annotated-render")
+            self._executor.submit(self._render, job_id, result, strategy, state)
+        return dict(state)
+
+    def _annotations(self, result: Dict[str, Any], strategy: str, scale_x: float, scale_y: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """逐帧的 (像素坐标 int32 [N,2], 有效掩码, 补齐掩码)，坐标已换算到输出分辨率"""
+        total = result.get("total_frames", 0)
+        xy = np.zeros((total, 2), dtype=np.float64)
+        valid = np.zeros(total, dtype=bool)
+        filled = np.zeros(total, dtype=bool)
+        selected = (result.get("selected_strategy") or {}).get("id")
+        if strategy == selected and result.get("right_frame_detections"):
+            # 用户选择的策略：直接使用右画面的补齐数据
+            for det in result["right_frame_detections"][:total]:
+                i = det["frame"]
+                if det.get("detected"):
+                    xy[i] = (det["x"], det["y"])
+                    valid[i] = True
+                    filled[i] = bool(det.get("is_filled"))
+        else:
+            # 其他策略：原始检测成功的帧用原始点，其余帧用策略轨迹补齐
+            width = result.get("video_width", 0)
+            height = result.get("video_height", 0)
+            trajectory = result.get("strategy_trajectories", {}).get(strategy, [])
+            detections = result.get("left_frame_detections") or result.get("frame_detections") or []
+            for i in range(min(total, len(trajectory))):
+                det = detections[i] if i < len(detections) else None
+                if det and det.get("detected"):
+                    xy[i] = (det["x"], det["y"])
+                    valid[i] = True
+                elif trajectory[i] and trajectory[i][0] != 0 and trajectory[i][1] != 0:
+                    xy[i] = (trajectory[i][0] * width, trajectory[i][1] * height)
+                    valid[i] = True
+                    filled[i] = True
+        xy *= (scale_x, scale_y)
+        return np.rint(xy).astype(np.int32), valid, filled
+
+    def _draw(self, frame: np.ndarray, i: int, xy: np.ndarray, valid: np.ndarray, filled: np.ndarray, phase: Optional[str]) -> None:
+        lo = max(0, i - self.trail_frames + 1) if self.trail_frames else 0
+        idx = np.flatnonzero(valid[lo:i + 1]) + lo
+        if len(idx) >= 2:
+            cv2.polylines(frame, [xy[idx].reshape(-1, 1, 2)], False, _TRAIL_COLOR, 2, cv2.LINE_AA)
+        for j in idx[filled[idx]]:
+            cv2.circle(frame, tuple(int(v) for v in xy[j]), 3, _FILLED_COLOR, 1, cv2.LINE_AA)
+        if i < len(valid) and valid[i]:
+            cv2.circle(frame, tuple(int(v) for v in xy[i]), 6, _FILLED_COLOR if filled[i] else _CURRENT_COLOR, -1, cv2.LINE_AA)
+        label = f"{phase}  #{i}" if phase else f"#{i}"
+        (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+        cv2.rectangle(frame, (8, 8), (16 + text_w, 16 + text_h + baseline), _LABEL_BG, -1)
+        cv2.putText(frame, label, (12, 12 + text_h), cv2.FONT_HERSHEY_SIMPLEX, 0.7, _LABEL_FG, 2, cv2.LINE_AA)
+
+    def _iter_source_frames(self, job_id: str, total_frames: int) -> Iterator[np.ndarray]:
+        """原视频（缩放到 max_size）或帧缓存（缺失的帧沿用上一帧）"""
+        source = self._source_path(job_id)
+        if source is not None:
+            for ok, frame in iter_video_frames(source, sample_stride=1, max_size=self.max_size):
+                if not ok:
+                    break
+                yield frame
+            return
+        cached = frame_cache_store.open(job_id)
+        if cached is None:
+            return
+        previous = None
+        for i in range(min(total_frames, len(cached))):
+            frame = cached.get(i)
+            if frame is not None:
+                previous = frame
+            if previous is not None:
+                yield np.array(previous)
+
+    def _render(self, job_id: str, result: Dict[str, Any], strategy: str, state: Dict[str, Any]) -> None:
+        _lower_thread_priority(self.nice)
+        state["status"] = "rendering"
+        start = time.perf_counter()
+        total = result.get("total_frames", 0)
+        fps = (result.get("video_info") or {}).get("fps") or 30
+        output_path = self.video_path(job_id, strategy)
+        tmp_path = output_path + ".tmp.mp4"
+        frames: "queue.Queue" = queue.Queue(maxsize=max(1, self.queue_frames))
+        stop = threading.Event()
+        decode_error = []
+
+        def _put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    frames.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _decode() -> None:
+            _lower_thread_priority(self.nice)
+            try:
+                for frame in self._iter_source_frames(job_id, total):
+                    if not _put(frame):
+                        return
+            except Exception as e:
+                decode_error.append(e)
+            _put(None)
+
+        decoder = threading.Thread(target=_decode, name=f"annotated-decode-{job_id[:8]}", daemon=True)
+        decoder.start()
+        proc = None
+        try:
+            first = frames.get()
+            if first is None:
+                raise RuntimeError(f"无法读取视频帧: {decode_error[0] if decode_error else '来源为空'}")
+            # yuv420p 要求宽高为偶数
+            out_h, out_w = first.shape[0] // 2 * 2, first.shape[1] // 2 * 2
+            xy, valid, filled = self._annotations(result, strategy, out_w / max(1, result.get("video_width") or out_w),
+                                                  out_h / max(1, result.get("video_height") or out_h))
+            phases = result.get("swing_phases") or []
+            cmd = ["ffmpeg", "-loglevel", "error", "-y",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{out_w}x{out_h}", "-r", f"{fps}", "-i", "pipe:0"]
+            source = self._source_path(job_id)
+            if source is not None:
+                cmd += ["-i", source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "aac", "-shortest"]
+            cmd += ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf), "-threads", str(self.ffmpeg_threads),
+                    "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-f", "mp4", tmp_path]
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    preexec_fn=(lambda: os.nice(self.nice)) if self.nice > 0 else None)
+
+            i = 0
+            frame = first
+            while frame is not None and i < total:
+                frame = np.ascontiguousarray(frame[:out_h, :out_w])
+                self._draw(frame, i, xy, valid, filled, phases[i] if i < len(phases) else None)
+                proc.stdin.write(frame.data)
+                i += 1
+                if i % 30 == 0:
+                    state["progress"] = min(99, int(i * 100 / max(1, total)))
+                frame = frames.get()
+            proc.stdin.close()
+            stderr = proc.stderr.read().decode("utf-8", errors="replace")
+            if proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg 编码失败: {stderr[-500:]}")
+            os.replace(tmp_path, output_path)
+            state["status"] = "done"
+            state["progress"] = 100
+            print(f"🎬 标注视频渲染完成: {job_id} ({strategy})，{i} 帧，用时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            state["status"] = "error"
+            state["error"] = str(e)
+            print(f"❌ 标注视频渲染失败: {job_id} ({strategy}): {e}")
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        finally:
+            stop.set()
+            decoder.join(timeout=5)
+            if proc is not None and proc.stderr is not None:
+                proc.stderr.close()
+            with self._lock:
+                if state["status"] == "done":
+                    self._renders.pop((job_id, strategy), None)
+
+    def remove(self, job_id: str) -> None:
+        if job_id and os.path.basename(job_id) == job_id:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        with self._lock:
+            for key in [key for key in self._renders if key[0] == job_id]:
+                self._renders.pop(key, None)
+
+    def sweep_expired(self, ttl_seconds: float) -> int:
+        """删除超过保留期的渲染目录（按目录修改时间）"""
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        removed = 0
+        for job_id in os.listdir(self.root):
+            try:
+                expired = now - os.path.getmtime(self._job_dir(job_id)) > ttl_seconds
+            except OSError:
+                continue
+            if expired:
+                self.remove(job_id)
+                removed += 1
+        return removed
+
+
+# 全局标注视频服务
+annotated_video_service = AnnotatedVideoService(VIDEO_ANALYSIS_CONFIG.get("annotated_video", {}))
@@ -0,0 +1,70 @@
+"""
+任务取消服务
+协作式取消：分析线程在逐帧循环、策略循环和训练页面生成中检查取消令牌，
+被取消时抛出 JobCancelled，由 analyze_video_job 统一清理并标记为 cancelled。
+"""
+import threading
+from typing import Dict, Optional
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class CancellationToken:
+    """单个任务的取消令牌"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled(self.reason or "cancelled")
+
+
+class CancellationRegistry:
+    """job_id -> 取消令牌"""
+
+    def __init__(self):
+        self._tokens: Dict[str, CancellationToken] = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> CancellationToken:
+        """获取（不存在时创建）任务的取消令牌"""
+        with self._lock:
+            token = self._tokens.get(job_id)
+            if token is None:
+                token = CancellationToken()
+                self._tokens[job_id] = token
+            return token
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> None:
+        self.get(job_id).cancel(reason)
+
+    def cancel_if_active(self, job_id: str, reason: str = "cancelled") -> bool:
+        """只取消仍在运行的任务（令牌已释放时不再创建），返回是否取消"""
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    def release(self, job_id: str) -> None:
+        """任务结束后释放令牌"""
+        with self._lock:
+            self._tokens.pop(job_id, None)
+
+
+# 全局取消令牌注册表
+cancellation_registry = CancellationRegistry()
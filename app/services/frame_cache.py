@@ -0,0 +1,220 @@
+"""
+解码帧缓存（可选）
+分析时唯一的一遍解码顺带把分析分辨率的帧写入磁盘上的 uint8 数组，任务结束后视频文件会被删除，
+训练帧提取、帧预览、缩略图等后续功能通过 np.memmap 零拷贝随机访问任意帧，不必再 seek 解码。
+任务进行中 FrameCacheStore.open() 返回写入器本身（按帧 pread 读取），任务内的关键帧缩略图、
+训练帧提取等步骤同样能命中缓存。多进程分片检测时由工作进程直接写入同一个数据文件。
+
+    {dir}/{job_id}/
+        frames.u8    [frame_count, height, width, channels] 的 uint8 原始数据（未写入的帧是稀疏空洞）
+        present.npy  每帧是否已写入（uint8）
+        meta.json    尺寸、帧数、是否完整
+
+缓存随任务记录一起按任务保留期清理。
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+
+
+class FrameCacheWriter:
+    """解码过程中按帧号写入缓存；帧尺寸由第一帧确定，尺寸不同的帧（降级切换分辨率后）不写入"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.shape: Optional[tuple] = None
+        self.frame_bytes = 0
+        self.skipped_frames = 0
+        self._present = bytearray()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.data_path = os.path.join(cache_dir, "frames.u8")
+        self._fd = os.open(self.data_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    def set_shape(self, shape: tuple) -> bool:
+        """预先确定帧尺寸（解码前已知分析分辨率时调用），返回是否与已确定的尺寸一致"""
+        if self.shape is None:
+            self.shape = tuple(shape)
+            self.frame_bytes = int(np.prod(self.shape))
+        return self.shape == tuple(shape)
+
+    def write(self, frame_idx: int, frame_bgr: np.ndarray) -> bool:
+        if self._fd is None:
+            return False
+        self.set_shape(frame_bgr.shape)
+        if tuple(frame_bgr.shape) != self.shape or frame_bgr.dtype != np.uint8 or \
+                (frame_idx + 1) * self.frame_bytes > self.max_bytes:
+            self.skipped_frames += 1
+            return False
+        os.pwrite(self._fd, np.ascontiguousarray(frame_bgr).data, frame_idx * self.frame_bytes)
+        self._mark(frame_idx)
+        return True
+
+    def mark_written(self, frame_indices) -> None:
+        """登记由其他进程直接写入数据文件的帧"""
+        for frame_idx in frame_indices:
+            self._mark(frame_idx)
+
+    def _mark(self, frame_idx: int) -> None:
+        if frame_idx >= len(self._present):
+            self._present.extend(b"\0" * (frame_idx + 1 - len(self._present)))
+        self._present[frame_idx] = 1
+
+    # ---- 任务进行中的只读访问（与 CachedFrames 接口一致） ----
+
+    @property
+    def frame_shape(self) -> tuple:
+        return self.shape
+
+    def __len__(self) -> int:
+        return len(self._present)
+
+    def __contains__(self, frame_idx: int) -> bool:
+        return 0 <= frame_idx < len(self._present) and bool(self._present[frame_idx])
+
+    def get(self, frame_idx: int) -> Optional[np.ndarray]:
+        """取一帧（BGR，分析分辨率，只读副本）；未缓存或写入器已关闭时返回 None"""
+        if frame_idx not in self:
+            return None
+        with self._lock:
+            if self._fd is None:
+                return None
+            data = os.pread(self._fd, self.frame_bytes, frame_idx * self.frame_bytes)
+        if len(data) != self.frame_bytes:
+            return None
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.shape)
+
+    def close(self, complete: bool = True) -> None:
+        """写入索引；未写入任何帧时删除缓存"""
+        with self._lock:
+            if self._fd is None:
+                return
+            os.close(self._fd)
+            self._fd = None
+        if self.shape is None or not any(self._present):
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            return
+        np.save(os.path.join(self.cache_dir, "present.npy"), np.frombuffer(bytes(self._present), dtype=np.uint8))
+        meta = {
+            "shape": list(self.shape),
+            "frame_count": len(self._present),
+            "cached_frames": sum(self._present),
+            "skipped_frames": self.skipped_frames,
+            "complete": complete,
+            "created_at": time.time()
+        }
+        with open(os.path.join(self.cache_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        print(f"🗂️ 帧缓存已写入: {meta['cached_frames']} 帧, {self.frame_bytes * meta['frame_count'] / 1024 / 1024:.0f}MB")
+
+
+class CachedFrames:
+    """只读的帧缓存视图，get() 返回 memmap 切片（零拷贝）"""
+
+    def __init__(self, cache_dir: str, meta: Dict[str, Any]):
+        self.meta = meta
+        self.present = np.load(os.path.join(cache_dir, "present.npy"))
+        self.array = np.memmap(os.path.join(cache_dir, "frames.u8"), dtype=np.uint8, mode="r",
+                               shape=(meta["frame_count"], *meta["shape"]))
+
+    @property
+    def frame_shape(self) -> tuple:
+        return tuple(self.meta["shape"])
+
+    def __len__(self) -> int:
+        return self.meta["frame_count"]
+
+    def __contains__(self, frame_idx: int) -> bool:
+        return 0 <= frame_idx < len(self.present) and bool(self.present[frame_idx])
+
+    def get(self, frame_idx: int) -> Optional[np.ndarray]:
+        """取一帧（BGR，分析分辨率）；未缓存时返回 None"""
+        if frame_idx not in self:
+            return None
+        return self.array[frame_idx]
+
+
+class FrameCacheStore:
+    """按任务管理解码帧缓存"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", False)
+        self.root = config.get("dir", "/tmp/golftracker_frame_cache")
+        self.max_bytes = config.get("max_bytes_per_job", 4 * 1024 * 1024 * 1024)
+        self._writers: Dict[str, FrameCacheWriter] = {}
+        self._lock = threading.Lock()
+
+    def _cache_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def create_writer(self, job_id: str) -> Optional[FrameCacheWriter]:
+        """任务开始解码时创建写入器（未启用时返回 None）"""
+        if not self.enabled:
+            return None
+        shutil.rmtree(self._cache_dir(job_id), ignore_errors=True)
+        writer = FrameCacheWriter(self._cache_dir(job_id), self.max_bytes)
+        with self._lock:
+            self._writers[job_id] = writer
+        return writer
+
+    def writer(self, job_id: Optional[str]) -> Optional[FrameCacheWriter]:
+        with self._lock:
+            return self._writers.get(job_id)
+
+    def finish_writer(self, job_id: str, complete: bool = True) -> None:
+        # 先写索引再摘除写入器，open() 任何时刻都能拿到写入器或已完成的缓存
+        writer = self.writer(job_id)
+        if writer is not None:
+            writer.close(complete)
+        with self._lock:
+            self._writers.pop(job_id, None)
+
+    def open(self, job_id: str) -> Optional[Union[CachedFrames, FrameCacheWriter]]:
+        """打开任务的帧缓存，不存在时返回 None；任务仍在写入时返回写入器（同样支持 in / get）"""
+        if not job_id or os.path.basename(job_id) != job_id:
+            return None
+        writer = self.writer(job_id)
+        if writer is not None:
+            return writer if writer.shape is not None else None
+        cache_dir = self._cache_dir(job_id)
+        try:
+            with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            return CachedFrames(cache_dir, meta)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self, job_id: str) -> None:
+        if job_id and os.path.basename(job_id) == job_id:
+            shutil.rmtree(self._cache_dir(job_id), ignore_errors=True)
+
+    def sweep_expired(self, ttl_seconds: float) -> int:
+        """删除超过保留期的缓存（重启后任务记录已不在内存中，按目录修改时间判断）"""
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        removed = 0
+        for job_id in os.listdir(self.root):
+            if self.writer(job_id) is not None:
+                continue
+            try:
+                expired = now - os.path.getmtime(self._cache_dir(job_id)) > ttl_seconds
+            except OSError:
+                continue
+            if expired:
+                self.remove(job_id)
+                removed += 1
+        return removed
+
+
+# 全局帧缓存
+frame_cache_store = FrameCacheStore(VIDEO_ANALYSIS_CONFIG.get("frame_cache", {}))
@@ -2,71 +2,97 @@
 HTML生成服务 - 从analyze.py中提取的HTML生成函数
 保持原有的HTML内容和样式完全不变
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from datetime import datetime
 import json
-import os
 import cv2
-import base64
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.training_assets import jpeg_size, training_asset_store
+from app.services.training_export import build_manifest
+from app.services.frame_cache import frame_cache_store
 
 
 class HTMLGeneratorService:
     """HTML生成服务 - 保持原有逻辑和界面"""
     
-    def generate_training_data_page(self, job_id: str, video_path: str, failure_frames: List[int], low_confidence_frames: List[int], confidence_threshold: float) -> str:
-        """生成训练数据收集页面（失败帧 + 低置信度帧）并返回URL"""
+    def generate_training_data_page(self, job_id: str, video_path: str, failure_frames: List[int], low_confidence_frames: List[int], confidence_threshold: float, cancel_token=None, frame_buffer=None, fps: float = None, total_frames: int = None, detections: Dict[int, Dict] = None, video_size: Tuple[int, int] = None) -> str:
+        """
+        生成训练数据收集页面（失败帧 + 低置信度帧）并返回URL
+
+        图片写成任务目录下的独立 JPEG 文件，页面按 URL 懒加载；
+        同时写入训练帧清单（含 detections 中的逐帧检测结果），供 ZIP 导出使用。
+        传入 frame_buffer（检测阶段收集的训练帧缓冲）时直接使用其中的 JPEG，不再打开视频；
+        缓冲中没有的帧（如从检查点恢复的帧）跳过。未传入时按帧号 seek 读取视频，并行编码。
+        训练帧是检测时的分析分辨率，每帧的图片尺寸和原视频尺寸 video_size 一并写入清单。
+        """
         try:
-            print(f"开始处理视频: {video_path}")
-            # 打开视频获取帧的图片
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                print(f"无法打开视频文件: {video_path}")
-                return None
+            # 收集所有训练数据帧
+            all_training_frames = sorted(set(failure_frames + low_confidence_frames))  # 去重并排序
+            failure_set = set(failure_frames)
             
-            # 获取视频信息
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            print(f"视频信息: 总帧数={total_frames}, FPS={fps}")
+            def frame_type_of(frame_num: int) -> str:
+                return "failure" if frame_num in failure_set else "low_confidence"
             
-            # 收集所有训练数据帧
-            all_training_frames = failure_frames + low_confidence_frames
-            all_training_frames = sorted(list(set(all_training_frames)))  # 去重并排序
+            def filename_of(frame_num: int) -> str:
+                return f"training_{frame_type_of(frame_num)}_frame_{frame_num:03d}.jpg"
             
-            training_frame_data = []
             print(f"开始处理 {len(all_training_frames)} 个训练数据帧...")
-            for i, frame_num in enumerate(all_training_frames):
-                if i % 5 == 0:  # 每5帧打印一次进度
-                    print(f"处理进度: {i+1}/{len(all_training_frames)} (帧 {frame_num})")
-                
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-                ret, frame = cap.read()
-                
-                if ret:
-                    # 将帧转换为base64编码的图片
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
-                    img_base64 = base64.b64encode(buffer).decode('utf-8')
-                    
-                    # 确定帧类型
-                    frame_type = "failure" if frame_num in failure_frames else "low_confidence"
-                    frame_type_cn = "失败帧" if frame_type == "failure" else "低置信度帧"
-                    
-                    training_frame_data.append({
-                        "frame_number": frame_num,
-                        "timestamp": frame_num / fps,
-                        "image_data": img_base64,
-                        "filename": f"training_{frame_type}_frame_{frame_num:03d}.jpg",
-                        "frame_type": frame_type,
-                        "frame_type_cn": frame_type_cn
-                    })
-                else:
-                    print(f"警告: 无法读取第 {frame_num} 帧")
-            
-            cap.release()
+            if frame_buffer is not None and fps is not None and total_frames is not None:
+                frame_buffer.flush()
+                encoded = []
+                for frame_num in all_training_frames:
+                    jpeg = frame_buffer.get(frame_num)
+                    if jpeg is not None:
+                        encoded.append((filename_of(frame_num), jpeg))
+                if len(encoded) < len(all_training_frames):
+                    print(f"训练帧缓冲中缺少 {len(all_training_frames) - len(encoded)} 帧（检查点恢复或超出缓冲上限），已跳过")
+            else:
+                print(f"开始处理视频: {video_path}")
+                # 打开视频获取帧的图片
+                cap = cv2.VideoCapture(video_path)
+                if not cap.isOpened() and frame_cache_store.open(job_id) is None:
+                    print(f"无法打开视频文件: {video_path}")
+                    return None
+                try:
+                    # 获取视频信息（视频已删除时只能取解码帧缓存中的帧）
+                    total_frames = total_frames or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                    fps = fps or cap.get(cv2.CAP_PROP_FPS)
+                    encoded = self._decode_training_frames(job_id, cap, all_training_frames, filename_of, cancel_token)
+                finally:
+                    cap.release()
+                if encoded is None:
+                    return None
+            print(f"视频信息: 总帧数={total_frames}, FPS={fps}")
             
-            if not training_frame_data:
+            if cancel_token is not None and cancel_token.cancelled:
+                print(f"任务 {job_id} 已取消，停止生成训练数据页面")
+                return None
+            if not encoded:
                 print("没有有效的训练数据帧")
                 return None
             
+            # 并行写入图片文件
+            urls = training_asset_store.write_frames(job_id, encoded)
+            sizes = {filename: jpeg_size(jpeg) for filename, jpeg in encoded}
+            training_frame_data = []
+            for frame_num in all_training_frames:
+                filename = filename_of(frame_num)
+                if filename not in sizes:
+                    continue
+                frame_type = frame_type_of(frame_num)
+                image_width, image_height = sizes[filename] or (None, None)
+                training_frame_data.append({
+                    "frame_number": frame_num,
+                    "timestamp": frame_num / fps if fps else 0.0,
+                    "image_url": urls[filename],
+                    "filename": filename,
+                    "image_width": image_width,
+                    "image_height": image_height,
+                    "frame_type": frame_type,
+                    "frame_type_cn": "失败帧" if frame_type == "failure" else "低置信度帧"
+                })
+            
             print(f"成功提取 {len(training_frame_data)} 个训练数据帧，开始生成HTML...")
             
             # 生成HTML内容
@@ -74,30 +100,502 @@ class HTMLGeneratorService:
                 training_frame_data, job_id, len(failure_frames), len(low_confidence_frames), 
                 total_frames, confidence_threshold
             )
-            print("HTML内容生成完成")
-            
-            # 保存HTML文件
-            html_filename = f"training_data_{job_id}.html"
-            html_path = os.path.join("static", html_filename)
             
-            # 确保static目录存在
-            os.makedirs("static", exist_ok=True)
-            print(f"保存HTML文件到: {html_path}")
-            
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            print(f"HTML文件保存完成，返回URL: /static/{html_filename}")
-            return f"/static/{html_filename}"
+            url = training_asset_store.write_page(job_id, "training_data.html", html_content)
+            training_asset_store.write_manifest(job_id, build_manifest(
+                job_id, training_frame_data, len(failure_frames), len(low_confidence_frames),
+                total_frames, fps, confidence_threshold, detections, video_size
+            ))
+            print(f"HTML文件保存完成，返回URL: {url}")
+            return url
             
         except Exception as e:
             print(f"生成训练数据收集页面失败: {e}")
             return None
     
+    def _decode_training_frames(self, job_id: str, cap, frame_numbers: List[int], filename_of, cancel_token=None, batch_size: int = 16):
+        """逐帧取帧（有解码帧缓存时直接读缓存，否则 seek 解码），每批在线程池中并行编码（分批以限制同时驻留内存的原始帧数）"""
+        encoded = []
+        batch = []
+        cached = frame_cache_store.open(job_id)
+        for i, frame_num in enumerate(frame_numbers):
+            if cancel_token is not None and cancel_token.cancelled:
+                print(f"任务 {job_id} 已取消，停止生成训练数据页面")
+                return None
+            if i % 5 == 0:  # 每5帧打印一次进度
+                print(f"处理进度: {i+1}/{len(frame_numbers)} (帧 {frame_num})")
+            frame = cached.get(frame_num) if cached is not None else None
+            if frame is None and cap.isOpened():
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+                ret, frame = cap.read()
+                if not ret:
+                    frame = None
+            if frame is None:
+                print(f"警告: 无法读取第 {frame_num} 帧")
+                continue
+            batch.append((filename_of(frame_num), frame))
+            if len(batch) >= batch_size:
+                encoded.extend(training_asset_store.encode_frames(batch, VIDEO_ANALYSIS_CONFIG.get("jpeg_quality", 90)))
+                batch = []
+        if batch:
+            encoded.extend(training_asset_store.encode_frames(batch, VIDEO_ANALYSIS_CONFIG.get("jpeg_quality", 90)))
+        return encoded
+    
     def generate_training_data_html(self, training_frame_data: List[Dict], job_id: str, failure_count: int, low_confidence_count: int, total_frames: int, confidence_threshold: float) -> str:
-        """生成训练数据收集页面的HTML内容 - 保持原有逻辑"""
-        # 这里先返回一个占位符，稍后会从analyze.py中复制完整的函数
-        return "HTML生成功能待实现"
+        """生成训练数据收集页面的HTML内容（图片按 URL 懒加载，不内嵌 base64）"""
+        total_training_frames = len(training_frame_data)
+        
+        html = f"""
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>训练数据收集 - Job {job_id[:8]}</title>
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+            max-width: 1400px;
+            margin: 0 auto;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }}
+        
+        .header {{
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 30px;
+            border-radius: 10px;
+            margin-bottom: 30px;
+            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+        }}
+        
+        .header h1 {{
+            margin: 0 0 10px 0;
+            font-size: 2.5em;
+            font-weight: 300;
+        }}
+        
+        .header p {{
+            margin: 0;
+            opacity: 0.9;
+            font-size: 1.1em;
+        }}
+        
+        .stats {{
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
+            gap: 20px;
+            margin-bottom: 30px;
+        }}
+        
+        .stat-card {{
+            background: white;
+            padding: 25px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            text-align: center;
+        }}
+        
+        .stat-number {{
+            font-size: 2.5em;
+            font-weight: bold;
+            color: #667eea;
+            margin-bottom: 10px;
+        }}
+        
+        .stat-label {{
+            color: #666;
+            font-size: 1.1em;
+        }}
+        
+        .controls {{
+            background: white;
+            padding: 20px;
+            border-radius: 10px;
+            margin-bottom: 30px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }}
+        
+        .btn {{
+            background: #667eea;
+            color: white;
+            border: none;
+            padding: 12px 24px;
+            border-radius: 6px;
+            cursor: pointer;
+            font-size: 1em;
+            margin-right: 10px;
+            margin-bottom: 10px;
+            transition: all 0.3s ease;
+        }}
+        
+        .btn:hover {{
+            background: #5a6fd8;
+            transform: translateY(-2px);
+        }}
+        
+        .btn-secondary {{
+            background: #6c757d;
+        }}
+        
+        .btn-success {{
+            background: #28a745;
+        }}
+        
+        .btn-primary {{
+            background: #007bff;
+        }}
+        
+        .filter-controls {{
+            margin-top: 20px;
+            padding-top: 20px;
+            border-top: 1px solid #eee;
+        }}
+        
+        .filter-controls label {{
+            display: inline-block;
+            margin-right: 20px;
+            cursor: pointer;
+        }}
+        
+        .filter-controls input[type="checkbox"] {{
+            margin-right: 8px;
+        }}
+        
+        .frames-grid {{
+            display: grid;
+            grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
+            gap: 20px;
+            margin-bottom: 30px;
+        }}
+        
+        .frame-item {{
+            background: white;
+            border-radius: 10px;
+            overflow: hidden;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            transition: all 0.3s ease;
+            cursor: pointer;
+        }}
+        
+        .frame-item:hover {{
+            transform: translateY(-5px);
+            box-shadow: 0 5px 20px rgba(0,0,0,0.15);
+        }}
+        
+        .frame-item.selected {{
+            border: 3px solid #667eea;
+        }}
+        
+        .frame-item.failure {{
+            border-left: 5px solid #dc3545;
+        }}
+        
+        .frame-item.low_confidence {{
+            border-left: 5px solid #ffc107;
+        }}
+        
+        .frame-image {{
+            width: 100%;
+            height: 200px;
+            object-fit: cover;
+        }}
+        
+        .frame-info {{
+            padding: 15px;
+        }}
+        
+        .frame-type {{
+            display: inline-block;
+            padding: 4px 12px;
+            border-radius: 20px;
+            font-size: 0.8em;
+            font-weight: bold;
+            margin-bottom: 10px;
+        }}
+        
+        .frame-type.failure {{
+            background: #f8d7da;
+            color: #721c24;
+        }}
+        
+        .frame-type.low_confidence {{
+            background: #fff3cd;
+            color: #856404;
+        }}
+        
+        .frame-info h4 {{
+            margin: 0 0 10px 0;
+            color: #333;
+        }}
+        
+        .frame-info p {{
+            margin: 5px 0;
+            color: #666;
+            font-size: 0.9em;
+        }}
+        
+        .download-btn {{
+            background: #28a745;
+            color: white;
+            border: none;
+            padding: 8px 16px;
+            border-radius: 4px;
+            cursor: pointer;
+            font-size: 0.9em;
+            margin-top: 10px;
+        }}
+        
+        .download-btn:hover {{
+            background: #218838;
+        }}
+        
+        .select-all {{
+            background: #f8f9fa;
+            padding: 15px;
+            border-radius: 6px;
+            margin-bottom: 20px;
+        }}
+        
+        .select-all input[type="checkbox"] {{
+            margin-right: 10px;
+        }}
+        
+        .select-all label {{
+            font-weight: bold;
+            cursor: pointer;
+        }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>🎯 训练数据收集</h1>
+        <p>收集失败帧和低置信度帧，用于模型训练数据增强</p>
+    </div>
+    
+    <div class="stats">
+        <div class="stat-card">
+            <div class="stat-number">{total_training_frames}</div>
+            <div class="stat-label">总训练帧数</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-number">{failure_count}</div>
+            <div class="stat-label">失败帧</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-number">{low_confidence_count}</div>
+            <div class="stat-label">低置信度帧</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-number">{confidence_threshold}</div>
+            <div class="stat-label">置信度阈值</div>
+        </div>
+    </div>
+    
+    <div class="info">
+        <p><strong>任务ID:</strong> {job_id}</p>
+        <p><strong>置信度阈值:</strong> {confidence_threshold}</p>
+        <p><strong>生成时间:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+        <p><strong>用途:</strong> 这些图片可用于模型训练数据增强，提高杆头检测准确率</p>
+    </div>
+    
+    <div class="controls">
+        <button class="btn" onclick="selectAll()">全选所有帧</button>
+        <button class="btn btn-secondary" onclick="clearSelection()">清除选择</button>
+        <button class="btn btn-success" onclick="downloadSelected()">下载选中帧</button>
+        <button class="btn" onclick="downloadAll()">下载全部帧</button>
+        <button class="btn btn-primary" onclick="downloadZip()">📦 下载ZIP包</button>
+        <a href="/analyze/server-test" class="btn btn-secondary">返回主页面</a>
+    </div>
+    
+    <div class="filter-controls">
+        <label>
+            <input type="checkbox" id="filterFailure" checked onchange="filterFrames()">
+            显示失败帧
+        </label>
+        <label>
+            <input type="checkbox" id="filterLowConfidence" checked onchange="filterFrames()">
+            显示低置信度帧
+        </label>
+    </div>
+    
+    <div class="select-all">
+        <input type="checkbox" id="selectAllCheckbox" onchange="toggleAllSelection()">
+        <label for="selectAllCheckbox">全选/取消全选</label>
+    </div>
+    
+    <div class="frames-grid" id="framesGrid">
+"""
+        
+        # 添加每个训练数据帧
+        for i, frame_data in enumerate(training_frame_data):
+            html += f"""
+            <div class="frame-item {frame_data['frame_type']}" data-frame="{frame_data['frame_number']}" data-type="{frame_data['frame_type']}">
+                <img src="{frame_data['image_url']}" loading="lazy" decoding="async"
+                     alt="Frame {frame_data['frame_number']}" 
+                     class="frame-image">
+                <div class="frame-info">
+                    <div class="frame-type {frame_data['frame_type']}">{frame_data['frame_type_cn']}</div>
+                    <h4>第 {frame_data['frame_number']} 帧</h4>
+                    <p>时间: {frame_data['timestamp']:.2f}s</p>
+                    <p>文件名: {frame_data['filename']}</p>
+                    <button class="download-btn" onclick="downloadSingleFrame({i})">
+                        下载此帧
+                    </button>
+                </div>
+            </div>
+            """
+        
+        html += """
+        </div>
+    </div>
+
+    <script>
+        const trainingFrames = """ + json.dumps(training_frame_data) + """;
+        
+        function selectAll() {
+            const visibleItems = document.querySelectorAll('.frame-item:not([style*="display: none"])');
+            visibleItems.forEach(item => {
+                item.classList.add('selected');
+            });
+            document.getElementById('selectAllCheckbox').checked = true;
+        }
+        
+        function clearSelection() {
+            const items = document.querySelectorAll('.frame-item');
+            items.forEach(item => {
+                item.classList.remove('selected');
+            });
+            document.getElementById('selectAllCheckbox').checked = false;
+        }
+        
+        function toggleAllSelection() {
+            const checkbox = document.getElementById('selectAllCheckbox');
+            if (checkbox.checked) {
+                selectAll();
+            } else {
+                clearSelection();
+            }
+        }
+        
+        function filterFrames() {
+            const showFailure = document.getElementById('filterFailure').checked;
+            const showLowConfidence = document.getElementById('filterLowConfidence').checked;
+            const items = document.querySelectorAll('.frame-item');
+            
+            items.forEach(item => {
+                const frameType = item.dataset.type;
+                if ((frameType === 'failure' && showFailure) || 
+                    (frameType === 'low_confidence' && showLowConfidence)) {
+                    item.style.display = 'block';
+                } else {
+                    item.style.display = 'none';
+                }
+            });
+            
+            // 更新全选状态
+            updateSelectAllCheckbox();
+        }
+        
+        function updateSelectAllCheckbox() {
+            const visibleItems = document.querySelectorAll('.frame-item:not([style*="display: none"])');
+            const selectedItems = document.querySelectorAll('.frame-item.selected:not([style*="display: none"])');
+            const checkbox = document.getElementById('selectAllCheckbox');
+            
+            if (visibleItems.length === 0) {
+                checkbox.checked = false;
+                checkbox.indeterminate = false;
+            } else if (selectedItems.length === visibleItems.length) {
+                checkbox.checked = true;
+                checkbox.indeterminate = false;
+            } else if (selectedItems.length > 0) {
+                checkbox.checked = false;
+                checkbox.indeterminate = true;
+            } else {
+                checkbox.checked = false;
+                checkbox.indeterminate = false;
+            }
+        }
+        
+        function downloadSingleFrame(index) {
+            const frame = trainingFrames[index];
+            downloadFrame(frame);
+        }
+        
+        function downloadSelected() {
+            const selectedItems = document.querySelectorAll('.frame-item.selected:not([style*="display: none"])');
+            if (selectedItems.length === 0) {
+                alert('请先选择要下载的帧！');
+                return;
+            }
+            
+            selectedItems.forEach(item => {
+                const frameNumber = parseInt(item.dataset.frame);
+                const frame = trainingFrames.find(f => f.frame_number === frameNumber);
+                if (frame) {
+                    downloadFrame(frame);
+                }
+            });
+        }
+        
+        function downloadAll() {
+            const visibleItems = document.querySelectorAll('.frame-item:not([style*="display: none"])');
+            if (visibleItems.length === 0) {
+                alert('没有可下载的帧！');
+                return;
+            }
+            
+            visibleItems.forEach(item => {
+                const frameNumber = parseInt(item.dataset.frame);
+                const frame = trainingFrames.find(f => f.frame_number === frameNumber);
+                if (frame) {
+                    downloadFrame(frame);
+                }
+            });
+        }
+        
+        function downloadZip() {
+            const jobId = '""" + job_id + """';
+            const zipUrl = `/analyze/training-data/zip/${jobId}`;
+            
+            // 创建下载链接
+            const link = document.createElement('a');
+            link.href = zipUrl;
+            link.download = `training_data_${jobId}.zip`;
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+        }
+        
+        function downloadFrame(frame) {
+            // 创建下载链接
+            const link = document.createElement('a');
+            link.href = frame.image_url;
+            link.download = frame.filename;
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+        }
+        
+        // 添加点击选择功能
+        document.addEventListener('DOMContentLoaded', function() {
+            const frameItems = document.querySelectorAll('.frame-item');
+            frameItems.forEach(item => {
+                item.addEventListener('click', function(e) {
+                    if (e.target.tagName !== 'BUTTON') {
+                        this.classList.toggle('selected');
+                        updateSelectAllCheckbox();
+                    }
+                });
+            });
+        });
+    </script>
+</body>
+</html>
+"""
+        
+        return html
     
     def generate_failure_frames_html(self, failure_frame_data: List[Dict], job_id: str, failure_count: int, total_frames: int) -> str:
         """生成失败帧下载页面的HTML内容 - 保持原有逻辑"""
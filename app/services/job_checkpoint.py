@@ -0,0 +1,211 @@
+"""
+分析任务检查点服务
+周期性地把逐帧原始检测结果和解码位置落盘，服务重启（如 OOM 后 restart: unless-stopped）后
+从最近的检查点继续分析，已完成的推理不再重复计算，客户端也无需重新上传。
+
+目录结构（每个任务一个目录）：
+    {checkpoint_dir}/{job_id}/
+        meta.json          任务参数、原始上传文件路径、解码位置（原子替换写入）
+        detections.jsonl   逐帧原始检测结果（追加写入）
+        video{ext}         上传的视频文件，任务完成前一直保留
+"""
+import os
+import json
+import time
+import shutil
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+
+
+class JobCheckpoint:
+    """单个任务的检查点写入器"""
+
+    def __init__(self, store: "JobCheckpointStore", job_id: str, interval_frames: int, interval_seconds: float):
+        self.store = store
+        self.job_id = job_id
+        self.interval_frames = max(1, int(interval_frames))
+        self.interval_seconds = float(interval_seconds)
+        self._buffer: List[list] = []
+        self._last_flush = time.monotonic()
+
+    def record(self, frame_idx: int, res: Optional[Tuple[float, float, float]], frame_shape: Tuple[int, ...], gated: bool = False) -> None:
+        """记录一帧的原始检测结果（检测器坐标系 + 帧尺寸，恢复时可重新映射）"""
+        self._buffer.append([
+            frame_idx,
+            list(res) if res is not None else None,
+            list(frame_shape[:2]),
+            bool(gated)
+        ])
+
+    def maybe_flush(self, decode_position: int) -> None:
+        """达到帧数或时间间隔时落盘"""
+        if len(self._buffer) >= self.interval_frames or \
+                (self._buffer and time.monotonic() - self._last_flush >= self.interval_seconds):
+            self.flush(decode_position)
+
+    def flush(self, decode_position: int) -> None:
+        """先追加检测结果并 fsync，再更新解码位置，保证 meta 指向的帧都已落盘"""
+        if self._buffer:
+            self.store.append_detections(self.job_id, self._buffer)
+            self._buffer = []
+        self.store.update_meta(self.job_id, decode_position=decode_position)
+        self._last_flush = time.monotonic()
+
+
+class JobCheckpointStore:
+    """任务检查点存储"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", False)
+        self.checkpoint_dir = config.get("dir", "/tmp/golftracker_jobs")
+        self.interval_frames = config.get("interval_frames", 200)
+        self.interval_seconds = config.get("interval_seconds", 10)
+        if self.enabled:
+            try:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+            except Exception as e:
+                print(f"⚠️ 创建检查点目录失败，禁用检查点: {e}")
+                self.enabled = False
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, job_id)
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self._job_dir(job_id), "meta.json")
+
+    def _detections_path(self, job_id: str) -> str:
+        return os.path.join(self._job_dir(job_id), "detections.jsonl")
+
+    def video_path(self, job_id: str, filename: str) -> Optional[str]:
+        """任务目录中视频文件的路径（上传时可直接写到这里，未启用时返回 None）"""
+        if not self.enabled:
+            return None
+        return os.path.join(self._job_dir(job_id), "video" + os.path.splitext(filename)[1])
+
+    def create(self, job_id: str, upload_path: str, params: Dict[str, Any], job_info: Dict[str, Any], upload_complete: bool = True) -> str:
+        """
+        为新任务建立检查点，并把上传文件移入任务目录（已在任务目录中时不移动）
+
+        upload_complete=False 表示上传仍在接收中，接收完之前重启时该任务不会被恢复
+
+        Returns:
+            任务应使用的视频路径（未启用时原样返回）
+        """
+        if not self.enabled:
+            return upload_path
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        video_path = self.video_path(job_id, upload_path)
+        if os.path.abspath(upload_path) != os.path.abspath(video_path):
+            shutil.move(upload_path, video_path)
+        self._write_meta(job_id, {
+            "job_id": job_id,
+            "video_path": video_path,
+            "params": params,
+            "job": job_info,
+            "decode_position": 0,
+            "upload_complete": upload_complete,
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat()
+        })
+        return video_path
+
+    def open(self, job_id: str) -> Optional[JobCheckpoint]:
+        """获取任务的检查点写入器（任务没有检查点时返回 None）"""
+        if not self.enabled or not os.path.exists(self._meta_path(job_id)):
+            return None
+        return JobCheckpoint(self, job_id, self.interval_frames, self.interval_seconds)
+
+    def _write_meta(self, job_id: str, meta: Dict[str, Any]) -> None:
+        tmp_path = self._meta_path(job_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path(job_id))
+
+    def load_meta(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def update_meta(self, job_id: str, **updates) -> None:
+        meta = self.load_meta(job_id)
+        if meta is None:
+            return
+        meta.update(updates)
+        meta["updated_at"] = datetime.now().isoformat()
+        self._write_meta(job_id, meta)
+
+    def append_detections(self, job_id: str, records: List[list]) -> None:
+        with open(self._detections_path(job_id), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_detections(self, job_id: str) -> Tuple[int, List[list]]:
+        """
+        读取已落盘的检测结果
+
+        Returns:
+            (解码位置, 按帧号排序且帧号连续的检测记录)；没有检查点时返回 (0, [])
+        """
+        meta = self.load_meta(job_id)
+        if meta is None:
+            return 0, []
+        decode_position = int(meta.get("decode_position", 0))
+        records: Dict[int, list] = {}
+        try:
+            with open(self._detections_path(job_id), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # 崩溃时写了一半的最后一行
+                    if record[0] < decode_position:
+                        records[record[0]] = record
+        except FileNotFoundError:
+            return 0, []
+        # 只接受从0开始连续的帧，中间有缺口时从缺口处重新检测
+        ordered = []
+        for i in range(decode_position):
+            if i not in records:
+                break
+            ordered.append(records[i])
+        return len(ordered), ordered
+
+    def list_interrupted(self) -> List[Dict[str, Any]]:
+        """列出重启前未完成的任务"""
+        if not self.enabled or not os.path.isdir(self.checkpoint_dir):
+            return []
+        interrupted = []
+        for job_id in os.listdir(self.checkpoint_dir):
+            meta = self.load_meta(job_id)
+            if meta is None:
+                continue
+            if not os.path.exists(meta.get("video_path", "")):
+                print(f"⚠️ 检查点 {job_id} 的视频文件已丢失，丢弃")
+                self.remove(job_id)
+                continue
+            if not meta.get("upload_complete", True):
+                print(f"⚠️ 检查点 {job_id} 的上传未接收完整，丢弃")
+                self.remove(job_id)
+                continue
+            interrupted.append(meta)
+        return interrupted
+
+    def remove(self, job_id: str) -> None:
+        """任务结束（完成或出错）后删除检查点和视频"""
+        if not self.enabled:
+            return
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+
+# 全局检查点存储实例
+job_checkpoint_store = JobCheckpointStore(VIDEO_ANALYSIS_CONFIG.get("checkpoint", {}))
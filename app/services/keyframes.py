@@ -0,0 +1,210 @@
+"""
+关键帧缩略图与拖动预览雪碧图
+检测循环把已解码的帧顺带交给收集器，每隔 sprite_stride 帧保留一个小格子（格子数有上限），
+同时把帧缩成缩略图尺寸保留在内存中（总字节数有上限，超过时步长加倍）。
+挥杆状态分析完成后 Top/Impact/Finish 优先取内存中的缩略图帧，没有保留的才从帧缓存/视频 seek 取帧，
+格子拼成一张雪碧图，写入任务目录（与训练数据同目录，静态服务可长期缓存）：
+
+    {training_assets.dir}/{job_id}/
+        keyframes/top.jpg, impact.jpg, finish.jpg
+        sprite.jpg
+
+前端拖动进度条时显示雪碧图中对应的格子，松手后才 seek 视频。
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from analyzer.swing_state_machine import SwingPhase
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.training_assets import encode_jpeg, training_asset_store
+
+
+def find_keyframes(swing_phases: List[SwingPhase]) -> Dict[str, int]:
+    """
+    从挥杆状态序列中定位关键帧
+
+    Top: 过渡阶段第一帧（没有过渡阶段时取上杆最后一帧）
+    Impact: 击球第一帧
+    Finish: 收杆第一帧（没有收杆阶段时取送杆最后一帧）
+    """
+    def first(phase):
+        return next((i for i, p in enumerate(swing_phases) if p == phase), None)
+
+    def last(phase):
+        return next((i for i in range(len(swing_phases) - 1, -1, -1) if swing_phases[i] == phase), None)
+
+    keyframes = {
+        "top": first(SwingPhase.TRANSITION),
+        "impact": first(SwingPhase.IMPACT),
+        "finish": first(SwingPhase.FINISH)
+    }
+    if keyframes["top"] is None:
+        keyframes["top"] = last(SwingPhase.BACKSWING)
+    if keyframes["finish"] is None:
+        keyframes["finish"] = last(SwingPhase.FOLLOWTHROUGH)
+    return {name: idx for name, idx in keyframes.items() if idx is not None}
+
+
+class KeyframeCollector:
+    """单个任务的关键帧候选与雪碧图格子"""
+
+    def __init__(self, job_id: str, video_width: int, video_height: int, thumb_width: int = 320, tile_width: int = 160,
+                 sprite_stride: int = 5, sprite_columns: int = 10, max_tiles: int = 300, jpeg_quality: int = 80,
+                 max_thumb_bytes: int = 64 * 1024 * 1024):
+        self.job_id = job_id
+        aspect = video_height / video_width if video_width and video_height else 9 / 16
+        self.thumb_size = (thumb_width, max(2, int(round(thumb_width * aspect / 2)) * 2))
+        self.tile_size = (tile_width, max(2, int(round(tile_width * aspect / 2)) * 2))
+        self.sprite_stride = max(1, sprite_stride)
+        self.sprite_columns = max(1, sprite_columns)
+        self.max_tiles = max(1, max_tiles)
+        self.jpeg_quality = jpeg_quality
+        self._tiles: Dict[int, np.ndarray] = {}
+        # 缩略图尺寸的候选帧：关键帧位置要到挥杆状态分析后才知道，检测时先按步长保留，步长从 1 开始
+        thumb_w, thumb_h = self.thumb_size
+        self.max_thumbs = max(1, max_thumb_bytes // (thumb_w * thumb_h * 3))
+        self.thumb_stride = 1
+        self._thumbs: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def offer(self, frame_idx: int, frame_bgr: np.ndarray) -> None:
+        """检测循环中每个已解码的帧调用一次，步长上的帧缩成格子/缩略图保留（同一帧重复提交时以最后一次为准）"""
+        if frame_idx % self.thumb_stride == 0:
+            thumb = cv2.resize(frame_bgr, self.thumb_size, interpolation=cv2.INTER_AREA)
+            with self._lock:
+                self._thumbs[frame_idx] = thumb
+                if len(self._thumbs) > self.max_thumbs:
+                    # 超出内存上限时步长加倍，没保留的关键帧在 finalize 时再 seek
+                    self.thumb_stride *= 2
+                    self._thumbs = {i: t for i, t in self._thumbs.items() if i % self.thumb_stride == 0}
+        if frame_idx % self.sprite_stride != 0:
+            return
+        tile = cv2.resize(frame_bgr, self.tile_size, interpolation=cv2.INTER_AREA)
+        with self._lock:
+            self._tiles[frame_idx] = tile
+            if len(self._tiles) > self.max_tiles:
+                # 格子过多时步长加倍，只保留新步长上的格子
+                self.sprite_stride *= 2
+                self._tiles = {i: t for i, t in self._tiles.items() if i % self.sprite_stride == 0}
+
+    def _thumbnail(self, frame_idx: int, frame_loader: Optional[Callable[[int], Optional[np.ndarray]]]) -> Optional[bytes]:
+        with self._lock:
+            thumb = self._thumbs.get(frame_idx)
+        if thumb is None:
+            frame_bgr = frame_loader(frame_idx) if frame_loader is not None else None
+            if frame_bgr is None:
+                return None
+            thumb = cv2.resize(frame_bgr, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return encode_jpeg(thumb, self.jpeg_quality)
+
+    def _build_sprite(self, total_frames: int) -> Optional[np.ndarray]:
+        """按帧号顺序拼接格子；缺失的格子（粗扫描/降级跳过的帧）沿用前一个格子"""
+        with self._lock:
+            tiles = dict(self._tiles)
+            stride = self.sprite_stride
+        if not tiles:
+            return None
+        count = (total_frames + stride - 1) // stride
+        rows = (count + self.sprite_columns - 1) // self.sprite_columns
+        tile_w, tile_h = self.tile_size
+        sprite = np.zeros((rows * tile_h, self.sprite_columns * tile_w, 3), dtype=np.uint8)
+        previous = tiles[min(tiles)]
+        for i in range(count):
+            tile = tiles.get(i * stride, previous)
+            previous = tile
+            row, col = divmod(i, self.sprite_columns)
+            sprite[row * tile_h:(row + 1) * tile_h, col * tile_w:(col + 1) * tile_w] = tile
+        return sprite
+
+    def finalize(self, swing_phases: List[SwingPhase], total_frames: int,
+                 frame_loader: Optional[Callable[[int], Optional[np.ndarray]]] = None) -> Dict[str, Any]:
+        """
+        写入关键帧缩略图和雪碧图
+
+        Args:
+            swing_phases: 挥杆状态序列
+            total_frames: 视频总帧数
+            frame_loader: 内存中没有保留的关键帧按帧号取原始帧（帧缓存或 seek 视频）；为 None 时只用内存中的帧
+
+        Returns:
+            {"keyframes": {名称: {"frame", "url"}}, "sprite": 雪碧图信息或 None}
+        """
+        keyframes = {}
+        positions = find_keyframes(swing_phases)
+        thumbs = training_asset_store.executor.map(lambda idx: self._thumbnail(idx, frame_loader), positions.values())
+        for (name, frame_idx), jpeg in zip(positions.items(), thumbs):
+            if jpeg is None:
+                continue
+            url = training_asset_store.write_asset(self.job_id, f"keyframes/{name}.jpg", jpeg)
+            keyframes[name] = {"frame": frame_idx, "url": url}
+
+        sprite_info = None
+        sprite = self._build_sprite(total_frames)
+        if sprite is not None:
+            jpeg = training_asset_store.executor.submit(encode_jpeg, sprite, self.jpeg_quality).result()
+            if jpeg is not None:
+                tile_w, tile_h = self.tile_size
+                sprite_info = {
+                    "url": training_asset_store.write_asset(self.job_id, "sprite.jpg", jpeg),
+                    "frame_stride": self.sprite_stride,
+                    "tile_width": tile_w,
+                    "tile_height": tile_h,
+                    "columns": self.sprite_columns,
+                    "rows": sprite.shape[0] // tile_h,
+                    "tiles": (total_frames + self.sprite_stride - 1) // self.sprite_stride
+                }
+        print(f"🖼️ 关键帧缩略图: {sorted(keyframes)}，雪碧图: {'已生成' if sprite_info else '无'}")
+        return {"keyframes": keyframes, "sprite": sprite_info}
+
+    def close(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+            self._thumbs.clear()
+
+
+class KeyframeRegistry:
+    """job_id -> 关键帧收集器"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = config or {}
+        self.enabled = self.config.get("enabled", True)
+        self._collectors: Dict[str, KeyframeCollector] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, video_width: int, video_height: int) -> Optional[KeyframeCollector]:
+        """任务开始检测时创建收集器（未启用时返回 None）"""
+        if not self.enabled:
+            return None
+        collector = KeyframeCollector(
+            job_id, video_width, video_height,
+            thumb_width=self.config.get("thumb_width", 320),
+            tile_width=self.config.get("tile_width", 160),
+            sprite_stride=self.config.get("sprite_stride", 5),
+            sprite_columns=self.config.get("sprite_columns", 10),
+            max_tiles=self.config.get("max_tiles", 300),
+            jpeg_quality=self.config.get("jpeg_quality", 80),
+            max_thumb_bytes=self.config.get("max_thumb_bytes", 64 * 1024 * 1024)
+        )
+        with self._lock:
+            old = self._collectors.pop(job_id, None)
+            self._collectors[job_id] = collector
+        if old is not None:
+            old.close()
+        return collector
+
+    def get(self, job_id: Optional[str]) -> Optional[KeyframeCollector]:
+        with self._lock:
+            return self._collectors.get(job_id)
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            collector = self._collectors.pop(job_id, None)
+        if collector is not None:
+            collector.close()
+
+
+# 全局关键帧收集器注册表
+keyframe_registry = KeyframeRegistry(VIDEO_ANALYSIS_CONFIG.get("thumbnails", {}))
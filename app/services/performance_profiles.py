@@ -0,0 +1,84 @@
+"""
+性能档位
+把分辨率、帧调度模式、模型档位、推理后端、策略集和运动门控打包成 fast / balanced / accurate 档位。
+参数优先级：单独传入的参数 > 性能档位 > 配置中的默认值。
+/analyze/profiles 发布档位定义和 scripts/benchmark_profiles.py 在本机实测的 fps/准确率。
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+
+from detector.model_pool import describe_hardware
+
+
+def resolve_profile(config: Dict[str, Any], profile: Optional[str]) -> Dict[str, Any]:
+    """获取性能档位配置，未指定时返回空字典；档位不存在时抛出 ValueError"""
+    if not profile:
+        return {}
+    profiles = config.get("performance_profiles", {})
+    if profile not in profiles:
+        raise ValueError(f"不支持的性能档位: {profile}")
+    return profiles[profile]
+
+
+def resolve_analysis_params(config: Dict[str, Any], profile: Optional[str] = None, resolution: Optional[str] = None,
+                            confidence: Optional[str] = None, iou: Optional[str] = None, max_det: Optional[str] = None,
+                            scheduling_mode: Optional[str] = None, motion_gate: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    合并单独传入的参数、性能档位和配置默认值
+
+    未指定档位时使用配置中的 default_profile。
+
+    Returns:
+        {"profile", "resolution", "confidence", "iou", "max_det", "scheduling_mode",
+         "model_tier", "backend", "strategies", "motion_gate"}
+    """
+    profile = profile or config.get("default_profile")
+    profile_config = resolve_profile(config, profile)
+    if motion_gate is None:
+        motion_gate = profile_config.get("motion_gate", config.get("motion_gate", {}).get("enabled", False))
+    return {
+        "profile": profile,
+        "resolution": resolution or profile_config.get("resolution") or config["default_resolution"],
+        "confidence": confidence or profile_config.get("confidence") or config["default_confidence"],
+        "iou": iou or profile_config.get("iou") or config["default_iou"],
+        "max_det": max_det or profile_config.get("max_det") or config["default_max_det"],
+        "scheduling_mode": scheduling_mode or profile_config.get("scheduling_mode") or config.get("default_scheduling_mode", "full"),
+        "model_tier": profile_config.get("model_tier", "default"),
+        "backend": profile_config.get("backend", "auto"),
+        "strategies": profile_config.get("strategies"),
+        "motion_gate": motion_gate
+    }
+
+
+def profiles_payload(config: Dict[str, Any], hardware: Optional[str] = None) -> Dict[str, Any]:
+    """列出性能档位及基准测试实测的 fps/准确率（实测硬件与当前硬件一致时标记 measured_on_current_hardware）"""
+    benchmarks = {}
+    benchmark_file = config.get("profile_benchmark_file")
+    if benchmark_file and os.path.exists(benchmark_file):
+        try:
+            with open(benchmark_file, "r", encoding="utf-8") as f:
+                benchmarks = json.load(f)
+        except Exception as e:
+            print(f"⚠️ 读取性能档位基准结果失败: {e}")
+    hardware = hardware or describe_hardware()
+    measured_hardware = benchmarks.get("hardware")
+    profiles = []
+    for name, profile_config in config.get("performance_profiles", {}).items():
+        measured = benchmarks.get("profiles", {}).get(name)
+        profiles.append({
+            "name": name,
+            **profile_config,
+            "measured": measured,
+            "measured_on_current_hardware": measured is not None and measured_hardware == hardware
+        })
+    return {
+        "default_profile": config.get("default_profile"),
+        "hardware": hardware,
+        "benchmark": {
+            "hardware": measured_hardware,
+            "generated_at": benchmarks.get("generated_at"),
+            "video": benchmarks.get("video")
+        },
+        "profiles": profiles
+    }
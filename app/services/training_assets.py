@@ -0,0 +1,173 @@
+"""
+训练数据静态资源
+训练帧以独立 JPEG 文件写入每个任务的目录，页面通过 URL 懒加载引用，不再把 base64 内嵌进 HTML：
+    {dir}/{job_id}/
+        training_data.html   训练数据收集页面
+        frames.json          训练帧清单（逐帧检测元数据），ZIP 导出以此为准
+        frames/*.jpg         训练帧图片（内容不再变化，静态服务可长期缓存）
+        keyframes/*.jpg      关键帧缩略图，sprite.jpg 拖动预览雪碧图（见 keyframes.py）
+
+JPEG 编码和文件写入在共享线程池中并行进行（cv2.imencode 与文件 IO 会释放 GIL），
+超过保留期的任务目录由清理任务删除。
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+
+
+def encode_jpeg(frame_bgr: Any, quality: int = 90) -> Optional[bytes]:
+    """编码为 JPEG，失败时返回 None"""
+    ok, buffer = cv2.imencode('.jpg', frame_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+
+def jpeg_size(jpeg: bytes) -> Optional[Tuple[int, int]]:
+    """从 JPEG 的 SOF 段读取 (宽, 高)，不解码图像；无法解析时返回 None"""
+    pos = 2
+    while pos + 9 <= len(jpeg):
+        if jpeg[pos] != 0xFF:
+            return None
+        marker = jpeg[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        length = int.from_bytes(jpeg[pos + 2:pos + 4], "big")
+        # SOF0-SOF15，排除 DHT(C4)、JPG(C8)、DAC(CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(jpeg[pos + 5:pos + 7], "big")
+            width = int.from_bytes(jpeg[pos + 7:pos + 9], "big")
+            return width, height
+        pos += 2 + length
+    return None
+
+
+class TrainingAssetStore:
+    """按任务组织的训练数据静态资源"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.root = config.get("dir", "static/jobs")
+        self.url_prefix = config.get("url_prefix", "/static/jobs").rstrip("/")
+        self.ttl_seconds = config.get("ttl_seconds", 7 * 24 * 3600)
+        self.sweep_interval_seconds = config.get("sweep_interval_seconds", 3600)
+        self.encode_workers = config.get("encode_workers", min(4, os.cpu_count() or 1))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """共享的 JPEG 编码 / 文件写入线程池（首次使用时创建）"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, int(self.encode_workers)),
+                                                    thread_name_prefix="jpeg-encode")
+            return self._executor
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def job_url(self, job_id: str, relative_path: str) -> str:
+        return f"{self.url_prefix}/{job_id}/{relative_path}"
+
+    def frame_path(self, job_id: str, filename: str) -> str:
+        return os.path.join(self.job_dir(job_id), "frames", filename)
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def write_frames(self, job_id: str, frames: List[Tuple[str, bytes]]) -> Dict[str, str]:
+        """
+        并行写入训练帧图片
+
+        Args:
+            frames: [(文件名, JPEG 数据)]
+
+        Returns:
+            文件名 -> URL
+        """
+        os.makedirs(os.path.join(self.job_dir(job_id), "frames"), exist_ok=True)
+        paths = [self.frame_path(job_id, filename) for filename, _ in frames]
+        list(self.executor.map(self._write_file, paths, [data for _, data in frames]))
+        return {filename: self.job_url(job_id, f"frames/{filename}") for filename, _ in frames}
+
+    def encode_frames(self, frames: List[Tuple[str, Any]], quality: int = 90) -> List[Tuple[str, bytes]]:
+        """并行编码已解码的帧：[(文件名, BGR 帧)] -> [(文件名, JPEG 数据)]，编码失败的帧丢弃"""
+        encoded = self.executor.map(lambda item: (item[0], encode_jpeg(item[1], quality)), frames)
+        return [(filename, jpeg) for filename, jpeg in encoded if jpeg is not None]
+
+    def write_page(self, job_id: str, filename: str, html: str) -> str:
+        """写入任务页面，返回 URL"""
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        self._write_file(os.path.join(self.job_dir(job_id), filename), html.encode("utf-8"))
+        return self.job_url(job_id, filename)
+
+    def write_asset(self, job_id: str, relative_path: str, data: bytes) -> str:
+        """写入任务目录下的其他静态资源（缩略图、雪碧图等），返回 URL"""
+        path = os.path.join(self.job_dir(job_id), relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_file(path, data)
+        return self.job_url(job_id, relative_path)
+
+    def write_manifest(self, job_id: str, manifest: Dict[str, Any]) -> None:
+        """写入训练帧清单"""
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        self._write_file(os.path.join(self.job_dir(job_id), "frames.json"),
+                         json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+    def load_manifest(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取训练帧清单，不存在时返回 None"""
+        if not job_id or os.path.basename(job_id) != job_id:
+            return None
+        try:
+            with open(os.path.join(self.job_dir(job_id), "frames.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self, job_id: str) -> None:
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def sweep_expired(self) -> int:
+        """删除超过保留期的任务目录（以及旧版直接写在 static/ 下的训练数据页面），返回删除数量"""
+        now = time.time()
+        removed = 0
+        if os.path.isdir(self.root):
+            for job_id in os.listdir(self.root):
+                path = self.job_dir(job_id)
+                try:
+                    expired = now - os.path.getmtime(path) > self.ttl_seconds
+                except OSError:
+                    continue
+                if expired and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+        static_root = os.path.dirname(os.path.normpath(self.root))
+        if os.path.isdir(static_root):
+            for name in os.listdir(static_root):
+                if not (name.startswith("training_data_") and name.endswith(".html")):
+                    continue
+                path = os.path.join(static_root, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl_seconds:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            print(f"🧹 清理过期训练数据 {removed} 个")
+        return removed
+
+
+# 全局训练数据资源存储
+training_asset_store = TrainingAssetStore(VIDEO_ANALYSIS_CONFIG.get("training_assets", {}))
@@ -0,0 +1,152 @@
+"""
+训练数据 ZIP 导出
+按条目流式生成 ZIP：每写完一个条目就把已产生的字节交给响应，内存占用与帧数无关。
+图片直接取任务目录中已保存的 JPEG，以 STORED 方式写入（JPEG 已压缩，再 deflate 只浪费 CPU）。
+
+ZIP 结构（YOLO 数据集格式）：
+    README.md
+    metadata.json        任务信息 + 逐帧检测元数据
+    classes.txt          类别名称（行号即类别 ID）
+    images/<帧文件名>.jpg
+    labels/<帧文件名>.txt  YOLO 标注：失败帧为空文件（待标注），低置信度帧为检测位置的预标注框
+"""
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.training_assets import training_asset_store
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """ZipFile 的不可 seek 输出端：收集写入的字节，由生成器分批取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def yolo_label(detection: Dict[str, Any], class_id: int, box_size: float) -> str:
+    """
+    单帧 YOLO 标注行
+
+    检测结果只有杆头中心点，没有框尺寸，预标注框使用固定的归一化边长 box_size，供标注员修正。
+    未检测到杆头的帧返回空字符串（空标注文件）。
+    """
+    if not detection or not detection.get("detected"):
+        return ""
+    half = box_size / 2
+    cx = min(max(float(detection.get("norm_x", 0.0)), half), 1 - half)
+    cy = min(max(float(detection.get("norm_y", 0.0)), half), 1 - half)
+    return f"{class_id} {cx:.6f} {cy:.6f} {box_size:.6f} {box_size:.6f}\n"
+
+
+def build_manifest(job_id: str, training_frame_data: List[Dict[str, Any]], failure_count: int, low_confidence_count: int,
+                   total_frames: int, fps: Optional[float], confidence_threshold: float,
+                   detections: Optional[Dict[int, Dict[str, Any]]] = None,
+                   video_size: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """训练帧清单：任务信息（含原视频分辨率）+ 每帧的图片文件名、图片尺寸、帧类型和检测元数据"""
+    detections = detections or {}
+    frames = []
+    for frame_data in training_frame_data:
+        frame = {k: v for k, v in frame_data.items() if k != "image_data"}
+        frame["detection"] = detections.get(frame_data["frame_number"])
+        frames.append(frame)
+    return {
+        "job_id": job_id,
+        "generated_at": datetime.now().isoformat(),
+        "total_frames": total_frames,
+        "fps": fps,
+        "video_width": video_size[0] if video_size else None,
+        "video_height": video_size[1] if video_size else None,
+        "confidence_threshold": confidence_threshold,
+        "failure_count": failure_count,
+        "low_confidence_count": low_confidence_count,
+        "frames": frames
+    }
+
+
+def _readme(manifest: Dict[str, Any]) -> str:
+    return f"""# 训练数据收集包
+
+## 任务信息
+- 任务ID: {manifest['job_id']}
+- 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+- 视频总帧数: {manifest.get('total_frames', 0)}
+- 训练帧数: {len(manifest.get('frames', []))}
+- 失败帧数: {manifest.get('failure_count', 0)}
+- 低置信度帧数: {manifest.get('low_confidence_count', 0)}
+- 置信度阈值: {manifest.get('confidence_threshold')}
+- 原视频分辨率: {manifest.get('video_width')}x{manifest.get('video_height')}
+
+## 文件说明
+- images/: 训练帧图片（JPEG），为检测时的分析分辨率，可能小于原视频（每帧尺寸见 metadata.json 的 image_width/image_height）
+- labels/: YOLO 格式标注，与图片同名
+  - 失败帧: 空文件，需要人工标注
+  - 低置信度帧: 检测到的杆头位置预标注（固定尺寸框），需要人工确认和修正框大小
+- classes.txt: 类别名称，行号即类别 ID
+- metadata.json: 逐帧检测元数据（帧号、时间戳、图片尺寸、帧类型、检测坐标与置信度）
+
+## 用途
+这些图片可用于模型训练数据增强，提高杆头检测准确率。
+"""
+
+
+def iter_training_zip(manifest: Dict[str, Any], chunk_size: int = 1024 * 1024,
+                      image_path: Optional[Callable[[Dict[str, Any]], str]] = None) -> Iterator[bytes]:
+    """
+    流式生成训练数据 ZIP
+
+    Args:
+        manifest: 训练帧清单（training_asset_store.load_manifest 的返回值）
+        chunk_size: 复制图片时每次读取的字节数
+        image_path: 由清单中的帧条目得到图片路径，默认取任务目录下的 frames/<filename>
+    """
+    export_config = VIDEO_ANALYSIS_CONFIG.get("training_export", {})
+    class_names = export_config.get("class_names", ["club", "club_head", "hand"])
+    class_id = export_config.get("label_class_id", 1)
+    box_size = export_config.get("label_box_size", 0.03)
+    job_id = manifest["job_id"]
+
+    sink = _ZipStreamBuffer()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr("README.md", _readme(manifest), compress_type=zipfile.ZIP_DEFLATED)
+        zip_file.writestr("metadata.json", json.dumps(manifest, indent=2, ensure_ascii=False),
+                          compress_type=zipfile.ZIP_DEFLATED)
+        zip_file.writestr("classes.txt", "\n".join(class_names) + "\n")
+        yield sink.drain()
+
+        for frame in manifest.get("frames", []):
+            filename = frame["filename"]
+            path = image_path(frame) if image_path is not None else training_asset_store.frame_path(job_id, filename)
+            try:
+                src = open(path, "rb")
+            except OSError:
+                print(f"⚠️ 训练帧图片不存在，跳过: {path}")
+                continue
+            with src, zip_file.open(f"images/{filename}", "w") as dest:
+                while True:
+                    block = src.read(chunk_size)
+                    if not block:
+                        break
+                    dest.write(block)
+                    yield sink.drain()
+            stem = os.path.splitext(filename)[0]
+            zip_file.writestr(f"labels/{stem}.txt", yolo_label(frame.get("detection"), class_id, box_size))
+            yield sink.drain()
+    # 中央目录
+    yield sink.drain()
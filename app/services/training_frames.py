@@ -0,0 +1,202 @@
+"""
+训练帧旁路缓冲
+检测循环在推理之后把失败帧/低置信度帧直接交给缓冲（当场编码为 JPEG），
+生成训练数据页面和 ZIP 时从缓冲读取，不再重新打开视频逐帧 seek + 解码。
+编码在共享线程池中进行，检测循环只在排队的帧数超过上限时才等待。
+
+内存中的 JPEG 超过上限后溢出到磁盘，总帧数超过上限的帧丢弃（只计数）。
+"""
+import os
+import shutil
+import threading
+from concurrent.futures import Future, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.training_assets import encode_jpeg, training_asset_store
+
+
+class TrainingFrameBuffer:
+    """单个任务的训练帧缓冲"""
+
+    def __init__(self, job_id: str, confidence_threshold: float = 0.3, max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_frames: int = 1000, spill_dir: str = "/tmp/golftracker_training_frames", jpeg_quality: int = 90,
+                 max_pending_encodes: int = 32):
+        self.job_id = job_id
+        self.confidence_threshold = confidence_threshold
+        self.max_memory_bytes = max_memory_bytes
+        self.max_frames = max_frames
+        self.spill_dir = os.path.join(spill_dir, job_id)
+        self.jpeg_quality = jpeg_quality
+        self._memory: Dict[int, bytes] = {}
+        self._spilled: Dict[int, str] = {}
+        self._memory_bytes = 0
+        self.dropped_frames = 0
+        self._lock = threading.Lock()
+        # 同一帧重复提交时只保留最后一次提交的编码结果
+        self._latest: Dict[int, object] = {}
+        self._inflight: Set[Future] = set()
+        self._pending_slots = threading.BoundedSemaphore(max(1, max_pending_encodes))
+
+    def classify(self, res: Optional[Tuple[float, float, float]]) -> Optional[str]:
+        """按推理结果判断帧类型：failure / low_confidence / None（不需要）"""
+        if res is None:
+            return "failure"
+        if res[2] < self.confidence_threshold:
+            return "low_confidence"
+        return None
+
+    def offer(self, frame_idx: int, frame_bgr: Any, res: Optional[Tuple[float, float, float]]) -> bool:
+        """检测循环调用：失败帧/低置信度帧提交到编码线程池后收下，其他帧忽略"""
+        if self.classify(res) is None:
+            return False
+        self._pending_slots.acquire()
+        token = object()
+        with self._lock:
+            self._latest[frame_idx] = token
+        try:
+            future = training_asset_store.executor.submit(self._encode, frame_idx, frame_bgr, token)
+        except RuntimeError:
+            # 线程池已关闭（服务退出中）
+            self._pending_slots.release()
+            return False
+        with self._lock:
+            self._inflight.add(future)
+        future.add_done_callback(self._encode_done)
+        return True
+
+    def _encode(self, frame_idx: int, frame_bgr: Any, token: object) -> None:
+        try:
+            jpeg = encode_jpeg(frame_bgr, self.jpeg_quality)
+            with self._lock:
+                if self._latest.get(frame_idx) is not token:
+                    return
+                del self._latest[frame_idx]
+            if jpeg is not None:
+                self.add_encoded(frame_idx, jpeg)
+        finally:
+            self._pending_slots.release()
+
+    def _encode_done(self, future: Future) -> None:
+        with self._lock:
+            self._inflight.discard(future)
+
+    def flush(self) -> None:
+        """等待已提交的帧全部编码完成"""
+        with self._lock:
+            inflight = list(self._inflight)
+        if inflight:
+            wait(inflight)
+
+    def add_encoded(self, frame_idx: int, jpeg: bytes) -> bool:
+        """收下已编码的帧（多进程模式下由工作进程编码），同一帧重复提交时以最后一次为准"""
+        with self._lock:
+            self._discard(frame_idx)
+            if len(self._memory) + len(self._spilled) >= self.max_frames:
+                self.dropped_frames += 1
+                return False
+            if self._memory_bytes + len(jpeg) <= self.max_memory_bytes:
+                self._memory[frame_idx] = jpeg
+                self._memory_bytes += len(jpeg)
+            else:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                path = os.path.join(self.spill_dir, f"frame_{frame_idx:06d}.jpg")
+                with open(path, "wb") as f:
+                    f.write(jpeg)
+                self._spilled[frame_idx] = path
+            return True
+
+    def _discard(self, frame_idx: int) -> None:
+        jpeg = self._memory.pop(frame_idx, None)
+        if jpeg is not None:
+            self._memory_bytes -= len(jpeg)
+        path = self._spilled.pop(frame_idx, None)
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, frame_idx: int) -> Optional[bytes]:
+        """取出帧的 JPEG 数据，没有缓冲该帧时返回 None"""
+        with self._lock:
+            jpeg = self._memory.get(frame_idx)
+            path = self._spilled.get(frame_idx)
+        if jpeg is not None:
+            return jpeg
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+        return None
+
+    def __contains__(self, frame_idx: int) -> bool:
+        with self._lock:
+            return frame_idx in self._memory or frame_idx in self._spilled
+
+    def frames(self) -> Iterator[int]:
+        self.flush()
+        with self._lock:
+            return iter(sorted(list(self._memory) + list(self._spilled)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buffered_frames": len(self._memory) + len(self._spilled),
+                "memory_frames": len(self._memory),
+                "spilled_frames": len(self._spilled),
+                "memory_bytes": self._memory_bytes,
+                "dropped_frames": self.dropped_frames
+            }
+
+    def close(self) -> None:
+        """释放内存并删除溢出文件"""
+        self.flush()
+        with self._lock:
+            self._memory.clear()
+            self._spilled.clear()
+            self._memory_bytes = 0
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+
+class TrainingFrameRegistry:
+    """job_id -> 训练帧缓冲"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = config or {}
+        self._buffers: Dict[str, TrainingFrameBuffer] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str) -> TrainingFrameBuffer:
+        buffer = TrainingFrameBuffer(
+            job_id,
+            confidence_threshold=self.config.get("confidence_threshold", 0.3),
+            max_memory_bytes=self.config.get("max_memory_bytes", 64 * 1024 * 1024),
+            max_frames=self.config.get("max_frames", 1000),
+            spill_dir=self.config.get("spill_dir", "/tmp/golftracker_training_frames"),
+            jpeg_quality=VIDEO_ANALYSIS_CONFIG.get("jpeg_quality", 90),
+            max_pending_encodes=self.config.get("max_pending_encodes", 32)
+        )
+        with self._lock:
+            old = self._buffers.pop(job_id, None)
+            self._buffers[job_id] = buffer
+        if old is not None:
+            old.close()
+        return buffer
+
+    def get(self, job_id: Optional[str]) -> Optional[TrainingFrameBuffer]:
+        with self._lock:
+            return self._buffers.get(job_id)
+
+    def release(self, job_id: str) -> None:
+        """任务结束后释放缓冲"""
+        with self._lock:
+            buffer = self._buffers.pop(job_id, None)
+        if buffer is not None:
+            buffer.close()
+
+
+# 全局训练帧缓冲注册表
+training_frame_registry = TrainingFrameRegistry(VIDEO_ANALYSIS_CONFIG.get("training_frames", {}))
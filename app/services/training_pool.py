@@ -0,0 +1,210 @@
+"""
+跨任务训练帧池
+所有任务的失败帧/低置信度帧汇入同一个只追加的池，按感知哈希（pHash）去重：
+重复上传、相同机位的近似帧只保留第一份，存储量随内容增长而不是随上传次数增长。
+
+    {dir}/
+        entries.jsonl   每个入池帧一行（id、pHash、来源任务、帧号、帧类型、检测元数据），只追加
+        hashes.bin      pHash 索引（uint64，与 entries.jsonl 同序），只追加，启动时整体读入 NumPy 数组
+        images/{id:08d}.jpg
+
+去重检索是对整个 uint64 数组做异或 + 查表 popcount，百万级条目也只需几毫秒。
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.training_assets import training_asset_store
+
+# 0-255 每个字节的置位数
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def phash(jpeg: bytes, hash_size: int = 8) -> Optional[int]:
+    """DCT 感知哈希：灰度缩放到 4*hash_size 见方，取低频 hash_size x hash_size 系数与中位数比较"""
+    gray = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    size = hash_size * 4
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size].flatten()
+    bits = low > np.median(low[1:])  # 直流分量不参与中位数
+    value = 0
+    for bit in bits[:64]:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """hashes（uint64 数组）中每个哈希与 value 的汉明距离"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class TrainingFramePool:
+    """持久化、只追加的跨任务训练帧池"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.root = config.get("dir", "data/training_pool")
+        self.hamming_threshold = config.get("hamming_threshold", 6)
+        self._lock = threading.Lock()
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._count = 0
+        self._loaded = False
+        self.duplicates_skipped = 0
+
+    @property
+    def _entries_path(self) -> str:
+        return os.path.join(self.root, "entries.jsonl")
+
+    @property
+    def _hashes_path(self) -> str:
+        return os.path.join(self.root, "hashes.bin")
+
+    def image_path(self, entry_id: int) -> str:
+        return os.path.join(self.root, "images", f"{entry_id:08d}.jpg")
+
+    def _load(self) -> None:
+        """首次使用时读入哈希索引；索引与条目数不一致（上次写入中断）时以 entries.jsonl 为准重建"""
+        if self._loaded:
+            return
+        os.makedirs(os.path.join(self.root, "images"), exist_ok=True)
+        entries = list(self.iter_entries())
+        hashes = np.fromfile(self._hashes_path, dtype=np.uint64) if os.path.exists(self._hashes_path) else np.zeros(0, dtype=np.uint64)
+        if len(hashes) != len(entries):
+            print(f"⚠️ 训练帧池哈希索引与条目数不一致（{len(hashes)}/{len(entries)}），重建索引")
+            hashes = np.array([int(e["phash"], 16) for e in entries], dtype=np.uint64)
+            hashes.tofile(self._hashes_path)
+        # 预留容量，追加时按倍数扩容
+        self._hashes = np.zeros(max(1024, len(hashes) * 2), dtype=np.uint64)
+        self._hashes[:len(hashes)] = hashes
+        self._count = len(hashes)
+        self._loaded = True
+        print(f"🗃️ 训练帧池已加载: {self._count} 帧")
+
+    def find_similar(self, value: int) -> Optional[int]:
+        """返回汉明距离不超过阈值的已有条目 id（取最近的一个），没有时返回 None"""
+        if self._count == 0:
+            return None
+        distances = hamming_distances(self._hashes[:self._count], value)
+        best = int(np.argmin(distances))
+        return best if distances[best] <= self.hamming_threshold else None
+
+    def add(self, jpeg: bytes, metadata: Dict[str, Any]) -> Optional[int]:
+        """
+        加入一帧
+
+        Returns:
+            新条目 id；与池中已有帧近似（被去重）或无法解码时返回 None
+        """
+        value = phash(jpeg)
+        if value is None:
+            return None
+        with self._lock:
+            self._load()
+            if self.find_similar(value) is not None:
+                self.duplicates_skipped += 1
+                return None
+            entry_id = self._count
+            with open(self.image_path(entry_id), "wb") as f:
+                f.write(jpeg)
+            entry = {
+                "id": entry_id,
+                "phash": f"{value:016x}",
+                "created_at": time.time(),
+                **metadata
+            }
+            with open(self._entries_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            with open(self._hashes_path, "ab") as f:
+                np.array([value], dtype=np.uint64).tofile(f)
+            if self._count >= len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros(len(self._hashes), dtype=np.uint64)])
+            self._hashes[self._count] = value
+            self._count += 1
+            return entry_id
+
+    def ingest_job(self, job_id: str) -> Dict[str, int]:
+        """把任务的训练帧（按训练帧清单）汇入池中"""
+        manifest = training_asset_store.load_manifest(job_id)
+        if not self.enabled or manifest is None:
+            return {"added": 0, "duplicates": 0}
+        added = 0
+        duplicates = 0
+        for frame in manifest.get("frames", []):
+            try:
+                with open(training_asset_store.frame_path(job_id, frame["filename"]), "rb") as f:
+                    jpeg = f.read()
+            except OSError:
+                continue
+            entry_id = self.add(jpeg, {
+                "job_id": job_id,
+                "frame_number": frame.get("frame_number"),
+                "frame_type": frame.get("frame_type"),
+                "detection": frame.get("detection")
+            })
+            if entry_id is None:
+                duplicates += 1
+            else:
+                added += 1
+        print(f"🗃️ 训练帧池: 任务 {job_id} 新增 {added} 帧，去重 {duplicates} 帧")
+        return {"added": added, "duplicates": duplicates}
+
+    def iter_entries(self, since_id: int = 0, frame_type: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """按 id 顺序读取条目（可按起始 id、帧类型过滤）"""
+        if not os.path.exists(self._entries_path):
+            return
+        emitted = 0
+        with open(self._entries_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 追加中断留下的半行
+                if entry["id"] < since_id or (frame_type and entry.get("frame_type") != frame_type):
+                    continue
+                yield entry
+                emitted += 1
+                if limit is not None and emitted >= limit:
+                    return
+
+    def export_manifest(self, since_id: int = 0, frame_type: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        """批量导出用的清单（格式与单任务训练帧清单相同，可直接交给 iter_training_zip）"""
+        frames: List[Dict[str, Any]] = []
+        for entry in self.iter_entries(since_id, frame_type, limit):
+            frames.append({
+                **entry,
+                "filename": f"{entry['id']:08d}.jpg",
+                "source_frame_number": entry.get("frame_number")
+            })
+        return {
+            "job_id": "training_pool",
+            "since_id": since_id,
+            "next_id": frames[-1]["id"] + 1 if frames else since_id,
+            "failure_count": sum(1 for f in frames if f.get("frame_type") == "failure"),
+            "low_confidence_count": sum(1 for f in frames if f.get("frame_type") == "low_confidence"),
+            "frames": frames
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            return {
+                "enabled": self.enabled,
+                "frames": self._count,
+                "hamming_threshold": self.hamming_threshold,
+                "duplicates_skipped": self.duplicates_skipped,
+                "index_bytes": self._count * 8
+            }
+
+
+# 全局训练帧池
+training_frame_pool = TrainingFramePool(VIDEO_ANALYSIS_CONFIG.get("training_pool", {}))
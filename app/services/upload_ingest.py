@@ -0,0 +1,240 @@
+"""
+上传接收服务
+按块读取上传内容，只写一次到任务工作目录；写入的同时计算 sha256 并检查大小上限，
+超过上限立即中止（413），不必等整个文件传完。
+小视频可选择完全留在内存（memfd），解码时通过 /proc/<pid>/fd/<n> 路径访问，不落盘。
+faststart MP4（moov 在 mdat 之前）在 moov 接收完后即可开始解码，分析与上传并行进行。
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from analyzer.ffmpeg import mp4_moov_end
+from app.config import VIDEO_ANALYSIS_CONFIG
+
+
+class UploadTooLarge(Exception):
+    """上传内容超过大小上限"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"文件超过大小上限 {limit // (1024 * 1024)}MB")
+        self.limit = limit
+
+
+class IngestedUpload:
+    """已接收的上传文件"""
+
+    def __init__(self, path: str, sha256: str, size: int, in_memory: bool = False):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.in_memory = in_memory
+
+
+class LiveUpload:
+    """正在接收中的上传，供分析线程边接收边解码"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bytes_written = 0
+        self.complete = False
+        self.failed = False
+        self._cond = threading.Condition()
+
+    def advance(self, size: int) -> None:
+        with self._cond:
+            self.bytes_written += size
+            self._cond.notify_all()
+
+    def finish(self, ok: bool) -> None:
+        with self._cond:
+            self.complete = ok
+            self.failed = not ok
+            self._cond.notify_all()
+
+    def wait_complete(self, timeout: Optional[float] = None) -> bool:
+        """等待上传结束，返回是否完整接收"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.complete or self.failed, timeout)
+            return self.complete
+
+    def iter_chunks(self, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        """按到达顺序读取已写入的字节，直到上传结束（上传失败时提前停止）"""
+        position = 0
+        with open(self.path, "rb") as f:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.bytes_written > position or self.complete or self.failed)
+                    if self.failed:
+                        return
+                    available = self.bytes_written
+                if available <= position:
+                    return  # 已完成且全部读完
+                data = f.read(min(chunk_size, available - position))
+                if not data:
+                    return
+                position += len(data)
+                yield data
+
+
+async def iter_upload_file(upload: Any, chunk_size: int) -> AsyncIterator[bytes]:
+    """按块读取 UploadFile"""
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class UploadIngestService:
+    """流式上传接收"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.max_file_size = VIDEO_ANALYSIS_CONFIG.get("max_file_size", 100 * 1024 * 1024)
+        self.chunk_size = config.get("chunk_size", 1024 * 1024)
+        self.upload_dir = config.get("dir", "/tmp/golftracker_uploads")
+        # 不超过该大小的上传放在内存（memfd）里，0 表示禁用；内存中的视频不写检查点，重启后无法恢复
+        self.memory_threshold = config.get("memory_threshold", 0) if hasattr(os, "memfd_create") else 0
+        self.multipart_overhead = config.get("multipart_overhead", 64 * 1024)
+        # 边上传边分析：moov 之后再多收这么多字节才启动任务，让解码器有数据可读
+        self.stream_start_bytes = config.get("stream_start_bytes", 256 * 1024)
+        self._memory_fds: Dict[str, int] = {}
+        self._live: Dict[str, LiveUpload] = {}
+        self._lock = threading.Lock()
+
+    def exceeds_limit(self, content_length: Optional[str], multipart: bool = False) -> bool:
+        """按请求头声明的长度判断是否超限（multipart 允许少量表单开销）"""
+        if not content_length or not content_length.isdigit():
+            return False
+        limit = self.max_file_size + (self.multipart_overhead if multipart else 0)
+        return int(content_length) > limit
+
+    def upload_path(self, job_id: str, filename: Optional[str]) -> str:
+        """任务视频的默认落盘位置（启用检查点时由检查点目录决定）"""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        return os.path.join(self.upload_dir, job_id + os.path.splitext(filename or "video.mp4")[1])
+
+    def _open_sink(self, dest_path: str, declared_size: Optional[int]) -> tuple:
+        if declared_size is not None and 0 < declared_size <= self.memory_threshold:
+            fd = os.memfd_create(os.path.basename(dest_path), os.MFD_CLOEXEC)
+            # 子进程（ffmpeg）也能通过父进程的 /proc 路径读取
+            return fd, f"/proc/{os.getpid()}/fd/{fd}", True
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        return fd, dest_path, False
+
+    @staticmethod
+    def _write_all(fd: int, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+
+    async def ingest(self, chunks: AsyncIterator[bytes], dest_path: str, declared_size: Optional[int] = None,
+                     on_ready: Optional[Callable[[str], None]] = None) -> IngestedUpload:
+        """
+        接收上传内容
+
+        Args:
+            chunks: 上传内容的异步块迭代器（request.stream() 或 UploadFile）
+            dest_path: 落盘路径（内存模式下只用作 memfd 名称）
+            declared_size: 声明的大小（Content-Length / UploadFile.size），用于提前拒绝和选择内存模式
+            on_ready: 边上传边分析的回调。faststart MP4 的 moov 接收完后以文件路径调用一次，
+                      之后分析线程可通过 live_upload(path) 跟随写入进度解码；非 faststart 文件不调用
+
+        Raises:
+            UploadTooLarge: 声明的大小或实际接收的字节数超过上限，已写入的部分会被清理
+        """
+        if declared_size is not None and declared_size > self.max_file_size:
+            raise UploadTooLarge(self.max_file_size)
+
+        fd, path, in_memory = self._open_sink(dest_path, declared_size)
+        digest = hashlib.sha256()
+        size = 0
+        live = None
+        head = bytearray()
+        ready_at = None if on_ready is not None and not in_memory else 0
+        if ready_at is None:
+            live = LiveUpload(path)
+            with self._lock:
+                self._live[path] = live
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > self.max_file_size:
+                    raise UploadTooLarge(self.max_file_size)
+                digest.update(chunk)
+                if in_memory:
+                    self._write_all(fd, chunk)
+                else:
+                    await asyncio.to_thread(self._write_all, fd, chunk)
+                if live is not None:
+                    live.advance(len(chunk))
+                    if ready_at is None and len(head) < 64 * 1024:
+                        # 只需要文件开头的 box 头就能判断 moov 是否在 mdat 之前
+                        head.extend(chunk[:64 * 1024 - len(head)])
+                        moov_end = mp4_moov_end(bytes(head))
+                        if moov_end is None and len(head) >= 64 * 1024:
+                            moov_end = 0
+                        if moov_end is not None:
+                            ready_at = moov_end + self.stream_start_bytes if moov_end > 0 else 0
+                            if moov_end == 0:
+                                print("📥 非 faststart 文件，等待上传完成后再分析")
+                    if ready_at and size >= ready_at:
+                        ready_at = 0
+                        print(f"📡 faststart 文件 moov 已接收（{size / 1024:.0f}KB），开始边上传边分析")
+                        on_ready(path)
+        except BaseException:
+            os.close(fd)
+            if live is not None:
+                live.finish(False)
+            if not in_memory:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+
+        if in_memory:
+            with self._lock:
+                self._memory_fds[path] = fd
+        else:
+            os.close(fd)
+        if live is not None:
+            live.finish(True)
+            with self._lock:
+                self._live.pop(path, None)
+        print(f"📥 上传接收完成: {size / 1024 / 1024:.1f}MB, sha256={digest.hexdigest()[:12]}, {'内存' if in_memory else path}")
+        return IngestedUpload(path, digest.hexdigest(), size, in_memory)
+
+    def live_upload(self, path: str) -> Optional[LiveUpload]:
+        """路径对应的上传仍在接收中（或已中断）时返回其进度对象"""
+        with self._lock:
+            return self._live.get(path)
+
+    def wait_complete(self, path: str) -> bool:
+        """等待路径对应的上传接收完（不在接收中的文件直接返回 True），上传中断时返回 False"""
+        live = self.live_upload(path)
+        return live is None or live.wait_complete()
+
+    def release(self, path: str) -> None:
+        """任务结束后释放视频（关闭 memfd 或删除文件）"""
+        with self._lock:
+            self._live.pop(path, None)
+            fd = self._memory_fds.pop(path, None)
+        if fd is not None:
+            os.close(fd)
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# 全局上传接收服务实例
+upload_ingest_service = UploadIngestService(VIDEO_ANALYSIS_CONFIG.get("upload", {}))
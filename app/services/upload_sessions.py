@@ -0,0 +1,216 @@
+"""
+可续传分片上传服务
+客户端先创建上传会话，再按偏移量 PUT 分片（可乱序、可并行），随时查询已接收的区间，
+断线后只补传缺失部分；全部接收后 finalize 成一个分析任务。
+
+会话保存在磁盘上（重启后仍可续传），超过有效期未完成的会话会被清理：
+    {sessions_dir}/{upload_id}/
+        meta.json   文件名、总大小、有效期、已接收区间（原子替换写入）
+        data        按总大小预分配的稀疏文件，分片按偏移量直接写入
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.upload_ingest import IngestedUpload, UploadTooLarge
+
+
+class UploadSessionError(Exception):
+    """上传会话请求无效（越界、未完成、校验失败等）"""
+
+
+def merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """合并重叠/相邻的 [start, end) 区间"""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class UploadSessionStore:
+    """磁盘上的上传会话"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.sessions_dir = config.get("dir", "/tmp/golftracker_upload_sessions")
+        self.expiry_seconds = config.get("expiry_seconds", 24 * 3600)
+        self.chunk_size = config.get("chunk_size", 8 * 1024 * 1024)
+        self.max_file_size = VIDEO_ANALYSIS_CONFIG.get("max_file_size", 100 * 1024 * 1024)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _session_dir(self, upload_id: str) -> str:
+        return os.path.join(self.sessions_dir, upload_id)
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self._session_dir(upload_id), "meta.json")
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self._session_dir(upload_id), "data")
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _write_meta(self, upload_id: str, meta: Dict[str, Any]) -> None:
+        tmp_path = self._meta_path(upload_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path(upload_id))
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """读取会话（不存在或已过期时返回 None，过期会话顺带删除）"""
+        if not upload_id or os.path.basename(upload_id) != upload_id:
+            return None
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception:
+            return None
+        if meta.get("expires_at", 0) < time.time():
+            self.remove(upload_id)
+            return None
+        return meta
+
+    def status(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        received = sum(end - start for start, end in meta["ranges"])
+        return {
+            "upload_id": meta["upload_id"],
+            "filename": meta["filename"],
+            "total_size": meta["total_size"],
+            "received_ranges": meta["ranges"],
+            "received_bytes": received,
+            "complete": received >= meta["total_size"],
+            "chunk_size": self.chunk_size,
+            "expires_at": meta["expires_at"]
+        }
+
+    def create(self, filename: str, total_size: int) -> Dict[str, Any]:
+        """创建上传会话，按总大小预分配稀疏文件"""
+        if total_size <= 0:
+            raise UploadSessionError("total_size 必须大于0")
+        if total_size > self.max_file_size:
+            raise UploadTooLarge(self.max_file_size)
+        self.sweep_expired()
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._session_dir(upload_id), exist_ok=True)
+        with open(self._data_path(upload_id), "wb") as f:
+            f.truncate(total_size)
+        now = time.time()
+        meta = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "total_size": total_size,
+            "ranges": [],
+            "created_at": now,
+            "expires_at": now + self.expiry_seconds
+        }
+        self._write_meta(upload_id, meta)
+        print(f"📦 创建上传会话 {upload_id}: {filename}, {total_size / 1024 / 1024:.1f}MB")
+        return meta
+
+    async def write_chunk(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        将一个分片写到 offset 处
+
+        连接中途断开时已写入的前缀也会记为已接收，客户端查询区间后只需补传剩余部分。
+        """
+        meta = self.get(upload_id)
+        if meta is None:
+            raise KeyError(upload_id)
+        total_size = meta["total_size"]
+        if offset < 0 or offset >= total_size:
+            raise UploadSessionError(f"offset 越界: {offset}")
+
+        fd = os.open(self._data_path(upload_id), os.O_WRONLY)
+        position = offset
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if position + len(chunk) > total_size:
+                    raise UploadSessionError(f"分片超出文件总大小 {total_size}")
+                await asyncio.to_thread(os.pwrite, fd, chunk, position)
+                position += len(chunk)
+        finally:
+            os.close(fd)
+            if position > offset:
+                self._record_range(upload_id, offset, position)
+        return self.status(self.get(upload_id) or meta)
+
+    def _record_range(self, upload_id: str, start: int, end: int) -> None:
+        # 并行的分片请求各自合并区间，同一会话的 meta 更新串行化
+        with self._lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                return
+            meta["ranges"] = merge_ranges(meta["ranges"] + [[start, end]])
+            self._write_meta(upload_id, meta)
+
+    def finalize(self, upload_id: str, dest_path: str, sha256: Optional[str] = None) -> IngestedUpload:
+        """
+        校验所有字节都已接收，计算内容哈希后把数据文件移到任务工作目录并删除会话
+
+        Raises:
+            KeyError: 会话不存在或已过期
+            UploadSessionError: 仍有缺失区间，或与客户端给出的 sha256 不一致
+        """
+        with self._lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise KeyError(upload_id)
+            status = self.status(meta)
+            if not status["complete"]:
+                raise UploadSessionError(f"上传未完成: 已接收 {status['received_bytes']}/{meta['total_size']} 字节")
+
+            digest = hashlib.sha256()
+            with open(self._data_path(upload_id), "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            if sha256 and sha256.lower() != digest.hexdigest():
+                raise UploadSessionError("sha256 校验失败，请重新上传")
+
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            shutil.move(self._data_path(upload_id), dest_path)
+            self.remove(upload_id)
+        print(f"📦 上传会话 {upload_id} 完成: sha256={digest.hexdigest()[:12]}")
+        return IngestedUpload(dest_path, digest.hexdigest(), meta["total_size"])
+
+    def remove(self, upload_id: str) -> None:
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+
+    def sweep_expired(self) -> int:
+        """删除过期的会话，返回删除数量"""
+        if not os.path.isdir(self.sessions_dir):
+            return 0
+        removed = 0
+        now = time.time()
+        for upload_id in os.listdir(self.sessions_dir):
+            try:
+                with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                    expires_at = json.load(f).get("expires_at", 0)
+            except Exception:
+                expires_at = 0
+            if expires_at < now:
+                self.remove(upload_id)
+                removed += 1
+        if removed:
+            print(f"🧹 清理过期上传会话 {removed} 个")
+        return removed
+
+
+# 全局上传会话存储
+upload_session_store = UploadSessionStore(VIDEO_ANALYSIS_CONFIG.get("upload_sessions", {}))
@@ -2,7 +2,7 @@
 视频分析服务 - 从analyze.py中提取的视频分析逻辑
 保持原有的分析逻辑和界面完全不变
 """
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import os
 import tempfile
 import shutil
@@ -14,19 +14,40 @@ import base64
 from datetime import datetime
 import zipfile
 import io
+from collections import deque
 
 import numpy as np
 import cv2
 
 from detector.yolov8_detector import YOLOv8Detector
 from detector.pose_detector import PoseDetector
-from analyzer.ffmpeg import iter_video_frames
+from detector.inference_server import InferenceServer, get_inference_server
+from detector.model_pool import ModelReplicaPool, get_model_pool
+from detector.process_pool import ProcessPoolRunner, get_process_pool
+from analyzer.ffmpeg import iter_stream_frames, iter_video_frames, resize_long_edge, scaled_size, seek_to_frame
 from analyzer.swing_analyzer import SwingAnalyzer
 from analyzer.trajectory_optimizer import TrajectoryOptimizer
 from analyzer.swing_state_machine import SwingStateMachine, SwingPhase
 from analyzer.strategy_manager import get_strategy_manager
+from analyzer.frame_scheduler import PhaseAwareScheduler, sparse_fill_max_gap
+from analyzer.motion_gate import MotionGate
+from analyzer.optical_flow_tracker import ClubHeadFlowTracker
+from analyzer.audio_onset import locate_impact_frame
+from analyzer.deadline_controller import DeadlineController
 from app.utils.helpers import get_mp_landmark_names, calculate_trajectory_distance, clean_json_data, check_video_compatibility
+from analyzer.config import MODEL_PATH
 from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.job_checkpoint import JobCheckpoint, job_checkpoint_store
+from app.services.cancellation import JobCancelled, cancellation_registry
+from app.services.upload_ingest import upload_ingest_service
+from app.services.training_frames import training_frame_registry
+from app.services.training_pool import training_frame_pool
+from app.services.training_assets import training_asset_store
+from app.services.frame_cache import frame_cache_store
+from app.services.keyframes import keyframe_registry
+from app.services.annotated_video import annotated_video_service
+from app.services.video_conversion import video_conversion_service
+from app.services.performance_profiles import profiles_payload, resolve_analysis_params
 
 
 class VideoAnalysisService:
@@ -36,22 +57,49 @@ class VideoAnalysisService:
         self.job_store: Dict[str, Dict] = {}
         self.analysis_results: Dict[str, Dict[str, Any]] = {}
         self.config = VIDEO_ANALYSIS_CONFIG
+        self._tier_detectors: Dict[str, YOLOv8Detector] = {}
     
-    def analyze_video_job(self, job_id: str, video_path: str, resolution: str = None, confidence: str = None, iou: str = None, max_det: str = None, optimization_strategy: str = None) -> None:
-        """分析视频任务 - 保持原有逻辑"""
-        # 使用配置中的默认值
-        resolution = resolution or self.config["default_resolution"]
-        confidence = confidence or self.config["default_confidence"]
-        iou = iou or self.config["default_iou"]
-        max_det = max_det or self.config["default_max_det"]
+    def analyze_video_job(self, job_id: str, video_path: str, resolution: str = None, confidence: str = None, iou: str = None, max_det: str = None, optimization_strategy: str = None, scheduling_mode: str = None, motion_gate: Optional[bool] = None, audio_onset: Optional[bool] = None, deadline_seconds: Optional[float] = None, profile: Optional[str] = None, convert_quality: Optional[str] = None) -> None:
+        """
+        分析视频任务 - 保持原有逻辑
+
+        convert_quality 不为空时同时输出浏览器兼容的 H.264 视频（合并任务，与分析共用一次解码，
+        结果通过 /convert/status/{job_id} 和 /convert/download/{job_id} 获取）
+        """
+        # 单独传入的参数 > 性能档位 > 配置中的默认值
+        params = resolve_analysis_params(self.config, profile, resolution=resolution, confidence=confidence, iou=iou,
+                                         max_det=max_det, scheduling_mode=scheduling_mode, motion_gate=motion_gate)
+        profile = params["profile"]
+        resolution, confidence, iou, max_det = params["resolution"], params["confidence"], params["iou"], params["max_det"]
         optimization_strategy = optimization_strategy or self.config["default_optimization_strategy"]
+        scheduling_mode = params["scheduling_mode"]
+        model_tier = params["model_tier"]
+        backend = params["backend"]
+        strategy_set = params["strategies"]
+        motion_gate = params["motion_gate"]
+        audio_config = self.config.get("audio_onset", {})
+        if audio_onset is None:
+            audio_onset = audio_config.get("enabled", False)
         
         try:
             # 从analyze.py导入全局变量
             from app.routes.analyze import _JOB_STORE
             
+            cancel_token = cancellation_registry.get(job_id)
+            cancel_token.raise_if_cancelled()
+            job_start_time = time.monotonic()
+            # 检测过程中收集失败帧/低置信度帧，训练数据页面无需再解码视频
+            training_buffer = training_frame_registry.create(job_id)
+            # 可选的解码帧缓存：分析结束后供帧预览/训练帧提取等随机访问（视频文件会被删除）
+            frame_cache = frame_cache_store.create_writer(job_id)
             _JOB_STORE[job_id]["status"] = "running"
-            detector = YOLOv8Detector()
+            model_path = self.config.get("model_tiers", {}).get(model_tier)
+            if model_tier != "default" and model_path and model_path != MODEL_PATH:
+                # 推理服务和进程池只承载默认模型，其他档位逐帧推理
+                detector = self._get_tier_detector(model_path)
+                backend = "sequential"
+            else:
+                detector = YOLOv8Detector()
             trajectory = []
             frame_detections = []
             total_frames = 0
@@ -61,15 +109,37 @@ class VideoAnalysisService:
             cap = cv2.VideoCapture(video_path)
             video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            video_fps = int(cap.get(cv2.CAP_PROP_FPS))
+            video_fps_exact = cap.get(cv2.CAP_PROP_FPS)
+            video_fps = int(video_fps_exact)
+            video_frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             cap.release()
+            # 关键帧缩略图与拖动预览雪碧图从检测循环已解码的帧生成
+            keyframe_collector = keyframe_registry.create(job_id, video_width, video_height)
+            # 合并转换：顺序逐帧检测的解码源同时输出 H.264 视频，需要随机访问的检测方式不能共用解码
+            fused_convert = False
+            if convert_quality:
+                # 接口已登记转换任务（重启恢复的任务在这里重新登记）；命中转换缓存时直接完成，分析按普通方式解码
+                conversion_job = video_conversion_service.get_job(job_id) or video_conversion_service.register_fused(
+                    job_id, convert_quality, sha256=_JOB_STORE[job_id].get("sha256"),
+                    output_filename=f"converted_{job_id[:8]}.mp4"
+                )
+                conversion_job["frame_count"] = video_frame_count  # 用于转换进度
+                fused_convert = video_conversion_service.fused_pending(job_id)
+                if fused_convert:
+                    print("🎞️ 合并转换任务：固定使用逐帧检测（单进程解码），忽略截止时间和多进程后端")
+                    scheduling_mode = "full"
+                    deadline_seconds = None
+                    if backend in ("auto", "process_pool"):
+                        backend = "batched"
+
+            # 边上传边分析只支持顺序逐帧解码（逐帧检测 + 线程内推理）；需要随机访问、完整音轨
+            # 或多进程分片的模式先等待上传完成
+            streaming_decode = scheduling_mode == "full" and not deadline_seconds and not audio_onset and not fused_convert and \
+                not (backend in ("auto", "process_pool") and self._get_process_pool() is not None)
+            if not streaming_decode and not upload_ingest_service.wait_complete(video_path):
+                raise JobCancelled("上传中断")
 
-            # 定义安全浮点数转换函数
-            def safe_float(value):
-                """确保浮点数值是JSON兼容的"""
-                if value is None or (isinstance(value, float) and (value != value or value == float('inf') or value == float('-inf'))):
-                    return 0.0
-                return float(value)
+            safe_float = self._safe_float
             
             def clean_trajectory(trajectory):
                 """清理轨迹中的NaN值"""
@@ -104,77 +174,164 @@ class VideoAnalysisService:
                 dynamic_resolution = max(min_resolution, min(max_resolution, user_resolution))
             
             # 计算保持宽高比的YOLO推理分辨率
-            # 根据视频宽高比，计算对应的YOLO推理尺寸
-            aspect_ratio = video_width / video_height
-            if aspect_ratio > 1:  # 宽 > 高
-                yolo_width = dynamic_resolution
-                yolo_height = int(dynamic_resolution / aspect_ratio)
-            else:  # 高 >= 宽
-                yolo_height = dynamic_resolution
-                yolo_width = int(dynamic_resolution * aspect_ratio)
-            
-            # 确保尺寸是32的倍数（YOLO要求）
-            yolo_width = int(yolo_width / 32) * 32
-            yolo_height = int(yolo_height / 32) * 32
+            yolo_width, yolo_height = self._yolo_input_size(video_width, video_height, dynamic_resolution)
+            detect_params = {"conf": confidence_float, "iou": iou_float, "max_det": max_det_int}
             
             print(f"🎯 视频分析参数:")
             print(f"   原始视频尺寸: {video_width}×{video_height}")
             print(f"   实际分析分辨率: {yolo_width}×{yolo_height} (保持宽高比)")
             print(f"   检测参数: 置信度={confidence_float}, IoU={iou_float}, 最大检测={max_det_int}")
             print(f"   优化策略: {optimization_strategy}")
+            print(f"   帧调度模式: {scheduling_mode}")
+            if profile:
+                print(f"   性能档位: {profile} (模型={model_tier}, 后端={backend})")
+            print(f"   运动门控: {'开启' if motion_gate else '关闭'}")
             
-            for ok, frame_bgr in iter_video_frames(video_path, sample_stride=1, max_size=dynamic_resolution):
-                if not ok:
-                    break
-                # 使用元组格式指定YOLO推理分辨率，保持宽高比
-                res = detector.detect_single_point(frame_bgr, imgsz=(yolo_height, yolo_width), conf=confidence_float, iou=iou_float, max_det=max_det_int)
-                if res is not None:
-                    cx, cy, conf = res
-                    # 获取当前帧的实际尺寸（可能被缩放）
-                    frame_h, frame_w = frame_bgr.shape[:2]
-                    
-                    # 计算缩放比例
-                    scale_x = video_width / frame_w
-                    scale_y = video_height / frame_h
-                    
-                    # 将检测坐标映射回原始视频坐标
-                    orig_x = cx * scale_x
-                    orig_y = cy * scale_y
-                    
-                    # 确保坐标在有效范围内
-                    x = max(0, min(video_width, int(orig_x)))
-                    y = max(0, min(video_height, int(orig_y)))
-                    
-                    trajectory.append([x, y])
-                    frame_detections.append({
-                        "frame": total_frames,
-                        "x": int(safe_float(x)),
-                        "y": int(safe_float(y)),
-                        "norm_x": safe_float((x / video_width) if video_width else 0.0),
-                        "norm_y": safe_float((y / video_height) if video_height else 0.0),
-                        "confidence": safe_float(conf),
-                        "detected": True
-                    })
-                    detected_frames += 1
-                    total_confidence += conf
-                else:
-                    trajectory.append([0, 0])
-                    frame_detections.append({
-                        "frame": total_frames,
-                        "x": 0,
-                        "y": 0,
-                        "norm_x": 0.0,
-                        "norm_y": 0.0,
-                        "confidence": 0.0,
-                        "detected": False
-                    })
-                total_frames += 1
-                # 简单进度，每处理100帧打点
-                if total_frames % 100 == 0:
-                    _JOB_STORE[job_id]["progress"] = total_frames
+            gate = self._create_motion_gate() if motion_gate else None
+            
+            # 音频击球定位：推理之前完成，代价远低于逐帧YOLO
+            audio_onset_info = {"enabled": bool(audio_onset), "available": False}
+            impact_hint = None
+            if audio_onset:
+                onset = locate_impact_frame(
+                    video_path, video_fps_exact, video_frame_count or None,
+                    sample_rate=audio_config.get("sample_rate", 16000),
+                    min_peak_ratio=audio_config.get("min_peak_ratio", 4.0)
+                )
+                if onset is not None:
+                    impact_hint = onset["frame"]
+                    audio_onset_info.update({"available": True, "impact_frame": onset["frame"],
+                                             "time": onset["time"], "strength": onset["strength"]})
+            
+            # 检查点：重启后从最近落盘的解码位置继续（逐帧检测模式）
+            checkpoint = job_checkpoint_store.open(job_id)
+            resumed_records = []
+            if checkpoint is not None and scheduling_mode == "full":
+                _, resumed_records = job_checkpoint_store.load_detections(job_id)
+                if resumed_records:
+                    print(f"♻️ 从检查点恢复: 已完成 {len(resumed_records)} 帧，从帧{len(resumed_records)}继续")
+            
+            # 截止时间：逐帧检测模式下按实时吞吐量自动降级
+            controller = None
+            if deadline_seconds and scheduling_mode == "full":
+                deadline_config = self.config.get("deadline", {})
+                controller = DeadlineController(
+                    float(deadline_seconds) - (time.monotonic() - job_start_time),
+                    video_frame_count,
+                    ladder=deadline_config.get("ladder"),
+                    postprocess_reserve_s=deadline_config.get("postprocess_reserve_s", 5.0),
+                    safety_factor=deadline_config.get("safety_factor", 1.1),
+                    check_interval_frames=deadline_config.get("check_interval_frames", 15)
+                )
+                controller.model_tier = model_tier
+            
+            # 只有逐帧检测（顺序/批处理推理）按帧写检查点；截止时间、粗扫描、跟踪和多进程分片
+            # 不写检查点，重启后从头开始，在检查点元数据中标记为不可续跑
+            resumable = controller is None and scheduling_mode == "full" and \
+                not (backend in ("auto", "process_pool") and self._get_process_pool() is not None)
+            if checkpoint is not None:
+                job_checkpoint_store.update_meta(job_id, resumable=resumable)
+            
+            scheduling_info = {"mode": "full"}
+            if controller is not None:
+                trajectory, frame_detections, scheduling_info = self._detect_with_deadline(
+                    job_id, detector, video_path, video_width, video_height,
+                    dynamic_resolution, detect_params, controller, gate
+                )
+            elif scheduling_mode == "phase_aware":
+                audio_window = None
+                if impact_hint is not None:
+                    audio_window = (impact_hint - int(audio_config.get("window_pre_s", 0.6) * video_fps_exact),
+                                    impact_hint + int(audio_config.get("window_post_s", 0.3) * video_fps_exact))
+                trajectory, frame_detections, scheduling_info = self._detect_phase_aware(
+                    job_id, detector, video_path, video_width, video_height,
+                    dynamic_resolution, (yolo_height, yolo_width), detect_params, gate, audio_window
+                )
+            elif scheduling_mode == "tracking":
+                trajectory, frame_detections, scheduling_info = self._detect_with_tracking(
+                    job_id, detector, video_path, video_width, video_height,
+                    dynamic_resolution, (yolo_height, yolo_width), detect_params, gate
+                )
+            
+            if controller is not None or scheduling_mode in ("phase_aware", "tracking"):
+                total_frames = len(frame_detections)
+                for det in frame_detections:
+                    if det.get("detected", False) and not det.get("is_interpolated", False) and not det.get("is_tracked", False):
+                        detected_frames += 1
+                        total_confidence += det["confidence"]
+            elif backend in ("auto", "process_pool") and self._get_process_pool() is not None:
+                # 多进程模式：按帧区间分片并行检测，按帧号合并
+                trajectory, frame_detections, scheduling_info = self._detect_with_process_pool(
+                    job_id, video_path, video_width, video_height, video_frame_count,
+                    dynamic_resolution, (yolo_height, yolo_width), detect_params, gate
+                )
+                total_frames = len(frame_detections)
+                for det in frame_detections:
+                    if det["detected"]:
+                        detected_frames += 1
+                        total_confidence += det["confidence"]
+            elif backend in ("auto", "batched") and self._get_inference_server() is not None:
+                # 批处理推理：解码与推理流水线化，帧通过推理服务与其他任务合批
+                trajectory, frame_detections = self._detect_dense_batched(
+                    job_id, video_path, video_width, video_height,
+                    dynamic_resolution, (yolo_height, yolo_width), detect_params, gate,
+                    checkpoint, resumed_records
+                )
+                total_frames = len(frame_detections)
+                for det in frame_detections:
+                    if det["detected"]:
+                        detected_frames += 1
+                        total_confidence += det["confidence"]
+            else:
+                trajectory, frame_detections = self._restore_detections(resumed_records, video_width, video_height)
+                for detection in frame_detections:
+                    if detection["detected"]:
+                        detected_frames += 1
+                        total_confidence += detection["confidence"]
+                total_frames = len(frame_detections)
+                for ok, frame_bgr in self._frame_source(video_path, video_width, video_height, dynamic_resolution, total_frames, job_id):
+                    if not ok:
+                        break
+                    cancel_token.raise_if_cancelled()
+                    if frame_cache is not None:
+                        frame_cache.write(total_frames, frame_bgr)
+                    if keyframe_collector is not None:
+                        keyframe_collector.offer(total_frames, frame_bgr)
+                    # 使用元组格式指定YOLO推理分辨率，保持宽高比
+                    res, gated = self._infer_frame(detector, frame_bgr, (yolo_height, yolo_width), detect_params, gate,
+                                                   job_id if backend != "sequential" else None)
+                    point, detection = self._build_detection(res, total_frames, frame_bgr.shape, video_width, video_height)
+                    if gated:
+                        detection["is_gated"] = True
+                    else:
+                        training_buffer.offer(total_frames, frame_bgr, res)
+                    trajectory.append(point)
+                    frame_detections.append(detection)
+                    if detection["detected"]:
+                        detected_frames += 1
+                        total_confidence += detection["confidence"]
+                    if checkpoint is not None:
+                        checkpoint.record(total_frames, res, frame_bgr.shape, gated)
+                    total_frames += 1
+                    if checkpoint is not None:
+                        checkpoint.maybe_flush(total_frames)
+                    # 简单进度，每处理100帧打点
+                    if total_frames % 100 == 0:
+                        _JOB_STORE[job_id]["progress"] = total_frames
+
+            # 后续步骤（训练数据页面等）需要完整文件
+            if not upload_ingest_service.wait_complete(video_path):
+                raise JobCancelled("上传中断")
 
+            # 检测率以实际推理的帧为分母，插值补齐的帧不计入
+            inferred_frames = scheduling_info.get("inferred_frames", total_frames)
             avg_confidence = total_confidence / detected_frames if detected_frames > 0 else 0.0
-            detection_rate = (detected_frames / total_frames * 100) if total_frames > 0 else 0.0
+            detection_rate = (detected_frames / inferred_frames * 100) if inferred_frames > 0 else 0.0
+            
+            motion_gate_info = gate.stats() if gate is not None else {"enabled": False}
+            if gate is not None:
+                print(f"🚦 运动门控: 跳过 {motion_gate_info['gated_frames']} 帧，"
+                      f"估算节省 {motion_gate_info['estimated_time_saved_ms']:.0f}ms")
 
             # 将像素坐标转换为归一化坐标，与API保持一致
             norm_trajectory = []
@@ -207,6 +364,10 @@ class VideoAnalysisService:
             print(f"🔄 开始生成所有策略轨迹...")
             print(f"🔄 可用策略: {list(available_strategies.keys())}")
             for strategy_id, strategy_info in available_strategies.items():
+                cancel_token.raise_if_cancelled()
+                # 性能档位限定了策略集时，只生成档位内的策略和用户选择的策略
+                if strategy_set is not None and strategy_id not in strategy_set and strategy_id != optimization_strategy:
+                    continue
                 # 处理所有策略，不只是real_开头的
                 if strategy_id != "original":  # 跳过原始检测
                     try:
@@ -242,7 +403,9 @@ class VideoAnalysisService:
             print("🎯 开始挥杆状态分析...")
             try:
                 swing_state_machine = SwingStateMachine()
-                swing_phases = swing_state_machine.analyze_swing(final_trajectory)
+                if impact_hint is not None and impact_hint >= len(final_trajectory):
+                    impact_hint = None
+                swing_phases = swing_state_machine.analyze_swing(final_trajectory, impact_hint=impact_hint)
                 print(f"✅ 挥杆状态分析完成，共分析 {len(swing_phases)} 帧")
             except Exception as e:
                 print(f"❌ 挥杆状态分析失败: {e}")
@@ -250,6 +413,17 @@ class VideoAnalysisService:
                 traceback.print_exc()
                 # 使用默认状态
                 swing_phases = [SwingPhase.UNKNOWN] * len(norm_trajectory)
+            
+            # 关键帧缩略图与雪碧图（优先用检测时保留的缩略图帧，没保留的再从帧缓存/视频 seek）
+            keyframe_assets = {"keyframes": {}, "sprite": None}
+            if keyframe_collector is not None:
+                try:
+                    keyframe_assets = keyframe_collector.finalize(
+                        swing_phases, total_frames,
+                        frame_loader=lambda idx: self._load_frame(job_id, video_path, idx)
+                    )
+                except Exception as e:
+                    print(f"⚠️ 关键帧缩略图生成失败: {e}")
 
             # 5. 生成补齐后的frame_detections数据（用于右画面显示）
             print(f"🔍 开始生成filled_frame_detections，总帧数: {total_frames}")
@@ -350,6 +524,19 @@ class VideoAnalysisService:
                 # ===== 其他数据 =====
                 "frame_detections": frame_detections,  # 保持向后兼容
                 "swing_phases": [phase.value for phase in swing_phases],  # 挥杆状态序列
+                "keyframes": keyframe_assets["keyframes"],  # Top/Impact/Finish 缩略图 {名称: {frame, url}}
+                "sprite": keyframe_assets["sprite"],        # 拖动预览雪碧图（未生成时为 None）
+                "converted_video": {                        # 合并转换输出（未请求转换时为 None）
+                    "status": video_conversion_service.get_job(job_id)["status"],
+                    "status_url": f"/convert/status/{job_id}",
+                    "download_url": f"/convert/download/{job_id}"
+                } if convert_quality and video_conversion_service.get_job(job_id) else None,
+                
+                "frame_scheduling": scheduling_info,  # 帧调度信息
+                "motion_gate": motion_gate_info,      # 运动门控统计（跳过帧数、节省时间）
+                "audio_onset": audio_onset_info,      # 音频击球定位（无音轨时 available=False）
+                "inference_server": self._inference_server_info(),  # 批处理推理服务统计
+                "deadline": controller.summary(total_frames) if controller is not None else {"enabled": False},  # 截止时间与降级记录
                 
                 # ===== 分析参数信息 =====
                 "analysis_resolution": f"{dynamic_resolution}×{dynamic_resolution}",
@@ -360,7 +547,14 @@ class VideoAnalysisService:
                     "confidence": confidence_float,
                     "iou": iou_float,
                     "max_det": max_det_int,
-                    "optimization_strategy": optimization_strategy
+                    "optimization_strategy": optimization_strategy,
+                    "scheduling_mode": scheduling_mode,
+                    "motion_gate": bool(motion_gate),
+                    "audio_onset": bool(audio_onset),
+                    "deadline_seconds": deadline_seconds,
+                    "profile": profile,
+                    "model_tier": model_tier,
+                    "backend": backend
                 },
                 "video_info": {
                     "width": video_width,
@@ -376,13 +570,16 @@ class VideoAnalysisService:
                 # 定义失败帧和低置信度帧
                 failure_frames = []
                 low_confidence_frames = []
-                confidence_threshold = 0.3  # 低置信度阈值
+                confidence_threshold = training_buffer.confidence_threshold  # 低置信度阈值
                 
                 for i, det in enumerate(frame_detections):
                     if det is None:
                         failure_frames.append(i)
                         continue
                     if isinstance(det, dict):
+                        if det.get("is_interpolated", False) or det.get("is_gated", False) or det.get("is_tracked", False):
+                            # 调度跳过/门控复用/光流跟踪的帧未经过模型推理，不作为训练数据
+                            continue
                         if not det.get("detected", False):
                             failure_frames.append(i)
                             continue
@@ -403,8 +600,13 @@ class VideoAnalysisService:
                     # 使用html_generator_service生成训练数据页面
                     from app.services.html_generator import html_generator_service
                     training_data_url = html_generator_service.generate_training_data_page(
-                        job_id, video_path, failure_frames, low_confidence_frames, confidence_threshold
+                        job_id, video_path, failure_frames, low_confidence_frames, confidence_threshold,
+                        cancel_token=cancel_token, frame_buffer=training_buffer,
+                        fps=video_fps_exact, total_frames=total_frames,
+                        detections={i: frame_detections[i] for i in failure_frames + low_confidence_frames},
+                        video_size=(video_width, video_height)
                     )
+                    print(f"🖼️ 训练帧缓冲: {training_buffer.stats()}")
                     print(f"训练数据收集页面生成完成: {training_data_url}")
                     # 将下载链接写入结果，确保状态接口能返回给前端
                     try:
@@ -413,21 +615,43 @@ class VideoAnalysisService:
                     except Exception:
                         pass
                     _JOB_STORE[job_id]["training_data_url"] = training_data_url
+                    if training_data_url:
+                        # 汇入跨任务训练帧池（pHash 去重）
+                        try:
+                            training_frame_pool.ingest_job(job_id)
+                        except Exception as e:
+                            print(f"⚠️ 训练帧入池失败: {e}")
                 else:
                     print("没有失败帧或低置信度帧，跳过训练数据收集页面生成")
+            except JobCancelled:
+                raise
             except Exception as e:
                 print(f"生成训练数据收集页面时出错: {e}")
                 import traceback
                 traceback.print_exc()
                 # 不影响主要分析结果
             
-            # 删除视频文件
+            # 保留一份原视频供标注视频渲染（按任务保留期清理）
             try:
-                os.remove(video_path)
-                print(f"已删除临时视频文件: {video_path}")
+                annotated_video_service.retain_source(job_id, video_path)
             except Exception as e:
-                print(f"删除临时视频文件失败: {e}")
+                print(f"⚠️ 保留原视频失败，标注视频将使用帧缓存: {e}")
+            
+            # 删除视频文件（内存中的上传关闭 memfd）
+            upload_ingest_service.release(video_path)
+            print(f"已删除临时视频文件: {video_path}")
+            job_checkpoint_store.remove(job_id)
                 
+        except JobCancelled as e:
+            from app.routes.analyze import _JOB_STORE
+            print(f"🛑 任务 {job_id} 已取消: {e}")
+            if job_id in _JOB_STORE:
+                _JOB_STORE[job_id]["status"] = "cancelled"
+                _JOB_STORE[job_id]["cancel_reason"] = str(e)
+            # 训练页面生成阶段被取消（已完成的任务被删除）时清掉写了一半的静态资源
+            training_asset_store.remove(job_id)
+            upload_ingest_service.release(video_path)
+            job_checkpoint_store.remove(job_id)
         except Exception as e:
             from app.routes.analyze import _JOB_STORE
             _JOB_STORE[job_id]["status"] = "error"
@@ -450,10 +674,679 @@ class VideoAnalysisService:
             
             _JOB_STORE[job_id]["error"] = error_msg
             # 即使出错也要删除视频文件
-            try:
-                os.remove(video_path)
-            except Exception:
-                pass
+            upload_ingest_service.release(video_path)
+            job_checkpoint_store.remove(job_id)
+        finally:
+            from app.routes.analyze import _JOB_STORE
+            cancellation_registry.release(job_id)
+            training_frame_registry.release(job_id)
+            keyframe_registry.release(job_id)
+            video_conversion_service.abandon_fused(job_id, "分析任务未完成，转换未执行")
+            done = _JOB_STORE.get(job_id, {}).get("status") == "done"
+            frame_cache_store.finish_writer(job_id, complete=done)
+            if not done:
+                frame_cache_store.remove(job_id)
+    
+    def resume_interrupted_jobs(self) -> int:
+        """服务启动时恢复重启前未完成的任务，返回恢复的任务数"""
+        from app.routes.analyze import _JOB_STORE
+        
+        interrupted = job_checkpoint_store.list_interrupted()
+        for meta in interrupted:
+            job_id = meta["job_id"]
+            # 不写检查点的检测方式（resumable=False）只能从头重新分析
+            resumable = meta.get("resumable", True)
+            decode_position = meta.get("decode_position", 0) if resumable else 0
+            _JOB_STORE[job_id] = {
+                **meta.get("job", {}),
+                **meta.get("params", {}),
+                "status": "queued",
+                "progress": decode_position,
+                "resumed": resumable,
+                "restarted": not resumable
+            }
+            if resumable:
+                print(f"♻️ 恢复中断的任务 {job_id}（已完成 {decode_position} 帧）")
+            else:
+                print(f"♻️ 重新开始中断的任务 {job_id}（该检测方式不支持从检查点续跑）")
+            t = threading.Thread(target=self.analyze_video_job, args=(job_id, meta["video_path"]), kwargs=meta.get("params", {}), daemon=True)
+            t.start()
+        return len(interrupted)
+    
+    def get_profiles(self) -> Dict[str, Any]:
+        """列出性能档位及基准测试实测的 fps/准确率（基准结果来自 scripts/benchmark_profiles.py）"""
+        return profiles_payload(self.config)
+    
+    @staticmethod
+    def _safe_float(value) -> float:
+        """确保浮点数值是JSON兼容的"""
+        if value is None or (isinstance(value, float) and (value != value or value == float('inf') or value == float('-inf'))):
+            return 0.0
+        return float(value)
+    
+    @staticmethod
+    def _yolo_input_size(video_width: int, video_height: int, resolution: int) -> Tuple[int, int]:
+        """根据视频宽高比计算YOLO推理尺寸 (宽, 高)，长边为resolution且为32的倍数"""
+        aspect_ratio = video_width / video_height
+        if aspect_ratio > 1:  # 宽 > 高
+            yolo_width = resolution
+            yolo_height = int(resolution / aspect_ratio)
+        else:  # 高 >= 宽
+            yolo_height = resolution
+            yolo_width = int(resolution * aspect_ratio)
+        
+        # 确保尺寸是32的倍数（YOLO要求）
+        yolo_width = int(yolo_width / 32) * 32
+        yolo_height = int(yolo_height / 32) * 32
+        return yolo_width, yolo_height
+    
+    def _create_motion_gate(self) -> MotionGate:
+        """按配置创建运动门控"""
+        gate_config = self.config.get("motion_gate", {})
+        return MotionGate(
+            downsample_size=gate_config.get("downsample_size", 128),
+            pixel_threshold=gate_config.get("pixel_threshold", 15),
+            max_changed_pixels=gate_config.get("max_changed_pixels", 2),
+            max_consecutive_gated=gate_config.get("max_consecutive_gated", 30)
+        )
+    
+    def _get_inference_server(self) -> Optional[InferenceServer]:
+        """按配置获取全局批处理推理服务，未启用时返回 None"""
+        server_config = self.config.get("inference_server", {})
+        if not server_config.get("enabled", False):
+            return None
+        return get_inference_server(
+            max_batch_size=server_config.get("max_batch_size", 8),
+            max_wait_ms=server_config.get("max_wait_ms", 5),
+            pool=self._get_model_pool()
+        )
+    
+    def _get_tier_detector(self, model_path: str) -> YOLOv8Detector:
+        """非默认模型档位的检测器（未启用副本池时使用，每个模型路径只加载一次）"""
+        tier_detector = self._tier_detectors.get(model_path)
+        if tier_detector is None:
+            tier_detector = YOLOv8Detector(model_path, model=YOLOv8Detector.load_model(model_path))
+            self._tier_detectors[model_path] = tier_detector
+        return tier_detector
+    
+    def _get_model_pool(self, model_path: Optional[str] = None) -> Optional[ModelReplicaPool]:
+        """按配置获取模型副本池（默认模型或指定档位），未启用时返回 None（使用类级共享模型）"""
+        pool_config = self.config.get("model_pool", {})
+        if not pool_config.get("enabled", False):
+            return None
+        return get_model_pool(
+            model_path=model_path,
+            size=pool_config.get("size", "auto"),
+            max_replicas=pool_config.get("max_replicas", 4),
+            cores_per_replica=pool_config.get("cores_per_replica", 4)
+        )
+    
+    def _get_process_pool(self) -> Optional[ProcessPoolRunner]:
+        """按配置获取推理进程池，未启用或不可用（CUDA）时返回 None"""
+        pool_config = self.config.get("process_pool", {})
+        if not pool_config.get("enabled", False):
+            return None
+        return get_process_pool(pool_config.get("workers", "auto"))
+    
+    def _check_cancelled(self, job_id: str) -> None:
+        """协作式取消检查点：任务已取消时抛出 JobCancelled"""
+        cancellation_registry.get(job_id).raise_if_cancelled()
+    
+    def _detect_with_process_pool(self, job_id: str, video_path: str, video_width: int, video_height: int, frame_count: int, resolution: int, imgsz: Tuple[int, int], detect_params: Dict[str, Any], gate: Optional[MotionGate] = None) -> Tuple[List[List[int]], List[Dict[str, Any]], Dict[str, Any]]:
+        """逐帧检测（多进程版）：长视频按帧区间分片到各工作进程，结果按帧号合并"""
+        runner = self._get_process_pool()
+        shard_frames = self.config.get("process_pool", {}).get("shard_frames", 300)
+        gate_config = None
+        if gate is not None:
+            gate_config = {
+                "downsample_size": gate.downsample_size,
+                "pixel_threshold": gate.pixel_threshold,
+                "max_changed_pixels": gate.max_changed_pixels,
+                "max_consecutive_gated": gate.max_consecutive_gated
+            }
+        
+        training_buffer = training_frame_registry.get(job_id)
+        # 帧缓存：工作进程按分析分辨率直接写入缓存数据文件，父进程登记写入的帧号
+        frame_cache = frame_cache_store.writer(job_id)
+        cache_task = None
+        if frame_cache is not None:
+            out_w, out_h = scaled_size(video_width, video_height, resolution)
+            if frame_cache.set_shape((out_h, out_w, 3)):
+                cache_task = {"path": frame_cache.data_path, "shape": list(frame_cache.shape), "max_bytes": frame_cache.max_bytes}
+        start = time.perf_counter()
+        results, gate_stats, training_frames, cached_frames = runner.detect_frames(
+            video_path, frame_count, resolution, imgsz, detect_params,
+            shard_frames=shard_frames, motion_gate=gate_config,
+            cancel_check=lambda: self._check_cancelled(job_id),
+            training_threshold=training_buffer.confidence_threshold if training_buffer is not None else None,
+            jpeg_quality=self.config.get("jpeg_quality", 90),
+            frame_cache=cache_task
+        )
+        if training_buffer is not None:
+            for frame_idx, jpeg in training_frames:
+                training_buffer.add_encoded(frame_idx, jpeg)
+        if frame_cache is not None:
+            frame_cache.mark_written(cached_frames)
+        if gate is not None:
+            gate.gated_frames += gate_stats.get("gated_frames", 0)
+            gate.inferred_frames += gate_stats.get("inferred_frames", 0)
+            gate.inference_seconds += gate_stats.get("inference_seconds", 0.0)
+        
+        trajectory = []
+        frame_detections = []
+        for frame_idx, res, frame_shape, gated in results:
+            point, detection = self._build_detection(res, frame_idx, frame_shape, video_width, video_height)
+            if gated:
+                detection["is_gated"] = True
+            trajectory.append(point)
+            frame_detections.append(detection)
+        
+        scheduling_info = {
+            "mode": "full",
+            "execution": "process_pool",
+            "workers": runner.workers,
+            "shards": len(runner.plan_shards(0, max(0, frame_count - 1), shard_frames)),
+            "detect_seconds": round(time.perf_counter() - start, 2)
+        }
+        print(f"✅ 多进程检测完成: {len(frame_detections)} 帧，{runner.workers} 个工作进程")
+        return trajectory, frame_detections, scheduling_info
+    
+    def _inference_server_info(self) -> Dict[str, Any]:
+        server = self._get_inference_server()
+        if server is None:
+            return {"enabled": False}
+        info = {"enabled": True, **server.stats()}
+        if server.pool is not None:
+            info["model_pool"] = server.pool.stats()
+        return info
+    
+    def _infer_frame(self, detector: YOLOv8Detector, frame_bgr: np.ndarray, imgsz: Tuple[int, int], detect_params: Dict[str, Any], gate: Optional[MotionGate] = None, job_id: Optional[str] = None, model_path: Optional[str] = None) -> Tuple[Optional[Tuple[float, float, float]], bool]:
+        """单帧推理（经过运动门控），返回 (检测结果, 是否复用了上一次推理结果)
+        
+        传入 job_id 且推理服务启用时，经推理服务与其他任务的帧合批推理。
+        model_path（未指定时为 detector 的模型）不是默认模型（如廉价模型档位）时绕过推理服务，
+        使用该模型的副本池——推理服务只承载默认模型。
+        """
+        if gate is not None and not gate.should_infer(frame_bgr):
+            return gate.last_result, True
+        start = time.perf_counter()
+        model_path = model_path or detector.model_path
+        if model_path != MODEL_PATH:
+            pool = self._get_model_pool(model_path)
+            if pool is not None:
+                with pool.checkout() as replica:
+                    res = replica.detect_single_point(frame_bgr, imgsz=imgsz, **detect_params)
+            else:
+                res = self._get_tier_detector(model_path).detect_single_point(frame_bgr, imgsz=imgsz, **detect_params)
+            if gate is not None:
+                gate.record_inference(res, time.perf_counter() - start)
+            return res, False
+        server = self._get_inference_server() if job_id else None
+        if server is not None:
+            future = server.submit(job_id, frame_bgr, imgsz, **detect_params)
+            res = future.result()
+            seconds = getattr(future, "inference_seconds", time.perf_counter() - start)
+        else:
+            pool = self._get_model_pool()
+            if pool is not None:
+                with pool.checkout() as replica:
+                    res = replica.detect_single_point(frame_bgr, imgsz=imgsz, **detect_params)
+            else:
+                res = detector.detect_single_point(frame_bgr, imgsz=imgsz, **detect_params)
+            seconds = time.perf_counter() - start
+        if gate is not None:
+            gate.record_inference(res, seconds)
+        return res, False
+    
+    def _offer_training_frame(self, job_id: str, frame_idx: int, frame_bgr: np.ndarray, res: Optional[Tuple[float, float, float]]) -> None:
+        """把推理过的失败帧/低置信度帧交给训练帧旁路缓冲（任务没有缓冲时忽略）"""
+        buffer = training_frame_registry.get(job_id)
+        if buffer is not None:
+            buffer.offer(frame_idx, frame_bgr, res)
+    
+    def _cache_frame(self, job_id: str, frame_idx: int, frame_bgr: np.ndarray) -> None:
+        """把已解码的帧写入帧缓存（任务没有启用帧缓存时忽略）"""
+        frame_cache = frame_cache_store.writer(job_id)
+        if frame_cache is not None:
+            frame_cache.write(frame_idx, frame_bgr)
+    
+    def _offer_keyframe(self, job_id: str, frame_idx: int, frame_bgr: np.ndarray) -> None:
+        """把已解码的帧交给关键帧收集器（任务没有收集器时忽略）"""
+        collector = keyframe_registry.get(job_id)
+        if collector is not None:
+            collector.offer(frame_idx, frame_bgr)
+    
+    def _load_frame(self, job_id: str, video_path: str, frame_idx: int) -> Optional[np.ndarray]:
+        """按帧号取一帧：优先帧缓存，否则 seek 视频文件"""
+        cached = frame_cache_store.open(job_id)
+        if cached is not None and frame_idx in cached:
+            return cached.get(frame_idx)
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not seek_to_frame(cap, frame_idx):
+                return None
+            ok, frame_bgr = cap.read()
+            return frame_bgr if ok else None
+        finally:
+            cap.release()
+    
+    def _frame_source(self, video_path: str, video_width: int, video_height: int, max_size: int, start_frame: int = 0, job_id: Optional[str] = None):
+        """逐帧解码源：合并转换任务由转换服务的 ffmpeg 同时编码输出；上传仍在接收中时经 ffmpeg 管道跟随写入进度解码，否则直接读文件"""
+        if video_conversion_service.fused_pending(job_id):
+            print("🎞️ 一次解码：同时输出 H.264 视频和检测帧")
+            conversion_job = video_conversion_service.get_job(job_id)
+            return video_conversion_service.iter_fused_frames(
+                job_id, video_path, video_width, video_height, max_size, start_frame,
+                conversion_job.get("frame_count", 0)
+            )
+        live = upload_ingest_service.live_upload(video_path)
+        if live is not None and not live.complete:
+            print("📡 上传尚未完成，边接收边解码")
+            return iter_stream_frames(live.iter_chunks(), video_width, video_height, max_size, start_frame)
+        return iter_video_frames(video_path, sample_stride=1, max_size=max_size, start_frame=start_frame)
+    
+    def _restore_detections(self, records: List[list], video_width: int, video_height: int) -> Tuple[List[List[int]], List[Dict[str, Any]]]:
+        """从检查点记录重建轨迹和 frame_detections"""
+        trajectory = []
+        frame_detections = []
+        for frame_idx, res, frame_shape, gated in records:
+            point, detection = self._build_detection(tuple(res) if res else None, frame_idx, tuple(frame_shape), video_width, video_height)
+            if gated:
+                detection["is_gated"] = True
+            trajectory.append(point)
+            frame_detections.append(detection)
+        return trajectory, frame_detections
+    
+    def _detect_dense_batched(self, job_id: str, video_path: str, video_width: int, video_height: int, resolution: int, imgsz: Tuple[int, int], detect_params: Dict[str, Any], gate: Optional[MotionGate] = None, checkpoint: Optional[JobCheckpoint] = None, resumed_records: Optional[List[list]] = None) -> Tuple[List[List[int]], List[Dict[str, Any]]]:
+        """
+        逐帧检测（批处理推理服务版）
+        
+        解码线程持续提交帧，最多 max_in_flight 帧在途，按帧序取回结果。
+        运动门控跳过的帧直接复用参考帧的 Future。
+        """
+        from app.routes.analyze import _JOB_STORE
+        
+        server = self._get_inference_server()
+        max_in_flight = max(1, self.config.get("inference_server", {}).get("max_in_flight", 16))
+        trajectory, frame_detections = self._restore_detections(resumed_records or [], video_width, video_height)
+        training_buffer = training_frame_registry.get(job_id)
+        frame_cache = frame_cache_store.writer(job_id)
+        keyframe_collector = keyframe_registry.get(job_id)
+        # (frame_idx, frame_bgr, future, gated)
+        pending = deque()
+        
+        def drain_one():
+            frame_idx, frame_bgr, future, gated = pending.popleft()
+            frame_shape = frame_bgr.shape
+            res = future.result()
+            if gate is not None and not gated:
+                gate.record_inference(res, getattr(future, "inference_seconds", 0.0))
+            point, detection = self._build_detection(res, frame_idx, frame_shape, video_width, video_height)
+            if gated:
+                detection["is_gated"] = True
+            elif training_buffer is not None:
+                training_buffer.offer(frame_idx, frame_bgr, res)
+            trajectory.append(point)
+            frame_detections.append(detection)
+            if checkpoint is not None:
+                checkpoint.record(frame_idx, res, frame_shape, gated)
+                checkpoint.maybe_flush(frame_idx + 1)
+        
+        reference_future = None
+        frame_idx = len(frame_detections)
+        try:
+            for ok, frame_bgr in self._frame_source(video_path, video_width, video_height, resolution, frame_idx, job_id):
+                if not ok:
+                    break
+                self._check_cancelled(job_id)
+                if frame_cache is not None:
+                    frame_cache.write(frame_idx, frame_bgr)
+                if keyframe_collector is not None:
+                    keyframe_collector.offer(frame_idx, frame_bgr)
+                if gate is not None and reference_future is not None and not gate.should_infer(frame_bgr):
+                    pending.append((frame_idx, frame_bgr, reference_future, True))
+                else:
+                    if gate is not None and reference_future is None:
+                        gate.should_infer(frame_bgr)  # 首帧作为参考帧
+                    reference_future = server.submit(job_id, frame_bgr, imgsz, **detect_params)
+                    pending.append((frame_idx, frame_bgr, reference_future, False))
+                frame_idx += 1
+                while len(pending) >= max_in_flight:
+                    drain_one()
+                # 简单进度，每处理100帧打点
+                if frame_idx % 100 == 0:
+                    _JOB_STORE[job_id]["progress"] = frame_idx
+            while pending:
+                drain_one()
+        finally:
+            server.release_job(job_id)
+        return trajectory, frame_detections
+    
+    def _build_detection(self, res: Optional[Tuple[float, float, float]], frame_idx: int, frame_shape: Tuple[int, ...], video_width: int, video_height: int) -> Tuple[List[int], Dict[str, Any]]:
+        """将单帧检测结果映射回原始视频坐标，返回 (轨迹点, frame_detection)"""
+        safe_float = self._safe_float
+        if res is None:
+            return [0, 0], {
+                "frame": frame_idx,
+                "x": 0,
+                "y": 0,
+                "norm_x": 0.0,
+                "norm_y": 0.0,
+                "confidence": 0.0,
+                "detected": False
+            }
+        
+        cx, cy, conf = res
+        # 获取当前帧的实际尺寸（可能被缩放）
+        frame_h, frame_w = frame_shape[:2]
+        
+        # 计算缩放比例，将检测坐标映射回原始视频坐标
+        orig_x = cx * (video_width / frame_w)
+        orig_y = cy * (video_height / frame_h)
+        
+        # 确保坐标在有效范围内
+        x = max(0, min(video_width, int(orig_x)))
+        y = max(0, min(video_height, int(orig_y)))
+        
+        return [x, y], {
+            "frame": frame_idx,
+            "x": int(safe_float(x)),
+            "y": int(safe_float(y)),
+            "norm_x": safe_float((x / video_width) if video_width else 0.0),
+            "norm_y": safe_float((y / video_height) if video_height else 0.0),
+            "confidence": safe_float(conf),
+            "detected": True
+        }
+    
+    def _detect_phase_aware(self, job_id: str, detector: YOLOv8Detector, video_path: str, video_width: int, video_height: int, dense_resolution: int, dense_imgsz: Tuple[int, int], detect_params: Dict[str, Any], gate: Optional[MotionGate] = None, audio_window: Optional[Tuple[int, int]] = None) -> Tuple[List[List[int]], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        分阶段帧调度检测
+        
+        1. 每k帧做一次低分辨率粗扫描
+        2. 稀疏轨迹交给SwingStateMachine定位 Top/Downswing/Impact（有音频击球窗口时用它收窄）
+        3. 快速阶段窗口内逐帧全分辨率检测
+        4. 其余帧用AutoFillStrategy插值补齐（标记 is_interpolated）
+        """
+        from app.routes.analyze import _JOB_STORE
+        
+        sched_config = self.config.get("phase_aware_scheduling", {})
+        scheduler = PhaseAwareScheduler(
+            coarse_stride=sched_config.get("coarse_stride", 8),
+            margin_frames=sched_config.get("margin_frames", 8),
+            min_valid_points=sched_config.get("min_valid_points", 4)
+        )
+        stride = scheduler.coarse_stride
+        coarse_resolution = min(dense_resolution, sched_config.get("coarse_resolution", 960))
+        coarse_w, coarse_h = self._yolo_input_size(video_width, video_height, coarse_resolution)
+        
+        # frame_idx -> (轨迹点, frame_detection)
+        detections: Dict[int, Tuple[List[int], Dict[str, Any]]] = {}
+        coarse_indices: List[int] = []
+        
+        # 帧缓存按快速阶段的分辨率存帧；粗扫描分辨率更低时粗扫描帧不写入
+        frame_cache = frame_cache_store.writer(job_id)
+        if frame_cache is not None:
+            dense_w, dense_h = scaled_size(video_width, video_height, dense_resolution)
+            frame_cache.set_shape((dense_h, dense_w, 3))
+        
+        # 1. 粗扫描：非采样帧只grab不解码，同时得到精确的总帧数
+        print(f"🔎 粗扫描: 每{stride}帧检测一次，分辨率 {coarse_w}×{coarse_h}")
+        cap = cv2.VideoCapture(video_path)
+        total_frames = 0
+        try:
+            while cap.grab():
+                if scheduler.is_coarse_frame(total_frames):
+                    self._check_cancelled(job_id)
+                    ok, frame_bgr = cap.retrieve()
+                    if ok:
+                        frame_bgr = resize_long_edge(frame_bgr, coarse_resolution)
+                        self._cache_frame(job_id, total_frames, frame_bgr)
+                        self._offer_keyframe(job_id, total_frames, frame_bgr)
+                        res, gated = self._infer_frame(detector, frame_bgr, (coarse_h, coarse_w), detect_params, gate, job_id,
+                                                       model_path=detector.model_path)
+                        detections[total_frames] = self._build_detection(res, total_frames, frame_bgr.shape, video_width, video_height)
+                        if gated:
+                            detections[total_frames][1]["is_gated"] = True
+                        else:
+                            self._offer_training_frame(job_id, total_frames, frame_bgr, res)
+                        coarse_indices.append(total_frames)
+                total_frames += 1
+        finally:
+            cap.release()
+        _JOB_STORE[job_id]["progress"] = len(coarse_indices)
+        
+        # 2. 定位快速阶段窗口
+        sparse_trajectory = [[detections[i][1]["norm_x"], detections[i][1]["norm_y"]] for i in coarse_indices]
+        window = scheduler.locate_dense_window(coarse_indices, sparse_trajectory, total_frames, audio_window)
+        if window is None:
+            # 无法定位时退回全量逐帧检测，保证结果正确性
+            print("⚠️ 无法定位快速阶段，退回逐帧检测")
+            window = (0, total_frames - 1)
+        
+        # 3. 快速阶段窗口逐帧全分辨率检测（覆盖窗口内的粗扫描结果）
+        dense_start, dense_end = window
+        print(f"🎯 快速阶段逐帧检测: 帧{dense_start} - 帧{dense_end}")
+        frame_idx = dense_start
+        if gate is not None:
+            # 分辨率变化，参考帧作废
+            gate.reset()
+        for ok, frame_bgr in iter_video_frames(video_path, sample_stride=1, max_size=dense_resolution, start_frame=dense_start, end_frame=dense_end):
+            if not ok:
+                break
+            self._check_cancelled(job_id)
+            self._cache_frame(job_id, frame_idx, frame_bgr)
+            self._offer_keyframe(job_id, frame_idx, frame_bgr)
+            res, gated = self._infer_frame(detector, frame_bgr, dense_imgsz, detect_params, gate, job_id,
+                                           model_path=detector.model_path)
+            detections[frame_idx] = self._build_detection(res, frame_idx, frame_bgr.shape, video_width, video_height)
+            if gated:
+                detections[frame_idx][1]["is_gated"] = True
+            else:
+                self._offer_training_frame(job_id, frame_idx, frame_bgr, res)
+            frame_idx += 1
+            if frame_idx % 100 == 0:
+                _JOB_STORE[job_id]["progress"] = len(detections)
+        
+        # 4. 窗口外未推理的帧用AutoFillStrategy插值补齐
+        trajectory, frame_detections, interpolated_count = self._fill_skipped_frames(
+            detections, total_frames, sparse_fill_max_gap(stride), video_width, video_height
+        )
+        
+        inferred_frames = len(detections)
+        scheduling_info = {
+            "mode": "phase_aware",
+            "coarse_stride": stride,
+            "coarse_resolution": coarse_resolution,
+            "dense_window": [dense_start, dense_end],
+            "inferred_frames": inferred_frames,
+            "interpolated_frames": interpolated_count,
+            "skipped_ratio": round(1 - inferred_frames / total_frames, 3) if total_frames > 0 else 0.0
+        }
+        print(f"✅ 分阶段调度完成: 推理 {inferred_frames}/{total_frames} 帧，插值 {interpolated_count} 帧")
+        return trajectory, frame_detections, scheduling_info
+    
+    def _fill_skipped_frames(self, detections: Dict[int, Tuple[List[int], Dict[str, Any]]], total_frames: int, max_gap: int, video_width: int, video_height: int) -> Tuple[List[List[int]], List[Dict[str, Any]], int]:
+        """未推理的帧用AutoFillStrategy插值补齐（标记 is_interpolated），返回 (轨迹, frame_detections, 插值帧数)"""
+        norm_trajectory = []
+        for i in range(total_frames):
+            if i in detections:
+                det = detections[i][1]
+                norm_trajectory.append([det["norm_x"], det["norm_y"]])
+            else:
+                norm_trajectory.append([0.0, 0.0])
+        filled = TrajectoryOptimizer().optimize_with_strategy(norm_trajectory, "auto_fill", max_gap=max_gap)
+        
+        trajectory = []
+        frame_detections = []
+        interpolated_count = 0
+        for i in range(total_frames):
+            if i in detections:
+                point, detection = detections[i]
+            else:
+                nx, ny = filled[i] if i < len(filled) else (0.0, 0.0)
+                if nx != 0 and ny != 0:
+                    point = [int(nx * video_width), int(ny * video_height)]
+                    detection = {
+                        "frame": i,
+                        "x": point[0],
+                        "y": point[1],
+                        "norm_x": self._safe_float(nx),
+                        "norm_y": self._safe_float(ny),
+                        "confidence": 0.5,  # 插值数据给一个中等置信度
+                        "detected": True,
+                        "is_interpolated": True
+                    }
+                else:
+                    point = [0, 0]
+                    detection = {
+                        "frame": i,
+                        "x": 0,
+                        "y": 0,
+                        "norm_x": 0.0,
+                        "norm_y": 0.0,
+                        "confidence": 0.0,
+                        "detected": False,
+                        "is_interpolated": True
+                    }
+                interpolated_count += 1
+            trajectory.append(point)
+            frame_detections.append(detection)
+        return trajectory, frame_detections, interpolated_count
+    
+    def _detect_with_deadline(self, job_id: str, detector: YOLOv8Detector, video_path: str, video_width: int, video_height: int, resolution: int, detect_params: Dict[str, Any], controller: DeadlineController, gate: Optional[MotionGate] = None) -> Tuple[List[List[int]], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        带截止时间的逐帧检测
+        
+        按实时吞吐量逐级降级（加大帧步长 / 降低分辨率 / 切换廉价模型），跳过的帧插值补齐；
+        检测预算用完时停止，只返回已处理部分的轨迹。
+        """
+        from app.routes.analyze import _JOB_STORE
+        
+        model_tiers = self.config.get("model_tiers", {})
+        detections: Dict[int, Tuple[List[int], Dict[str, Any]]] = {}
+        cap = cv2.VideoCapture(video_path)
+        frame_idx = 0
+        try:
+            # 跳过的帧只 grab 不转换像素格式
+            while cap.grab():
+                self._check_cancelled(job_id)
+                if controller.expired(frame_idx):
+                    break
+                if frame_idx % controller.stride == 0:
+                    ok, frame_bgr = cap.retrieve()
+                    if ok:
+                        current_resolution = min(resolution, controller.resolution) if controller.resolution else resolution
+                        frame_bgr = resize_long_edge(frame_bgr, current_resolution)
+                        self._cache_frame(job_id, frame_idx, frame_bgr)
+                        self._offer_keyframe(job_id, frame_idx, frame_bgr)
+                        yolo_w, yolo_h = self._yolo_input_size(video_width, video_height, current_resolution)
+                        res, gated = self._infer_frame(detector, frame_bgr, (yolo_h, yolo_w), detect_params, gate, job_id,
+                                                       model_path=model_tiers.get(controller.model_tier))
+                        detections[frame_idx] = self._build_detection(res, frame_idx, frame_bgr.shape, video_width, video_height)
+                        if gated:
+                            detections[frame_idx][1]["is_gated"] = True
+                        else:
+                            self._offer_training_frame(job_id, frame_idx, frame_bgr, res)
+                frame_idx += 1
+                step = controller.update(frame_idx)
+                if step is not None and step["type"] in ("resolution", "model") and gate is not None:
+                    # 输入尺寸或模型变化，参考帧和复用结果作废
+                    gate.reset()
+                if frame_idx % 100 == 0:
+                    _JOB_STORE[job_id]["progress"] = frame_idx
+        finally:
+            cap.release()
+        
+        trajectory, frame_detections, interpolated_count = self._fill_skipped_frames(
+            detections, frame_idx, sparse_fill_max_gap(controller.stride), video_width, video_height
+        )
+        inferred_frames = len(detections)
+        scheduling_info = {
+            "mode": "deadline",
+            "inferred_frames": inferred_frames,
+            "interpolated_frames": interpolated_count,
+            "skipped_ratio": round(1 - inferred_frames / frame_idx, 3) if frame_idx > 0 else 0.0
+        }
+        print(f"✅ 截止时间模式检测完成: 处理 {frame_idx} 帧，推理 {inferred_frames} 帧，降级 {len(controller.degradations)} 次")
+        return trajectory, frame_detections, scheduling_info
+    
+    def _detect_with_tracking(self, job_id: str, detector: YOLOv8Detector, video_path: str, video_width: int, video_height: int, resolution: int, imgsz: Tuple[int, int], detect_params: Dict[str, Any], gate: Optional[MotionGate] = None) -> Tuple[List[List[int]], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        检测器 + 光流跟踪混合检测
+        
+        检测器只在关键帧运行；关键帧之间用杆头周围小块区域的稀疏光流传播位置（标记 is_tracked）。
+        跟踪失败或跟踪质量（光流一致性，初始化时为 1.0，与检测置信度无关）低于阈值时强制重新检测。
+        """
+        from app.routes.analyze import _JOB_STORE
+        
+        track_config = self.config.get("tracking", {})
+        keyframe_interval = max(1, track_config.get("keyframe_interval", 10))
+        min_confidence = track_config.get("min_confidence", 0.35)
+        tracker = ClubHeadFlowTracker(
+            patch_radius=track_config.get("patch_radius", 24),
+            search_radius=track_config.get("search_radius", 48),
+            fb_error_threshold=track_config.get("fb_error_threshold", 1.5)
+        )
+        
+        trajectory = []
+        frame_detections = []
+        keyframes = 0
+        tracked_frames = 0
+        forced_detections = 0
+        frames_since_keyframe = 0
+        frame_idx = 0
+        for ok, frame_bgr in iter_video_frames(video_path, sample_stride=1, max_size=resolution):
+            if not ok:
+                break
+            self._check_cancelled(job_id)
+            self._cache_frame(job_id, frame_idx, frame_bgr)
+            self._offer_keyframe(job_id, frame_idx, frame_bgr)
+            gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+            
+            tracked = None
+            if tracker.active and frames_since_keyframe < keyframe_interval:
+                tracked = tracker.track(gray)
+                if tracked is None or tracker.quality < min_confidence:
+                    # 跟踪丢失或跟踪质量过低，强制检测
+                    tracked = None
+                    forced_detections += 1
+            
+            if tracked is not None:
+                point, detection = self._build_detection(tracked, frame_idx, frame_bgr.shape, video_width, video_height)
+                detection["is_tracked"] = True
+                tracked_frames += 1
+                frames_since_keyframe += 1
+            else:
+                res, gated = self._infer_frame(detector, frame_bgr, imgsz, detect_params, gate, job_id,
+                                               model_path=detector.model_path)
+                point, detection = self._build_detection(res, frame_idx, frame_bgr.shape, video_width, video_height)
+                if gated:
+                    detection["is_gated"] = True
+                else:
+                    self._offer_training_frame(job_id, frame_idx, frame_bgr, res)
+                if res is not None:
+                    tracker.init(gray, (res[0], res[1]), res[2])
+                else:
+                    tracker.reset()
+                keyframes += 1
+                frames_since_keyframe = 0
+            
+            trajectory.append(point)
+            frame_detections.append(detection)
+            frame_idx += 1
+            if frame_idx % 100 == 0:
+                _JOB_STORE[job_id]["progress"] = frame_idx
+        
+        scheduling_info = {
+            "mode": "tracking",
+            "keyframe_interval": keyframe_interval,
+            "inferred_frames": keyframes,
+            "tracked_frames": tracked_frames,
+            "forced_detections": forced_detections,
+            "skipped_ratio": round(tracked_frames / frame_idx, 3) if frame_idx > 0 else 0.0
+        }
+        print(f"✅ 混合跟踪完成: 检测 {keyframes} 帧，光流跟踪 {tracked_frames} 帧，强制重检 {forced_detections} 次")
+        return trajectory, frame_detections, scheduling_info
     
     def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """获取任务状态 - 保持原有逻辑"""
@@ -0,0 +1,703 @@
+"""
+视频转换服务
+转换任务进入有界队列，由固定数量的工作线程执行，超过并发数的任务排队而不是各自起一个 ffmpeg。
+ffmpeg 以 `-progress pipe:1` 输出机器可读的进度（out_time、fps、speed），解析为真实的百分比和剩余时间；
+每个任务的 ffmpeg 线程数按 CPU 核数 / 并发数封顶，并发转换之间不会互相抢占。
+
+转换前先用 ffprobe 读取流信息，选择代价最低的有效操作：
+    copy             已是 faststart 的 H.264/AAC MP4，直接复制
+    remux            视频/音频编码浏览器可播放，只换容器并加 +faststart（流复制，秒级完成）
+    audio_transcode  视频可直接复制，只把音频转成 AAC
+    reencode         完整重编码为 H.264
+输出按输入内容的 sha256 缓存：流复制类输出与质量无关（{sha256}_stream.mp4），重编码按质量档位区分
+（{sha256}_{quality}.mp4），同一视频重复上传直接命中缓存。
+
+分析接口的合并任务（convert=true）不经过队列：分析的顺序解码直接由一个 ffmpeg 进程完成，
+解码结果同时送往 H.264 编码器和检测管道（见 iter_fused_frames），视频只解码一次。
+
+长视频的完整重编码分段并行：先流复制按关键帧切成 N 段（只含视频），N 个 ffmpeg 进程同时编码，
+再用 concat demuxer 无损拼接并一次性编码音频。N 由空闲 CPU 核数（扣除系统负载和其他转换任务占用）决定。
+"""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+
+from analyzer.ffmpeg import iter_tee_frames, mp4_moov_end
+from app.config import VIDEO_ANALYSIS_CONFIG
+
+# 浏览器可直接播放的像素格式（按视频编码）
+_BROWSER_PIX_FMTS = {
+    "h264": {"yuv420p", "yuvj420p"},
+    "hevc": {"yuv420p", "yuv420p10le"},
+}
+_BROWSER_AUDIO_CODECS = {"aac", "mp3"}
+
+
+class ConversionQueueFull(Exception):
+    """排队的转换任务已达上限"""
+
+
+def check_video_compatibility(video_path: str) -> Dict[str, Any]:
+    """检查视频兼容性"""
+    try:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return {"compatible": False, "error": "无法打开视频文件"}
+
+        # 获取视频信息
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc_str = ''.join([chr((fourcc >> 8 * i) & 0xFF) for i in range(4)])
+
+        cap.release()
+
+        # 检查编码格式兼容性
+        compatible_formats = ['h264', 'H264', 'avc1', 'AVC1']
+        is_compatible = fourcc_str.lower() in [fmt.lower() for fmt in compatible_formats]
+
+        return {
+            "compatible": is_compatible,
+            "video_info": {
+                "width": width,
+                "height": height,
+                "fps": fps,
+                "frame_count": frame_count,
+                "codec": fourcc_str,
+                "aspect_ratio": width / height if height > 0 else 0
+            },
+            "compatibility": {
+                "browser_playback": is_compatible,
+                "backend_processing": True,
+                "recommended_format": "H.264 encoded MP4" if not is_compatible else "Current format is compatible"
+            }
+        }
+
+    except Exception as e:
+        return {"compatible": False, "error": str(e)}
+
+
+def check_ffmpeg_available() -> bool:
+    """检查FFmpeg是否可用"""
+    try:
+        result = subprocess.run(['ffmpeg', '-version'],
+                              capture_output=True, text=True, timeout=5)
+        return result.returncode == 0
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return False
+
+
+def run_ffmpeg_with_progress(cmd: List[str], duration_s: Optional[float],
+                             on_progress: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    运行 ffmpeg 并解析 `-progress pipe:1` 输出
+
+    cmd 中不需要包含 -progress 参数（这里插入到输入参数之前）。每个进度块（以 progress= 行结束）
+    回调一次 on_progress({"percent", "fps", "speed", "eta_seconds", "out_time_s"})。
+    失败时抛出 RuntimeError，附带 stderr 的最后几行。
+    """
+    cmd = [cmd[0], "-hide_banner", "-nostats", "-progress", "pipe:1"] + cmd[1:]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+    stderr_tail: deque = deque(maxlen=20)
+
+    def _drain_stderr() -> None:
+        for line in process.stderr:
+            stderr_tail.append(line.rstrip())
+
+    stderr_thread = threading.Thread(target=_drain_stderr, daemon=True)
+    stderr_thread.start()
+    block: Dict[str, str] = {}
+    for line in process.stdout:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        block[key] = value
+        if key != "progress":
+            continue
+        out_time_s = None
+        out_time_us = block.get("out_time_us") or block.get("out_time_ms")  # 两者单位都是微秒
+        if out_time_us and out_time_us.lstrip("-").isdigit():
+            out_time_s = max(0.0, int(out_time_us) / 1_000_000)
+        try:
+            speed = float(block.get("speed", "").rstrip("x"))
+        except ValueError:
+            speed = None
+        try:
+            fps = float(block.get("fps", ""))
+        except ValueError:
+            fps = None
+        percent = None
+        eta = None
+        if duration_s and out_time_s is not None:
+            percent = min(100.0, out_time_s * 100 / duration_s)
+            if speed:
+                eta = max(0.0, (duration_s - out_time_s) / speed)
+        if value == "end":
+            percent, eta = 100.0, 0.0
+        on_progress({
+            "percent": percent,
+            "fps": fps,
+            "speed": speed,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "out_time_s": out_time_s
+        })
+        block = {}
+    process.wait()
+    stderr_thread.join(timeout=1.0)
+    if process.returncode != 0:
+        raise RuntimeError("FFmpeg转换失败: " + "\n".join(stderr_tail))
+
+
+def probe_video(path: str) -> Optional[Dict[str, Any]]:
+    """ffprobe 读取第一条视频流/音频流和容器信息；ffprobe 不可用或解析失败时返回 None"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries",
+             "stream=index,codec_type,codec_name,pix_fmt:format=format_name,duration", "-of", "json", path],
+            capture_output=True, text=True, timeout=30
+        )
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        return None
+    streams = data.get("streams", [])
+    video = next((st for st in streams if st.get("codec_type") == "video"), None)
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), None)
+    fmt = data.get("format", {})
+    try:
+        duration = float(fmt.get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return {
+        "video_codec": video.get("codec_name") if video else None,
+        "pix_fmt": video.get("pix_fmt") if video else None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "format_name": fmt.get("format_name", ""),
+        "duration": duration
+    }
+
+
+def is_faststart(path: str) -> bool:
+    """MP4 的 moov 是否在 mdat 之前"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64 * 1024)
+    except OSError:
+        return False
+    return bool(mp4_moov_end(head))
+
+
+def plan_conversion(path: str, probe: Optional[Dict[str, Any]], copy_video_codecs: List[str]) -> Dict[str, Any]:
+    """
+    选择代价最低的有效转换方式
+
+    Returns:
+        {"mode": "copy" | "remux" | "audio_transcode" | "reencode", "reason": 说明, "probe": ffprobe 信息}
+    """
+    if probe is None or not probe.get("video_codec"):
+        return {"mode": "reencode", "reason": "无法读取视频流信息，完整重编码", "probe": probe}
+    video_codec = probe["video_codec"]
+    if video_codec not in copy_video_codecs or probe.get("pix_fmt") not in _BROWSER_PIX_FMTS.get(video_codec, ()):
+        return {"mode": "reencode", "reason": f"视频编码 {video_codec}/{probe.get('pix_fmt')} 浏览器不兼容，重编码为 H.264", "probe": probe}
+    audio_codec = probe.get("audio_codec")
+    if audio_codec is not None and audio_codec not in _BROWSER_AUDIO_CODECS:
+        return {"mode": "audio_transcode", "reason": f"视频流可直接复制，音频 {audio_codec} 转为 AAC", "probe": probe}
+    is_mp4 = os.path.splitext(path)[1].lower() in (".mp4", ".m4v") and "mp4" in probe.get("format_name", "")
+    if is_mp4 and video_codec == "h264" and is_faststart(path):
+        return {"mode": "copy", "reason": "已是 faststart 的 H.264 MP4，直接复制", "probe": probe}
+    return {"mode": "remux", "reason": "编码兼容，只需更换容器并前置 moov（流复制）", "probe": probe}
+
+
+class VideoConversionService:
+    """有界队列 + 固定工作线程的视频转换服务"""
+
+    QUALITY_SETTINGS = {
+        "high": ["-crf", "18", "-preset", "slow"],
+        "medium": ["-crf", "23", "-preset", "medium"],
+        "low": ["-crf", "28", "-preset", "fast"]
+    }
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.workers = max(1, int(config.get("workers", 2)))
+        self.max_queue = config.get("max_queue", 20)
+        self.ffmpeg_threads = config.get("ffmpeg_threads") or max(1, (os.cpu_count() or 1) // self.workers)
+        self.copy_video_codecs = config.get("copy_video_codecs", ["h264"])
+        self.cache_dir = config.get("cache_dir", "/tmp/golftracker_convert_cache")
+        self.cache_ttl_seconds = config.get("cache_ttl_seconds", 7 * 24 * 3600)
+        self.segment_config = config.get("segmented", {})
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: deque = deque()  # 排队中的 job_id（用于计算排队位置）
+        self._active = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="convert")
+        self._lock = threading.Lock()
+
+    @property
+    def active_conversions(self) -> int:
+        return self._active
+
+    @property
+    def queue_length(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """排队位置（1 表示下一个执行），不在队列中返回 None"""
+        with self._lock:
+            try:
+                return self._queue.index(job_id) + 1
+            except ValueError:
+                return None
+
+    def plan(self, input_path: str) -> Dict[str, Any]:
+        """ffprobe 并选择转换方式"""
+        return plan_conversion(input_path, probe_video(input_path), self.copy_video_codecs)
+
+    def cache_path(self, sha256: str, variant: str) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], f"{sha256}_{variant}.mp4")
+
+    def lookup_cache(self, sha256: str, quality: str) -> Optional[str]:
+        """已缓存的转换结果（流复制类输出对任何质量档位都有效）"""
+        for variant in ("stream", quality):
+            path = self.cache_path(sha256, variant)
+            if os.path.exists(path):
+                os.utime(path)  # 命中即续期
+                return path
+        return None
+
+    def submit(self, job_id: str, input_path: str, output_path: str, quality: str = "medium",
+               sha256: Optional[str] = None, plan: Optional[Dict[str, Any]] = None, **job_fields) -> Dict[str, Any]:
+        """
+        登记并排队一个转换任务
+
+        传入 sha256 时先查转换缓存，命中则任务直接完成（不排队、不运行 ffmpeg），输出指向缓存文件；
+        未命中时输出写入缓存，output_path 被忽略。
+
+        Raises:
+            ConversionQueueFull: 排队任务数已达上限
+        """
+        if sha256:
+            job = self._cache_hit_job(job_id, sha256, quality, **job_fields)
+            if job is not None:
+                try:
+                    os.remove(input_path)
+                except OSError:
+                    pass
+                return job
+            variant = quality if (plan or {}).get("mode", "reencode") == "reencode" else "stream"
+            output_path = self.cache_path(sha256, variant)
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                raise ConversionQueueFull(f"排队的转换任务已达上限 {self.max_queue}")
+            job = {
+                "status": "queued",
+                "progress": 0,
+                "output_path": output_path,
+                "quality": quality,
+                "mode": (plan or {}).get("mode"),
+                "cache_hit": False,
+                "created_at": time.time(),
+                **job_fields
+            }
+            self.jobs[job_id] = job
+            self._queue.append(job_id)
+        self._executor.submit(self._run, job_id, input_path, output_path, quality, plan)
+        return job
+
+    def _cache_hit_job(self, job_id: str, sha256: str, quality: str, **job_fields) -> Optional[Dict[str, Any]]:
+        """命中缓存时登记一个已完成的任务并返回，未命中返回 None"""
+        cached = self.lookup_cache(sha256, quality)
+        if cached is None:
+            return None
+        job = {
+            "status": "completed",
+            "progress": 100,
+            "message": "命中转换缓存，无需重新转换",
+            "output_path": cached,
+            "quality": quality,
+            "cache_hit": True,
+            "created_at": time.time(),
+            **job_fields
+        }
+        self.jobs[job_id] = job
+        print(f"♻️ 转换缓存命中: {sha256[:12]} ({quality})")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def register_fused(self, job_id: str, quality: str = "medium", sha256: Optional[str] = None,
+                       **job_fields) -> Dict[str, Any]:
+        """
+        登记与分析任务合并的转换（转换任务与分析任务使用同一个 id）
+
+        命中缓存时直接完成，分析按普通方式解码；否则等待分析的解码循环通过 iter_fused_frames 执行。
+        """
+        if sha256:
+            job = self._cache_hit_job(job_id, sha256, quality, **job_fields)
+            if job is not None:
+                return job
+        output_path = self.cache_path(sha256, quality) if sha256 else \
+            os.path.join(tempfile.gettempdir(), f"converted_{job_id[:8]}.mp4")
+        job = {
+            "status": "queued",
+            "progress": 0,
+            "message": "等待分析任务解码",
+            "output_path": output_path,
+            "quality": quality,
+            "mode": "fused",
+            "cache_hit": False,
+            "created_at": time.time(),
+            **job_fields
+        }
+        self.jobs[job_id] = job
+        return job
+
+    def fused_pending(self, job_id: Optional[str]) -> bool:
+        """是否有等待分析解码执行的合并转换"""
+        job = self.jobs.get(job_id)
+        return job is not None and job.get("mode") == "fused" and job.get("status") == "queued"
+
+    def abandon_fused(self, job_id: str, reason: str) -> None:
+        """分析任务结束时合并转换仍未执行（取消、失败或使用了需要随机访问的检测方式）"""
+        if self.fused_pending(job_id):
+            job = self.jobs[job_id]
+            job["status"] = "error"
+            job["error"] = reason
+            job["finished_at"] = time.time()
+
+    def iter_fused_frames(self, job_id: str, input_path: str, width: int, height: int, max_size: int,
+                          start_frame: int = 0, frame_count: int = 0):
+        """
+        合并任务的解码源：一个 ffmpeg 进程解码一次，编码输出 H.264 MP4，同时产出缩放后的 BGR 帧
+
+        编码速度跟随检测消费帧的速度；帧全部取完且 ffmpeg 正常退出后原子替换到输出路径，
+        提前停止（取消/出错）时转换任务标记为失败。
+        """
+        job = self.jobs[job_id]
+        output_path = job["output_path"]
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = output_path + f".{job_id[:8]}.tmp.mp4"
+        threads = str(self.ffmpeg_threads)
+        encode_args = [
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-threads", threads
+        ] + self.QUALITY_SETTINGS.get(job["quality"], self.QUALITY_SETTINGS["medium"]) + [
+            "-c:a", "aac", "-movflags", "+faststart", "-f", "mp4"
+        ]
+        job["status"] = "converting"
+        job["message"] = ""
+        job["started_at"] = time.time()
+        result: Dict[str, Any] = {}
+        idx = start_frame
+        try:
+            for item in iter_tee_frames(input_path, width, height, tmp_path, encode_args, max_size, start_frame, result):
+                yield item
+                idx += 1
+                if frame_count and idx % 30 == 0:
+                    job["progress"] = min(99, int(idx * 100 / frame_count))
+        finally:
+            if result.get("returncode") == 0:
+                os.replace(tmp_path, output_path)
+                job["status"] = "completed"
+                job["progress"] = 100
+                job["message"] = "视频转换完成（H.264格式，与分析共用一次解码）"
+                print(f"🎞️ 合并转换完成: {job_id}")
+            else:
+                job["status"] = "error"
+                job["error"] = result.get("stderr") or "分析任务提前结束，转换未完成"
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            job["finished_at"] = time.time()
+
+    def _run(self, job_id: str, input_path: str, output_path: str, quality: str, plan: Optional[Dict[str, Any]] = None) -> None:
+        """后台视频转换任务（先写临时文件，成功后原子替换到输出路径，缓存中不会出现半个文件）"""
+        with self._lock:
+            try:
+                self._queue.remove(job_id)
+            except ValueError:
+                pass
+            self._active += 1
+        job = self.jobs[job_id]
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = output_path + f".{job_id[:8]}.tmp.mp4"
+        try:
+            job["status"] = "converting"
+            job["started_at"] = time.time()
+
+            plan = plan or self.plan(input_path)
+            job["mode"] = plan["mode"]
+            print(f"🎞️ 转换方式: {plan['mode']}（{plan['reason']}）")
+            if plan["mode"] == "copy":
+                # 如果已经兼容，直接复制文件
+                shutil.copy2(input_path, tmp_path)
+                job["message"] = "视频已经是兼容格式，无需转换"
+            elif not check_ffmpeg_available():
+                # 如果FFmpeg不可用，使用OpenCV进行简单转换；结果可能不是 H.264，不写入内容哈希缓存，
+                # 否则之后即使装好 ffmpeg，同一视频也会一直命中这份结果
+                if os.path.abspath(output_path).startswith(os.path.abspath(self.cache_dir) + os.sep):
+                    output_path = os.path.join(tempfile.gettempdir(), f"converted_{job_id[:8]}.mp4")
+                    tmp_path = output_path + f".{job_id[:8]}.tmp.mp4"
+                self._convert_with_opencv(job_id, input_path, tmp_path)
+            else:
+                duration_s = (plan.get("probe") or {}).get("duration")
+                if duration_s is None:
+                    video_info = (job.get("compatibility") or check_video_compatibility(input_path)).get("video_info", {})
+                    duration_s = video_info["frame_count"] / video_info["fps"] if video_info.get("fps") else None
+                segments = self._segment_count(duration_s) if plan["mode"] == "reencode" else 1
+                converted = False
+                if segments > 1:
+                    try:
+                        self._convert_segmented(job_id, input_path, tmp_path, quality, duration_s, segments)
+                        converted = True
+                    except RuntimeError as e:
+                        print(f"⚠️ 分段并行转换失败，改为单进程转换: {e}")
+                if not converted:
+                    self._convert_with_ffmpeg(job_id, input_path, tmp_path, quality, duration_s, plan)
+            os.replace(tmp_path, output_path)
+            job["output_path"] = output_path
+            job["status"] = "completed"
+            job["progress"] = 100
+        except Exception as e:
+            job["status"] = "error"
+            job["error"] = str(e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        finally:
+            # 清理输入文件
+            try:
+                os.remove(input_path)
+            except OSError:
+                pass
+            job["finished_at"] = time.time()
+            with self._lock:
+                self._active = max(0, self._active - 1)
+
+    def _ffmpeg_command(self, input_path: str, output_path: str, quality: str, plan: Dict[str, Any]) -> List[str]:
+        """按转换方式构建 ffmpeg 命令（只保留第一条视频流和音频流，丢弃 iPhone 的元数据轨道）"""
+        threads = str(self.ffmpeg_threads)
+        cmd = ["ffmpeg", "-threads", threads, "-i", input_path, "-map", "0:v:0", "-map", "0:a:0?"]
+        mode = plan["mode"]
+        probe = plan.get("probe") or {}
+        if mode in ("remux", "audio_transcode"):
+            cmd += ["-c:v", "copy"]
+            if probe.get("video_codec") == "hevc":
+                cmd += ["-tag:v", "hvc1"]  # Safari/iOS 只播放 hvc1 标记的 HEVC
+            cmd += ["-c:a", "copy"] if mode == "remux" else ["-c:a", "aac", "-b:a", "160k"]
+        else:
+            cmd += [
+                "-c:v", "libx264",  # 使用H.264编码器
+                "-pix_fmt", "yuv420p",
+                "-c:a", "aac",      # 音频编码器
+                "-threads", threads
+            ] + self.QUALITY_SETTINGS.get(quality, self.QUALITY_SETTINGS["medium"])
+        cmd += [
+            "-movflags", "+faststart",  # 优化网络播放
+            "-f", "mp4",
+            "-y",  # 覆盖输出文件
+            output_path
+        ]
+        return cmd
+
+    def _convert_with_ffmpeg(self, job_id: str, input_path: str, output_path: str, quality: str,
+                             duration_s: Optional[float], plan: Optional[Dict[str, Any]] = None) -> None:
+        """使用FFmpeg转换（流复制或 H.264 重编码；解码和编码线程数按并发数封顶）"""
+        job = self.jobs[job_id]
+        plan = plan or {"mode": "reencode"}
+        cmd = self._ffmpeg_command(input_path, output_path, quality, plan)
+        print(f"执行FFmpeg命令: {' '.join(cmd)}")
+
+        def on_progress(progress: Dict[str, Any]) -> None:
+            if progress["percent"] is not None:
+                job["progress"] = int(progress["percent"])
+            job["fps"] = progress["fps"]
+            job["speed"] = progress["speed"]
+            job["eta_seconds"] = progress["eta_seconds"]
+
+        run_ffmpeg_with_progress(cmd, duration_s, on_progress)
+        job["message"] = {
+            "remux": "视频转换完成（流复制，仅更换容器）",
+            "audio_transcode": "视频转换完成（视频流复制，音频转为AAC）"
+        }.get(plan["mode"], "视频转换完成（H.264格式）")
+        job["eta_seconds"] = 0
+        print("FFmpeg转换成功")
+
+    def _segment_count(self, duration_s: Optional[float]) -> int:
+        """
+        分段并行转换的段数（1 表示不分段）
+
+        空闲核数 = CPU 核数 - max(系统 1 分钟负载, 其他转换任务占用的 ffmpeg 线程)，
+        每段占用 threads_per_segment 个核，且每段不短于 min_segment_seconds。
+        """
+        config = self.segment_config
+        if not config.get("enabled", True) or not duration_s or duration_s < config.get("min_duration_seconds", 120):
+            return 1
+        cores = os.cpu_count() or 1
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            load = 0.0
+        busy = max(load, (self.active_conversions - 1) * self.ffmpeg_threads)
+        idle_cores = max(0.0, cores - busy)
+        by_cores = int(idle_cores // max(1, config.get("threads_per_segment", 2)))
+        by_duration = int(duration_s // max(1, config.get("min_segment_seconds", 30)))
+        return max(1, min(by_cores, by_duration, config.get("max_segments", 8)))
+
+    def _convert_segmented(self, job_id: str, input_path: str, output_path: str, quality: str,
+                           duration_s: float, segments: int) -> None:
+        """按关键帧切段 -> 并行编码视频 -> concat demuxer 拼接并编码音频"""
+        job = self.jobs[job_id]
+        threads = str(max(1, self.segment_config.get("threads_per_segment", 2)))
+        work_dir = tempfile.mkdtemp(prefix=f"segments_{job_id[:8]}_", dir=os.path.dirname(output_path))
+        try:
+            # 1. 流复制切段：segment muxer 在指定时间之后的第一个关键帧处切开
+            split_times = ",".join(f"{duration_s * i / segments:.3f}" for i in range(1, segments))
+            run_ffmpeg_with_progress([
+                "ffmpeg", "-i", input_path, "-map", "0:v:0", "-c", "copy", "-an",
+                "-f", "segment", "-segment_times", split_times, "-reset_timestamps", "1",
+                "-y", os.path.join(work_dir, "src_%03d.mkv")
+            ], None, lambda _: None)
+            sources = sorted(name for name in os.listdir(work_dir) if name.startswith("src_"))
+            if not sources:
+                raise RuntimeError("切段后没有输出")
+            durations = []
+            for name in sources:
+                probe = probe_video(os.path.join(work_dir, name))
+                durations.append((probe or {}).get("duration") or duration_s / len(sources))
+            print(f"✂️ 分段并行转换: {len(sources)} 段，每段 {threads} 线程")
+            job["segments"] = len(sources)
+
+            # 2. 并行编码各段，进度按各段已编码时长汇总
+            segment_progress: Dict[int, Dict[str, Any]] = {}
+            progress_lock = threading.Lock()
+
+            def encode(i: int) -> str:
+                src = os.path.join(work_dir, sources[i])
+                dst = os.path.join(work_dir, f"enc_{i:03d}.mp4")
+
+                def on_progress(progress: Dict[str, Any]) -> None:
+                    with progress_lock:
+                        segment_progress[i] = progress
+                        done = sum(min(p["out_time_s"] or 0.0, durations[k]) for k, p in segment_progress.items())
+                        speed = sum(p["speed"] or 0.0 for p in segment_progress.values())
+                        job["progress"] = int(min(99.0, done * 100 / sum(durations)))
+                        job["fps"] = sum(p["fps"] or 0.0 for p in segment_progress.values())
+                        job["speed"] = round(speed, 2)
+                        job["eta_seconds"] = round((sum(durations) - done) / speed, 1) if speed else None
+
+                run_ffmpeg_with_progress([
+                    "ffmpeg", "-threads", threads, "-i", src,
+                    "-c:v", "libx264", "-pix_fmt", "yuv420p", "-threads", threads
+                ] + self.QUALITY_SETTINGS.get(quality, self.QUALITY_SETTINGS["medium"]) + [
+                    "-an", "-f", "mp4", "-y", dst
+                ], durations[i], on_progress)
+                return dst
+
+            with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix=f"segment-{job_id[:8]}") as pool:
+                encoded = list(pool.map(encode, range(len(sources))))
+
+            # 3. 无损拼接视频，音频从原文件一次性编码
+            list_path = os.path.join(work_dir, "concat.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                for path in encoded:
+                    f.write(f"file '{os.path.abspath(path)}'\n")
+            run_ffmpeg_with_progress([
+                "ffmpeg", "-f", "concat", "-safe", "0", "-i", list_path, "-i", input_path,
+                "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", "-c:a", "aac",
+                "-movflags", "+faststart", "-f", "mp4", "-y", output_path
+            ], None, lambda _: None)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        job["message"] = f"视频转换完成（H.264格式，{len(sources)} 段并行）"
+        job["eta_seconds"] = 0
+        print("FFmpeg分段转换成功")
+
+    def _convert_with_opencv(self, job_id: str, input_path: str, output_path: str) -> None:
+        """使用OpenCV进行转换（备用方案）"""
+        job = self.jobs[job_id]
+        cap = cv2.VideoCapture(input_path)
+        if not cap.isOpened():
+            raise Exception("无法打开输入视频文件")
+
+        # 获取视频属性
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+
+        # 创建视频写入器 - 尝试使用H.264编码器
+        fourcc = cv2.VideoWriter_fourcc(*'H264')  # 尝试H.264编码器
+        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+
+        if not out.isOpened():
+            # 如果H.264不可用，回退到mp4v
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+
+        frame_count = 0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            out.write(frame)
+            frame_count += 1
+
+            # 更新进度
+            job["progress"] = int((frame_count / total_frames) * 100) if total_frames else 0
+
+        cap.release()
+        out.release()
+
+        job["message"] = "视频转换完成（OpenCV，可能不是H.264）"
+
+    def sweep_cache(self) -> int:
+        """删除超过保留期未被使用的缓存输出（命中时会刷新修改时间）"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        now = time.time()
+        removed = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(path) > self.cache_ttl_seconds:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            print(f"🧹 清理过期转换缓存 {removed} 个")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "active_conversions": self.active_conversions,
+            "queue_length": self.queue_length,
+            "max_queue": self.max_queue,
+            "ffmpeg_threads_per_job": self.ffmpeg_threads
+        }
+
+
+# 全局视频转换服务
+video_conversion_service = VideoConversionService(VIDEO_ANALYSIS_CONFIG.get("conversion", {}))
@@ -0,0 +1,82 @@
+"""
+带缓存头的静态文件服务
+"""
+import os
+import re
+from typing import Dict, Iterator, Optional
+
+from fastapi.responses import Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    按路径前缀附加 Cache-Control 的 StaticFiles
+
+    cache_rules: [(路径前缀或后缀规则, Cache-Control 值)]，按顺序匹配第一条；
+    规则以 "*" 开头时按后缀匹配（如 "*.html"），否则按前缀匹配（相对挂载点的路径）。
+    """
+
+    def __init__(self, *args, cache_rules: Optional[Dict[str, str]] = None, default_cache_control: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_rules = cache_rules or {}
+        self.default_cache_control = default_cache_control
+
+    def cache_control_for(self, path: str) -> Optional[str]:
+        path = path.lstrip("/")
+        for rule, value in self.cache_rules.items():
+            if rule.startswith("*"):
+                if path.endswith(rule[1:]):
+                    return value
+            elif path.startswith(rule):
+                return value
+        return self.default_cache_control
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            cache_control = self.cache_control_for(path)
+            if cache_control:
+                response.headers["Cache-Control"] = cache_control
+        return response
+
+
+def _iter_file_range(path: str, start: int, length: int, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(chunk_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def file_range_response(path: str, range_header: Optional[str], media_type: str,
+                        headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    支持单个 Range 的文件响应（视频播放器拖动进度时按字节区间请求）
+
+    没有 Range 头或格式无法识别时返回整个文件（200），区间越界返回 416。
+    """
+    size = os.path.getsize(path)
+    headers = {"Accept-Ranges": "bytes", **(headers or {})}
+    match = _RANGE_RE.match(range_header.strip()) if range_header else None
+    if match is None or match.group(1) == match.group(2) == "":
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_iter_file_range(path, 0, size), media_type=media_type, headers=headers)
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # bytes=-N：最后 N 个字节
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    if start >= size or start > end:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file_range(path, start, end - start + 1), status_code=206,
+                             media_type=media_type, headers=headers)
@@ -0,0 +1,202 @@
+"""
+进程内推理服务 - 跨任务动态批处理
+
+多个分析任务同时运行时，每个线程各自调用 YOLOv8Detector._model.predict，
+ultralytics predictor 并非为并发调用设计，也无法共享任何计算。
+这里由单个工作线程统一收集所有任务提交的帧，凑批后一次前向推理，再把结果通过 Future 返回给各任务。
+
+- max_batch_size / max_wait_ms：批大小上限和凑批最长等待时间
+- 按任务轮询取帧，长视频不会饿死短视频
+- 只有推理参数 (imgsz, conf, iou, max_det) 和帧尺寸都相同的请求才会合并到同一批：
+  ultralytics 遇到尺寸不同的批会关闭最小矩形 letterbox（auto=False），检测框会随同批的其他帧变化
+- 配合模型副本池时，每个副本一个工作线程，每批借出一个副本推理
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from detector.yolov8_detector import YOLOv8Detector
+from detector.model_pool import ModelReplicaPool
+
+
+class _Request:
+    __slots__ = ("image", "params", "future")
+
+    def __init__(self, image: np.ndarray, params: Tuple, future: Future) -> None:
+        self.image = image
+        self.params = params
+        self.future = future
+
+
+class InferenceServer:
+    """跨任务动态批处理推理服务"""
+
+    def __init__(self, detector: Optional[YOLOv8Detector] = None, max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 pool: Optional[ModelReplicaPool] = None) -> None:
+        self.detector = detector or YOLOv8Detector()
+        self.pool = pool
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+
+        # job_id -> 待处理请求队列；OrderedDict 的顺序即轮询顺序
+        self._queues: "OrderedDict[str, Deque[_Request]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._closed = False
+
+        # 统计信息
+        self.batches = 0
+        self.frames = 0
+        self.inference_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+        # 有副本池时每个副本一个工作线程，否则单线程独占共享模型
+        num_workers = pool.size if pool is not None else 1
+        self._workers = [
+            threading.Thread(target=self._run, name=f"inference-server-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, job_id: str, image_bgr: np.ndarray, imgsz, conf: float = 0.01, iou: float = 0.7, max_det: int = 10) -> Future:
+        """
+        提交一帧，返回 Future，结果为 (cx, cy, conf) 或 None
+
+        Future 上附带 inference_seconds 属性：该帧分摊到的批推理耗时。
+        """
+        future: Future = Future()
+        key = (tuple(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz, float(conf), float(iou), int(max_det),
+               tuple(image_bgr.shape[:2]))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("推理服务已关闭")
+            self._queues.setdefault(job_id, deque()).append(_Request(image_bgr, key, future))
+            self._pending += 1
+            self._cond.notify()
+        return future
+
+    def release_job(self, job_id: str) -> int:
+        """任务结束/取消时丢弃其未处理的请求，返回被取消的请求数"""
+        with self._cond:
+            queue = self._queues.pop(job_id, None)
+            if not queue:
+                return 0
+            self._pending -= len(queue)
+        for req in queue:
+            req.future.cancel()
+        return len(queue)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            active_jobs = len(self._queues)
+            pending = self._pending
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait_s * 1000, 2),
+            "workers": len(self._workers),
+            "active_jobs": active_jobs,
+            "pending_frames": pending,
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0.0,
+            "avg_batch_ms": round(self.inference_seconds / self.batches * 1000, 2) if self.batches else 0.0
+        }
+
+    def _take_batch(self) -> List[_Request]:
+        """按任务轮询取请求（需持有锁）：每轮每个任务最多取一帧，直到凑满或取空"""
+        batch: List[_Request] = []
+        params = None
+        while len(batch) < self.max_batch_size:
+            progressed = False
+            for job_id in list(self._queues.keys()):
+                if len(batch) >= self.max_batch_size:
+                    break
+                queue = self._queues[job_id]
+                if not queue:
+                    continue
+                if params is None:
+                    params = queue[0].params
+                if queue[0].params != params:
+                    continue
+                batch.append(queue.popleft())
+                self._pending -= 1
+                progressed = True
+                # 被取过帧的任务移到队尾，下一批从其他任务开始
+                self._queues.move_to_end(job_id)
+                if not queue:
+                    del self._queues[job_id]
+            if not progressed:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending == 0 and not self._closed:
+                    self._cond.wait()
+                if self._closed and self._pending == 0:
+                    return
+                # 凑批：等待更多帧到达，直到批满或超时
+                deadline = time.monotonic() + self.max_wait_s
+                while self._pending < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+
+            batch = [req for req in batch if req.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            imgsz, conf, iou, max_det, _shape = batch[0].params
+            start = time.perf_counter()
+            images = [req.image for req in batch]
+            try:
+                if self.pool is not None:
+                    with self.pool.checkout() as replica:
+                        results = replica.detect_batch(images, imgsz=imgsz, conf=conf, iou=iou, max_det=max_det)
+                else:
+                    results = self.detector.detect_batch(images, imgsz=imgsz, conf=conf, iou=iou, max_det=max_det)
+            except Exception as e:
+                print(f"❌ 批推理失败 (batch={len(batch)}): {e}")
+                for req in batch:
+                    req.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            with self._stats_lock:
+                self.batches += 1
+                self.frames += len(batch)
+                self.inference_seconds += elapsed
+            share = elapsed / len(batch)
+            for req, res in zip(batch, results):
+                req.future.inference_seconds = share
+                req.future.set_result(res)
+
+
+_server: Optional[InferenceServer] = None
+_server_lock = threading.Lock()
+
+
+def get_inference_server(max_batch_size: int = 8, max_wait_ms: float = 5.0, pool: Optional[ModelReplicaPool] = None) -> InferenceServer:
+    """获取全局推理服务（首次调用时创建，参数只在创建时生效）"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = InferenceServer(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, pool=pool)
+            print(f"🧠 推理服务已启动: max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms}")
+        return _server
@@ -0,0 +1,139 @@
+"""
+模型副本池 - 并发任务的线程安全推理
+
+YOLOv8Detector._model 是所有分析线程共享的类级对象，并发调用 predict() 要么串行、要么在
+ultralytics predictor 内部状态上产生竞争。这里按模型路径维护 N 个独立的模型副本：
+任务（或推理服务的工作线程）每推理一批借出一个副本，用完归还。
+
+副本池不设置线程数或 CPU 亲和性：torch.set_num_threads 是进程级设置，会连带影响推理服务和
+不经过副本池的推理路径；os.sched_setaffinity 只作用于调用线程，torch 已创建的 OpenMP 工作线程
+不受影响。CPU 上的副本数因此按 可用核数/cores_per_replica 控制，避免过度订阅。
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from analyzer.config import MODEL_PATH
+from detector.yolov8_detector import YOLOv8Detector
+
+
+def _available_cpus() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # 非 Linux 平台
+        return list(range(os.cpu_count() or 1))
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+def describe_hardware() -> str:
+    """当前推理硬件的简短描述（性能档位基准结果据此判断是否在本机测得）"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return f"cuda:{torch.cuda.get_device_name(0)}"
+    except Exception:
+        pass
+    import platform
+    return f"cpu:{platform.processor() or platform.machine()}x{len(_available_cpus())}"
+
+
+def resolve_pool_size(size: Any = "auto", max_replicas: int = 4, cores_per_replica: int = 4) -> int:
+    """
+    解析副本数
+
+    "auto"：GPU 上使用 1 个副本（GPU 并发由批处理推理服务负责）；
+    CPU 上按可用核数 / 每副本核数计算，并受 max_replicas 限制。
+    """
+    if isinstance(size, int) or (isinstance(size, str) and size.isdigit()):
+        return max(1, int(size))
+    if _cuda_available():
+        return 1
+    return max(1, min(int(max_replicas), len(_available_cpus()) // max(1, int(cores_per_replica))))
+
+
+class _Replica:
+    __slots__ = ("index", "detector")
+
+    def __init__(self, index: int, detector: YOLOv8Detector) -> None:
+        self.index = index
+        self.detector = detector
+
+
+class ModelReplicaPool:
+    """同一模型的 N 个独立副本，借出/归还式使用"""
+
+    def __init__(self, model_path: Optional[str] = None, size: int = 1) -> None:
+        self.model_path = model_path or MODEL_PATH
+        self.size = max(1, int(size))
+
+        self._idle: "queue.Queue[_Replica]" = queue.Queue()
+        self._replicas: List[_Replica] = []
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+        # 统计信息
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+
+    def _ensure_loaded(self) -> None:
+        with self._load_lock:
+            if self._loaded:
+                return
+            for i in range(self.size):
+                detector = YOLOv8Detector(self.model_path, model=YOLOv8Detector.load_model(self.model_path))
+                replica = _Replica(i, detector)
+                self._replicas.append(replica)
+                self._idle.put(replica)
+            self._loaded = True
+            print(f"🧩 模型副本池就绪: {self.model_path} × {self.size}")
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[YOLOv8Detector]:
+        """借出一个副本，with 块结束时归还；没有空闲副本时阻塞，超过 timeout 抛出 queue.Empty"""
+        self._ensure_loaded()
+        start = time.perf_counter()
+        replica = self._idle.get(timeout=timeout)
+        self.wait_seconds += time.perf_counter() - start
+        self.checkouts += 1
+        try:
+            yield replica.detector
+        finally:
+            self._idle.put(replica)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_path": self.model_path,
+            "size": self.size,
+            "idle": self._idle.qsize() if self._loaded else self.size,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(self.wait_seconds / self.checkouts * 1000, 2) if self.checkouts else 0.0
+        }
+
+
+_pools: Dict[str, ModelReplicaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_model_pool(model_path: Optional[str] = None, size: Any = "auto", max_replicas: int = 4,
+                   cores_per_replica: int = 4) -> ModelReplicaPool:
+    """按模型路径获取全局副本池（首次调用时创建，参数只在创建时生效）"""
+    model_path = model_path or MODEL_PATH
+    with _pools_lock:
+        pool = _pools.get(model_path)
+        if pool is None:
+            pool = ModelReplicaPool(model_path, resolve_pool_size(size, max_replicas, cores_per_replica))
+            _pools[model_path] = pool
+        return pool
@@ -0,0 +1,238 @@
+"""
+多进程推理 - 写时复制共享模型权重
+
+analyze_video_job 中的 Python 侧后处理受 GIL 限制，线程无法用满所有核。
+父进程只加载一次检测器权重，并在 fork 之前做一次预热推理：ultralytics 加载时会把权重转成 float，
+首次 predict 时 AutoBackend 还会 fuse() 改写所有卷积权重，这些都必须在父进程里完成，
+否则每个工作进程各自改写一遍，得到的是私有副本。之后 fork 出的工作进程以写时复制方式共享权重页。工作进程按帧区间领取任务：长视频按帧区间切片并行检测，
+最后在父进程按帧号合并。
+
+fork 之后不能再使用 CUDA，父进程已初始化 CUDA 时不创建进程池，调用方应回退到线程模式。
+"""
+
+from __future__ import annotations
+
+import gc
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analyzer.config import MODEL_PATH
+from detector.yolov8_detector import YOLOv8Detector
+
+
+# 单帧结果：(frame_idx, (cx, cy, conf) 或 None, 帧尺寸, 是否复用了上一次推理结果)
+FrameResult = Tuple[int, Optional[Tuple[float, float, float]], Tuple[int, ...], bool]
+
+
+def _cuda_initialized() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+# ---- 工作进程侧 ----
+
+def _init_worker(threads: int) -> None:
+    """工作进程初始化：限制每个进程的线程数，避免 N 个进程各开满核"""
+    for k in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[k] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except Exception:
+        pass
+
+
+def _detect_range(task: Dict[str, Any]) -> Tuple[List[FrameResult], Dict[str, Any], List[Tuple[int, bytes]], List[int]]:
+    """
+    工作进程：检测 [start_frame, end_frame] 区间内的帧
+
+    模型来自 fork 前父进程加载的类级 YOLOv8Detector._model（写时复制共享）。
+    task 带 training_threshold 时，推理失败/低于阈值的帧在工作进程内编码为 JPEG 一并返回。
+    task 带 frame_cache 时，尺寸一致的帧直接写入父进程帧缓存的数据文件，返回写入的帧号。
+    """
+    import cv2
+    from analyzer.ffmpeg import iter_video_frames
+    from analyzer.motion_gate import MotionGate
+
+    detector = YOLOv8Detector(task.get("model_path"))
+    gate_config = task.get("motion_gate")
+    gate = MotionGate(**gate_config) if gate_config else None
+    params = task["detect_params"]
+    imgsz = tuple(task["imgsz"])
+    training_threshold = task.get("training_threshold")
+    jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, task.get("jpeg_quality", 90)]
+    cache = task.get("frame_cache")
+    cache_fd = os.open(cache["path"], os.O_WRONLY) if cache else None
+
+    results: List[FrameResult] = []
+    training_frames: List[Tuple[int, bytes]] = []
+    cached_frames: List[int] = []
+    frame_idx = task["start_frame"]
+    try:
+        for ok, frame_bgr in iter_video_frames(task["video_path"], sample_stride=1, max_size=task["resolution"],
+                                               start_frame=task["start_frame"], end_frame=task["end_frame"]):
+            if not ok:
+                break
+            if cache_fd is not None and frame_bgr.shape == tuple(cache["shape"]) and \
+                    (frame_idx + 1) * frame_bgr.nbytes <= cache["max_bytes"]:
+                os.pwrite(cache_fd, np.ascontiguousarray(frame_bgr).data, frame_idx * frame_bgr.nbytes)
+                cached_frames.append(frame_idx)
+            if gate is not None and not gate.should_infer(frame_bgr):
+                results.append((frame_idx, gate.last_result, frame_bgr.shape, True))
+            else:
+                start = time.perf_counter()
+                res = detector.detect_single_point(frame_bgr, imgsz=imgsz, **params)
+                if gate is not None:
+                    gate.record_inference(res, time.perf_counter() - start)
+                results.append((frame_idx, res, frame_bgr.shape, False))
+                if training_threshold is not None and (res is None or res[2] < training_threshold):
+                    ok, buffer = cv2.imencode('.jpg', frame_bgr, jpeg_params)
+                    if ok:
+                        training_frames.append((frame_idx, buffer.tobytes()))
+            frame_idx += 1
+    finally:
+        if cache_fd is not None:
+            os.close(cache_fd)
+
+    gate_stats = {
+        "gated_frames": gate.gated_frames,
+        "inferred_frames": gate.inferred_frames,
+        "inference_seconds": gate.inference_seconds
+    } if gate is not None else {}
+    return results, gate_stats, training_frames, cached_frames
+
+
+# ---- 父进程侧 ----
+
+class ProcessPoolRunner:
+    """fork 出的检测工作进程池"""
+
+    def __init__(self, model_path: Optional[str] = None, workers: int = 2, threads_per_worker: int = 1) -> None:
+        self.model_path = model_path or MODEL_PATH
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = max(1, int(threads_per_worker))
+
+        # 父进程加载一次权重，子进程继承同一份内存页
+        if YOLOv8Detector._model is None:
+            YOLOv8Detector._model = YOLOv8Detector.load_model(self.model_path)
+        # 预热推理：在父进程里完成 predictor/AutoBackend 初始化和 fuse()，工作进程不再改写权重
+        YOLOv8Detector(self.model_path).detect_single_point(np.zeros((64, 64, 3), dtype=np.uint8), imgsz=64)
+        # 冻结现有对象，避免子进程里的 GC 扫描触碰（并复制）这些对象所在的页
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+        ctx = multiprocessing.get_context("fork")
+        self._pool = ctx.Pool(processes=self.workers, initializer=_init_worker, initargs=(self.threads_per_worker,))
+        print(f"🧵 推理进程池就绪: {self.workers} 个工作进程，每进程 {self.threads_per_worker} 线程")
+
+    @staticmethod
+    def plan_shards(start_frame: int, end_frame: int, shard_frames: int) -> List[Tuple[int, int]]:
+        """将 [start_frame, end_frame] 切成若干个长度不超过 shard_frames 的闭区间"""
+        shard_frames = max(1, int(shard_frames))
+        return [(s, min(end_frame, s + shard_frames - 1)) for s in range(start_frame, end_frame + 1, shard_frames)]
+
+    def detect_frames(self, video_path: str, total_frames: int, resolution: int, imgsz: Tuple[int, int],
+                      detect_params: Dict[str, Any], shard_frames: int = 300,
+                      motion_gate: Optional[Dict[str, Any]] = None,
+                      cancel_check: Optional[Callable[[], None]] = None,
+                      training_threshold: Optional[float] = None,
+                      jpeg_quality: int = 90, frame_cache: Optional[Dict[str, Any]] = None
+                      ) -> Tuple[List[FrameResult], Dict[str, Any], List[Tuple[int, bytes]], List[int]]:
+        """
+        按帧区间分片并行检测，结果按帧号合并
+
+        cancel_check 在每个分片完成后调用，抛出异常即停止等待剩余分片。
+        training_threshold 不为 None 时，工作进程顺带编码训练帧（失败帧/低置信度帧）。
+        frame_cache（{"path", "shape", "max_bytes"}）不为 None 时，工作进程把帧写入该帧缓存数据文件。
+
+        Returns:
+            (按帧号排序的逐帧结果, 合并后的运动门控统计, [(帧号, JPEG 数据)], 写入帧缓存的帧号)
+        """
+        shards = self.plan_shards(0, max(0, total_frames - 1), shard_frames)
+        tasks = [{
+            "video_path": video_path,
+            "model_path": self.model_path,
+            "start_frame": s,
+            "end_frame": e,
+            "resolution": resolution,
+            "imgsz": list(imgsz),
+            "detect_params": detect_params,
+            "motion_gate": motion_gate,
+            "training_threshold": training_threshold,
+            "jpeg_quality": jpeg_quality,
+            "frame_cache": frame_cache,
+        } for s, e in shards]
+        # CAP_PROP_FRAME_COUNT 只是估计值，最后一片读到视频结尾
+        tasks[-1]["end_frame"] = None
+
+        return self.merge_shards(self._pool.imap(_detect_range, tasks), cancel_check)
+
+    @staticmethod
+    def merge_shards(outputs: Iterable[Tuple[List[FrameResult], Dict[str, Any], List[Tuple[int, bytes]], List[int]]],
+                     cancel_check: Optional[Callable[[], None]] = None
+                     ) -> Tuple[List[FrameResult], Dict[str, Any], List[Tuple[int, bytes]], List[int]]:
+        """合并各分片的 _detect_range 输出：逐帧结果、训练帧和缓存帧号按帧号排序，运动门控统计求和"""
+        merged: List[FrameResult] = []
+        training_frames: List[Tuple[int, bytes]] = []
+        cached_frames: List[int] = []
+        gate_stats = {"gated_frames": 0, "inferred_frames": 0, "inference_seconds": 0.0}
+        for results, stats, frames, cached in outputs:
+            if cancel_check is not None:
+                cancel_check()
+            merged.extend(results)
+            training_frames.extend(frames)
+            cached_frames.extend(cached)
+            for k in gate_stats:
+                gate_stats[k] += stats.get(k, 0)
+        merged.sort(key=lambda r: r[0])
+        training_frames.sort(key=lambda f: f[0])
+        cached_frames.sort()
+        return merged, gate_stats, training_frames, cached_frames
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+
+_runner: Optional[ProcessPoolRunner] = None
+_runner_lock = threading.Lock()
+_runner_failed = False
+
+
+def get_process_pool(workers: Any = "auto", model_path: Optional[str] = None) -> Optional[ProcessPoolRunner]:
+    """
+    获取全局进程池（首次调用时 fork）
+
+    CUDA 可用或创建失败时返回 None，调用方回退到线程模式。
+    最好在服务启动、其他线程开始工作之前调用，避免在多线程状态下 fork。
+    """
+    global _runner, _runner_failed
+    with _runner_lock:
+        if _runner is not None or _runner_failed:
+            return _runner
+        if _cuda_initialized():
+            print("⚠️ CUDA 可用，fork 后无法安全使用 CUDA，进程池模式回退到线程模式")
+            _runner_failed = True
+            return None
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        count = int(workers) if str(workers).isdigit() else max(1, cpus // 2)
+        try:
+            _runner = ProcessPoolRunner(model_path, workers=count, threads_per_worker=max(1, cpus // count))
+        except Exception as e:
+            print(f"⚠️ 推理进程池创建失败，回退到线程模式: {e}")
+            _runner_failed = True
+        return _runner
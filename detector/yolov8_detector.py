@@ -15,33 +15,46 @@ class YOLOv8Detector:
 
     _model = None
 
-    def __init__(self, model_path: Optional[str] = None) -> None:
+    def __init__(self, model_path: Optional[str] = None, model=None) -> None:
         self.model_path = model_path or MODEL_PATH
+        # 模型副本池中的检测器持有独立的模型实例，否则使用类级共享模型
+        self._replica_model = model
 
-    def _ensure_model(self) -> None:
-        if YOLOv8Detector._model is None:
-            from ultralytics import YOLO  # Lazy import
-            import torch
-
-            model = YOLO(self.model_path)
-            try:
-                # 自动检测GPU可用性
-                if torch.cuda.is_available():
-                    print("🚀 检测到GPU，使用CUDA加速")
-                    model.to("cuda")
-                    if hasattr(model, "model") and hasattr(model.model, "half"):
-                        model.model.half = True  # 启用半精度推理
-                else:
-                    print("💻 未检测到GPU，使用CPU")
-                    model.to("cpu")
-                    if hasattr(model, "model") and hasattr(model.model, "half"):
-                        model.model.half = False
-            except Exception as e:
-                print(f"⚠️ 设备设置失败，回退到CPU: {e}")
+    @property
+    def model(self):
+        return self._replica_model if self._replica_model is not None else YOLOv8Detector._model
+
+    @staticmethod
+    def load_model(model_path: str):
+        """Load a YOLO model onto the best available device."""
+        from ultralytics import YOLO  # Lazy import
+        import torch
+
+        model = YOLO(model_path)
+        try:
+            # 自动检测GPU可用性
+            if torch.cuda.is_available():
+                print("🚀 检测到GPU，使用CUDA加速")
+                model.to("cuda")
+                if hasattr(model, "model") and hasattr(model.model, "half"):
+                    model.model.half = True  # 启用半精度推理
+            else:
+                print("💻 未检测到GPU，使用CPU")
                 model.to("cpu")
                 if hasattr(model, "model") and hasattr(model.model, "half"):
                     model.model.half = False
-            YOLOv8Detector._model = model
+        except Exception as e:
+            print(f"⚠️ 设备设置失败，回退到CPU: {e}")
+            model.to("cpu")
+            if hasattr(model, "model") and hasattr(model.model, "half"):
+                model.model.half = False
+        return model
+
+    def _ensure_model(self) -> None:
+        if self._replica_model is not None:
+            return
+        if YOLOv8Detector._model is None:
+            YOLOv8Detector._model = self.load_model(self.model_path)
 
     def detect_single_point(self, image_bgr: np.ndarray, debug: bool = False, imgsz: int = 480, conf: float = 0.01, iou: float = 0.7, max_det: int = 10) -> Optional[Tuple[float, float, float]]:
         """
@@ -52,13 +65,27 @@ class YOLOv8Detector:
         Returns:
             (cx, cy, conf) if club head detection found, else None
         """
-        # 定义安全浮点数转换函数
-        def safe_float(value):
-            """确保浮点数值是JSON兼容的"""
-            if value is None or (isinstance(value, float) and (value != value or value == float('inf') or value == float('-inf'))):
-                return 0.0
-            return float(value)
-        
+        results = self._predict(image_bgr, imgsz=imgsz, conf=conf, iou=iou, max_det=max_det)
+        if not results:
+            return None
+        return self._select_club_head(results[0], debug=debug)
+
+    def detect_batch(self, images_bgr: List[np.ndarray], imgsz: int = 480, conf: float = 0.01, iou: float = 0.7, max_det: int = 10) -> List[Optional[Tuple[float, float, float]]]:
+        """
+        Run one forward pass over a batch of frames.
+
+        Returns:
+            one (cx, cy, conf) or None per input frame, in input order
+        """
+        if not images_bgr:
+            return []
+        results = self._predict(list(images_bgr), imgsz=imgsz, conf=conf, iou=iou, max_det=max_det)
+        if not results:
+            return [None] * len(images_bgr)
+        return [self._select_club_head(r) for r in results]
+
+    def _predict(self, source, imgsz, conf: float, iou: float, max_det: int):
+        """Call ultralytics predict on one image or a list of images."""
         self._ensure_model()
 
         # CPU增强模式：允许更多线程并行处理
@@ -81,8 +108,8 @@ class YOLOv8Detector:
         device = "cuda" if torch.cuda.is_available() else "cpu"
         
         # 控制推理分辨率，使用动态分辨率以平衡检测精度和处理速度
-        results = YOLOv8Detector._model.predict(
-            source=image_bgr,
+        return self.model.predict(
+            source=source,
             verbose=False,
             device=device,  # 自动选择设备
             imgsz=imgsz,  # 使用传入的分辨率参数
@@ -92,10 +119,17 @@ class YOLOv8Detector:
             agnostic_nms=False,  # 使用类别感知的NMS
             augment=False,  # 关闭测试时增强以提高速度
         )
-        if not results:
-            return None
 
-        r0 = results[0]
+    @staticmethod
+    def _select_club_head(r0, debug: bool = False) -> Optional[Tuple[float, float, float]]:
+        """Pick the best club head box from one ultralytics result."""
+        # 定义安全浮点数转换函数
+        def safe_float(value):
+            """确保浮点数值是JSON兼容的"""
+            if value is None or (isinstance(value, float) and (value != value or value == float('inf') or value == float('-inf'))):
+                return 0.0
+            return float(value)
+
         if r0.boxes is None or r0.boxes.data is None or len(r0.boxes.data) == 0:
             return None
 
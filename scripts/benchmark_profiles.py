@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+性能档位基准测试 - 在当前硬件上测量各档位的 fps 和准确率
+
+对同一段视频依次用每个性能档位调用 /analyze/video，记录处理耗时和帧率；
+以参考档位（默认 accurate）的原始检测轨迹为基准，统计其他档位的杆头位置一致率。
+结果写入 profile_benchmark_file（默认 data/profile_benchmarks.json），由 /analyze/profiles 发布。
+
+用法:
+    python scripts/benchmark_profiles.py video.mp4 [--url http://localhost:5005] [--output data/profile_benchmarks.json]
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def run_profile(base_url: str, video_path: str, profile: str, timeout: int = 600) -> dict:
+    """用指定档位分析视频，返回 (耗时, 分析结果)"""
+    start_time = time.time()
+    with open(video_path, 'rb') as f:
+        response = requests.post(f"{base_url}/analyze/video", files={'video': f}, data={'profile': profile}, timeout=timeout)
+    response.raise_for_status()
+    job_id = response.json()['job_id']
+
+    while time.time() - start_time < timeout:
+        status_data = requests.get(f"{base_url}/analyze/video/status", params={'job_id': job_id}, timeout=30).json()
+        status = status_data.get('status')
+        if status == 'done':
+            return {'seconds': time.time() - start_time, 'result': status_data.get('result', {})}
+        if status in ('error', 'cancelled'):
+            raise RuntimeError(f"档位 {profile} 分析失败: {status_data.get('error', status)}")
+        time.sleep(1)
+    raise TimeoutError(f"档位 {profile} 分析超时")
+
+
+def trajectory_agreement(trajectory: list, reference: list, tolerance: float) -> float:
+    """参考轨迹有检测的帧中，位置误差（归一化坐标）不超过 tolerance 的比例"""
+    matched = 0
+    total = 0
+    for point, ref in zip(trajectory, reference):
+        if ref[0] == 0 and ref[1] == 0:
+            continue
+        total += 1
+        if point[0] == 0 and point[1] == 0:
+            continue
+        if ((point[0] - ref[0]) ** 2 + (point[1] - ref[1]) ** 2) ** 0.5 <= tolerance:
+            matched += 1
+    return matched / total if total > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能档位基准测试")
+    parser.add_argument("video", help="测试视频路径")
+    parser.add_argument("--url", default="http://localhost:5005", help="服务地址")
+    parser.add_argument("--output", default=None, help="结果文件（默认取服务配置 profile_benchmark_file）")
+    parser.add_argument("--reference", default="accurate", help="作为准确率基准的档位")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="位置一致的归一化距离阈值")
+    args = parser.parse_args()
+
+    from app.config import VIDEO_ANALYSIS_CONFIG
+    output = args.output or VIDEO_ANALYSIS_CONFIG.get("profile_benchmark_file", "data/profile_benchmarks.json")
+
+    try:
+        profiles_info = requests.get(f"{args.url}/analyze/profiles", timeout=10).json()
+    except requests.exceptions.RequestException:
+        print("❌ 服务未运行，请先启动服务")
+        return 1
+    profile_names = [p["name"] for p in profiles_info["profiles"]]
+    if args.reference not in profile_names:
+        print(f"❌ 参考档位不存在: {args.reference}")
+        return 1
+
+    # 先跑参考档位，其他档位与之比较
+    ordered = [args.reference] + [name for name in profile_names if name != args.reference]
+    runs = {}
+    for name in ordered:
+        print(f"🚀 测试档位 {name} ...")
+        runs[name] = run_profile(args.url, args.video, name)
+        result = runs[name]["result"]
+        fps = result.get("total_frames", 0) / runs[name]["seconds"] if runs[name]["seconds"] > 0 else 0.0
+        print(f"✅ {name}: {runs[name]['seconds']:.2f}秒, {fps:.1f} fps, 检测率 {result.get('detection_rate', 0)}%")
+
+    reference_trajectory = runs[args.reference]["result"].get("original_trajectory", [])
+    measurements = {}
+    for name, run in runs.items():
+        result = run["result"]
+        total_frames = result.get("total_frames", 0)
+        measurements[name] = {
+            "fps": round(total_frames / run["seconds"], 2) if run["seconds"] > 0 else 0.0,
+            "processing_seconds": round(run["seconds"], 2),
+            "total_frames": total_frames,
+            "detection_rate": result.get("detection_rate", 0),
+            "accuracy": round(trajectory_agreement(result.get("original_trajectory", []), reference_trajectory, args.tolerance), 4),
+            "accuracy_reference": args.reference
+        }
+
+    benchmarks = {
+        "generated_at": datetime.now().isoformat(),
+        "hardware": profiles_info.get("hardware"),
+        "video": Path(args.video).name,
+        "tolerance": args.tolerance,
+        "profiles": measurements
+    }
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(benchmarks, f, ensure_ascii=False, indent=2)
+    print(f"📊 基准结果已写入 {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -103,7 +103,9 @@ class DualPlayerModule {
                 </div>
                 
                 <div class="dual-frame-control">
+                    <div id="dualScrubPreview" class="dual-scrub-preview"></div>
                     <input type="range" id="dualFrameSlider" min="0" max="0" value="0" class="frame-slider">
+                    <div id="dualKeyframes" class="dual-keyframes"></div>
                 </div>
             </div>
         `;
@@ -134,12 +136,76 @@ class DualPlayerModule {
         if (slider) slider.oninput = (e) => {
             this.isManualControl = true;
             this.isPlaying = false;
-            this.seekToFrame(parseInt(e.target.value));
+            const frame = parseInt(e.target.value);
+            // 有雪碧图时拖动过程中只显示预览格子，松手后再seek视频（移动端seek很慢）
+            if (this.data?.sprite) {
+                this.showScrubPreview(frame);
+            } else {
+                this.seekToFrame(frame);
+            }
+        };
+        if (slider) slider.onchange = (e) => {
+            if (this.data?.sprite) {
+                this.hideScrubPreview();
+                this.seekToFrame(parseInt(e.target.value));
+            }
         };
         
+        this.renderKeyframes();
+        
         console.log('双画面播放器事件绑定完成');
     }
 
+    showScrubPreview(frame) {
+        const sprite = this.data.sprite;
+        const preview = document.getElementById('dualScrubPreview');
+        const slider = document.getElementById('dualFrameSlider');
+        if (!preview || !slider) return;
+        
+        const tile = Math.min(sprite.tiles - 1, Math.floor(frame / sprite.frame_stride));
+        const col = tile % sprite.columns;
+        const row = Math.floor(tile / sprite.columns);
+        preview.style.width = sprite.tile_width + 'px';
+        preview.style.height = sprite.tile_height + 'px';
+        preview.style.backgroundImage = `url(${sprite.url})`;
+        preview.style.backgroundPosition = `-${col * sprite.tile_width}px -${row * sprite.tile_height}px`;
+        const ratio = this.totalFrames > 1 ? frame / (this.totalFrames - 1) : 0;
+        preview.style.left = `${slider.offsetLeft + ratio * slider.offsetWidth}px`;
+        preview.style.display = 'block';
+        
+        const frameNum = document.getElementById('dualFrameNum');
+        if (frameNum) frameNum.textContent = frame;
+    }
+
+    hideScrubPreview() {
+        const preview = document.getElementById('dualScrubPreview');
+        if (preview) preview.style.display = 'none';
+    }
+
+    renderKeyframes() {
+        // Top/Impact/Finish 缩略图，点击跳转到对应帧
+        const container = document.getElementById('dualKeyframes');
+        const keyframes = this.data?.keyframes;
+        if (!container || !keyframes) return;
+        
+        const labels = { top: 'Top', impact: 'Impact', finish: 'Finish' };
+        container.innerHTML = Object.keys(labels)
+            .filter(name => keyframes[name])
+            .map(name => `
+                <button class="dual-keyframe-btn" data-frame="${keyframes[name].frame}">
+                    <img src="${keyframes[name].url}" alt="${labels[name]}" loading="lazy" decoding="async">
+                    <span>${labels[name]} · 帧${keyframes[name].frame}</span>
+                </button>
+            `).join('');
+        container.querySelectorAll('.dual-keyframe-btn').forEach(btn => {
+            btn.onclick = () => {
+                this.isManualControl = true;
+                this.isPlaying = false;
+                this.seekToFrame(parseInt(btn.dataset.frame));
+            };
+        });
+    }
+
     updateStrategyDisplay() {
         // 更新策略名称显示
         const strategyNameElement = document.getElementById('currentStrategyName');
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+标注视频原视频保留测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+from app.services.annotated_video import AnnotatedVideoService
+
+
+class TestRetainSource(unittest.TestCase):
+    """分析结束时保留原视频测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.tmp_dir, "upload.mp4")
+        with open(self.video_path, "wb") as f:
+            f.write(b"video")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def service(self, **config):
+        return AnnotatedVideoService({"dir": os.path.join(self.tmp_dir, "annotated"), **config})
+
+    def test_default_does_not_retain(self):
+        """默认不保留原视频"""
+        service = self.service()
+        service.retain_source("job1", self.video_path)
+        self.assertIsNone(service._source_path("job1"))
+
+    def test_link_retains(self):
+        """keep_source="link" 时以硬链接保留，原文件删除后仍可读取"""
+        service = self.service(keep_source="link")
+        service.retain_source("job1", self.video_path)
+        source = service._source_path("job1")
+        self.assertTrue(source.endswith("source.mp4"))
+        os.remove(self.video_path)
+        with open(source, "rb") as f:
+            self.assertEqual(f.read(), b"video")
+
+
+if __name__ == '__main__':
+    unittest.main()
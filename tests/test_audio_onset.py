@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+音频击球瞬态定位测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import numpy as np
+from analyzer.audio_onset import detect_onset, onset_to_frame
+
+
+def click_track(click_time, duration=2.0, sample_rate=16000, seed=0):
+    """低电平噪声背景 + 一个短促的击球声"""
+    rng = np.random.RandomState(seed)
+    samples = (rng.randn(int(duration * sample_rate)) * 0.001).astype(np.float32)
+    start = int(click_time * sample_rate)
+    length = int(0.01 * sample_rate)
+    samples[start:start + length] += (rng.randn(length) * 0.8 * np.exp(-np.arange(length) / 40.0)).astype(np.float32)
+    return samples
+
+
+class TestDetectOnset(unittest.TestCase):
+    """起音点检测测试"""
+
+    def test_synthetic_click(self):
+        """合成击球声的起音时间误差在 2ms 以内（分析帧内按采样细化）"""
+        onset = detect_onset(click_track(1.25), 16000)
+        self.assertIsNotNone(onset)
+        self.assertAlmostEqual(onset["time"], 1.25, delta=0.002)
+        self.assertGreater(onset["strength"], 4.0)
+
+    def test_no_transient(self):
+        """只有平稳噪声时返回 None"""
+        rng = np.random.RandomState(1)
+        samples = (rng.randn(32000) * 0.1).astype(np.float32)
+        self.assertIsNone(detect_onset(samples, 16000, min_peak_ratio=50.0))
+
+    def test_too_short(self):
+        """样本过短时返回 None"""
+        self.assertIsNone(detect_onset(np.zeros(100, dtype=np.float32), 16000))
+
+
+class TestOnsetToFrame(unittest.TestCase):
+    """起音时间到视频帧号的换算测试"""
+
+    def test_average_fps_without_timing(self):
+        """没有时间戳时按平均帧率换算并限制在视频范围内"""
+        self.assertEqual(onset_to_frame(0.5, 30.0), 15)
+        self.assertEqual(onset_to_frame(10.0, 30.0, total_frames=100), 99)
+
+    def test_stream_start_offset(self):
+        """音频比视频晚开始时加上起始时间差"""
+        timing = {"audio_start": 0.1, "video_start": 0.0, "video_pts": np.array([])}
+        self.assertEqual(onset_to_frame(0.5, 30.0, timing), 18)
+
+    def test_variable_frame_rate(self):
+        """可变帧率时按视频帧时间戳找最近的帧"""
+        # 前 10 帧 30fps，之后 240fps 慢动作
+        video_pts = np.concatenate([np.arange(10) / 30.0, 10 / 30.0 + np.arange(1, 200) / 240.0])
+        timing = {"audio_start": 0.05, "video_start": 0.0, "video_pts": video_pts}
+        frame = onset_to_frame(0.5, 60.0, timing)
+        self.assertEqual(frame, int(np.argmin(np.abs(video_pts - 0.55))))
+        self.assertEqual(frame, 61)
+        self.assertEqual(onset_to_frame(100.0, 60.0, timing), len(video_pts) - 1)
+        self.assertEqual(onset_to_frame(0.0, 60.0, {"audio_start": -1.0, "video_start": 0.0, "video_pts": video_pts}), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
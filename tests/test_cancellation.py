@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+任务取消测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import io
+import threading
+import time
+import unittest
+from unittest import mock
+from app.services.cancellation import CancellationRegistry, CancellationToken, JobCancelled
+
+try:
+    from fastapi import HTTPException, UploadFile
+    from starlette.datastructures import Headers
+    from app.routes import analyze as analyze_routes
+except ImportError:  # 分析路由依赖的模型/姿态检测包未安装
+    analyze_routes = None
+
+
+class TestCancellationToken(unittest.TestCase):
+    """取消令牌测试"""
+
+    def test_cancel_keeps_first_reason(self):
+        """重复取消时保留第一次的原因"""
+        token = CancellationToken()
+        self.assertFalse(token.cancelled)
+        token.raise_if_cancelled()
+        token.cancel("客户端断开连接")
+        token.cancel("用户取消")
+        self.assertTrue(token.cancelled)
+        self.assertEqual(token.reason, "客户端断开连接")
+        with self.assertRaises(JobCancelled) as ctx:
+            token.raise_if_cancelled()
+        self.assertEqual(str(ctx.exception), "客户端断开连接")
+
+    def test_cancel_from_other_thread(self):
+        """其他线程取消后，工作线程在下一个检查点退出"""
+        token = CancellationToken()
+        stopped = threading.Event()
+
+        def worker():
+            try:
+                while True:
+                    token.raise_if_cancelled()
+                    time.sleep(0.001)
+            except JobCancelled:
+                stopped.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        token.cancel()
+        thread.join(2)
+        self.assertTrue(stopped.is_set())
+
+
+class TestCancellationRegistry(unittest.TestCase):
+    """取消令牌注册表测试"""
+
+    def setUp(self):
+        self.registry = CancellationRegistry()
+
+    def test_get_returns_same_token(self):
+        """同一任务取到同一个令牌，取消后对持有者可见"""
+        token = self.registry.get("job1")
+        self.assertIs(self.registry.get("job1"), token)
+        self.registry.cancel("job1", "用户取消")
+        self.assertTrue(token.cancelled)
+        self.assertFalse(self.registry.get("job2").cancelled)
+
+    def test_cancel_before_start(self):
+        """排队中的任务先被取消，开始运行时取到的令牌已是取消状态"""
+        self.registry.cancel("job1", "用户取消")
+        self.assertTrue(self.registry.get("job1").cancelled)
+
+    def test_release(self):
+        """释放后重新获取的是新令牌"""
+        self.registry.cancel("job1")
+        self.registry.release("job1")
+        self.assertFalse(self.registry.get("job1").cancelled)
+
+    def test_cancel_if_active(self):
+        """只取消仍在运行的任务，已释放的任务不再创建令牌"""
+        self.assertFalse(self.registry.cancel_if_active("job1", "任务已删除"))
+        token = self.registry.get("job1")
+        self.assertTrue(self.registry.cancel_if_active("job1", "任务已删除"))
+        self.assertEqual(token.reason, "任务已删除")
+        self.registry.release("job1")
+        self.assertFalse(self.registry.cancel_if_active("job1"))
+
+
+class DisconnectedRequest:
+    """客户端已断开的请求"""
+
+    async def is_disconnected(self):
+        return True
+
+
+@unittest.skipIf(analyze_routes is None, "需要完整的分析依赖")
+class TestClientDisconnect(unittest.TestCase):
+    """同步分析接口客户端断开测试"""
+
+    def test_disconnect_cancels_job(self):
+        """客户端断开时取消任务并返回 499，分析线程在取消后退出"""
+        started = {}
+
+        def fake_analyze(job_id, video_path, **kwargs):
+            started["job_id"] = job_id
+            token = analyze_routes.cancellation_registry.get(job_id)
+            deadline = time.time() + 5
+            while not token.cancelled and time.time() < deadline:
+                time.sleep(0.01)
+            started["reason"] = token.reason
+            analyze_routes._JOB_STORE[job_id]["status"] = "cancelled"
+            analyze_routes.upload_ingest_service.release(video_path)
+
+        upload = UploadFile(file=io.BytesIO(b"\0" * 64), filename="swing.mp4",
+                            headers=Headers({"content-type": "video/mp4"}))
+        with mock.patch.object(analyze_routes.video_analysis_service, "analyze_video_job", side_effect=fake_analyze):
+            with self.assertRaises(HTTPException) as ctx:
+                asyncio.run(analyze_routes.analyze(request=DisconnectedRequest(), file=upload, handed="right",
+                                                   deadline_seconds=None, profile=None))
+            self.assertEqual(ctx.exception.status_code, 499)
+            deadline = time.time() + 5
+            while "reason" not in started and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(started.get("reason"), "客户端断开连接")
+        analyze_routes._JOB_STORE.pop(started["job_id"], None)
+        analyze_routes.cancellation_registry.release(started["job_id"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+截止时间控制器测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+from analyzer.deadline_controller import DeadlineController, DEFAULT_DEGRADATION_LADDER
+
+
+def make_controller(deadline, total_frames, elapsed, **kwargs):
+    """构造一个已运行 elapsed 秒的控制器（把起始时间往前拨，避免测试依赖真实耗时）"""
+    kwargs.setdefault("postprocess_reserve_s", 0.0)
+    kwargs.setdefault("safety_factor", 1.0)
+    kwargs.setdefault("check_interval_frames", 1)
+    kwargs.setdefault("min_sample_seconds", 0.0)
+    controller = DeadlineController(deadline, total_frames, **kwargs)
+    controller.start_time -= elapsed
+    controller._sample_start_time -= elapsed
+    return controller
+
+
+class TestDeadlineController(unittest.TestCase):
+    """截止时间控制器测试"""
+
+    def test_on_track_no_degradation(self):
+        """预计按时完成时不降级"""
+        # 10秒处理了500帧（50帧/秒），剩余500帧还需10秒，预算30秒
+        controller = make_controller(30, 1000, 10)
+        self.assertIsNone(controller.update(500))
+        self.assertEqual(controller.level, 0)
+
+    def test_behind_schedule_degrades_in_ladder_order(self):
+        """预计超时时沿降级阶梯逐级前进"""
+        # 10秒处理了100帧（10帧/秒），剩余900帧还需90秒，预算30秒
+        controller = make_controller(30, 1000, 10)
+        step = controller.update(100)
+        self.assertEqual((step["type"], step["value"]), ("stride", 2))
+        self.assertEqual(controller.stride, 2)
+        self.assertEqual(step["at_frame"], 100)
+
+        controller._sample_start_time -= 10
+        step = controller.update(150)
+        self.assertEqual((step["type"], step["value"]), ("resolution", 960))
+        self.assertEqual(controller.resolution, 960)
+
+    def test_ladder_exhausted(self):
+        """阶梯用完后不再降级"""
+        controller = make_controller(30, 1000, 10, ladder=[{"type": "model", "value": "cheap"}])
+        self.assertEqual(controller.update(100)["value"], "cheap")
+        self.assertEqual(controller.model_tier, "cheap")
+        controller._sample_start_time -= 10
+        self.assertIsNone(controller.update(150))
+        self.assertEqual(len(controller.degradations), 1)
+
+    def test_stride_and_resolution_never_relax(self):
+        """步长只增不减，分辨率只降不升"""
+        ladder = [
+            {"type": "stride", "value": 4},
+            {"type": "stride", "value": 2},
+            {"type": "resolution", "value": 640},
+            {"type": "resolution", "value": 960},
+        ]
+        controller = make_controller(30, 100000, 10, ladder=ladder)
+        for frame_idx in (100, 110, 120, 130):
+            controller._sample_start_time -= 10
+            controller.update(frame_idx)
+        self.assertEqual(controller.stride, 4)
+        self.assertEqual(controller.resolution, 640)
+
+    def test_check_interval(self):
+        """未达到评估间隔时不评估"""
+        controller = make_controller(30, 1000, 10, check_interval_frames=200)
+        self.assertIsNone(controller.update(100))
+        self.assertIsNotNone(controller.update(200))
+
+    def test_min_sample_seconds(self):
+        """采样时长不足时不做预测"""
+        controller = DeadlineController(30, 1000, min_sample_seconds=60)
+        self.assertIsNone(controller.projected_finish(100))
+
+    def test_expired_and_summary(self):
+        """截止时间到达后记录停止帧，汇总标记为部分结果"""
+        controller = make_controller(10, 1000, 12, postprocess_reserve_s=1.0)
+        self.assertEqual(controller.detection_budget, 9.0)
+        self.assertTrue(controller.expired(300))
+        self.assertTrue(controller.expired(301))
+        summary = controller.summary(300)
+        self.assertFalse(summary["met"])
+        self.assertTrue(summary["partial"])
+        self.assertEqual(controller.expired_at_frame, 300)
+
+    def test_not_expired(self):
+        """预算内未到期"""
+        controller = make_controller(60, 1000, 1)
+        self.assertFalse(controller.expired(10))
+        self.assertTrue(controller.summary(10)["met"])
+
+    def test_default_ladder_copied(self):
+        """默认阶梯不会被实例修改"""
+        controller = DeadlineController(30, 1000)
+        controller.ladder.append({"type": "stride", "value": 8})
+        self.assertEqual(len(DEFAULT_DEGRADATION_LADDER), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
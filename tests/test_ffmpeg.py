@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+ffmpeg 解码/合并转换测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+from analyzer.ffmpeg import iter_tee_frames, scaled_size
+
+# 按 -filter_complex 中的缩放尺寸输出 FRAMES 帧 bgr24（第 i 帧像素值为 i），记录参数并写出编码输出文件
+FAKE_FFMPEG = """#!{python}
+import json, re, sys
+args = sys.argv[1:]
+with open({args_path!r}, "w") as f:
+    json.dump(args, f)
+w, h = map(int, re.search(r"scale=(\\d+):(\\d+)", args[args.index("-filter_complex") + 1]).groups())
+with open(args[args.index("-y") + 1], "wb") as f:
+    f.write(b"encoded")
+for i in range({frames}):
+    sys.stdout.buffer.write(bytes([i]) * (w * h * 3))
+sys.stdout.buffer.flush()
+sys.stderr.write("fake ffmpeg done\\n")
+sys.exit({exit_code})
+"""
+
+
+def write_clip(path, frames=10, width=64, height=48, fps=10.0):
+    """用 OpenCV 写一段每帧亮度递增的小视频"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(frames):
+        writer.write(np.full((height, width, 3), i * 20, dtype=np.uint8))
+    writer.release()
+
+
+class TestScaledSize(unittest.TestCase):
+    """缩放尺寸测试"""
+
+    def test_long_edge(self):
+        """按长边等比缩放，不放大"""
+        self.assertEqual(scaled_size(1920, 1080, 960), (960, 540))
+        self.assertEqual(scaled_size(1080, 1920, 960), (540, 960))
+        self.assertEqual(scaled_size(640, 480, 960), (640, 480))
+
+
+class TestIterTeeFramesCommand(unittest.TestCase):
+    """合并转换的帧输出（用脚本代替 ffmpeg）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.args_path = os.path.join(self.tmp_dir, "args.json")
+        self.output_path = os.path.join(self.tmp_dir, "out.mp4")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def fake_ffmpeg(self, frames=5, exit_code=0):
+        bin_dir = os.path.join(self.tmp_dir, "bin")
+        os.makedirs(bin_dir, exist_ok=True)
+        script = os.path.join(bin_dir, "ffmpeg")
+        with open(script, "w") as f:
+            f.write(FAKE_FFMPEG.format(python=sys.executable, args_path=self.args_path, frames=frames, exit_code=exit_code))
+        os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+        return mock.patch.dict(os.environ, {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", "")})
+
+    def test_frames_and_command(self):
+        """逐帧产出缩放后的 bgr24 帧，编码分支和检测分支共用一次解码"""
+        result = {}
+        with self.fake_ffmpeg(frames=5):
+            frames = list(iter_tee_frames("in.mov", 1920, 1080, self.output_path, ["-c:v", "libx264", "-f", "mp4"],
+                                          max_size=64, result=result))
+        self.assertEqual(len(frames), 5)
+        self.assertTrue(all(ok for ok, _ in frames))
+        self.assertEqual(frames[0][1].shape, (36, 64, 3))
+        self.assertEqual([int(frame[0, 0, 0]) for _, frame in frames], [0, 1, 2, 3, 4])
+        self.assertEqual(result["returncode"], 0)
+        self.assertEqual(result["frames"], 5)
+        self.assertIn("fake ffmpeg done", result["stderr"])
+        with open(self.args_path) as f:
+            args = json.load(f)
+        self.assertIn("split=2", args[args.index("-filter_complex") + 1])
+        self.assertEqual(args[args.index("-y") + 1], self.output_path)
+        self.assertIn("0:a:0?", args)
+        self.assertEqual(args[-1], "pipe:1")
+
+    def test_start_frame(self):
+        """start_frame 之前的帧被丢弃，计数仍包含它们"""
+        result = {}
+        with self.fake_ffmpeg(frames=5):
+            frames = list(iter_tee_frames("in.mov", 64, 48, self.output_path, [], max_size=64, start_frame=3,
+                                          result=result))
+        self.assertEqual([int(frame[0, 0, 0]) for _, frame in frames], [3, 4])
+        self.assertEqual(result["frames"], 5)
+
+    def test_consumer_stops_early(self):
+        """消费方提前停止时结束 ffmpeg，returncode 为 None"""
+        result = {}
+        with self.fake_ffmpeg(frames=50):
+            generator = iter_tee_frames("in.mov", 64, 48, self.output_path, [], max_size=64, result=result)
+            next(generator)
+            generator.close()
+        self.assertIsNone(result["returncode"])
+
+    def test_ffmpeg_failure(self):
+        """ffmpeg 失败时 returncode 非零"""
+        result = {}
+        with self.fake_ffmpeg(frames=2, exit_code=1):
+            frames = list(iter_tee_frames("in.mov", 64, 48, self.output_path, [], max_size=64, result=result))
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(result["returncode"], 1)
+
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "需要 ffmpeg")
+class TestIterTeeFramesFfmpeg(unittest.TestCase):
+    """真实 ffmpeg 的合并转换测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.tmp_dir, "clip.mp4")
+        write_clip(self.input_path, frames=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_synthetic_clip(self):
+        """小视频解码一次：产出全部帧，同时写出可读取的编码输出"""
+        output_path = os.path.join(self.tmp_dir, "out.mp4")
+        result = {}
+        frames = list(iter_tee_frames(self.input_path, 64, 48, output_path, ["-c:v", "mpeg4", "-f", "mp4"],
+                                      max_size=32, result=result))
+        self.assertEqual(result["returncode"], 0, result.get("stderr"))
+        self.assertEqual(len(frames), 10)
+        self.assertEqual(frames[0][1].shape, (24, 32, 3))
+        self.assertLess(float(frames[0][1].mean()), float(frames[-1][1].mean()))
+        cap = cv2.VideoCapture(output_path)
+        self.assertEqual(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 10)
+        cap.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
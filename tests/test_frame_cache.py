@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+解码帧缓存测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import time
+import unittest
+import numpy as np
+from app.services.frame_cache import FrameCacheStore
+
+
+def frame(value, h=24, w=32):
+    """用像素值标记帧"""
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+class TestFrameCache(unittest.TestCase):
+    """帧缓存写入、读取与清理测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = FrameCacheStore({"enabled": True, "dir": self.tmp_dir, "max_bytes_per_job": 1024 * 1024})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_disabled(self):
+        """未启用时不创建写入器"""
+        store = FrameCacheStore({"enabled": False, "dir": self.tmp_dir})
+        self.assertIsNone(store.create_writer("job1"))
+
+    def test_round_trip(self):
+        """写入的帧在任务结束后原样读回，未写入的帧返回 None"""
+        writer = self.store.create_writer("job1")
+        writer.write(0, frame(10))
+        writer.write(2, frame(30))
+        self.store.finish_writer("job1")
+
+        cached = self.store.open("job1")
+        self.assertIsNotNone(cached)
+        self.assertEqual(len(cached), 3)
+        self.assertEqual(cached.frame_shape, (24, 32, 3))
+        np.testing.assert_array_equal(cached.get(0), frame(10))
+        np.testing.assert_array_equal(cached.get(2), frame(30))
+        self.assertNotIn(1, cached)
+        self.assertIsNone(cached.get(1))
+        self.assertIsNone(cached.get(5))
+
+    def test_readable_while_writing(self):
+        """任务进行中 open() 返回写入器，任务内的消费者能读到已写入的帧"""
+        writer = self.store.create_writer("job1")
+        self.assertIsNone(self.store.open("job1"))
+        writer.write(0, frame(10))
+        live = self.store.open("job1")
+        self.assertIs(live, writer)
+        self.assertIn(0, live)
+        np.testing.assert_array_equal(live.get(0), frame(10))
+        self.assertIsNone(live.get(1))
+        self.store.finish_writer("job1")
+        # 关闭后同一对象不再可读，重新 open 得到落盘的缓存
+        self.assertIsNone(live.get(0))
+        np.testing.assert_array_equal(self.store.open("job1").get(0), frame(10))
+
+    def test_size_cap_and_shape_mismatch_skipped(self):
+        """超过大小上限或尺寸不同的帧不写入"""
+        store = FrameCacheStore({"enabled": True, "dir": self.tmp_dir, "max_bytes_per_job": 24 * 32 * 3 * 2})
+        writer = store.create_writer("job1")
+        self.assertTrue(writer.write(0, frame(1)))
+        self.assertTrue(writer.write(1, frame(2)))
+        self.assertFalse(writer.write(2, frame(3)))
+        self.assertFalse(writer.write(0, frame(4, 48, 64)))
+        self.assertEqual(writer.skipped_frames, 2)
+        store.finish_writer("job1")
+        cached = store.open("job1")
+        self.assertEqual(cached.meta["cached_frames"], 2)
+        self.assertEqual(cached.meta["skipped_frames"], 2)
+        np.testing.assert_array_equal(cached.get(0), frame(1))
+
+    def test_preset_shape(self):
+        """预先确定尺寸后，其他尺寸的帧（如低分辨率粗扫描帧）不写入"""
+        writer = self.store.create_writer("job1")
+        self.assertTrue(writer.set_shape((24, 32, 3)))
+        self.assertFalse(writer.write(0, frame(1, 12, 16)))
+        self.assertTrue(writer.write(1, frame(2)))
+        self.assertFalse(writer.set_shape((12, 16, 3)))
+
+    def test_external_writes(self):
+        """其他进程直接写入数据文件的帧登记后可读"""
+        writer = self.store.create_writer("job1")
+        writer.set_shape((24, 32, 3))
+        fd = os.open(writer.data_path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, frame(7).tobytes(), 3 * writer.frame_bytes)
+        finally:
+            os.close(fd)
+        writer.mark_written([3])
+        np.testing.assert_array_equal(self.store.open("job1").get(3), frame(7))
+
+    def test_empty_cache_removed(self):
+        """没有写入任何帧时删除缓存目录"""
+        self.store.create_writer("job1")
+        self.store.finish_writer("job1")
+        self.assertIsNone(self.store.open("job1"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "job1")))
+
+    def test_sweep_expired(self):
+        """按目录修改时间清理过期缓存，正在写入的任务不清理"""
+        for job_id in ("old", "fresh"):
+            self.store.create_writer(job_id).write(0, frame(1))
+            self.store.finish_writer(job_id)
+        active = self.store.create_writer("active")
+        active.write(0, frame(1))
+        past = time.time() - 3600
+        for job_id in ("old", "active"):
+            os.utime(os.path.join(self.tmp_dir, job_id), (past, past))
+
+        self.assertEqual(self.store.sweep_expired(60), 1)
+        self.assertIsNone(self.store.open("old"))
+        self.assertIsNotNone(self.store.open("fresh"))
+        self.assertIsNotNone(self.store.open("active"))
+
+    def test_rejects_path_traversal(self):
+        """任务 ID 不能跳出缓存目录"""
+        self.assertIsNone(self.store.open("../etc"))
+        self.assertIsNone(self.store.open(""))
+
+
+if __name__ == '__main__':
+    unittest.main()
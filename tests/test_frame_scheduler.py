@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+分阶段帧调度器测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+from analyzer.trajectory_optimizer import TrajectoryOptimizer
+from analyzer.frame_scheduler import PhaseAwareScheduler, sparse_fill_max_gap
+
+
+def make_swing(total_frames, stride):
+    """构造粗扫描轨迹：前后段几乎静止，中段（帧 100-140）快速移动"""
+    coarse_indices = list(range(0, total_frames, stride))
+    trajectory = []
+    for idx in coarse_indices:
+        if idx < 100:
+            trajectory.append([0.5, 0.8 - idx * 0.001])
+        elif idx <= 140:
+            t = (idx - 100) / 40.0
+            trajectory.append([0.5 + 0.4 * t, 0.7 - 0.5 * t])
+        else:
+            trajectory.append([0.9, 0.2])
+    return coarse_indices, trajectory
+
+
+class TestPhaseAwareScheduler(unittest.TestCase):
+    """分阶段帧调度器测试"""
+
+    def setUp(self):
+        self.scheduler = PhaseAwareScheduler(coarse_stride=8, margin_frames=8, min_valid_points=4)
+
+    def test_is_coarse_frame(self):
+        """只有步长整数倍的帧属于粗扫描"""
+        self.assertTrue(self.scheduler.is_coarse_frame(0))
+        self.assertTrue(self.scheduler.is_coarse_frame(16))
+        self.assertFalse(self.scheduler.is_coarse_frame(17))
+
+    def test_invalid_stride_clamped(self):
+        """步长和边距不合法时被修正"""
+        scheduler = PhaseAwareScheduler(coarse_stride=0, margin_frames=-3)
+        self.assertEqual(scheduler.coarse_stride, 1)
+        self.assertEqual(scheduler.margin_frames, 0)
+
+    def test_too_few_points_returns_none(self):
+        """有效点不足时无法定位"""
+        indices = [0, 8, 16, 24, 32]
+        trajectory = [[0, 0], [0.5, 0.5], [0, 0], [0.6, 0.4], [0, 0]]
+        self.assertIsNone(self.scheduler.locate_dense_window(indices, trajectory, 40))
+
+    def test_too_few_points_falls_back_to_audio_window(self):
+        """有效点不足时使用音频窗口（裁剪到视频范围内）"""
+        indices = [0, 8, 16]
+        trajectory = [[0, 0], [0, 0], [0, 0]]
+        window = self.scheduler.locate_dense_window(indices, trajectory, 20, audio_window=(10, 30))
+        self.assertEqual(window, (10, 19))
+
+    def test_window_covers_fast_motion(self):
+        """密集窗口覆盖快速运动段且不超出视频范围"""
+        total = 240
+        indices, trajectory = make_swing(total, 8)
+        window = self.scheduler.locate_dense_window(indices, trajectory, total)
+        self.assertIsNotNone(window)
+        start, end = window
+        self.assertGreaterEqual(start, 0)
+        self.assertLessEqual(end, total - 1)
+        self.assertLessEqual(start, 120)
+        self.assertGreaterEqual(end, 120)
+
+    def test_audio_window_narrows_visual_window(self):
+        """音频窗口与视觉窗口重叠时取交集"""
+        total = 240
+        indices, trajectory = make_swing(total, 8)
+        visual = self.scheduler.locate_dense_window(indices, trajectory, total)
+        audio = (visual[0] + 2, visual[0] + 6)
+        self.assertEqual(self.scheduler.locate_dense_window(indices, trajectory, total, audio_window=audio), audio)
+
+    def test_clamp(self):
+        """窗口裁剪到 [0, total_frames - 1]，无交集时返回 None"""
+        self.assertEqual(PhaseAwareScheduler._clamp((-5, 500), 100), (0, 99))
+        self.assertIsNone(PhaseAwareScheduler._clamp((200, 300), 100))
+        self.assertIsNone(PhaseAwareScheduler._clamp(None, 100))
+
+    def test_peak_velocity_fallback(self):
+        """速度峰值回退：以最大位移为中心取前后两个粗扫描点"""
+        indices = [0, 8, 16, 24, 32, 40, 48]
+        trajectory = [[0.5, 0.5], [0.5, 0.5], [0.5, 0.5], [0.9, 0.1], [0.9, 0.1], [0.9, 0.1], [0.9, 0.1]]
+        self.assertEqual(self.scheduler._locate_by_peak_velocity(indices, trajectory), (8, 40))
+
+    def test_peak_velocity_ignores_missing_points(self):
+        """未检测到的点不参与速度计算"""
+        indices = [0, 8, 16]
+        trajectory = [[0, 0], [0.5, 0.5], [0, 0]]
+        self.assertIsNone(self.scheduler._locate_by_peak_velocity(indices, trajectory))
+
+
+class TestSparseFill(unittest.TestCase):
+    """稀疏推理后插值补齐的间隔测试"""
+
+    def test_max_gap(self):
+        """最大间隔为两倍步长，且不小于策略默认值"""
+        self.assertEqual(sparse_fill_max_gap(8), 16)
+        self.assertEqual(sparse_fill_max_gap(2), 10)
+        self.assertEqual(sparse_fill_max_gap(0), 10)
+
+    def test_missed_sample_still_filled(self):
+        """步长上的一个采样点漏检时，前后两个推理帧之间仍全部补齐"""
+        stride, total_frames = 4, 41
+        trajectory = [[0.0, 0.0] for _ in range(total_frames)]
+        for idx in range(0, total_frames, stride):
+            if idx != 16:
+                trajectory[idx] = [0.1 + idx * 0.01, 0.5]
+        filled = TrajectoryOptimizer().optimize_with_strategy(trajectory, "auto_fill", max_gap=sparse_fill_max_gap(stride))
+        self.assertTrue(all(p[0] != 0 and p[1] != 0 for p in filled))
+        self.assertAlmostEqual(filled[16][0], 0.1 + 16 * 0.01, places=6)
+        # 以步长为最大间隔时漏检点两侧会留下空洞
+        holes = TrajectoryOptimizer().optimize_with_strategy(trajectory, "auto_fill", max_gap=stride)
+        self.assertEqual(list(holes[16]), [0.0, 0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+跨任务动态批处理推理服务测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import unittest
+import numpy as np
+from detector.inference_server import InferenceServer
+
+
+class FakeDetector:
+    """
+    模拟 ultralytics 的批推理行为
+
+    同批帧尺寸一致时使用最小矩形 letterbox；尺寸不同时 letterbox 方式改变，检测结果随之偏移。
+    """
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def detect_batch(self, images, imgsz=480, conf=0.01, iou=0.7, max_det=10):
+        with self._lock:
+            self.batches.append([image.shape[:2] for image in images])
+        mixed = len({image.shape for image in images}) > 1
+        return [(float(image[0, 0, 0]) + (0.5 if mixed else 0.0), float(image.shape[0]), conf) for image in images]
+
+
+def frame(value, h=48, w=64):
+    """用像素值标记帧，便于核对结果是否回到正确的请求"""
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+class TestInferenceServer(unittest.TestCase):
+    """推理服务测试"""
+
+    def setUp(self):
+        self.detector = FakeDetector()
+        self.server = InferenceServer(detector=self.detector, max_batch_size=4, max_wait_ms=20)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_results_routed_to_submitting_future(self):
+        """每个 Future 拿到的是自己那一帧的结果"""
+        futures = []
+        with self.server._cond:  # 持锁提交，保证所有帧进入同一轮凑批
+            for job in ("a", "b", "c"):
+                for value in range(3):
+                    futures.append((job, value, self.server.submit(job, frame(10 * ord(job[0]) % 250 + value), 480)))
+        for job, value, future in futures:
+            self.assertEqual(future.result(5)[0], float(10 * ord(job[0]) % 250 + value))
+            self.assertIsNotNone(future.inference_seconds)
+        self.assertEqual(self.server.stats()["frames"], 9)
+
+    def test_round_robin_between_jobs(self):
+        """按任务轮询取帧：长任务排在前面也不会独占一整批"""
+        server = InferenceServer(detector=self.detector, max_batch_size=2, max_wait_ms=0)
+        try:
+            with server._cond:
+                for value in range(4):
+                    server.submit("long", frame(value), 480)
+                server.submit("short", frame(100), 480)
+                first = server._take_batch()
+                second = server._take_batch()
+            self.assertEqual([int(req.image[0, 0, 0]) for req in first], [0, 100])
+            self.assertEqual([int(req.image[0, 0, 0]) for req in second], [1, 2])
+        finally:
+            server.close()
+
+    def test_different_params_not_batched_together(self):
+        """推理参数不同的帧不合并"""
+        with self.server._cond:
+            a = self.server.submit("a", frame(1), 480)
+            b = self.server.submit("b", frame(2), 640)
+        self.assertEqual(a.result(5)[0], 1.0)
+        self.assertEqual(b.result(5)[0], 2.0)
+        self.assertEqual(self.server.stats()["batches"], 2)
+
+    def test_batched_results_equal_single_frame_results(self):
+        """不同尺寸的帧分开成批，批推理结果与单帧推理一致"""
+        images = [("a", frame(1, 48, 64)), ("b", frame(2, 64, 48)), ("a", frame(3, 48, 64)), ("b", frame(4, 64, 48))]
+        with self.server._cond:
+            futures = [self.server.submit(job, image, 480) for job, image in images]
+        batched = [future.result(5) for future in futures]
+        single = [self.detector.detect_batch([image], 480)[0] for _, image in images]
+        self.assertEqual(batched, single)
+        for shapes in self.detector.batches:
+            self.assertEqual(len(set(shapes)), 1)
+
+    def test_release_job_cancels_pending(self):
+        """释放任务时取消其未处理的请求"""
+        with self.server._cond:
+            futures = [self.server.submit("gone", frame(value), 480) for value in range(3)]
+            self.assertEqual(self.server.release_job("gone"), 3)
+        self.assertTrue(all(future.cancelled() for future in futures))
+        self.assertEqual(self.server.release_job("gone"), 0)
+        self.assertEqual(self.server.stats()["pending_frames"], 0)
+
+    def test_detector_error_propagates(self):
+        """批推理失败时异常传递给该批所有请求"""
+        def failing(images, **kwargs):
+            raise ValueError("boom")
+        self.detector.detect_batch = failing
+        future = self.server.submit("a", frame(1), 480)
+        with self.assertRaises(ValueError):
+            future.result(5)
+
+    def test_submit_after_close(self):
+        """关闭后不再接受请求"""
+        self.server.close()
+        with self.assertRaises(RuntimeError):
+            self.server.submit("a", frame(1), 480)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+任务检查点测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+from app.services.job_checkpoint import JobCheckpointStore
+
+
+class TestJobCheckpoint(unittest.TestCase):
+    """任务检查点写入、读取测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = JobCheckpointStore({
+            "enabled": True,
+            "dir": os.path.join(self.tmp_dir, "jobs"),
+            "interval_frames": 2,
+            "interval_seconds": 3600
+        })
+        self.upload_path = os.path.join(self.tmp_dir, "upload.mp4")
+        with open(self.upload_path, "wb") as f:
+            f.write(b"video")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_create_moves_upload(self):
+        """建立检查点时把上传文件移入任务目录"""
+        video_path = self.store.create("job1", self.upload_path, {"resolution": 480}, {"status": "queued"})
+        self.assertFalse(os.path.exists(self.upload_path))
+        self.assertTrue(os.path.exists(video_path))
+        meta = self.store.load_meta("job1")
+        self.assertEqual(meta["video_path"], video_path)
+        self.assertEqual(meta["params"], {"resolution": 480})
+        self.assertEqual(meta["decode_position"], 0)
+
+    def test_detections_round_trip(self):
+        """检测结果落盘后按帧号原样读回"""
+        self.store.create("job1", self.upload_path, {}, {})
+        checkpoint = self.store.open("job1")
+        checkpoint.record(0, (10.0, 20.0, 0.9), (480, 640, 3))
+        checkpoint.record(1, None, (480, 640, 3), gated=True)
+        checkpoint.maybe_flush(2)
+        checkpoint.record(2, (11.0, 21.0, 0.8), (480, 640, 3))
+        checkpoint.flush(3)
+
+        position, records = self.store.load_detections("job1")
+        self.assertEqual(position, 3)
+        self.assertEqual(records, [
+            [0, [10.0, 20.0, 0.9], [480, 640], False],
+            [1, None, [480, 640], True],
+            [2, [11.0, 21.0, 0.8], [480, 640], False],
+        ])
+
+    def test_maybe_flush_waits_for_interval(self):
+        """未达到帧数间隔时不落盘"""
+        self.store.create("job1", self.upload_path, {}, {})
+        checkpoint = self.store.open("job1")
+        checkpoint.record(0, None, (480, 640))
+        checkpoint.maybe_flush(1)
+        self.assertEqual(self.store.load_detections("job1"), (0, []))
+
+    def test_records_beyond_decode_position_ignored(self):
+        """解码位置之后的记录（meta 未更新前崩溃）被丢弃"""
+        self.store.create("job1", self.upload_path, {}, {})
+        self.store.append_detections("job1", [[0, None, [1, 1], False], [1, None, [1, 1], False]])
+        self.store.update_meta("job1", decode_position=1)
+        position, records = self.store.load_detections("job1")
+        self.assertEqual(position, 1)
+        self.assertEqual(len(records), 1)
+
+    def test_truncated_last_line_and_gap(self):
+        """写了一半的最后一行被忽略，帧号有缺口时只恢复缺口之前的部分"""
+        self.store.create("job1", self.upload_path, {}, {})
+        self.store.append_detections("job1", [[0, None, [1, 1], False], [2, None, [1, 1], False]])
+        with open(self.store._detections_path("job1"), "a") as f:
+            f.write('[3, nu')
+        self.store.update_meta("job1", decode_position=4)
+        position, records = self.store.load_detections("job1")
+        self.assertEqual(position, 1)
+        self.assertEqual(records[0][0], 0)
+
+    def test_list_interrupted_drops_incomplete_uploads(self):
+        """上传未完成或视频丢失的检查点被丢弃"""
+        self.store.create("job1", self.upload_path, {}, {})
+        other_upload = os.path.join(self.tmp_dir, "other.mp4")
+        with open(other_upload, "wb") as f:
+            f.write(b"video")
+        self.store.create("job2", other_upload, {}, {}, upload_complete=False)
+
+        interrupted = self.store.list_interrupted()
+        self.assertEqual([meta["job_id"] for meta in interrupted], ["job1"])
+        self.assertIsNone(self.store.load_meta("job2"))
+
+    def test_remove(self):
+        """删除检查点目录"""
+        self.store.create("job1", self.upload_path, {}, {})
+        self.store.remove("job1")
+        self.assertIsNone(self.store.open("job1"))
+        self.assertEqual(self.store.list_interrupted(), [])
+
+    def test_disabled_store(self):
+        """未启用时原样返回上传路径，不写任何文件"""
+        store = JobCheckpointStore({"enabled": False})
+        self.assertEqual(store.create("job1", self.upload_path, {}, {}), self.upload_path)
+        self.assertIsNone(store.open("job1"))
+        self.assertTrue(os.path.exists(self.upload_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
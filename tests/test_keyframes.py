@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+关键帧缩略图与雪碧图测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from analyzer.swing_state_machine import SwingPhase
+from app.services.keyframes import KeyframeCollector, find_keyframes
+from app.services.training_assets import training_asset_store
+
+
+def solid_frame(value, width=64, height=36):
+    """纯色帧，像素值即帧的标记"""
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+class TestFindKeyframes(unittest.TestCase):
+    """关键帧定位测试"""
+
+    def test_phase_boundaries(self):
+        """Top/Impact/Finish 取对应阶段的第一帧"""
+        phases = [SwingPhase.ADDRESS, SwingPhase.BACKSWING, SwingPhase.TRANSITION, SwingPhase.DOWNSWING,
+                  SwingPhase.IMPACT, SwingPhase.FOLLOWTHROUGH, SwingPhase.FINISH, SwingPhase.FINISH]
+        self.assertEqual(find_keyframes(phases), {"top": 2, "impact": 4, "finish": 6})
+
+    def test_fallback_phases(self):
+        """没有过渡/收杆阶段时取上杆/送杆最后一帧，没有击球时不返回 impact"""
+        phases = [SwingPhase.BACKSWING, SwingPhase.BACKSWING, SwingPhase.DOWNSWING,
+                  SwingPhase.FOLLOWTHROUGH, SwingPhase.FOLLOWTHROUGH]
+        self.assertEqual(find_keyframes(phases), {"top": 1, "finish": 4})
+
+
+class TestKeyframeCollector(unittest.TestCase):
+    """关键帧收集器测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(training_asset_store, "root", self.tmp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def collector(self, **kwargs):
+        params = {"thumb_width": 32, "tile_width": 16, "sprite_stride": 2, "sprite_columns": 4}
+        params.update(kwargs)
+        return KeyframeCollector("job1", 64, 36, **params)
+
+    def test_sprite_stride_doubles(self):
+        """格子超过上限时步长加倍，只保留新步长上的格子"""
+        collector = self.collector(max_tiles=4)
+        for i in range(10):
+            collector.offer(i, solid_frame(i))
+        self.assertEqual(collector.sprite_stride, 4)
+        self.assertEqual(sorted(collector._tiles), [0, 4, 8])
+
+    def test_sprite_missing_tiles_reuse_previous(self):
+        """缺失的格子沿用前一个格子"""
+        collector = self.collector()
+        collector.offer(0, solid_frame(10))
+        collector.offer(6, solid_frame(60))
+        sprite = collector._build_sprite(8)
+        tile_w, tile_h = collector.tile_size
+        self.assertEqual(sprite.shape, (tile_h, 4 * tile_w, 3))
+        values = [int(sprite[0, col * tile_w, 0]) for col in range(4)]
+        self.assertEqual(values, [10, 10, 10, 60])
+
+    def test_thumb_stride_doubles_within_budget(self):
+        """缩略图帧超过内存上限时步长加倍"""
+        thumb_w, thumb_h = self.collector().thumb_size
+        collector = self.collector(max_thumb_bytes=3 * thumb_w * thumb_h * 3)
+        for i in range(8):
+            collector.offer(i, solid_frame(i))
+        self.assertEqual(collector.thumb_stride, 4)
+        self.assertEqual(sorted(collector._thumbs), [0, 4])
+
+    def test_finalize_uses_retained_frames(self):
+        """保留在内存中的关键帧不再调用 frame_loader"""
+        collector = self.collector()
+        for i in range(8):
+            collector.offer(i, solid_frame(i * 20))
+        phases = [SwingPhase.BACKSWING] * 2 + [SwingPhase.TRANSITION, SwingPhase.DOWNSWING,
+                                               SwingPhase.IMPACT, SwingPhase.FOLLOWTHROUGH, SwingPhase.FINISH,
+                                               SwingPhase.FINISH]
+        loader = mock.Mock(return_value=None)
+        assets = collector.finalize(phases, 8, frame_loader=loader)
+        loader.assert_not_called()
+        self.assertEqual({name: info["frame"] for name, info in assets["keyframes"].items()},
+                         {"top": 2, "impact": 4, "finish": 6})
+        path = os.path.join(self.tmp_dir, "job1", "keyframes", "impact.jpg")
+        image = cv2.imread(path)
+        self.assertEqual(image.shape[:2], (collector.thumb_size[1], collector.thumb_size[0]))
+        self.assertAlmostEqual(int(image[0, 0, 0]), 80, delta=3)
+        sprite = assets["sprite"]
+        self.assertEqual(sprite["frame_stride"], 2)
+        self.assertEqual(sprite["tiles"], 4)
+        self.assertEqual(sprite["rows"], 1)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, "job1", "sprite.jpg")))
+
+    def test_finalize_loads_missing_frames(self):
+        """内存中没有的关键帧交给 frame_loader，取不到时跳过"""
+        collector = self.collector(max_thumb_bytes=1)
+        for i in range(4):
+            collector.offer(i, solid_frame(i))
+        phases = [SwingPhase.BACKSWING, SwingPhase.TRANSITION, SwingPhase.IMPACT, SwingPhase.FINISH]
+        loaded = {1: solid_frame(100)}
+        assets = collector.finalize(phases, 4, frame_loader=loaded.get)
+        self.assertEqual(sorted(assets["keyframes"]), ["top"])
+        self.assertEqual(assets["keyframes"]["top"]["frame"], 1)
+
+    def test_finalize_without_frames(self):
+        """没有收到任何帧时不生成雪碧图"""
+        collector = self.collector()
+        assets = collector.finalize([SwingPhase.IMPACT], 1)
+        self.assertEqual(assets, {"keyframes": {}, "sprite": None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+模型副本池测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import queue
+import unittest
+from unittest import mock
+from detector import model_pool
+from detector.model_pool import ModelReplicaPool, get_model_pool, resolve_pool_size
+from detector.yolov8_detector import YOLOv8Detector
+
+
+class TestModelReplicaPool(unittest.TestCase):
+    """副本借出/归还测试（模型加载替换为占位对象）"""
+
+    def setUp(self):
+        self.loads = []
+        patcher = mock.patch.object(YOLOv8Detector, "load_model", side_effect=lambda path: self.loads.append(path) or object())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lazy_load(self):
+        """首次借出时才加载所有副本"""
+        pool = ModelReplicaPool("model.pt", size=2)
+        self.assertEqual(self.loads, [])
+        self.assertEqual(pool.stats()["idle"], 2)
+        with pool.checkout():
+            pass
+        self.assertEqual(self.loads, ["model.pt", "model.pt"])
+
+    def test_checkout_returns_distinct_replicas(self):
+        """同时借出的副本各自持有独立的模型"""
+        pool = ModelReplicaPool("model.pt", size=2)
+        with pool.checkout() as a, pool.checkout() as b:
+            self.assertIsNot(a, b)
+            self.assertIsNot(a.model, b.model)
+            self.assertEqual(pool.stats()["idle"], 0)
+        self.assertEqual(pool.stats()["idle"], 2)
+        self.assertEqual(pool.stats()["checkouts"], 2)
+
+    def test_exhausted_pool_times_out(self):
+        """没有空闲副本时等待，超时抛出 queue.Empty"""
+        pool = ModelReplicaPool("model.pt", size=1)
+        with pool.checkout():
+            with self.assertRaises(queue.Empty):
+                with pool.checkout(timeout=0.05):
+                    pass
+        with pool.checkout(timeout=0.05):
+            pass
+
+    def test_replica_returned_on_error(self):
+        """with 块内抛出异常时副本仍被归还"""
+        pool = ModelReplicaPool("model.pt", size=1)
+        with self.assertRaises(ValueError):
+            with pool.checkout():
+                raise ValueError("inference failed")
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_checkout_does_not_touch_threads_or_affinity(self):
+        """借出副本不修改进程级线程数或 CPU 亲和性"""
+        pool = ModelReplicaPool("model.pt", size=2)
+        with mock.patch.object(os, "sched_setaffinity", create=True) as setaffinity:
+            with pool.checkout():
+                pass
+        setaffinity.assert_not_called()
+
+    def test_get_model_pool_cached_per_model(self):
+        """按模型路径缓存全局副本池"""
+        with mock.patch.dict(model_pool._pools, clear=True):
+            a = get_model_pool("a.pt", size=1)
+            self.assertIs(get_model_pool("a.pt", size=3), a)
+            self.assertIsNot(get_model_pool("b.pt", size=1), a)
+            self.assertEqual(a.size, 1)
+
+
+class TestResolvePoolSize(unittest.TestCase):
+    """副本数解析测试"""
+
+    def test_explicit_size(self):
+        """显式数量直接使用"""
+        self.assertEqual(resolve_pool_size(3), 3)
+        self.assertEqual(resolve_pool_size("2"), 2)
+        self.assertEqual(resolve_pool_size(0), 1)
+
+    def test_auto_on_gpu(self):
+        """GPU 上只用一个副本"""
+        with mock.patch.object(model_pool, "_cuda_available", return_value=True):
+            self.assertEqual(resolve_pool_size("auto"), 1)
+
+    def test_auto_on_cpu(self):
+        """CPU 上按可用核数 / 每副本核数，并受上限约束"""
+        with mock.patch.object(model_pool, "_cuda_available", return_value=False), \
+                mock.patch.object(model_pool, "_available_cpus", return_value=list(range(16))):
+            self.assertEqual(resolve_pool_size("auto", max_replicas=8, cores_per_replica=4), 4)
+            self.assertEqual(resolve_pool_size("auto", max_replicas=2, cores_per_replica=4), 2)
+            self.assertEqual(resolve_pool_size("auto", max_replicas=8, cores_per_replica=32), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
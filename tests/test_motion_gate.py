@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+运动门控测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import numpy as np
+from analyzer.motion_gate import MotionGate
+
+
+def blank_frame(value=0, h=240, w=320):
+    """构造纯色 BGR 帧"""
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+class TestMotionGate(unittest.TestCase):
+    """运动门控测试"""
+
+    def test_first_frame_always_inferred(self):
+        """没有参考帧时必须推理"""
+        gate = MotionGate()
+        self.assertTrue(gate.should_infer(blank_frame()))
+
+    def test_static_frame_gated(self):
+        """与参考帧相同的帧被跳过"""
+        gate = MotionGate()
+        frame = blank_frame(50)
+        self.assertTrue(gate.should_infer(frame))
+        gate.record_inference({"ball": 1}, 0.02)
+        self.assertFalse(gate.should_infer(frame.copy()))
+        self.assertEqual(gate.last_result, {"ball": 1})
+
+    def test_changed_frame_inferred(self):
+        """画面明显变化时重新推理"""
+        gate = MotionGate()
+        gate.should_infer(blank_frame(0))
+        moved = blank_frame(0)
+        moved[60:180, 80:240] = 255
+        self.assertTrue(gate.should_infer(moved))
+
+    def test_small_noise_tolerated(self):
+        """低于像素阈值的噪声不算变化"""
+        gate = MotionGate(pixel_threshold=15)
+        gate.should_infer(blank_frame(100))
+        self.assertFalse(gate.should_infer(blank_frame(110)))
+
+    def test_max_consecutive_gated_forces_inference(self):
+        """连续跳过达到上限后强制推理一次"""
+        gate = MotionGate(max_consecutive_gated=3)
+        frame = blank_frame(30)
+        self.assertTrue(gate.should_infer(frame))
+        self.assertEqual([gate.should_infer(frame) for _ in range(4)], [False, False, False, True])
+
+    def test_reset_clears_reference_keeps_stats(self):
+        """reset 清除参考帧但保留统计信息"""
+        gate = MotionGate()
+        frame = blank_frame(30)
+        gate.should_infer(frame)
+        gate.record_inference("r", 0.01)
+        gate.should_infer(frame)
+        gate.reset()
+        self.assertIsNone(gate.last_result)
+        self.assertTrue(gate.should_infer(frame))
+        self.assertEqual(gate.gated_frames, 1)
+        self.assertEqual(gate.inferred_frames, 1)
+
+    def test_resolution_change_inferred(self):
+        """参考帧尺寸不同（分辨率切换）时重新推理"""
+        gate = MotionGate()
+        gate.should_infer(blank_frame(30, 240, 320))
+        self.assertTrue(gate.should_infer(blank_frame(30, 320, 240)))
+
+    def test_stats(self):
+        """统计跳过比例和节省时间"""
+        gate = MotionGate()
+        frame = blank_frame(30)
+        gate.should_infer(frame)
+        gate.record_inference("r", 0.02)
+        for _ in range(3):
+            gate.should_infer(frame)
+        stats = gate.stats()
+        self.assertEqual(stats["gated_frames"], 3)
+        self.assertEqual(stats["inferred_frames"], 1)
+        self.assertEqual(stats["gated_ratio"], 0.75)
+        self.assertEqual(stats["avg_inference_ms"], 20.0)
+        self.assertEqual(stats["estimated_time_saved_ms"], 60.0)
+
+    def test_empty_stats(self):
+        """没有帧时统计为零"""
+        stats = MotionGate().stats()
+        self.assertEqual(stats["gated_ratio"], 0.0)
+        self.assertEqual(stats["avg_inference_ms"], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
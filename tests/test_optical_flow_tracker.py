@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+杆头光流跟踪器测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import cv2
+import numpy as np
+from analyzer.optical_flow_tracker import ClubHeadFlowTracker
+
+
+def textured_frame(h=240, w=320, seed=0):
+    """构造带纹理的灰度帧（平滑噪声，便于角点检测和光流）"""
+    rng = np.random.RandomState(seed)
+    noise = rng.randint(0, 256, (h, w)).astype(np.uint8)
+    return cv2.GaussianBlur(noise, (5, 5), 1.5)
+
+
+def shifted(gray, dx, dy):
+    """整体平移图像"""
+    h, w = gray.shape
+    matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(gray, matrix, (w, h), borderMode=cv2.BORDER_REFLECT)
+
+
+class TestClubHeadFlowTracker(unittest.TestCase):
+    """杆头光流跟踪器测试"""
+
+    def test_inactive_before_init(self):
+        """未初始化时不跟踪"""
+        tracker = ClubHeadFlowTracker()
+        self.assertFalse(tracker.active)
+        self.assertIsNone(tracker.track(textured_frame()))
+
+    def test_init_sets_confidence(self):
+        """初始化后置信度等于检测置信度，跟踪质量为 1.0"""
+        tracker = ClubHeadFlowTracker()
+        self.assertTrue(tracker.init(textured_frame(), (160, 120), 0.9))
+        self.assertTrue(tracker.active)
+        self.assertAlmostEqual(tracker.confidence, 0.9)
+        self.assertEqual(tracker.quality, 1.0)
+
+    def test_low_confidence_detection_still_tracked(self):
+        """低置信度检测初始化后跟踪质量不受影响，仍高于强制检测阈值"""
+        tracker = ClubHeadFlowTracker()
+        frame = textured_frame()
+        tracker.init(frame, (160, 120), 0.05)
+        result = tracker.track(shifted(frame, 3, 2))
+        self.assertIsNotNone(result)
+        self.assertGreater(tracker.quality, 0.35)
+        self.assertAlmostEqual(result[2], 0.05 * tracker.quality)
+
+    def test_init_outside_frame_fails(self):
+        """杆头位置在画面之外时初始化失败"""
+        tracker = ClubHeadFlowTracker(patch_radius=10)
+        self.assertFalse(tracker.init(textured_frame(), (1000, 1000), 0.9))
+        self.assertFalse(tracker.active)
+
+    def test_tracks_translation(self):
+        """整体平移时杆头位置随之移动，置信度不增加"""
+        tracker = ClubHeadFlowTracker()
+        frame = textured_frame()
+        tracker.init(frame, (160, 120), 0.9)
+        result = tracker.track(shifted(frame, 4, -3))
+        self.assertIsNotNone(result)
+        x, y, confidence = result
+        self.assertAlmostEqual(x, 164, delta=0.5)
+        self.assertAlmostEqual(y, 117, delta=0.5)
+        self.assertLessEqual(confidence, 0.9)
+        self.assertGreater(confidence, 0.0)
+
+    def test_confidence_decays_over_frames(self):
+        """连续跟踪时置信度单调不增"""
+        tracker = ClubHeadFlowTracker()
+        frame = textured_frame()
+        tracker.init(frame, (160, 120), 1.0)
+        confidences = []
+        for step in range(1, 4):
+            result = tracker.track(shifted(frame, 2 * step, 0))
+            self.assertIsNotNone(result)
+            confidences.append(result[2])
+        self.assertEqual(confidences, sorted(confidences, reverse=True))
+
+    def test_reset(self):
+        """reset 后不再跟踪"""
+        tracker = ClubHeadFlowTracker()
+        tracker.init(textured_frame(), (160, 120), 0.9)
+        tracker.reset()
+        self.assertFalse(tracker.active)
+        self.assertEqual(tracker.confidence, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+性能档位测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy
+import json
+import shutil
+import tempfile
+import unittest
+from app.config import VIDEO_ANALYSIS_CONFIG
+from app.services.performance_profiles import profiles_payload, resolve_analysis_params, resolve_profile
+
+
+class TestResolveAnalysisParams(unittest.TestCase):
+    """参数优先级测试"""
+
+    def setUp(self):
+        self.config = copy.deepcopy(VIDEO_ANALYSIS_CONFIG)
+        self.config["default_profile"] = None
+
+    def test_unknown_profile(self):
+        """不存在的档位抛出 ValueError"""
+        with self.assertRaises(ValueError):
+            resolve_profile(self.config, "turbo")
+        self.assertEqual(resolve_profile(self.config, None), {})
+
+    def test_defaults_without_profile(self):
+        """未指定档位时使用配置默认值"""
+        params = resolve_analysis_params(self.config)
+        self.assertIsNone(params["profile"])
+        self.assertEqual(params["resolution"], self.config["default_resolution"])
+        self.assertEqual(params["confidence"], self.config["default_confidence"])
+        self.assertEqual(params["scheduling_mode"], self.config["default_scheduling_mode"])
+        self.assertEqual(params["model_tier"], "default")
+        self.assertEqual(params["backend"], "auto")
+        self.assertIsNone(params["strategies"])
+        self.assertEqual(params["motion_gate"], self.config["motion_gate"]["enabled"])
+
+    def test_profile_values(self):
+        """指定档位时使用档位中的设置，档位没有的参数回退到配置默认值"""
+        fast = self.config["performance_profiles"]["fast"]
+        params = resolve_analysis_params(self.config, "fast")
+        self.assertEqual(params["profile"], "fast")
+        self.assertEqual(params["resolution"], fast["resolution"])
+        self.assertEqual(params["scheduling_mode"], fast["scheduling_mode"])
+        self.assertEqual(params["model_tier"], fast["model_tier"])
+        self.assertEqual(params["strategies"], fast["strategies"])
+        self.assertEqual(params["motion_gate"], fast["motion_gate"])
+        self.assertEqual(params["iou"], self.config["default_iou"])
+
+    def test_explicit_params_override_profile(self):
+        """单独传入的参数优先于档位"""
+        params = resolve_analysis_params(self.config, "fast", resolution="1280", confidence="0.5",
+                                         scheduling_mode="full", motion_gate=False)
+        self.assertEqual(params["resolution"], "1280")
+        self.assertEqual(params["confidence"], "0.5")
+        self.assertEqual(params["scheduling_mode"], "full")
+        self.assertFalse(params["motion_gate"])
+        # 没有单独参数的档位设置不受影响
+        self.assertEqual(params["model_tier"], "cheap")
+
+    def test_default_profile(self):
+        """配置了 default_profile 时未指定档位的任务使用它"""
+        self.config["default_profile"] = "accurate"
+        params = resolve_analysis_params(self.config)
+        self.assertEqual(params["profile"], "accurate")
+        self.assertEqual(params["resolution"], self.config["performance_profiles"]["accurate"]["resolution"])
+
+
+class TestProfilesPayload(unittest.TestCase):
+    """/analyze/profiles 响应测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = copy.deepcopy(VIDEO_ANALYSIS_CONFIG)
+        self.config["profile_benchmark_file"] = os.path.join(self.tmp_dir, "benchmarks.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_without_benchmarks(self):
+        """没有基准结果时列出档位定义，measured 为 None"""
+        payload = profiles_payload(self.config, hardware="cpu:x86_64x8")
+        self.assertEqual(payload["hardware"], "cpu:x86_64x8")
+        self.assertEqual([p["name"] for p in payload["profiles"]], list(self.config["performance_profiles"]))
+        for profile in payload["profiles"]:
+            self.assertIsNone(profile["measured"])
+            self.assertFalse(profile["measured_on_current_hardware"])
+            self.assertIn("scheduling_mode", profile)
+        self.assertIsNone(payload["benchmark"]["hardware"])
+
+    def test_with_benchmarks(self):
+        """基准结果在当前硬件上测得时标记 measured_on_current_hardware"""
+        with open(self.config["profile_benchmark_file"], "w", encoding="utf-8") as f:
+            json.dump({"hardware": "cpu:x86_64x8", "generated_at": "2026-01-01T00:00:00", "video": "swing.mp4",
+                       "profiles": {"fast": {"fps": 42.0, "agreement": 0.91}}}, f)
+        payload = profiles_payload(self.config, hardware="cpu:x86_64x8")
+        by_name = {p["name"]: p for p in payload["profiles"]}
+        self.assertEqual(by_name["fast"]["measured"], {"fps": 42.0, "agreement": 0.91})
+        self.assertTrue(by_name["fast"]["measured_on_current_hardware"])
+        self.assertFalse(by_name["accurate"]["measured_on_current_hardware"])
+        self.assertEqual(payload["benchmark"]["video"], "swing.mp4")
+        other = profiles_payload(self.config, hardware="cuda:A100")
+        self.assertFalse({p["name"]: p for p in other["profiles"]}["fast"]["measured_on_current_hardware"])
+
+    def test_invalid_benchmark_file(self):
+        """基准结果文件损坏时忽略"""
+        with open(self.config["profile_benchmark_file"], "w", encoding="utf-8") as f:
+            f.write("{not json")
+        payload = profiles_payload(self.config, hardware="cpu:x86_64x8")
+        self.assertTrue(all(p["measured"] is None for p in payload["profiles"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+多进程推理分片与合并测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+from detector.process_pool import ProcessPoolRunner
+
+
+class TestPlanShards(unittest.TestCase):
+    """帧区间切片测试"""
+
+    def test_even_split(self):
+        """区间按分片长度切成闭区间"""
+        self.assertEqual(ProcessPoolRunner.plan_shards(0, 899, 300), [(0, 299), (300, 599), (600, 899)])
+
+    def test_last_shard_shorter(self):
+        """最后一片不足分片长度"""
+        self.assertEqual(ProcessPoolRunner.plan_shards(0, 649, 300), [(0, 299), (300, 599), (600, 649)])
+
+    def test_offset_and_single_frame(self):
+        """支持非零起点和单帧区间"""
+        self.assertEqual(ProcessPoolRunner.plan_shards(10, 14, 2), [(10, 11), (12, 13), (14, 14)])
+        self.assertEqual(ProcessPoolRunner.plan_shards(0, 0, 300), [(0, 0)])
+
+    def test_invalid_shard_size(self):
+        """分片长度小于 1 时按 1 处理"""
+        self.assertEqual(ProcessPoolRunner.plan_shards(0, 2, 0), [(0, 0), (1, 1), (2, 2)])
+
+    def test_shards_cover_range_without_overlap(self):
+        """分片首尾相接、覆盖整个区间"""
+        shards = ProcessPoolRunner.plan_shards(0, 1000, 77)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], 1000)
+        for (_, end), (start, _) in zip(shards, shards[1:]):
+            self.assertEqual(start, end + 1)
+
+
+class TestMergeShards(unittest.TestCase):
+    """分片结果合并测试"""
+
+    def test_merge_out_of_order(self):
+        """分片乱序返回时按帧号合并，门控统计求和"""
+        outputs = [
+            ([(2, (5.0, 6.0, 0.9), (48, 64, 3), False), (3, None, (48, 64, 3), False)],
+             {"gated_frames": 1, "inferred_frames": 1, "inference_seconds": 0.5},
+             [(3, b"jpeg3")], [2, 3]),
+            ([(0, (1.0, 2.0, 0.8), (48, 64, 3), False), (1, (1.0, 2.0, 0.8), (48, 64, 3), True)],
+             {"gated_frames": 1, "inferred_frames": 1, "inference_seconds": 0.25},
+             [(0, b"jpeg0")], [0, 1]),
+            ([(4, None, (48, 64, 3), False)], {}, [], []),
+        ]
+        merged, gate_stats, training_frames, cached_frames = ProcessPoolRunner.merge_shards(outputs)
+        self.assertEqual([r[0] for r in merged], [0, 1, 2, 3, 4])
+        self.assertTrue(merged[1][3])
+        self.assertEqual(gate_stats, {"gated_frames": 2, "inferred_frames": 2, "inference_seconds": 0.75})
+        self.assertEqual(training_frames, [(0, b"jpeg0"), (3, b"jpeg3")])
+        self.assertEqual(cached_frames, [0, 1, 2, 3])
+
+    def test_cancel_check_stops_merge(self):
+        """cancel_check 抛出异常时停止等待剩余分片"""
+        consumed = []
+
+        def outputs():
+            for shard in range(3):
+                consumed.append(shard)
+                yield [(shard, None, (1, 1, 3), False)], {}, [], []
+
+        def cancel_check():
+            if len(consumed) >= 2:
+                raise RuntimeError("cancelled")
+
+        with self.assertRaises(RuntimeError):
+            ProcessPoolRunner.merge_shards(outputs(), cancel_check)
+        self.assertEqual(consumed, [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Range 文件响应测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+from app.utils.static_files import file_range_response
+
+
+async def read_body(response):
+    """读取流式响应的全部内容"""
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class TestFileRangeResponse(unittest.TestCase):
+    """Range 请求处理测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "video.mp4")
+        self.data = bytes(range(100))
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _response(self, range_header, headers=None):
+        response = file_range_response(self.path, range_header, "video/mp4", headers=headers)
+        body = asyncio.run(read_body(response)) if hasattr(response, "body_iterator") else response.body
+        return response, body
+
+    def test_no_range_full_file(self):
+        """没有 Range 头时返回整个文件"""
+        response, body = self._response(None, headers={"Cache-Control": "no-cache"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response.headers["content-length"], "100")
+        self.assertEqual(response.headers["accept-ranges"], "bytes")
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+
+    def test_closed_range(self):
+        """bytes=start-end 返回闭区间"""
+        response, body = self._response("bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[10:20])
+        self.assertEqual(response.headers["content-range"], "bytes 10-19/100")
+        self.assertEqual(response.headers["content-length"], "10")
+
+    def test_open_range(self):
+        """bytes=start- 返回到文件末尾"""
+        response, body = self._response("bytes=90-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[90:])
+        self.assertEqual(response.headers["content-range"], "bytes 90-99/100")
+
+    def test_suffix_range(self):
+        """bytes=-N 返回最后 N 个字节，N 超过文件大小时返回整个文件"""
+        response, body = self._response("bytes=-5")
+        self.assertEqual(body, self.data[-5:])
+        self.assertEqual(response.headers["content-range"], "bytes 95-99/100")
+        response, body = self._response("bytes=-500")
+        self.assertEqual(body, self.data)
+
+    def test_end_clamped(self):
+        """结束位置超过文件大小时截断"""
+        response, body = self._response("bytes=50-1000")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[50:])
+        self.assertEqual(response.headers["content-range"], "bytes 50-99/100")
+
+    def test_unsatisfiable(self):
+        """起始位置越界或区间颠倒时返回 416"""
+        for range_header in ("bytes=100-", "bytes=20-10"):
+            response, _ = self._response(range_header)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response.headers["content-range"], "bytes */100")
+
+    def test_unrecognized_range(self):
+        """无法识别的 Range（多区间、其他单位、空区间）按无 Range 处理"""
+        for range_header in ("bytes=0-1,5-6", "items=0-5", "bytes=-", ""):
+            response, body = self._response(range_header)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(body, self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
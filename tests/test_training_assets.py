@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+训练数据静态资源测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import shutil
+import tempfile
+import time
+import unittest
+import numpy as np
+from app.services.training_assets import TrainingAssetStore
+from app.utils.static_files import CachedStaticFiles
+
+
+class TestTrainingAssetStore(unittest.TestCase):
+    """按任务组织的训练帧文件测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = TrainingAssetStore({"dir": os.path.join(self.tmp_dir, "static", "jobs"),
+                                         "url_prefix": "/static/jobs/", "ttl_seconds": 60, "encode_workers": 2})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_encode_and_write_frames(self):
+        """并行编码的帧写入任务目录，返回逐帧 URL"""
+        frames = [(f"frame_{i:06d}.jpg", np.full((16, 16, 3), i * 40, dtype=np.uint8)) for i in range(4)]
+        encoded = self.store.encode_frames(frames, quality=80)
+        self.assertEqual([name for name, _ in encoded], [name for name, _ in frames])
+        self.assertTrue(all(jpeg.startswith(b"\xff\xd8") for _, jpeg in encoded))
+        urls = self.store.write_frames("job1", encoded)
+        self.assertEqual(urls["frame_000002.jpg"], "/static/jobs/job1/frames/frame_000002.jpg")
+        for name, jpeg in encoded:
+            with open(self.store.frame_path("job1", name), "rb") as f:
+                self.assertEqual(f.read(), jpeg)
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(os.path.join(self.store.job_dir("job1"), "frames"))))
+
+    def test_page_and_manifest(self):
+        """页面和清单写在任务目录下，清单可读回"""
+        url = self.store.write_page("job1", "training_data.html", "<html>训练数据</html>")
+        self.assertEqual(url, "/static/jobs/job1/training_data.html")
+        self.store.write_manifest("job1", {"job_id": "job1", "frames": [{"frame": 3}]})
+        self.assertEqual(self.store.load_manifest("job1"), {"job_id": "job1", "frames": [{"frame": 3}]})
+        self.assertIsNone(self.store.load_manifest("job2"))
+        self.assertIsNone(self.store.load_manifest("../job1"))
+
+    def test_sweep_expired(self):
+        """超过保留期的任务目录和旧版训练数据页面被删除，未过期的保留"""
+        self.store.write_page("old", "training_data.html", "old")
+        self.store.write_page("new", "training_data.html", "new")
+        legacy_page = os.path.join(self.tmp_dir, "static", "training_data_old.html")
+        other_file = os.path.join(self.tmp_dir, "static", "index.html")
+        for path in (legacy_page, other_file):
+            with open(path, "w") as f:
+                f.write("x")
+        past = time.time() - 120
+        for path in (self.store.job_dir("old"), legacy_page, other_file):
+            os.utime(path, (past, past))
+        self.assertEqual(self.store.sweep_expired(), 2)
+        self.assertFalse(os.path.exists(self.store.job_dir("old")))
+        self.assertFalse(os.path.exists(legacy_page))
+        self.assertTrue(os.path.exists(self.store.job_dir("new")))
+        self.assertTrue(os.path.exists(other_file))
+
+
+class TestCachedStaticFiles(unittest.TestCase):
+    """静态文件缓存头测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp_dir, "jobs", "job1"))
+        for name in ("jobs/job1/frame.jpg", "jobs/job1/training_data.html", "logo.png"):
+            with open(os.path.join(self.tmp_dir, name), "wb") as f:
+                f.write(b"x")
+        self.static = CachedStaticFiles(directory=self.tmp_dir, cache_rules={
+            "*.html": "no-cache",
+            "jobs/": "public, max-age=60, immutable"
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _cache_control(self, path):
+        scope = {"type": "http", "method": "GET", "headers": []}
+        response = asyncio.run(self.static.get_response(path, scope))
+        return response.headers.get("Cache-Control")
+
+    def test_rules(self):
+        """页面不缓存，任务目录下的帧图片长期缓存，其他文件不加缓存头"""
+        self.assertEqual(self._cache_control("jobs/job1/frame.jpg"), "public, max-age=60, immutable")
+        self.assertEqual(self._cache_control("jobs/job1/training_data.html"), "no-cache")
+        self.assertIsNone(self._cache_control("logo.png"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+训练数据 ZIP 导出测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import cv2
+import numpy as np
+from app.services.training_assets import encode_jpeg, jpeg_size
+from app.services.training_export import build_manifest, iter_training_zip, yolo_label
+
+
+class TestYoloLabel(unittest.TestCase):
+    """YOLO 标注行测试"""
+
+    def test_detected_frame(self):
+        """检测到杆头时输出以检测位置为中心的固定尺寸框"""
+        label = yolo_label({"detected": True, "norm_x": 0.25, "norm_y": 0.5}, 1, 0.04)
+        self.assertEqual(label, "1 0.250000 0.500000 0.040000 0.040000\n")
+
+    def test_box_clamped_inside_image(self):
+        """框中心被限制在图像内，框不越界"""
+        label = yolo_label({"detected": True, "norm_x": 0.0, "norm_y": 1.0}, 1, 0.04)
+        self.assertEqual(label, "1 0.020000 0.980000 0.040000 0.040000\n")
+
+    def test_undetected_frame_empty(self):
+        """未检测到（失败帧）时为空标注"""
+        self.assertEqual(yolo_label({"detected": False}, 1, 0.04), "")
+        self.assertEqual(yolo_label(None, 1, 0.04), "")
+
+
+class TestTrainingZip(unittest.TestCase):
+    """训练数据 ZIP 结构测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        frame_data = [
+            {"frame_number": 3, "filename": "frame_000003_failure.jpg", "frame_type": "failure", "image_data": "base64..."},
+            {"frame_number": 7, "filename": "frame_000007_low_confidence.jpg", "frame_type": "low_confidence"},
+            {"frame_number": 9, "filename": "frame_000009_missing.jpg", "frame_type": "failure"},
+        ]
+        detections = {
+            3: {"detected": False},
+            7: {"detected": True, "norm_x": 0.5, "norm_y": 0.5, "confidence": 0.3},
+        }
+        self.manifest = build_manifest("job1", frame_data, 2, 1, 100, 30.0, 0.5, detections, (1920, 1080))
+        for name in ("frame_000003_failure.jpg", "frame_000007_low_confidence.jpg"):
+            with open(os.path.join(self.tmp_dir, name), "wb") as f:
+                f.write(b"\xff\xd8jpeg-" + name.encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _build_zip(self, chunk_size=4):
+        data = b"".join(iter_training_zip(self.manifest, chunk_size=chunk_size,
+                                          image_path=lambda frame: os.path.join(self.tmp_dir, frame["filename"])))
+        return zipfile.ZipFile(io.BytesIO(data))
+
+    def test_manifest_strips_image_data(self):
+        """清单不包含 base64 图片，附带每帧检测结果"""
+        frame = self.manifest["frames"][0]
+        self.assertNotIn("image_data", frame)
+        self.assertEqual(frame["detection"], {"detected": False})
+        self.assertIsNone(self.manifest["frames"][2]["detection"])
+
+    def test_zip_layout(self):
+        """ZIP 包含说明、元数据、类别、图片和同名标注，缺失的图片被跳过"""
+        zip_file = self._build_zip()
+        self.assertIsNone(zip_file.testzip())
+        self.assertEqual(sorted(zip_file.namelist()), sorted([
+            "README.md",
+            "metadata.json",
+            "classes.txt",
+            "images/frame_000003_failure.jpg",
+            "labels/frame_000003_failure.txt",
+            "images/frame_000007_low_confidence.jpg",
+            "labels/frame_000007_low_confidence.txt",
+        ]))
+        self.assertEqual(zip_file.read("images/frame_000007_low_confidence.jpg"),
+                         b"\xff\xd8jpeg-frame_000007_low_confidence.jpg")
+        self.assertEqual(zip_file.getinfo("images/frame_000003_failure.jpg").compress_type, zipfile.ZIP_STORED)
+
+    def test_labels(self):
+        """失败帧为空标注，低置信度帧为预标注框"""
+        zip_file = self._build_zip()
+        self.assertEqual(zip_file.read("labels/frame_000003_failure.txt"), b"")
+        label = zip_file.read("labels/frame_000007_low_confidence.txt").decode()
+        class_id, cx, cy, w, h = label.split()
+        self.assertEqual((float(cx), float(cy)), (0.5, 0.5))
+        self.assertEqual(float(w), float(h))
+        classes = zip_file.read("classes.txt").decode().splitlines()
+        self.assertLess(int(class_id), len(classes))
+
+    def test_metadata(self):
+        """metadata.json 即任务清单"""
+        metadata = json.loads(self._build_zip().read("metadata.json"))
+        self.assertEqual(metadata["job_id"], "job1")
+        self.assertEqual(metadata["failure_count"], 2)
+        self.assertEqual(len(metadata["frames"]), 3)
+        self.assertEqual((metadata["video_width"], metadata["video_height"]), (1920, 1080))
+
+    def test_readme_states_resolution(self):
+        """README 给出原视频分辨率"""
+        readme = self._build_zip().read("README.md").decode()
+        self.assertIn("1920x1080", readme)
+
+    def test_streamed_in_chunks(self):
+        """ZIP 按条目分批产出，而不是一次性生成"""
+        chunks = list(iter_training_zip(self.manifest, chunk_size=4,
+                                        image_path=lambda frame: os.path.join(self.tmp_dir, frame["filename"])))
+        self.assertGreater(len([chunk for chunk in chunks if chunk]), 3)
+
+
+class TestJpegSize(unittest.TestCase):
+    """JPEG 尺寸读取测试"""
+
+    def test_encoded_frame(self):
+        """读出的尺寸与编码前的帧一致"""
+        frame = np.zeros((540, 960, 3), dtype=np.uint8)
+        self.assertEqual(jpeg_size(encode_jpeg(frame)), (960, 540))
+        ok, progressive = cv2.imencode(".jpg", frame[:100, :50], [cv2.IMWRITE_JPEG_PROGRESSIVE, 1])
+        self.assertEqual(jpeg_size(progressive.tobytes()), (50, 100))
+
+    def test_invalid(self):
+        """不是 JPEG 或数据被截断时返回 None"""
+        self.assertIsNone(jpeg_size(b"\xff\xd8jpeg-frame"))
+        self.assertIsNone(jpeg_size(b""))
+        self.assertIsNone(jpeg_size(encode_jpeg(np.zeros((8, 8, 3), dtype=np.uint8))[:10]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+训练帧旁路缓冲测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from app.services.training_assets import jpeg_size
+from app.services.training_frames import TrainingFrameBuffer, TrainingFrameRegistry
+
+
+class TestTrainingFrameBuffer(unittest.TestCase):
+    """检测过程中收集训练帧测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_buffer(self, **kwargs):
+        return TrainingFrameBuffer("job1", spill_dir=self.tmp_dir, **kwargs)
+
+    def test_classify(self):
+        """未检出为失败帧，低于阈值为低置信度帧，其余不收集"""
+        buffer = self.make_buffer(confidence_threshold=0.3)
+        self.assertEqual(buffer.classify(None), "failure")
+        self.assertEqual(buffer.classify((10.0, 20.0, 0.1)), "low_confidence")
+        self.assertIsNone(buffer.classify((10.0, 20.0, 0.9)))
+
+    def test_offer_encodes_at_frame_size(self):
+        """失败帧/低置信度帧按检测时的帧尺寸编码，高置信度帧忽略"""
+        buffer = self.make_buffer()
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        self.assertTrue(buffer.offer(0, frame, None))
+        self.assertTrue(buffer.offer(1, frame, (1.0, 1.0, 0.1)))
+        self.assertFalse(buffer.offer(2, frame, (1.0, 1.0, 0.9)))
+        self.assertEqual(list(buffer.frames()), [0, 1])
+        self.assertNotIn(2, buffer)
+        self.assertEqual(jpeg_size(buffer.get(0)), (64, 48))
+        self.assertIsNone(buffer.get(2))
+        buffer.close()
+
+    def test_spill_to_disk(self):
+        """内存超过上限后溢出到磁盘，close 时删除溢出文件"""
+        buffer = self.make_buffer(max_memory_bytes=10)
+        buffer.add_encoded(0, b"a" * 8)
+        buffer.add_encoded(1, b"b" * 8)
+        stats = buffer.stats()
+        self.assertEqual(stats["memory_frames"], 1)
+        self.assertEqual(stats["spilled_frames"], 1)
+        self.assertEqual(buffer.get(1), b"b" * 8)
+        buffer.close()
+        self.assertFalse(os.path.exists(buffer.spill_dir))
+        self.assertIsNone(buffer.get(0))
+
+    def test_max_frames(self):
+        """总帧数达到上限后丢弃并计数"""
+        buffer = self.make_buffer(max_frames=2)
+        for idx in range(4):
+            buffer.add_encoded(idx, b"x")
+        self.assertEqual(list(buffer.frames()), [0, 1])
+        self.assertEqual(buffer.stats()["dropped_frames"], 2)
+
+    def test_resubmit_replaces(self):
+        """同一帧重复提交时以最后一次为准，内存计数不重复累加"""
+        buffer = self.make_buffer()
+        buffer.add_encoded(5, b"old")
+        buffer.add_encoded(5, b"newer")
+        self.assertEqual(buffer.get(5), b"newer")
+        self.assertEqual(buffer.stats()["memory_bytes"], 5)
+
+
+class TestTrainingFrameRegistry(unittest.TestCase):
+    """训练帧缓冲注册表测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.registry = TrainingFrameRegistry({"spill_dir": self.tmp_dir, "confidence_threshold": 0.5})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_create_and_release(self):
+        """按配置创建缓冲，重新创建时关闭旧缓冲，释放后取不到"""
+        buffer = self.registry.create("job1")
+        self.assertEqual(buffer.confidence_threshold, 0.5)
+        buffer.add_encoded(0, b"x")
+        replacement = self.registry.create("job1")
+        self.assertIsNone(buffer.get(0))
+        self.assertIs(self.registry.get("job1"), replacement)
+        self.registry.release("job1")
+        self.assertIsNone(self.registry.get("job1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+跨任务训练帧池测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+import cv2
+import numpy as np
+from app.services.training_pool import TrainingFramePool, hamming_distances, phash
+
+
+def make_jpeg(seed, brightness=0, quality=90):
+    """构造一张带随机块状纹理的 JPEG"""
+    rng = np.random.RandomState(seed)
+    blocks = rng.randint(0, 200, (8, 8)).astype(np.uint8)
+    image = cv2.resize(blocks, (256, 256), interpolation=cv2.INTER_NEAREST)
+    image = cv2.add(image, np.full_like(image, brightness))
+    ok, buffer = cv2.imencode(".jpg", cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+class TestPhash(unittest.TestCase):
+    """感知哈希测试"""
+
+    def test_near_duplicate_close(self):
+        """亮度和压缩质量略有不同的同一画面哈希接近"""
+        a = phash(make_jpeg(1))
+        b = phash(make_jpeg(1, brightness=10, quality=60))
+        distance = hamming_distances(np.array([a], dtype=np.uint64), b)[0]
+        self.assertLessEqual(distance, 6)
+
+    def test_different_images_far(self):
+        """不同画面的哈希差异大"""
+        a = phash(make_jpeg(1))
+        b = phash(make_jpeg(2))
+        distance = hamming_distances(np.array([a], dtype=np.uint64), b)[0]
+        self.assertGreater(distance, 6)
+
+    def test_invalid_jpeg(self):
+        """无法解码时返回 None"""
+        self.assertIsNone(phash(b"not a jpeg"))
+
+    def test_hamming_distances(self):
+        """汉明距离按位计数"""
+        hashes = np.array([0, 0b1011, 2 ** 64 - 1], dtype=np.uint64)
+        self.assertEqual(list(hamming_distances(hashes, 0)), [0, 3, 64])
+
+
+class TestTrainingFramePool(unittest.TestCase):
+    """训练帧池去重与持久化测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = {"dir": os.path.join(self.tmp_dir, "pool"), "hamming_threshold": 6}
+        self.pool = TrainingFramePool(self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_dedup(self):
+        """近似帧只保留第一份"""
+        first = self.pool.add(make_jpeg(1), {"job_id": "a", "frame_type": "failure"})
+        duplicate = self.pool.add(make_jpeg(1, brightness=10, quality=60), {"job_id": "b", "frame_type": "failure"})
+        other = self.pool.add(make_jpeg(2), {"job_id": "b", "frame_type": "low_confidence"})
+        self.assertEqual(first, 0)
+        self.assertIsNone(duplicate)
+        self.assertEqual(other, 1)
+        self.assertEqual(self.pool.duplicates_skipped, 1)
+        self.assertTrue(os.path.exists(self.pool.image_path(1)))
+
+    def test_reload_keeps_index(self):
+        """重新加载后仍按已有索引去重"""
+        self.pool.add(make_jpeg(1), {"job_id": "a"})
+        reloaded = TrainingFramePool(self.config)
+        self.assertIsNone(reloaded.add(make_jpeg(1), {"job_id": "b"}))
+        self.assertEqual(reloaded.stats()["frames"], 1)
+
+    def test_rebuild_inconsistent_index(self):
+        """哈希索引与条目数不一致时以条目为准重建"""
+        self.pool.add(make_jpeg(1), {"job_id": "a"})
+        self.pool.add(make_jpeg(2), {"job_id": "a"})
+        with open(self.pool._hashes_path, "wb") as f:
+            f.write(b"\0" * 8)
+        reloaded = TrainingFramePool(self.config)
+        self.assertEqual(reloaded.stats()["frames"], 2)
+        self.assertIsNone(reloaded.add(make_jpeg(2), {"job_id": "b"}))
+
+    def test_index_grows(self):
+        """条目数超过预留容量时扩容"""
+        self.pool._load()
+        self.pool._hashes = np.zeros(1, dtype=np.uint64)
+        for seed in range(3):
+            self.pool.add(make_jpeg(seed), {})
+        self.assertEqual(self.pool._count, 3)
+        self.assertGreaterEqual(len(self.pool._hashes), 3)
+
+    def test_export_manifest(self):
+        """按起始 id 和帧类型导出，next_id 用于增量导出"""
+        self.pool.add(make_jpeg(1), {"frame_type": "failure", "frame_number": 5})
+        self.pool.add(make_jpeg(2), {"frame_type": "low_confidence", "frame_number": 6})
+        self.pool.add(make_jpeg(3), {"frame_type": "failure", "frame_number": 7})
+
+        manifest = self.pool.export_manifest(frame_type="failure")
+        self.assertEqual([f["id"] for f in manifest["frames"]], [0, 2])
+        self.assertEqual(manifest["frames"][1]["filename"], "00000002.jpg")
+        self.assertEqual(manifest["frames"][1]["source_frame_number"], 7)
+        self.assertEqual(manifest["failure_count"], 2)
+        self.assertEqual(manifest["next_id"], 3)
+
+        manifest = self.pool.export_manifest(since_id=1, limit=1)
+        self.assertEqual([f["id"] for f in manifest["frames"]], [1])
+        self.assertEqual(manifest["next_id"], 2)
+
+    def test_export_empty(self):
+        """没有新条目时 next_id 保持不变"""
+        manifest = self.pool.export_manifest(since_id=4)
+        self.assertEqual(manifest["frames"], [])
+        self.assertEqual(manifest["next_id"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+上传接收服务测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import threading
+import unittest
+from analyzer.ffmpeg import mp4_moov_end
+from app.services.upload_ingest import UploadIngestService, UploadTooLarge
+
+
+def box(box_type, payload_size):
+    """构造一个 MP4 box（32位长度头）"""
+    return (8 + payload_size).to_bytes(4, "big") + box_type + b"\0" * payload_size
+
+
+async def iter_chunks(chunks):
+    """把字节块列表包装成异步迭代器"""
+    for chunk in chunks:
+        yield chunk
+
+
+class TestUploadIngest(unittest.TestCase):
+    """流式上传接收测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = UploadIngestService({"dir": self.tmp_dir})
+        self.service.max_file_size = 1024
+        self.dest_path = os.path.join(self.tmp_dir, "job1.mp4")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_ingest_writes_file_and_hash(self):
+        """写入的文件内容、大小和 sha256 与上传内容一致"""
+        chunks = [b"abc", b"", b"defg"]
+        upload = asyncio.run(self.service.ingest(iter_chunks(chunks), self.dest_path))
+        self.assertEqual(upload.path, self.dest_path)
+        self.assertEqual(upload.size, 7)
+        self.assertEqual(upload.sha256, hashlib.sha256(b"abcdefg").hexdigest())
+        self.assertFalse(upload.in_memory)
+        with open(self.dest_path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdefg")
+
+    def test_declared_size_over_limit(self):
+        """声明的大小超限时不写文件直接拒绝"""
+        with self.assertRaises(UploadTooLarge):
+            asyncio.run(self.service.ingest(iter_chunks([b"x"]), self.dest_path, declared_size=2048))
+        self.assertFalse(os.path.exists(self.dest_path))
+
+    def test_actual_size_over_limit_cleans_up(self):
+        """实际接收超限时中止并删除已写入的部分"""
+        chunks = [b"x" * 600, b"x" * 600]
+        with self.assertRaises(UploadTooLarge):
+            asyncio.run(self.service.ingest(iter_chunks(chunks), self.dest_path))
+        self.assertFalse(os.path.exists(self.dest_path))
+
+    def test_exceeds_limit(self):
+        """按 Content-Length 提前判断是否超限"""
+        self.assertFalse(self.service.exceeds_limit(None))
+        self.assertFalse(self.service.exceeds_limit("abc"))
+        self.assertFalse(self.service.exceeds_limit("1024"))
+        self.assertTrue(self.service.exceeds_limit("1025"))
+        self.assertFalse(self.service.exceeds_limit("2048", multipart=True))
+
+    def test_upload_path(self):
+        """默认落盘路径沿用原文件扩展名"""
+        self.assertEqual(self.service.upload_path("job1", "swing.MOV"), os.path.join(self.tmp_dir, "job1.MOV"))
+        self.assertEqual(self.service.upload_path("job2", None), os.path.join(self.tmp_dir, "job2.mp4"))
+
+    @unittest.skipUnless(hasattr(os, "memfd_create"), "需要 memfd_create")
+    def test_small_upload_in_memory(self):
+        """不超过内存阈值的上传留在 memfd 中，不落盘"""
+        self.service.memory_threshold = 512
+        upload = asyncio.run(self.service.ingest(iter_chunks([b"abc"]), self.dest_path, declared_size=3))
+        self.assertTrue(upload.in_memory)
+        self.assertFalse(os.path.exists(self.dest_path))
+        with open(upload.path, "rb") as f:
+            self.assertEqual(f.read(), b"abc")
+        self.service.release(upload.path)
+
+    def test_release_removes_file(self):
+        """任务结束后释放落盘的视频"""
+        asyncio.run(self.service.ingest(iter_chunks([b"abc"]), self.dest_path))
+        self.service.release(self.dest_path)
+        self.assertFalse(os.path.exists(self.dest_path))
+
+
+class TestMp4MoovEnd(unittest.TestCase):
+    """faststart（moov 在 mdat 之前）检测测试"""
+
+    def test_faststart(self):
+        """moov 在 mdat 之前时返回 moov 结束位置"""
+        head = box(b"ftyp", 16) + box(b"moov", 100) + box(b"mdat", 10)
+        self.assertEqual(mp4_moov_end(head), 24 + 108)
+
+    def test_mdat_first(self):
+        """mdat 在 moov 之前时返回 0"""
+        head = box(b"ftyp", 16) + box(b"free", 4) + box(b"mdat", 10) + box(b"moov", 10)
+        self.assertEqual(mp4_moov_end(head), 0)
+
+    def test_not_mp4(self):
+        """第一个 box 不是 ftyp 时返回 0"""
+        self.assertEqual(mp4_moov_end(b"RIFF\0\0\0\0AVI LIST"), 0)
+
+    def test_need_more_bytes(self):
+        """box 头还没收全时返回 None"""
+        head = box(b"ftyp", 16)
+        self.assertIsNone(mp4_moov_end(head))
+        self.assertIsNone(mp4_moov_end(head + b"\0\0"))
+
+    def test_largesize_box(self):
+        """支持 64 位长度的 box"""
+        moov = (1).to_bytes(4, "big") + b"moov" + (16 + 50).to_bytes(8, "big") + b"\0" * 50
+        head = box(b"ftyp", 16) + moov
+        self.assertEqual(mp4_moov_end(head), 24 + 66)
+        self.assertIsNone(mp4_moov_end(box(b"ftyp", 16) + moov[:12]))
+
+    def test_invalid_size(self):
+        """长度小于头部的 box（含 size=0）视为无法边传边解码"""
+        head = box(b"ftyp", 16) + (0).to_bytes(4, "big") + b"mdat"
+        self.assertEqual(mp4_moov_end(head), 0)
+
+
+class TestLiveUpload(unittest.TestCase):
+    """边上传边分析测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = UploadIngestService({"dir": self.tmp_dir, "stream_start_bytes": 16})
+        self.dest_path = os.path.join(self.tmp_dir, "job1.mp4")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_on_ready_after_moov(self):
+        """faststart 文件在 moov 之后再收到 stream_start_bytes 字节时回调一次"""
+        data = box(b"ftyp", 16) + box(b"moov", 40) + box(b"mdat", 200)
+        ready = []
+
+        def on_ready(path):
+            ready.append((path, self.service.live_upload(path).bytes_written))
+
+        chunks = [data[i:i + 32] for i in range(0, len(data), 32)]
+        upload = asyncio.run(self.service.ingest(iter_chunks(chunks), self.dest_path, on_ready=on_ready))
+        self.assertEqual(len(ready), 1)
+        self.assertEqual(ready[0][0], self.dest_path)
+        self.assertGreaterEqual(ready[0][1], 24 + 48 + 16)
+        self.assertEqual(upload.size, len(data))
+        # 接收完成后不再是进行中的上传
+        self.assertIsNone(self.service.live_upload(self.dest_path))
+        self.assertTrue(self.service.wait_complete(self.dest_path))
+
+    def test_non_faststart_never_ready(self):
+        """非 faststart 文件不回调，等上传完成后再分析"""
+        data = box(b"ftyp", 16) + box(b"mdat", 200) + box(b"moov", 40)
+        ready = []
+        asyncio.run(self.service.ingest(iter_chunks([data]), self.dest_path, on_ready=ready.append))
+        self.assertEqual(ready, [])
+
+    def test_live_chunks_follow_writes(self):
+        """分析线程按写入进度读取已接收的字节"""
+        data = box(b"ftyp", 16) + box(b"moov", 40) + box(b"mdat", 200)
+        received = []
+
+        def on_ready(path):
+            live = self.service.live_upload(path)
+            thread = threading.Thread(target=lambda: received.extend(live.iter_chunks(chunk_size=50)))
+            thread.start()
+            threads.append(thread)
+
+        threads = []
+        chunks = [data[i:i + 32] for i in range(0, len(data), 32)]
+        asyncio.run(self.service.ingest(iter_chunks(chunks), self.dest_path, on_ready=on_ready))
+        threads[0].join(5)
+        self.assertEqual(b"".join(received), data)
+
+    def test_aborted_upload_marks_failed(self):
+        """上传中断时进行中的上传被标记为失败"""
+        self.service.max_file_size = 100
+        data = box(b"ftyp", 16) + box(b"moov", 8) + box(b"mdat", 200)
+        lives = []
+
+        def on_ready(path):
+            lives.append(self.service.live_upload(path))
+
+        chunks = [data[i:i + 32] for i in range(0, len(data), 32)]
+        with self.assertRaises(UploadTooLarge):
+            asyncio.run(self.service.ingest(iter_chunks(chunks), self.dest_path, on_ready=on_ready))
+        self.assertEqual(len(lives), 1)
+        self.assertFalse(lives[0].wait_complete(1))
+        self.assertTrue(lives[0].failed)
+
+
+if __name__ == '__main__':
+    unittest.main()
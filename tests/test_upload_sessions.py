@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+可续传分片上传测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from app.services.upload_ingest import UploadTooLarge
+from app.services.upload_sessions import UploadSessionError, UploadSessionStore, merge_ranges
+
+
+async def iter_chunks(chunks):
+    """把字节块列表包装成异步迭代器"""
+    for chunk in chunks:
+        yield chunk
+
+
+async def broken_chunks(chunks):
+    """发送若干块后连接中断"""
+    for chunk in chunks:
+        yield chunk
+    raise ConnectionError("连接断开")
+
+
+class TestMergeRanges(unittest.TestCase):
+    """已接收区间合并测试"""
+
+    def test_merge(self):
+        """重叠和相邻的区间合并，乱序输入按起点排序"""
+        self.assertEqual(merge_ranges([[10, 20], [0, 5], [5, 8], [15, 30], [40, 50]]), [[0, 8], [10, 30], [40, 50]])
+
+    def test_contained_range(self):
+        """被包含的区间不改变结果"""
+        self.assertEqual(merge_ranges([[0, 100], [10, 20]]), [[0, 100]])
+        self.assertEqual(merge_ranges([]), [])
+
+
+class TestUploadSessionStore(unittest.TestCase):
+    """上传会话测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = UploadSessionStore({"dir": os.path.join(self.tmp_dir, "sessions"), "chunk_size": 4})
+        self.data = bytes(range(32))
+        self.meta = self.store.create("swing.mp4", len(self.data))
+        self.upload_id = self.meta["upload_id"]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, offset, chunks):
+        return asyncio.run(self.store.write_chunk(self.upload_id, offset, iter_chunks(chunks)))
+
+    def test_create_validates_size(self):
+        """总大小为 0 或超过上限时拒绝创建"""
+        with self.assertRaises(UploadSessionError):
+            self.store.create("empty.mp4", 0)
+        with self.assertRaises(UploadTooLarge):
+            self.store.create("huge.mp4", self.store.max_file_size + 1)
+
+    def test_out_of_order_chunks_merge(self):
+        """乱序分片的已接收区间合并，全部接收后 complete"""
+        status = self.write(16, [self.data[16:24]])
+        self.assertEqual(status["received_ranges"], [[16, 24]])
+        self.assertFalse(status["complete"])
+        self.write(0, [self.data[0:8], self.data[8:16]])
+        status = self.write(24, [self.data[24:]])
+        self.assertEqual(status["received_ranges"], [[0, 32]])
+        self.assertEqual(status["received_bytes"], 32)
+        self.assertTrue(status["complete"])
+
+    def test_interrupted_chunk_keeps_prefix(self):
+        """分片中途断开时已写入的前缀记为已接收"""
+        with self.assertRaises(ConnectionError):
+            asyncio.run(self.store.write_chunk(self.upload_id, 8, broken_chunks([self.data[8:12]])))
+        status = self.store.status(self.store.get(self.upload_id))
+        self.assertEqual(status["received_ranges"], [[8, 12]])
+
+    def test_out_of_bounds(self):
+        """越界的偏移量和超出总大小的分片被拒绝"""
+        with self.assertRaises(UploadSessionError):
+            self.write(32, [b"x"])
+        with self.assertRaises(UploadSessionError):
+            self.write(30, [b"xyz"])
+        with self.assertRaises(KeyError):
+            asyncio.run(self.store.write_chunk("missing", 0, iter_chunks([b"x"])))
+
+    def test_finalize(self):
+        """全部接收后 finalize 移动数据文件、计算 sha256 并删除会话"""
+        self.write(0, [self.data])
+        dest_path = os.path.join(self.tmp_dir, "jobs", "job1.mp4")
+        upload = self.store.finalize(self.upload_id, dest_path, sha256=hashlib.sha256(self.data).hexdigest().upper())
+        self.assertEqual(upload.path, dest_path)
+        self.assertEqual(upload.size, 32)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.data).hexdigest())
+        with open(dest_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertIsNone(self.store.get(self.upload_id))
+
+    def test_finalize_incomplete(self):
+        """仍有缺失区间时不能 finalize，会话保留"""
+        self.write(0, [self.data[:16]])
+        with self.assertRaises(UploadSessionError):
+            self.store.finalize(self.upload_id, os.path.join(self.tmp_dir, "job1.mp4"))
+        self.assertIsNotNone(self.store.get(self.upload_id))
+
+    def test_finalize_sha_mismatch(self):
+        """sha256 不一致时拒绝，会话保留以便重传"""
+        self.write(0, [self.data])
+        dest_path = os.path.join(self.tmp_dir, "job1.mp4")
+        with self.assertRaises(UploadSessionError):
+            self.store.finalize(self.upload_id, dest_path, sha256="0" * 64)
+        self.assertFalse(os.path.exists(dest_path))
+        self.assertIsNotNone(self.store.get(self.upload_id))
+
+    def test_session_survives_restart(self):
+        """会话保存在磁盘上，新的存储实例可继续上传"""
+        self.write(0, [self.data[:8]])
+        store = UploadSessionStore({"dir": self.store.sessions_dir})
+        self.assertEqual(store.status(store.get(self.upload_id))["received_ranges"], [[0, 8]])
+
+    def test_expired_session(self):
+        """过期会话读取时视为不存在并删除，sweep_expired 清理过期会话"""
+        meta = self.store.get(self.upload_id)
+        meta["expires_at"] = time.time() - 1
+        with open(os.path.join(self.store.sessions_dir, self.upload_id, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        other = self.store.create("other.mp4", 8)
+        # create 会顺带清理过期会话
+        self.assertFalse(os.path.exists(os.path.join(self.store.sessions_dir, self.upload_id)))
+        self.assertIsNotNone(self.store.get(other["upload_id"]))
+        self.assertEqual(self.store.sweep_expired(), 0)
+
+    def test_invalid_upload_id(self):
+        """带路径分隔符的 upload_id 视为不存在"""
+        self.assertIsNone(self.store.get("../" + self.upload_id))
+        self.assertIsNone(self.store.get(""))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+视频转换服务测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+from app.services.video_conversion import VideoConversionService, is_faststart, plan_conversion, run_ffmpeg_with_progress
+
+
+PROGRESS_OUTPUT = """frame=30
+fps=29.50
+out_time_us=2000000
+speed=2.0x
+progress=continue
+frame=60
+fps=N/A
+out_time_ms=5000000
+speed=N/A
+progress=continue
+out_time_us=-9223372036854775807
+progress=continue
+frame=90
+out_time_us=10000000
+speed=2.5x
+progress=end
+"""
+
+
+class TestRunFfmpegWithProgress(unittest.TestCase):
+    """ffmpeg -progress 输出解析测试（用输出固定内容的脚本代替 ffmpeg）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _fake_ffmpeg(self, stdout, exit_code=0, stderr=""):
+        """生成一个忽略参数、输出指定内容的可执行脚本"""
+        stdout_path = os.path.join(self.tmp_dir, "stdout.txt")
+        with open(stdout_path, "w") as f:
+            f.write(stdout)
+        script = os.path.join(self.tmp_dir, "ffmpeg")
+        with open(script, "w") as f:
+            f.write(f"#!/bin/sh\ncat '{stdout_path}'\necho '{stderr}' >&2\nexit {exit_code}\n")
+        os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+        return script
+
+    def test_progress_blocks(self):
+        """每个进度块回调一次，按时长计算百分比和剩余时间"""
+        updates = []
+        run_ffmpeg_with_progress([self._fake_ffmpeg(PROGRESS_OUTPUT), "-i", "in.mp4", "out.mp4"], 10.0, updates.append)
+        self.assertEqual(len(updates), 4)
+        self.assertEqual(updates[0], {"percent": 20.0, "fps": 29.5, "speed": 2.0, "eta_seconds": 4.0, "out_time_s": 2.0})
+        # fps/speed 为 N/A 时为 None，out_time_ms 也按微秒解析
+        self.assertEqual(updates[1], {"percent": 50.0, "fps": None, "speed": None, "eta_seconds": None, "out_time_s": 5.0})
+        # 负的 out_time（尚未输出）按 0 处理
+        self.assertEqual(updates[2]["out_time_s"], 0.0)
+        self.assertEqual(updates[3]["percent"], 100.0)
+        self.assertEqual(updates[3]["eta_seconds"], 0.0)
+
+    def test_unknown_duration(self):
+        """时长未知时没有百分比，结束块仍报告 100%"""
+        updates = []
+        run_ffmpeg_with_progress([self._fake_ffmpeg(PROGRESS_OUTPUT), "out.mp4"], None, updates.append)
+        self.assertIsNone(updates[0]["percent"])
+        self.assertIsNone(updates[0]["eta_seconds"])
+        self.assertEqual(updates[0]["out_time_s"], 2.0)
+        self.assertEqual(updates[-1]["percent"], 100.0)
+
+    def test_percent_capped(self):
+        """输出时长超过探测时长时百分比不超过 100"""
+        updates = []
+        run_ffmpeg_with_progress([self._fake_ffmpeg(PROGRESS_OUTPUT), "out.mp4"], 4.0, updates.append)
+        self.assertEqual(updates[1]["percent"], 100.0)
+
+    def test_failure_raises_with_stderr(self):
+        """ffmpeg 失败时抛出 RuntimeError 并附带 stderr"""
+        script = self._fake_ffmpeg("progress=end\n", exit_code=1, stderr="Invalid data found")
+        with self.assertRaises(RuntimeError) as context:
+            run_ffmpeg_with_progress([script, "out.mp4"], 10.0, lambda progress: None)
+        self.assertIn("Invalid data found", str(context.exception))
+
+
+def box(box_type, payload_size):
+    """构造一个 MP4 box（32位长度头）"""
+    return (8 + payload_size).to_bytes(4, "big") + box_type + b"\0" * payload_size
+
+
+def make_probe(video_codec="h264", pix_fmt="yuv420p", audio_codec="aac", format_name="mov,mp4,m4a,3gp,3g2,mj2"):
+    """构造 probe_video 的返回值"""
+    return {"video_codec": video_codec, "pix_fmt": pix_fmt, "audio_codec": audio_codec,
+            "format_name": format_name, "duration": 3.0}
+
+
+class TestPlanConversion(unittest.TestCase):
+    """转换方式选择测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.faststart = self._write("faststart.mp4", box(b"ftyp", 16) + box(b"moov", 32) + box(b"mdat", 64))
+        self.mdat_first = self._write("camera.mp4", box(b"ftyp", 16) + box(b"mdat", 64) + box(b"moov", 32))
+        self.mov = self._write("camera.mov", box(b"ftyp", 16) + box(b"moov", 32) + box(b"mdat", 64))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_is_faststart(self):
+        """按 moov/mdat 顺序判断 faststart，文件不存在时为 False"""
+        self.assertTrue(is_faststart(self.faststart))
+        self.assertFalse(is_faststart(self.mdat_first))
+        self.assertFalse(is_faststart(os.path.join(self.tmp_dir, "missing.mp4")))
+
+    def test_copy(self):
+        """已是 faststart 的 H.264 MP4 直接复制"""
+        self.assertEqual(plan_conversion(self.faststart, make_probe(), ["h264"])["mode"], "copy")
+
+    def test_remux_when_moov_at_end(self):
+        """moov 在末尾时只需重新封装"""
+        self.assertEqual(plan_conversion(self.mdat_first, make_probe(), ["h264"])["mode"], "remux")
+
+    def test_remux_other_container(self):
+        """兼容编码的非 MP4 容器重新封装"""
+        self.assertEqual(plan_conversion(self.mov, make_probe(format_name="mov,mp4,m4a,3gp,3g2,mj2"), ["h264"])["mode"], "remux")
+
+    def test_remux_hevc_when_allowed(self):
+        """配置允许复制 HEVC 时 HEVC 也只重新封装"""
+        probe = make_probe(video_codec="hevc", pix_fmt="yuv420p10le")
+        self.assertEqual(plan_conversion(self.faststart, probe, ["h264", "hevc"])["mode"], "remux")
+        self.assertEqual(plan_conversion(self.faststart, probe, ["h264"])["mode"], "reencode")
+
+    def test_audio_transcode(self):
+        """视频兼容、音频不兼容时只转音频"""
+        plan = plan_conversion(self.faststart, make_probe(audio_codec="pcm_s16le"), ["h264"])
+        self.assertEqual(plan["mode"], "audio_transcode")
+
+    def test_no_audio(self):
+        """没有音轨时不需要转音频"""
+        self.assertEqual(plan_conversion(self.faststart, make_probe(audio_codec=None), ["h264"])["mode"], "copy")
+
+    def test_reencode_incompatible_pix_fmt(self):
+        """像素格式浏览器不支持时重编码"""
+        plan = plan_conversion(self.faststart, make_probe(pix_fmt="yuv422p10le"), ["h264"])
+        self.assertEqual(plan["mode"], "reencode")
+
+    def test_reencode_unknown_codec(self):
+        """编码不在可复制列表中时重编码"""
+        self.assertEqual(plan_conversion(self.faststart, make_probe(video_codec="mpeg4"), ["h264"])["mode"], "reencode")
+
+    def test_reencode_without_probe(self):
+        """ffprobe 失败或没有视频流时重编码"""
+        self.assertEqual(plan_conversion(self.faststart, None, ["h264"])["mode"], "reencode")
+        plan = plan_conversion(self.faststart, make_probe(video_codec=None), ["h264"])
+        self.assertEqual(plan["mode"], "reencode")
+        self.assertIn("probe", plan)
+
+
+class TestConversionCache(unittest.TestCase):
+    """转换缓存测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = VideoConversionService({"cache_dir": os.path.join(self.tmp_dir, "cache"), "workers": 1})
+        self.addCleanup(self.service._executor.shutdown)
+        self.sha256 = "ab" * 32
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _input(self):
+        path = os.path.join(self.tmp_dir, "input.mov")
+        with open(path, "wb") as f:
+            f.write(b"input")
+        return path
+
+    def test_copy_result_cached(self):
+        """流复制类结果写入缓存，之后任何质量档位都命中"""
+        output_path = self.service.cache_path(self.sha256, "stream")
+        self.service.jobs["job1"] = {"status": "queued"}
+        self.service._run("job1", self._input(), output_path, "medium", {"mode": "copy", "reason": ""})
+        self.assertEqual(self.service.jobs["job1"]["status"], "completed")
+        self.assertEqual(self.service.lookup_cache(self.sha256, "high"), output_path)
+
+    def test_opencv_fallback_not_cached(self):
+        """ffmpeg 不可用时 OpenCV 转换的结果不写入缓存"""
+        def fake_opencv(job_id, input_path, output_path):
+            with open(output_path, "wb") as f:
+                f.write(b"mp4v")
+
+        output_path = self.service.cache_path(self.sha256, "medium")
+        self.service.jobs["job1"] = {"status": "queued"}
+        with mock.patch("app.services.video_conversion.check_ffmpeg_available", return_value=False), \
+                mock.patch.object(self.service, "_convert_with_opencv", side_effect=fake_opencv):
+            self.service._run("job1", self._input(), output_path, "medium", {"mode": "reencode", "reason": ""})
+        job = self.service.jobs["job1"]
+        self.assertEqual(job["status"], "completed")
+        self.assertNotEqual(job["output_path"], output_path)
+        self.assertFalse(job["output_path"].startswith(self.service.cache_dir))
+        self.assertIsNone(self.service.lookup_cache(self.sha256, "medium"))
+        os.remove(job["output_path"])
+
+
+class TestSegmentedConversion(unittest.TestCase):
+    """分段并行转换测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.service = VideoConversionService({"workers": 2, "ffmpeg_threads": 2, "segmented": {
+            "min_duration_seconds": 120, "min_segment_seconds": 30, "threads_per_segment": 2, "max_segments": 8
+        }})
+        self.addCleanup(self.service._executor.shutdown)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def segment_count(self, duration_s, cores=16, load=0.0, active=1):
+        self.service._active = active
+        with mock.patch("app.services.video_conversion.os.cpu_count", return_value=cores), \
+                mock.patch("app.services.video_conversion.os.getloadavg", return_value=(load, 0.0, 0.0)):
+            return self.service._segment_count(duration_s)
+
+    def test_short_or_unknown_duration_not_segmented(self):
+        """时长未知或短于 min_duration_seconds 时不分段"""
+        self.assertEqual(self.segment_count(None), 1)
+        self.assertEqual(self.segment_count(119), 1)
+        self.service.segment_config["enabled"] = False
+        self.assertEqual(self.segment_count(600), 1)
+
+    def test_limited_by_duration_and_max(self):
+        """段数不超过 时长/最短段长 和 max_segments"""
+        self.assertEqual(self.segment_count(150), 5)
+        self.assertEqual(self.segment_count(3600), 8)
+
+    def test_limited_by_idle_cores(self):
+        """空闲核数扣除系统负载和其他转换任务占用的线程"""
+        self.assertEqual(self.segment_count(3600, cores=8, load=3.0), 2)
+        # 另有 2 个转换在运行，每个占 2 线程
+        self.assertEqual(self.segment_count(3600, cores=8, load=0.0, active=3), 2)
+        self.assertEqual(self.segment_count(3600, cores=2, load=2.0), 1)
+
+    def test_segment_and_concat_commands(self):
+        """切段、并行编码和拼接的 ffmpeg 命令"""
+        commands = []
+        concat_lists = []
+
+        def fake_ffmpeg(cmd, duration_s, on_progress):
+            commands.append((cmd, duration_s))
+            if "segment" in cmd:
+                work_dir = os.path.dirname(cmd[-1])
+                for i in range(3):
+                    open(os.path.join(work_dir, f"src_{i:03d}.mkv"), "wb").close()
+            elif "concat" in cmd:
+                with open(cmd[cmd.index("concat") + 4], encoding="utf-8") as f:
+                    concat_lists.append(f.read().splitlines())
+            else:
+                on_progress({"out_time_s": duration_s, "speed": 1.0, "fps": 30.0, "percent": 100.0})
+
+        output_path = os.path.join(self.tmp_dir, "out.mp4")
+        self.service.jobs["job1"] = {"status": "converting"}
+        with mock.patch("app.services.video_conversion.run_ffmpeg_with_progress", side_effect=fake_ffmpeg), \
+                mock.patch("app.services.video_conversion.probe_video", return_value={"duration": 40.0}):
+            self.service._convert_segmented("job1", "/videos/in.mov", output_path, "medium", 120.0, 3)
+
+        split_cmd = commands[0][0]
+        self.assertEqual(split_cmd[split_cmd.index("-segment_times") + 1], "40.000,80.000")
+        self.assertEqual(split_cmd[split_cmd.index("-c") + 1], "copy")
+        self.assertIn("-an", split_cmd)
+
+        encode_cmds = commands[1:4]
+        self.assertEqual(sorted(os.path.basename(cmd[cmd.index("-i") + 1]) for cmd, _ in encode_cmds),
+                         ["src_000.mkv", "src_001.mkv", "src_002.mkv"])
+        for cmd, duration_s in encode_cmds:
+            self.assertEqual(duration_s, 40.0)
+            self.assertEqual(cmd[cmd.index("-threads") + 1], "2")
+            self.assertIn("libx264", cmd)
+            self.assertIn("-an", cmd)
+
+        concat_cmd = commands[4][0]
+        self.assertEqual(concat_cmd[-1], output_path)
+        self.assertEqual(concat_cmd[concat_cmd.index("-i", concat_cmd.index("concat")) + 3], "/videos/in.mov")
+        self.assertIn("1:a:0?", concat_cmd)
+        self.assertEqual([line.rsplit("/", 1)[-1] for line in concat_lists[0]],
+                         ["enc_000.mp4'", "enc_001.mp4'", "enc_002.mp4'"])
+
+        job = self.service.jobs["job1"]
+        self.assertEqual(job["segments"], 3)
+        self.assertEqual(job["progress"], 99)
+        self.assertEqual(job["eta_seconds"], 0)
+        # 临时分段目录已删除
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    def test_remux_command_tags_hevc(self):
+        """HEVC 流复制时加 hvc1 标记，只保留第一条视频和音频流"""
+        cmd = self.service._ffmpeg_command("in.mov", "out.mp4", "medium",
+                                           {"mode": "remux", "probe": {"video_codec": "hevc"}})
+        self.assertEqual(cmd[cmd.index("-tag:v") + 1], "hvc1")
+        self.assertEqual(cmd[cmd.index("-c:a") + 1], "copy")
+        self.assertIn("0:a:0?", cmd)
+        self.assertEqual(cmd[-1], "out.mp4")
+
+
+if __name__ == '__main__':
+    unittest.main()